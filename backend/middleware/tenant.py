@@ -8,6 +8,7 @@ Resolution Priority:
 - Production: Host header only
 - Local/Staging/Preview: Header injection → Query param → Host header
 """
+import copy
 import os
 import logging
 from typing import Optional, Tuple
@@ -15,6 +16,7 @@ from fastapi import Request, HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.responses import Response, JSONResponse
 from database import db
+from utils.ttl_cache import TTLCache, MISSING
 
 logger = logging.getLogger(__name__)
 
@@ -93,16 +95,54 @@ def extract_subdomain(host: str) -> Optional[str]:
     return None
 
 
+# Slug → organization cache (per worker). Unknown slugs are cached too, with a
+# shorter TTL, so probing random subdomains does not hit MongoDB every time.
+# Writers call invalidate_tenant() so suspensions/branding changes apply at once
+# on the worker that handled the write; other workers converge within the TTL.
+_tenant_cache = TTLCache(
+    max_size=int(os.environ.get("TENANT_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("TENANT_CACHE_TTL", "60")),
+    negative_ttl=float(os.environ.get("TENANT_CACHE_NEGATIVE_TTL", "10")),
+)
+
+
 async def resolve_tenant_from_slug(slug: str) -> Optional[dict]:
-    """Look up tenant organization by slug"""
+    """
+    Look up tenant organization by slug (cached). Returns a copy, so callers
+    may modify it (nested settings included) without changing the cached org.
+    """
     if not slug:
         return None
     
-    org = await db.organizations.find_one(
-        {"slug": slug.lower(), "is_deleted": {"$ne": True}},
-        {"_id": 0}
-    )
-    return org
+    key = slug.lower()
+    org = _tenant_cache.get(key)
+    if org is MISSING:
+        org = await db.organizations.find_one(
+            {"slug": key, "is_deleted": {"$ne": True}},
+            {"_id": 0}
+        )
+        _tenant_cache.set(key, org)
+    return copy.deepcopy(org)
+
+
+def invalidate_tenant(org_id: Optional[str] = None, slug: Optional[str] = None) -> int:
+    """
+    Evict cached tenant entries by organization id and/or slug.
+    Call after any write to an organization document (status, branding,
+    settings, plan, slug) and after creating one (clears a negative entry).
+    """
+    evicted = 0
+    if slug and _tenant_cache.invalidate(slug.lower()):
+        evicted += 1
+    if org_id:
+        evicted += _tenant_cache.invalidate_where(
+            lambda _key, org: bool(org) and org.get("id") == org_id
+        )
+    return evicted
+
+
+def get_tenant_cache_stats() -> dict:
+    return _tenant_cache.stats()
 
 
 async def resolve_tenant(request: Request) -> Tuple[Optional[dict], Optional[str]]:
@@ -581,6 +581,9 @@ class TicketV2(BaseModel):
     assigned_team_name: Optional[str] = None
     assigned_to_id: Optional[str] = None
     assigned_to_name: Optional[str] = None
+    is_assigned: bool = False  # assigned_to_id and assigned_to_name both set (kept by sync_ticket_rollup)
+    assignment_status: Optional[str] = None  # pending, accepted, declined
+    assigned_at: Optional[str] = None
     
     # Status flags
     is_open: bool = True
@@ -591,8 +594,10 @@ class TicketV2(BaseModel):
     source: str = "web"  # web, email, phone, chat, api
     source_reference: Optional[str] = None
     
-    # Timeline
+    # Timeline: the last few events (services/ticket_events.py holds the full history)
     timeline: List[TicketTimelineEntry] = Field(default_factory=list)
+    event_count: int = 0
+    events_migrated: bool = True
     
     # Tasks
     task_ids: List[str] = Field(default_factory=list)
@@ -11,8 +11,11 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
 
 from models.amc_onboarding import AMCOnboarding, AMCOnboardingUpdate
-from utils.helpers import get_ist_isoformat
+from utils.helpers import get_ist_isoformat, with_lookup_keys
 from services.auth import get_current_company_user, get_current_admin
+from services.search_index import sync_search_entries, sync_search_matching
+from services.tenant_counters import count_inserted
+from services.expiries import sync_expiries, sync_expiries_matching
 
 router = APIRouter()
 
@@ -271,11 +274,15 @@ async def convert_to_amc(
     )
     
     await _db.amc_contracts.insert_one(amc_contract.model_dump())
+    await count_inserted("amc_contracts", [amc_contract.model_dump()])
+    await sync_search_entries("amc_contracts", [amc_contract.id])
+    await sync_expiries("amc_contracts", [amc_contract.id])
     
     # Import devices from inventory
     step4 = onboarding.get("step4_device_inventory", {})
     devices = step4.get("devices", [])
     devices_created = 0
+    device_docs = []
     
     for device in devices:
         device_doc = {
@@ -298,8 +305,12 @@ async def convert_to_amc(
             "is_deleted": False,
             "created_at": get_ist_isoformat()
         }
-        await _db.devices.insert_one(device_doc)
+        await _db.devices.insert_one(with_lookup_keys(device_doc))
+        device_docs.append(device_doc)
         devices_created += 1
+    await count_inserted("devices", device_docs)
+    await sync_search_matching("devices", {"onboarding_id": onboarding_id})
+    await sync_expiries_matching("devices", {"onboarding_id": onboarding_id})
     
     # Update onboarding status
     await _db.amc_onboardings.update_one(
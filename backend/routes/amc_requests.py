@@ -12,6 +12,9 @@ from models.amc import (
     AMCContract, AMCContractCreate, InAppNotification
 )
 from services.auth import get_current_admin, get_current_company_user
+from services.search_index import sync_search_entries
+from services.tenant_counters import count_inserted
+from services.expiries import sync_expiries
 from utils.helpers import get_ist_isoformat, calculate_warranty_expiry
 
 router = APIRouter(tags=["AMC Requests"])
@@ -313,6 +316,9 @@ async def approve_amc_request(
     )
     
     await db.amc_contracts.insert_one(contract.model_dump())
+    await count_inserted("amc_contracts", [contract.model_dump()])
+    await sync_search_entries("amc_contracts", [contract.id])
+    await sync_expiries("amc_contracts", [contract.id])
     
     # Update request status
     await db.amc_requests.update_one(
@@ -8,32 +8,42 @@ from pydantic import BaseModel
 from datetime import datetime, timedelta, timezone
 from collections import defaultdict
 from typing import Optional, List
-import time, logging, bcrypt
+import functools, logging, bcrypt
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 _db = None
 logger = logging.getLogger("analytics")
 
-# Simple in-memory cache with TTL
-_cache = {}
 CACHE_TTL = 300  # 5 minutes
 
 def init_db(database):
     global _db
     _db = database
 
-def _cached(key, ttl=CACHE_TTL):
-    if key in _cache:
-        data, ts = _cache[key]
-        if time.time() - ts < ttl:
-            return data
-    return None
-
-def _set_cache(key, data):
-    _cache[key] = (data, time.time())
-
 # Auth dependency
 from services.auth import get_current_admin
+from services import ticket_rollups as rollups
+from services import analytics_pipelines as pipelines
+from services import profitability
+from services.batch_join import collect_ids, fetch_map
+from services.analytics_cache import analytics_cache, invalidate_analytics
+
+def _cached_endpoint(name: str, tags=(), ttl: float = CACHE_TTL):
+    """
+    Serve an endpoint through the analytics cache, keyed by org and query params.
+    `tags` name the data the result is derived from, for invalidate_analytics().
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            org_id = kwargs["admin"].get("organization_id")
+            params = ":".join(f"{k}={v}" for k, v in sorted(kwargs.items()) if k != "admin")
+            return await analytics_cache.get_or_compute(
+                f"{name}:{org_id}:{params}", lambda: fn(*args, **kwargs),
+                org_id=org_id, tags=tags, ttl=ttl
+            )
+        return wrapper
+    return decorator
 
 def _parse_dates(days_back: int):
     now = datetime.now(timezone.utc)
@@ -46,175 +56,194 @@ def _parse_dates(days_back: int):
 # ══════════════════════════════════════════════════════════
 
 @router.get("/tickets")
+@_cached_endpoint("ticket_intel", tags=("tickets",))
 async def ticket_intelligence(
     days: int = Query(30, ge=1, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"ticket_intel:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    start_iso, _ = _parse_dates(days)
-    base_filter = {"organization_id": org_id, "is_deleted": {"$ne": True}}
-    all_tickets = await _db.tickets_v2.find(base_filter, {"_id": 0}).to_list(5000)
-    period_tickets = [t for t in all_tickets if t.get("created_at", "") >= start_iso]
-
-    # Volume by day
-    volume_by_day = defaultdict(int)
-    for t in period_tickets:
-        day = t.get("created_at", "")[:10]
-        volume_by_day[day] += 1
-
-    # Stage distribution
-    stage_dist = defaultdict(int)
-    for t in all_tickets:
-        if t.get("is_open"):
-            stage_dist[t.get("current_stage_name", "Unknown")] += 1
-
-    # Priority distribution
-    priority_dist = defaultdict(int)
-    for t in period_tickets:
-        priority_dist[t.get("priority_name", "medium")] += 1
-
-    # Help topic breakdown
-    topic_dist = defaultdict(int)
-    for t in period_tickets:
-        topic_dist[t.get("help_topic_name", "Unknown")] += 1
-
-    # Source analysis
-    source_dist = defaultdict(int)
-    for t in period_tickets:
-        source_dist[t.get("source", "web")] += 1
-
-    # Resolution time (for closed tickets)
-    resolution_times = []
-    for t in all_tickets:
-        if t.get("closed_at") and t.get("created_at"):
-            try:
-                created = datetime.fromisoformat(t["created_at"].replace("Z", "+00:00"))
-                closed = datetime.fromisoformat(t["closed_at"].replace("Z", "+00:00"))
-                hours = (closed - created).total_seconds() / 3600
-                resolution_times.append(hours)
-            except Exception:
-                pass
-
-    avg_resolution = sum(resolution_times) / len(resolution_times) if resolution_times else 0
-    resolution_times.sort()
-    p95 = resolution_times[int(len(resolution_times) * 0.95)] if resolution_times else 0
-
-    # First response time
-    response_times = []
-    for t in all_tickets:
-        if t.get("first_response_at") and t.get("created_at"):
-            try:
-                created = datetime.fromisoformat(t["created_at"].replace("Z", "+00:00"))
-                responded = datetime.fromisoformat(t["first_response_at"].replace("Z", "+00:00"))
-                hours = (responded - created).total_seconds() / 3600
-                response_times.append(hours)
-            except Exception:
-                pass
-
-    avg_first_response = sum(response_times) / len(response_times) if response_times else 0
-
-    # Heat map (day of week x hour)
-    heatmap = defaultdict(lambda: defaultdict(int))
-    for t in period_tickets:
-        try:
-            dt = datetime.fromisoformat(t["created_at"].replace("Z", "+00:00"))
-            heatmap[dt.strftime("%a")][dt.hour] += 1
-        except Exception:
-            pass
-
-    # Reopen rate (tickets that were closed then reopened)
-    reopen_count = sum(1 for t in all_tickets if t.get("closed_at") and t.get("is_open"))
-
-    # Unassigned vs assigned
-    unassigned = sum(1 for t in all_tickets if t.get("is_open") and not t.get("assigned_to_id"))
-    assigned = sum(1 for t in all_tickets if t.get("is_open") and t.get("assigned_to_id"))
+    totals = await rollups.load_totals(org_id)
+    if rollups.rollups_current(totals):
+        stats = await _ticket_stats_from_rollups(org_id, days, totals)
+    else:
+        # Rollups not rebuilt for this org yet (maybe partial): aggregate on the server instead
+        stats = await _ticket_stats_from_pipeline(org_id, days)
+    totals = stats["totals"]
+
+    total_tickets = totals.get("total", 0)
+    resolution_count = totals.get("resolution_count", 0)
+    response_count = totals.get("first_response_count", 0)
+
+    avg_resolution = totals.get("resolution_hours", 0) / resolution_count if resolution_count else 0
+    p95 = rollups.histogram_percentile(totals.get("resolution_hist"), 0.95)
+    avg_first_response = totals.get("first_response_hours", 0) / response_count if response_count else 0
 
     result = {
         "summary": {
-            "total_tickets": len(all_tickets),
-            "period_tickets": len(period_tickets),
-            "open_tickets": sum(1 for t in all_tickets if t.get("is_open")),
-            "closed_tickets": sum(1 for t in all_tickets if not t.get("is_open")),
-            "unassigned": unassigned,
-            "assigned": assigned,
+            "total_tickets": total_tickets,
+            "period_tickets": sum(c for _, c in stats["volume_by_day"]),
+            "open_tickets": totals.get("open", 0),
+            "closed_tickets": totals.get("closed", 0),
+            "unassigned": totals.get("open_unassigned", 0),
+            "assigned": totals.get("open_assigned", 0),
             "avg_resolution_hours": round(avg_resolution, 1),
             "p95_resolution_hours": round(p95, 1),
             "avg_first_response_hours": round(avg_first_response, 1),
-            "reopen_rate": round(reopen_count / max(len(all_tickets), 1) * 100, 1),
+            "reopen_rate": round(totals.get("reopened", 0) / max(total_tickets, 1) * 100, 1),
         },
-        "volume_by_day": [{"date": k, "count": v} for k, v in sorted(volume_by_day.items())],
-        "stage_distribution": [{"name": k, "count": v} for k, v in sorted(stage_dist.items(), key=lambda x: -x[1])],
-        "priority_distribution": [{"name": k, "count": v} for k, v in priority_dist.items()],
-        "topic_distribution": [{"name": k, "count": v} for k, v in sorted(topic_dist.items(), key=lambda x: -x[1])[:15]],
-        "source_distribution": [{"name": k, "count": v} for k, v in source_dist.items()],
-        "heatmap": {day: dict(hours) for day, hours in heatmap.items()},
+        "volume_by_day": [{"date": d, "count": c} for d, c in stats["volume_by_day"]],
+        "stage_distribution": [{"name": k, "count": v} for k, v in sorted(stats["stages"].items(), key=lambda x: -x[1])],
+        "priority_distribution": [{"name": k, "count": v} for k, v in stats["priority"].items()],
+        "topic_distribution": [{"name": k, "count": v} for k, v in sorted(stats["topic"].items(), key=lambda x: -x[1])[:15]],
+        "source_distribution": [{"name": k, "count": v} for k, v in stats["source"].items()],
+        "heatmap": stats["heatmap"],
     }
-    _set_cache(cache_key, result)
     return result
 
 
+async def _ticket_stats_from_rollups(org_id: str, days: int, totals: dict) -> dict:
+    rows = await rollups.load_daily(
+        org_id, rollups.period_start(days), fields=["created", "priority", "topic", "source", "heatmap"]
+    )
+
+    # Heat map (day of week x hour)
+    heatmap = defaultdict(dict)
+    for row in rows:
+        for day, hours in (row.get("heatmap") or {}).items():
+            for hour, count in hours.items():
+                heatmap[day][int(hour)] = heatmap[day].get(int(hour), 0) + count
+
+    return {
+        "totals": totals,
+        "volume_by_day": [(r["date"], r["created"]) for r in rows if r.get("created")],
+        "stages": rollups.unescape_keys(totals.get("open_by_stage")),
+        "priority": rollups.merge_counts(rows, "priority"),
+        "topic": rollups.merge_counts(rows, "topic"),
+        "source": rollups.merge_counts(rows, "source"),
+        "heatmap": {day: {h: c for h, c in hours.items() if c} for day, hours in heatmap.items()},
+    }
+
+
+async def _ticket_stats_from_pipeline(org_id: str, days: int) -> dict:
+    docs = await _db.tickets_v2.aggregate(
+        pipelines.ticket_intelligence_pipeline(org_id, rollups.period_start(days))
+    ).to_list(1)
+    facets = pipelines.facet_result(docs)
+
+    totals = pipelines.first(facets.get("totals"))
+    totals["closed"] = totals.get("total", 0) - totals.get("open", 0)
+    totals["open_unassigned"] = totals.get("open", 0) - totals.get("open_assigned", 0)
+    totals["resolution_hist"] = pipelines.histogram_from_buckets(facets.get("resolution_hist", []))
+
+    heatmap = defaultdict(dict)
+    for r in facets.get("heatmap", []):
+        heatmap[pipelines.WEEKDAYS[r["_id"]["day"]]][r["_id"]["hour"]] = r["count"]
+
+    return {
+        "totals": totals,
+        "volume_by_day": [(r["_id"], r["count"]) for r in facets.get("volume_by_day", [])],
+        "stages": pipelines.as_counts(facets.get("stages")),
+        "priority": pipelines.as_counts(facets.get("priority")),
+        "topic": pipelines.as_counts(facets.get("topic")),
+        "source": pipelines.as_counts(facets.get("source")),
+        "heatmap": dict(heatmap),
+    }
+
+
+@router.post("/rollups/rebuild")
+async def rebuild_ticket_rollups(admin: dict = Depends(get_current_admin)):
+    """Recompute this organization's ticket rollups from tickets_v2 (backfill / reconciliation)"""
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    stats = await rollups.rebuild_rollups(org_id)
+    await invalidate_analytics(org_id, "tickets")
+    return stats
+
+
 # ══════════════════════════════════════════════════════════
 # 2. WORKFORCE PERFORMANCE
 # ══════════════════════════════════════════════════════════
 
 @router.get("/workforce")
+@_cached_endpoint("workforce", tags=("tickets", "visits"))
 async def workforce_performance(
     days: int = Query(30, ge=1, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"workforce:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    start_iso, _ = _parse_dates(days)
     base = {"organization_id": org_id, "is_deleted": {"$ne": True}}
 
     engineers = await _db.engineers.find(
         {**base, "is_active": True}, {"_id": 0, "id": 1, "name": 1, "email": 1, "phone": 1}
     ).to_list(200)
 
-    all_tickets = await _db.tickets_v2.find(base, {"_id": 0}).to_list(5000)
+    totals = await rollups.load_totals(org_id)
+    if rollups.rollups_current(totals):
+        rows = await rollups.load_daily(org_id, rollups.period_start(days), fields=["engineer_created"])
+        eng_totals = rollups.unescape_keys(totals.get("engineers"))
+        period_assigned = rollups.merge_counts(rows, "engineer_created")
+    else:
+        # Rollups not rebuilt for this org yet (maybe partial): aggregate on the server instead
+        groups = await _db.tickets_v2.aggregate(
+            pipelines.workforce_tickets_pipeline(org_id, rollups.period_start(days))
+        ).to_list(None)
+        eng_totals = {g["_id"]: g for g in groups}
+        period_assigned = {g["_id"]: g["period_assigned"] for g in groups}
     visits = await _db.service_visits_new.find({"organization_id": org_id}, {"_id": 0}).to_list(2000)
     parts_reqs = await _db.parts_requests.find({"organization_id": org_id}, {"_id": 0}).to_list(1000)
     sla_logs = await _db.assignment_sla_logs.find({"organization_id": org_id}, {"_id": 0}).to_list(1000)
 
+    visits_by_eng = defaultdict(list)
+    for v in visits:
+        visits_by_eng[v.get("technician_id")].append(v)
+    parts_by_eng = defaultdict(list)
+    for p in parts_reqs:
+        parts_by_eng[p.get("engineer_id")].append(p)
+    sla_by_eng = defaultdict(list)
+    for sl in sla_logs:
+        sla_by_eng[sl.get("engineer_id")].append(sl)
+
+    # First time fix: closed tickets of the engineer with exactly one visit by them.
+    # Resolve which single-visit tickets are closed with one query for all engineers.
+    single_visit = set()
+    for eid, eng_visits in visits_by_eng.items():
+        per_ticket = defaultdict(int)
+        for v in eng_visits:
+            per_ticket[v.get("ticket_id")] += 1
+        single_visit.update((eid, tid) for tid, n in per_ticket.items() if tid and n == 1)
+    closed_single = set()
+    if single_visit:
+        async for t in _db.tickets_v2.find(
+            {"organization_id": org_id, "is_deleted": {"$ne": True}, "is_open": False,
+             "id": {"$in": list({tid for _, tid in single_visit})}},
+            {"_id": 0, "id": 1, "assigned_to_id": 1}
+        ):
+            if (t.get("assigned_to_id"), t["id"]) in single_visit:
+                closed_single.add((t["assigned_to_id"], t["id"]))
+    ftf_by_eng = defaultdict(int)
+    for eid, _ in closed_single:
+        ftf_by_eng[eid] += 1
+
     eng_map = {e["id"]: e["name"] for e in engineers}
     scorecards = []
 
     for eng in engineers:
         eid = eng["id"]
-        assigned = [t for t in all_tickets if t.get("assigned_to_id") == eid]
-        period_assigned = [t for t in assigned if t.get("created_at", "") >= start_iso]
-        closed = [t for t in assigned if not t.get("is_open")]
-        eng_visits = [v for v in visits if v.get("technician_id") == eid]
-        eng_parts = [p for p in parts_reqs if p.get("engineer_id") == eid]
-        eng_sla = [s for s in sla_logs if s.get("engineer_id") == eid]
-
-        # Resolution times
-        res_times = []
-        for t in closed:
-            if t.get("closed_at") and t.get("assigned_at"):
-                try:
-                    a = datetime.fromisoformat(t["assigned_at"].replace("Z", "+00:00"))
-                    c = datetime.fromisoformat(t["closed_at"].replace("Z", "+00:00"))
-                    res_times.append((c - a).total_seconds() / 3600)
-                except Exception:
-                    pass
+        counts = eng_totals.get(eid, {})
+        assigned = counts.get("assigned", 0)
+        closed = counts.get("closed", 0)
+        eng_visits = visits_by_eng.get(eid, [])
+        eng_parts = parts_by_eng.get(eid, [])
+        eng_sla = sla_by_eng.get(eid, [])
 
         # SLA response times
         resp_times = []
-        for s in eng_sla:
-            if s.get("responded_at") and s.get("assigned_at"):
+        for sl in eng_sla:
+            if sl.get("responded_at") and sl.get("assigned_at"):
                 try:
-                    a = datetime.fromisoformat(s["assigned_at"].replace("Z", "+00:00"))
-                    r = datetime.fromisoformat(s["responded_at"].replace("Z", "+00:00"))
+                    a = datetime.fromisoformat(sl["assigned_at"].replace("Z", "+00:00"))
+                    r = datetime.fromisoformat(sl["responded_at"].replace("Z", "+00:00"))
                     resp_times.append((r - a).total_seconds() / 60)
                 except Exception:
                     pass
@@ -222,27 +251,20 @@ async def workforce_performance(
         # Visit hours
         total_visit_hours = sum((v.get("duration_minutes") or 0) / 60 for v in eng_visits)
 
-        # First time fix rate
-        tickets_with_one_visit = 0
-        for t in closed:
-            t_visits = [v for v in eng_visits if v.get("ticket_id") == t.get("id")]
-            if len(t_visits) == 1:
-                tickets_with_one_visit += 1
-
         parts_cost = sum(p.get("grand_total", 0) for p in eng_parts)
 
         scorecards.append({
             "id": eid,
             "name": eng["name"],
-            "total_assigned": len(assigned),
-            "period_assigned": len(period_assigned),
-            "closed": len(closed),
-            "open": len(assigned) - len(closed),
-            "avg_resolution_hours": round(sum(res_times) / max(len(res_times), 1), 1),
+            "total_assigned": assigned,
+            "period_assigned": period_assigned.get(eid, 0),
+            "closed": closed,
+            "open": assigned - closed,
+            "avg_resolution_hours": round(counts.get("resolution_hours", 0) / max(counts.get("resolution_count", 0), 1), 1),
             "avg_response_minutes": round(sum(resp_times) / max(len(resp_times), 1), 1),
             "total_visits": len(eng_visits),
             "total_visit_hours": round(total_visit_hours, 1),
-            "first_time_fix_rate": round(tickets_with_one_visit / max(len(closed), 1) * 100, 1),
+            "first_time_fix_rate": round(ftf_by_eng[eid] / max(closed, 1) * 100, 1),
             "parts_requests": len(eng_parts),
             "parts_cost": round(parts_cost, 2),
         })
@@ -261,7 +283,6 @@ async def workforce_performance(
         "scorecards": sorted(scorecards, key=lambda x: -x["total_assigned"]),
         "workload_distribution": workload,
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -270,16 +291,12 @@ async def workforce_performance(
 # ══════════════════════════════════════════════════════════
 
 @router.get("/financial")
+@_cached_endpoint("financial", tags=("contracts",))
 async def financial_analytics(
     days: int = Query(30, ge=1, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"financial:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
     start_iso, _ = _parse_dates(days)
 
     quotations = await _db.quotations.find(
@@ -361,7 +378,6 @@ async def financial_analytics(
         "parts_by_status": [{"status": k, "amount": round(v, 2)} for k, v in parts_by_status.items()],
         "aging_buckets": [{"bucket": k, "amount": round(v, 2)} for k, v in aging_buckets.items()],
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -370,69 +386,60 @@ async def financial_analytics(
 # ══════════════════════════════════════════════════════════
 
 @router.get("/clients")
+@_cached_endpoint("clients", tags=("tickets",))
 async def client_health(
     days: int = Query(30, ge=1, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"clients:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
     companies = await _db.companies.find(
         {"organization_id": org_id}, {"_id": 0, "id": 1, "name": 1, "amc_status": 1}
     ).to_list(500)
-    all_tickets = await _db.tickets_v2.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0}
-    ).to_list(5000)
-    devices = await _db.devices.find(
-        {"organization_id": org_id}, {"_id": 0, "id": 1, "company_id": 1}
-    ).to_list(5000)
-    quotations = await _db.quotations.find(
-        {"organization_id": org_id}, {"_id": 0, "company_id": 1, "total_amount": 1, "status": 1}
-    ).to_list(5000)
+    ticket_facets = pipelines.facet_result(await _db.tickets_v2.aggregate(
+        pipelines.client_tickets_pipeline(org_id, rollups.period_start(days))
+    ).to_list(1))
+    device_counts = pipelines.as_counts(
+        await _db.devices.aggregate(pipelines.count_by_company_pipeline(org_id)).to_list(None)
+    )
+    quote_totals = {
+        q["_id"]: q for q in
+        await _db.quotations.aggregate(pipelines.client_quotations_pipeline(org_id)).to_list(None)
+    }
 
-    start_iso, _ = _parse_dates(days)
+    ticket_stats = {t["_id"]: t for t in ticket_facets.get("per_company", [])}
+    topics = {t["_id"]: t["topics"] for t in ticket_facets.get("topics", [])}
     company_scores = []
 
     for comp in companies:
         cid = comp["id"]
-        c_tickets = [t for t in all_tickets if t.get("company_id") == cid]
-        c_period = [t for t in c_tickets if t.get("created_at", "") >= start_iso]
-        c_open = [t for t in c_tickets if t.get("is_open")]
-        c_devices = [d for d in devices if d.get("company_id") == cid]
-        c_quotes = [q for q in quotations if q.get("company_id") == cid]
-        c_approved = sum(q.get("total_amount", 0) for q in c_quotes if q.get("status") == "approved")
-        c_pending = sum(q.get("total_amount", 0) for q in c_quotes if q.get("status") in ("sent", "draft", "pending"))
+        c_stats = ticket_stats.get(cid, {})
+        c_total = c_stats.get("total", 0)
+        c_period = c_stats.get("period", 0)
+        c_devices = device_counts.get(cid, 0)
+        c_quotes = quote_totals.get(cid, {})
 
         # SLA breach count
-        sla_breaches = sum(1 for t in c_tickets if t.get("sla_breached"))
+        sla_breaches = c_stats.get("breaches", 0)
 
         # Health score (0-100): lower tickets, fewer breaches, more devices = healthier
-        ticket_ratio = len(c_period) / max(len(c_devices), 1)
-        breach_ratio = sla_breaches / max(len(c_tickets), 1)
+        ticket_ratio = c_period / max(c_devices, 1)
+        breach_ratio = sla_breaches / max(c_total, 1)
         health = max(0, min(100, int(100 - ticket_ratio * 20 - breach_ratio * 30)))
 
-        # Topic breakdown for this company
-        topic_breakdown = defaultdict(int)
-        for t in c_period:
-            topic_breakdown[t.get("help_topic_name", "Other")] += 1
-
         company_scores.append({
             "id": cid,
             "name": comp["name"],
             "amc_status": comp.get("amc_status", "none"),
-            "device_count": len(c_devices),
-            "total_tickets": len(c_tickets),
-            "period_tickets": len(c_period),
-            "open_tickets": len(c_open),
+            "device_count": c_devices,
+            "total_tickets": c_total,
+            "period_tickets": c_period,
+            "open_tickets": c_stats.get("open", 0),
             "sla_breaches": sla_breaches,
             "health_score": health,
-            "revenue": round(c_approved, 2),
-            "pending_amount": round(c_pending, 2),
+            "revenue": round(c_quotes.get("approved", 0), 2),
+            "pending_amount": round(c_quotes.get("pending", 0), 2),
             "ticket_to_device_ratio": round(ticket_ratio, 2),
-            "top_topics": sorted(topic_breakdown.items(), key=lambda x: -x[1])[:5],
+            "top_topics": topics.get(cid, []),
         })
 
     result = {
@@ -444,7 +451,6 @@ async def client_health(
         },
         "companies": sorted(company_scores, key=lambda x: x["health_score"]),
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -453,109 +459,53 @@ async def client_health(
 # ══════════════════════════════════════════════════════════
 
 @router.get("/assets")
+@_cached_endpoint("assets", tags=("tickets",))
 async def asset_intelligence(admin: dict = Depends(get_current_admin)):
     org_id = admin.get("organization_id")
-    cache_key = f"assets:{org_id}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    devices = await _db.devices.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(10000)
-    service_hist = await _db.service_history.find(
-        {"organization_id": org_id} if "organization_id" in (await _db.service_history.find_one({}) or {}) else {},
-        {"_id": 0}
-    ).to_list(5000)
-    all_tickets = await _db.tickets_v2.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0, "device_id": 1, "device_name": 1}
-    ).to_list(5000)
-
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     now_dt = datetime.now(timezone.utc)
-
-    # Warranty expiry timeline
-    expiry_30 = 0
-    expiry_60 = 0
-    expiry_90 = 0
-    expired = 0
-    active_warranty = 0
-    for d in devices:
-        we = d.get("warranty_end_date", "")
-        if not we:
-            continue
-        try:
-            we_dt = datetime.strptime(str(we)[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            days_left = (we_dt - now_dt).days
-            if days_left < 0:
-                expired += 1
-            elif days_left <= 30:
-                expiry_30 += 1
-            elif days_left <= 60:
-                expiry_60 += 1
-            elif days_left <= 90:
-                expiry_90 += 1
-            else:
-                active_warranty += 1
-        except Exception:
-            pass
-
-    # Brand/model distribution
-    brand_dist = defaultdict(int)
-    model_dist = defaultdict(int)
-    type_dist = defaultdict(int)
-    status_dist = defaultdict(int)
-    for d in devices:
-        brand_dist[d.get("brand", "Unknown")] += 1
-        model_dist[f"{d.get('brand','')}/{d.get('model','')}"] += 1
-        type_dist[d.get("device_type", "Unknown")] += 1
-        status_dist[d.get("status", "unknown")] += 1
+    device_facets = pipelines.facet_result(await _db.devices.aggregate(
+        pipelines.asset_devices_pipeline(org_id, now_dt)
+    ).to_list(1))
+    failure_facets = pipelines.facet_result(await _db.tickets_v2.aggregate(
+        pipelines.asset_failures_pipeline(org_id)
+    ).to_list(1))
+
+    # Warranty expiry timeline ($bucket ids are the lower bound in days left)
+    warranty = pipelines.as_counts(device_facets.get("warranty"))
+    expired = warranty.get(float("-inf"), 0)
+    expiry_30 = warranty.get(0, 0)
+    expiry_60 = warranty.get(31, 0)
+    expiry_90 = warranty.get(61, 0)
+    active_warranty = warranty.get("active", 0)
+
+    # Brand/type/status distribution
+    brand_dist = pipelines.as_counts(device_facets.get("brand"))
+    type_dist = pipelines.as_counts(device_facets.get("type"))
+    status_dist = pipelines.as_counts(device_facets.get("status"))
 
     # Failure rate (tickets per device)
-    device_ticket_count = defaultdict(int)
-    for t in all_tickets:
-        if t.get("device_id"):
-            device_ticket_count[t["device_id"]] += 1
-
-    failure_by_brand = defaultdict(lambda: {"tickets": 0, "devices": 0})
-    for d in devices:
-        brand = d.get("brand", "Unknown")
-        failure_by_brand[brand]["devices"] += 1
-        failure_by_brand[brand]["tickets"] += device_ticket_count.get(d["id"], 0)
+    brand_tickets = {r["_id"]: r["tickets"] for r in failure_facets.get("by_brand", [])}
+    failure_by_brand = {
+        brand: {"tickets": brand_tickets.get(brand, 0), "devices": count}
+        for brand, count in brand_dist.items()
+    }
 
     # Age distribution
-    age_buckets = {"<1yr": 0, "1-2yr": 0, "2-3yr": 0, "3-4yr": 0, "4-5yr": 0, "5yr+": 0}
-    for d in devices:
-        pd_str = d.get("purchase_date", "")
-        if not pd_str:
-            continue
-        try:
-            pd_dt = datetime.strptime(str(pd_str)[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            age_years = (now_dt - pd_dt).days / 365
-            if age_years < 1:
-                age_buckets["<1yr"] += 1
-            elif age_years < 2:
-                age_buckets["1-2yr"] += 1
-            elif age_years < 3:
-                age_buckets["2-3yr"] += 1
-            elif age_years < 4:
-                age_buckets["3-4yr"] += 1
-            elif age_years < 5:
-                age_buckets["4-5yr"] += 1
-            else:
-                age_buckets["5yr+"] += 1
-        except Exception:
-            pass
+    ages = pipelines.as_counts(device_facets.get("age"))
+    age_buckets = dict(zip(
+        pipelines.AGE_BUCKETS,
+        [ages.get(float("-inf"), 0), ages.get(1, 0), ages.get(2, 0), ages.get(3, 0), ages.get(4, 0), ages.get("5yr+", 0)]
+    ))
 
     result = {
         "summary": {
-            "total_devices": len(devices),
+            "total_devices": pipelines.first(device_facets.get("total"), {"count": 0})["count"],
             "active_warranty": active_warranty,
             "expired_warranty": expired,
             "expiring_30d": expiry_30,
             "expiring_60d": expiry_60,
             "expiring_90d": expiry_90,
-            "devices_with_tickets": len(device_ticket_count),
+            "devices_with_tickets": pipelines.first(failure_facets.get("devices_with_tickets"), {"count": 0})["count"],
         },
         "warranty_timeline": [
             {"label": "Expired", "count": expired},
@@ -574,7 +524,6 @@ async def asset_intelligence(admin: dict = Depends(get_current_admin)):
             for k, v in sorted(failure_by_brand.items(), key=lambda x: -x[1]["tickets"])[:10]
         ],
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -583,58 +532,52 @@ async def asset_intelligence(admin: dict = Depends(get_current_admin)):
 # ══════════════════════════════════════════════════════════
 
 @router.get("/sla")
+@_cached_endpoint("sla", tags=("tickets",))
 async def sla_compliance(
     days: int = Query(30, ge=1, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"sla:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    all_tickets = await _db.tickets_v2.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0}
-    ).to_list(5000)
     sla_policies = await _db.ticket_sla_policies.find(
         {"organization_id": org_id}, {"_id": 0}
     ).to_list(100)
+    if rollups.rollups_current(await rollups.load_totals(org_id)):
+        rows = await rollups.load_daily(
+            org_id, rollups.period_start(days),
+            fields=["created", "sla_breached", "is_overdue", "is_escalated", "priority", "priority_breached", "team"]
+        )
+    else:
+        # Rollups not rebuilt for this org yet (maybe partial): the same rows from tickets_v2
+        rows = rollups.daily_rows_from_groups(await _db.tickets_v2.aggregate(
+            pipelines.sla_daily_pipeline(org_id, rollups.period_start(days))
+        ).to_list(None))
 
-    start_iso, _ = _parse_dates(days)
-    period = [t for t in all_tickets if t.get("created_at", "") >= start_iso]
-
-    total = len(period)
-    breached = sum(1 for t in period if t.get("sla_breached"))
-    overdue = sum(1 for t in period if t.get("is_overdue"))
-    escalated = sum(1 for t in period if t.get("is_escalated"))
+    total = rollups.total(rows, "created")
+    breached = rollups.total(rows, "sla_breached")
+    overdue = rollups.total(rows, "is_overdue")
+    escalated = rollups.total(rows, "is_escalated")
 
     # Breach by priority
-    breach_by_priority = defaultdict(lambda: {"total": 0, "breached": 0})
-    for t in period:
-        p = t.get("priority_name", "medium")
-        breach_by_priority[p]["total"] += 1
-        if t.get("sla_breached"):
-            breach_by_priority[p]["breached"] += 1
+    priority_breached = rollups.merge_counts(rows, "priority_breached")
+    breach_by_priority = {
+        p: {"total": n, "breached": priority_breached.get(p, 0)}
+        for p, n in rollups.merge_counts(rows, "priority").items()
+    }
 
     # Breach by team
-    breach_by_team = defaultdict(lambda: {"total": 0, "breached": 0})
-    for t in period:
-        team = t.get("assigned_team_name", "Unassigned")
-        breach_by_team[team]["total"] += 1
-        if t.get("sla_breached"):
-            breach_by_team[team]["breached"] += 1
+    breach_by_team = {
+        team: {"total": v.get("total", 0), "breached": v.get("breached", 0)}
+        for team, v in rollups.merge_nested(rows, "team").items() if v.get("total")
+    }
 
     # Breach trend by week
     breach_by_week = defaultdict(lambda: {"total": 0, "breached": 0})
-    for t in period:
-        try:
-            dt = datetime.fromisoformat(t["created_at"].replace("Z", "+00:00"))
-            week = dt.strftime("%Y-W%W")
-            breach_by_week[week]["total"] += 1
-            if t.get("sla_breached"):
-                breach_by_week[week]["breached"] += 1
-        except Exception:
-            pass
+    for row in rows:
+        if not row.get("created"):
+            continue
+        week = datetime.strptime(row["date"], "%Y-%m-%d").strftime("%Y-W%W")
+        breach_by_week[week]["total"] += row.get("created", 0)
+        breach_by_week[week]["breached"] += row.get("sla_breached", 0)
 
     result = {
         "summary": {
@@ -662,7 +605,6 @@ async def sla_compliance(
         ],
         "sla_policies_count": len(sla_policies),
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -671,64 +613,47 @@ async def sla_compliance(
 # ══════════════════════════════════════════════════════════
 
 @router.get("/workflows")
+@_cached_endpoint("workflows", tags=("tickets",))
 async def workflow_analytics(admin: dict = Depends(get_current_admin)):
     org_id = admin.get("organization_id")
-    cache_key = f"workflows:{org_id}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
     workflows = await _db.ticket_workflows.find(
         {"organization_id": org_id, "is_active": True}, {"_id": 0}
     ).to_list(100)
-    all_tickets = await _db.tickets_v2.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0, "workflow_id": 1, "current_stage_name": 1, "current_stage_id": 1,
-         "is_open": 1, "created_at": 1, "closed_at": 1, "timeline": 1, "device_warranty_type": 1}
-    ).to_list(5000)
+    facets = pipelines.facet_result(
+        await _db.tickets_v2.aggregate(pipelines.workflow_tickets_pipeline(org_id)).to_list(1)
+    )
+    # Cycle times from the full stage history (ticket_events), not the trimmed timeline summary
+    stays = await _db.ticket_events.aggregate(pipelines.stage_cycle_pipeline(org_id), allowDiskUse=True).to_list(None)
+
+    counts = defaultdict(lambda: {"open": 0, "closed": 0, "backlog": defaultdict(int)})
+    for r in facets.get("stages", []):
+        wf_counts = counts[r["_id"].get("workflow")]
+        wf_counts["open" if r["_id"]["open"] else "closed"] += r["count"]
+        if r["_id"]["open"]:
+            wf_counts["backlog"][r["_id"]["stage"]] += r["count"]
+    stage_times = defaultdict(list)
+    for r in stays:
+        stage_times[r["_id"].get("workflow")].append(
+            {"stage": r["_id"]["stage"], "avg_hours": round(r["hours"] / r["count"], 1), "count": r["count"]}
+        )
 
     wf_analytics = []
     for wf in workflows:
-        wf_tickets = [t for t in all_tickets if t.get("workflow_id") == wf["id"]]
+        wf_counts = counts[wf["id"]]
         stages = wf.get("stages", [])
-
-        # Stage backlog
-        stage_backlog = defaultdict(int)
-        for t in wf_tickets:
-            if t.get("is_open"):
-                stage_backlog[t.get("current_stage_name", "?")] += 1
-
-        # Stage cycle times from timeline
-        stage_times = defaultdict(list)
-        for t in wf_tickets:
-            timeline = t.get("timeline", [])
-            for i, ev in enumerate(timeline):
-                if ev.get("type") == "stage_changed" and i > 0:
-                    try:
-                        prev_ts = datetime.fromisoformat(timeline[i - 1].get("timestamp", "").replace("Z", "+00:00"))
-                        curr_ts = datetime.fromisoformat(ev.get("timestamp", "").replace("Z", "+00:00"))
-                        prev_stage = ev.get("description", "").split("→")[0].strip().replace("Stage changed: ", "")
-                        hours = (curr_ts - prev_ts).total_seconds() / 3600
-                        if hours > 0:
-                            stage_times[prev_stage].append(hours)
-                    except Exception:
-                        pass
-
         wf_analytics.append({
             "id": wf["id"],
             "name": wf["name"],
-            "total_tickets": len(wf_tickets),
-            "open_tickets": sum(1 for t in wf_tickets if t.get("is_open")),
-            "closed_tickets": sum(1 for t in wf_tickets if not t.get("is_open")),
+            "total_tickets": wf_counts["open"] + wf_counts["closed"],
+            "open_tickets": wf_counts["open"],
+            "closed_tickets": wf_counts["closed"],
             "stages_count": len(stages),
-            "stage_backlog": [{"stage": s.get("name", "?"), "count": stage_backlog.get(s.get("name"), 0), "order": s.get("order", 0)} for s in sorted(stages, key=lambda x: x.get("order", 0))],
-            "stage_cycle_times": [{"stage": k, "avg_hours": round(sum(v) / len(v), 1), "count": len(v)} for k, v in stage_times.items()],
+            "stage_backlog": [{"stage": s.get("name", "?"), "count": wf_counts["backlog"].get(s.get("name"), 0), "order": s.get("order", 0)} for s in sorted(stages, key=lambda x: x.get("order", 0))],
+            "stage_cycle_times": stage_times.get(wf["id"], []),
         })
 
     # Warranty type distribution
-    warranty_dist = defaultdict(int)
-    for t in all_tickets:
-        warranty_dist[t.get("device_warranty_type", "unknown")] += 1
+    warranty_dist = pipelines.as_counts(facets.get("warranty"))
 
     result = {
         "summary": {
@@ -738,7 +663,6 @@ async def workflow_analytics(admin: dict = Depends(get_current_admin)):
         "workflows": wf_analytics,
         "warranty_type_distribution": [{"type": k, "count": v} for k, v in warranty_dist.items()],
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -747,69 +671,49 @@ async def workflow_analytics(admin: dict = Depends(get_current_admin)):
 # ══════════════════════════════════════════════════════════
 
 @router.get("/inventory")
+@_cached_endpoint("inventory")
 async def inventory_analytics(admin: dict = Depends(get_current_admin)):
     org_id = admin.get("organization_id")
-    cache_key = f"inventory:{org_id}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    inventory = await _db.inventory.find({"organization_id": org_id}, {"_id": 0}).to_list(1000)
-    products = await _db.item_products.find({"organization_id": org_id, "is_active": True}, {"_id": 0}).to_list(1000)
-    transactions = await _db.inventory_transactions.find({"organization_id": org_id}, {"_id": 0}).to_list(5000)
-    ledger = await _db.stock_ledger.find({"organization_id": org_id}, {"_id": 0}).to_list(5000)
-    part_reqs = await _db.ticket_part_requests.find({"organization_id": org_id}, {"_id": 0}).to_list(1000)
-
-    product_map = {p["id"]: p.get("name", "?") for p in products}
+    stock_facets = pipelines.facet_result(
+        await _db.inventory.aggregate(pipelines.inventory_stock_pipeline(org_id)).to_list(1)
+    )
+    tx_facets = pipelines.facet_result(
+        await _db.inventory_transactions.aggregate(pipelines.inventory_transactions_pipeline(org_id)).to_list(1)
+    )
+    total_products = await _db.item_products.count_documents({"organization_id": org_id, "is_active": True})
+    pr_status = {
+        r["_id"]: r["count"] async for r in _db.ticket_part_requests.aggregate([
+            {"$match": {"organization_id": org_id}},
+            {"$group": {"_id": {"$ifNull": ["$status", "pending"]}, "count": {"$sum": 1}}},
+        ])
+    }
 
     # Stock levels vs reorder
-    stock_alerts = []
-    for inv in inventory:
-        pid = inv.get("product_id")
-        stock = inv.get("quantity_in_stock", 0)
-        reorder = inv.get("reorder_level", 0)
-        if stock <= reorder:
-            stock_alerts.append({
-                "product": product_map.get(pid, pid),
-                "stock": stock,
-                "reorder_level": reorder,
-                "deficit": reorder - stock,
-            })
-
-    # Top consumed items
-    consumption = defaultdict(int)
-    for tx in transactions:
-        if tx.get("type") in ("issue", "consume", "out"):
-            consumption[tx.get("product_name", "?")] += tx.get("quantity", 0)
-
-    # Transaction volume by month
-    tx_by_month = defaultdict(lambda: {"in": 0, "out": 0})
-    for tx in transactions:
-        month = tx.get("created_at", "")[:7]
-        if tx.get("type") in ("receive", "purchase", "in"):
-            tx_by_month[month]["in"] += tx.get("quantity", 0)
-        else:
-            tx_by_month[month]["out"] += tx.get("quantity", 0)
-
-    # Parts request status
-    pr_status = defaultdict(int)
-    for pr in part_reqs:
-        pr_status[pr.get("status", "pending")] += 1
+    alerts = stock_facets.get("alerts", [])
+    products = await fetch_map(
+        "item_products", collect_ids(alerts, "product_id"), {"name": 1},
+        {"organization_id": org_id, "is_active": True}
+    )
+    stock_alerts = [{
+        "product": products[a["product_id"]].get("name", "?") if a.get("product_id") in products else a.get("product_id"),
+        "stock": a["stock"],
+        "reorder_level": a["reorder_level"],
+        "deficit": a["deficit"],
+    } for a in alerts]
 
     result = {
         "summary": {
-            "total_products": len(products),
-            "total_stock_items": len(inventory),
-            "low_stock_alerts": len(stock_alerts),
-            "total_transactions": len(transactions),
+            "total_products": total_products,
+            "total_stock_items": pipelines.first(stock_facets.get("total"), {"count": 0})["count"],
+            "low_stock_alerts": pipelines.first(stock_facets.get("alert_count"), {"count": 0})["count"],
+            "total_transactions": pipelines.first(tx_facets.get("total"), {"count": 0})["count"],
             "pending_part_requests": pr_status.get("pending", 0) + pr_status.get("requested", 0),
         },
-        "stock_alerts": sorted(stock_alerts, key=lambda x: -x["deficit"])[:20],
-        "top_consumed": [{"item": k, "quantity": v} for k, v in sorted(consumption.items(), key=lambda x: -x[1])[:15]],
-        "transaction_trend": [{"month": k, **v} for k, v in sorted(tx_by_month.items())],
+        "stock_alerts": stock_alerts,
+        "top_consumed": [{"item": r["_id"], "quantity": r["quantity"]} for r in tx_facets.get("top_consumed", [])],
+        "transaction_trend": [{"month": r["_id"], "in": r["in"], "out": r["out"]} for r in tx_facets.get("by_month", [])],
         "part_request_status": [{"status": k, "count": v} for k, v in pr_status.items()],
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -818,92 +722,61 @@ async def inventory_analytics(admin: dict = Depends(get_current_admin)):
 # ══════════════════════════════════════════════════════════
 
 @router.get("/contracts")
+@_cached_endpoint("contracts", tags=("contracts",))
 async def contract_analytics(admin: dict = Depends(get_current_admin)):
     org_id = admin.get("organization_id")
-    cache_key = f"contracts:{org_id}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    contracts = await _db.amc_contracts.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0}
-    ).to_list(500)
-    assignments = await _db.amc_device_assignments.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(5000)
-    devices = await _db.devices.find(
-        {"organization_id": org_id}, {"_id": 0, "id": 1, "company_id": 1}
-    ).to_list(10000)
-    companies = await _db.companies.find(
-        {"organization_id": org_id}, {"_id": 0, "id": 1, "name": 1}
-    ).to_list(500)
-
-    now_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     now_dt = datetime.now(timezone.utc)
+    facets = pipelines.facet_result(
+        await _db.amc_contracts.aggregate(pipelines.contracts_pipeline(org_id, now_dt)).to_list(1)
+    )
+    covered_devices = pipelines.first(
+        await _db.amc_device_assignments.aggregate(pipelines.covered_devices_pipeline(org_id)).to_list(1),
+        {"count": 0}
+    )["count"]
+    total_devices = await _db.devices.count_documents({"organization_id": org_id})
 
-    company_map = {c["id"]: c["name"] for c in companies}
-
-    active = [c for c in contracts if c.get("end_date", "") >= now_str]
-    expired = [c for c in contracts if c.get("end_date", "") < now_str]
+    status = pipelines.as_counts(facets.get("status"))
+    active = status.get(True, 0)
+    expired = status.get(False, 0)
 
     # Type distribution
-    type_dist = defaultdict(int)
-    for c in contracts:
-        type_dist[c.get("amc_type", "unknown")] += 1
-
-    # Expiry pipeline
-    expiry_30 = 0
-    expiry_60 = 0
-    expiry_90 = 0
-    for c in active:
-        try:
-            end = datetime.strptime(c["end_date"][:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            days_left = (end - now_dt).days
-            if days_left <= 30:
-                expiry_30 += 1
-            elif days_left <= 60:
-                expiry_60 += 1
-            elif days_left <= 90:
-                expiry_90 += 1
-        except Exception:
-            pass
-
-    # Coverage analysis
-    covered_devices = set()
-    for a in assignments:
-        if a.get("status") == "active":
-            covered_devices.add(a.get("device_id"))
+    type_dist = pipelines.as_counts(facets.get("type"))
 
-    total_devices = len(devices)
+    # Expiry pipeline ($bucket ids are the lower bound in days left)
+    expiry = pipelines.as_counts(facets.get("expiry"))
+    expiry_30 = expiry.get(float("-inf"), 0)
+    expiry_60 = expiry.get(31, 0)
+    expiry_90 = expiry.get(61, 0)
 
     # Contracts by company
-    contracts_by_company = defaultdict(int)
-    for c in contracts:
-        cid = c.get("company_id")
-        contracts_by_company[company_map.get(cid, cid)] += 1
+    by_company = facets.get("by_company", [])
+    companies = await fetch_map("companies", collect_ids(by_company, "_id"), {"name": 1}, {"organization_id": org_id})
+    contracts_by_company = [
+        {"company": companies[r["_id"]]["name"] if r["_id"] in companies else r["_id"], "count": r["count"]}
+        for r in by_company
+    ]
 
     result = {
         "summary": {
-            "total_contracts": len(contracts),
-            "active_contracts": len(active),
-            "expired_contracts": len(expired),
+            "total_contracts": active + expired,
+            "active_contracts": active,
+            "expired_contracts": expired,
             "expiring_30d": expiry_30,
             "expiring_60d": expiry_60,
             "expiring_90d": expiry_90,
-            "devices_covered": len(covered_devices),
+            "devices_covered": covered_devices,
             "total_devices": total_devices,
-            "coverage_rate": round(len(covered_devices) / max(total_devices, 1) * 100, 1),
+            "coverage_rate": round(covered_devices / max(total_devices, 1) * 100, 1),
         },
         "type_distribution": [{"type": k, "count": v} for k, v in type_dist.items()],
         "expiry_pipeline": [
             {"label": "Expiring 0-30d", "count": expiry_30},
             {"label": "Expiring 31-60d", "count": expiry_60},
             {"label": "Expiring 61-90d", "count": expiry_90},
-            {"label": "Active (90d+)", "count": len(active) - expiry_30 - expiry_60 - expiry_90},
+            {"label": "Active (90d+)", "count": active - expiry_30 - expiry_60 - expiry_90},
         ],
-        "by_company": [{"company": k, "count": v} for k, v in sorted(contracts_by_company.items(), key=lambda x: -x[1])[:15]],
+        "by_company": contracts_by_company,
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -912,43 +785,32 @@ async def contract_analytics(admin: dict = Depends(get_current_admin)):
 # ══════════════════════════════════════════════════════════
 
 @router.get("/operational")
+@_cached_endpoint("operational", tags=("tickets", "contracts"))
 async def operational_intelligence(
     days: int = Query(90, ge=7, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"operational:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
-    start_iso, _ = _parse_dates(days)
-    all_tickets = await _db.tickets_v2.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0}
-    ).to_list(5000)
-    devices = await _db.devices.find(
-        {"organization_id": org_id}, {"_id": 0, "id": 1, "warranty_end_date": 1, "company_id": 1, "brand": 1}
-    ).to_list(10000)
-    contracts = await _db.amc_contracts.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0, "company_id": 1, "end_date": 1, "name": 1}
-    ).to_list(500)
-    companies = await _db.companies.find(
-        {"organization_id": org_id}, {"_id": 0, "id": 1, "name": 1}
-    ).to_list(500)
-
-    company_map = {c["id"]: c["name"] for c in companies}
+    period_from = rollups.period_start(days)
     now_dt = datetime.now(timezone.utc)
+    rows = await rollups.load_daily(org_id, fields=["created", "company", "topic"])
+    warranty_facets = pipelines.facet_result(await _db.devices.aggregate(
+        pipelines.expiring_warranties_pipeline(org_id, now_dt)
+    ).to_list(1))
+    contracts = await _db.amc_contracts.aggregate(
+        pipelines.expiring_contracts_pipeline(org_id, now_dt)
+    ).to_list(None)
 
     # Weekly ticket trend for prediction
     weekly_volumes = defaultdict(int)
-    for t in all_tickets:
-        try:
-            dt = datetime.fromisoformat(t["created_at"].replace("Z", "+00:00"))
-            week = dt.strftime("%Y-W%W")
-            weekly_volumes[week] += 1
-        except Exception:
-            pass
+    company_weekly = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        if not row.get("created"):
+            continue
+        week = datetime.strptime(row["date"], "%Y-%m-%d").strftime("%Y-W%W")
+        weekly_volumes[week] += row["created"]
+        for cid, count in rollups.unescape_keys(row.get("company")).items():
+            company_weekly[cid][week] += count
 
     sorted_weeks = sorted(weekly_volumes.items())
     volumes = [v for _, v in sorted_weeks]
@@ -968,17 +830,7 @@ async def operational_intelligence(
             trend_direction = "decreasing"
 
     # Anomaly detection (company with unusual ticket spike)
-    company_weekly = defaultdict(lambda: defaultdict(int))
-    for t in all_tickets:
-        if t.get("company_id"):
-            try:
-                dt = datetime.fromisoformat(t["created_at"].replace("Z", "+00:00"))
-                week = dt.strftime("%Y-W%W")
-                company_weekly[t["company_id"]][week] += 1
-            except Exception:
-                pass
-
-    anomalies = []
+    spikes = []
     for cid, weeks in company_weekly.items():
         if len(weeks) < 3:
             continue
@@ -989,66 +841,62 @@ async def operational_intelligence(
         latest_week = sorted(weeks.keys())[-1]
         latest_val = weeks[latest_week]
         if latest_val > avg_val * 2 and latest_val > 3:
-            anomalies.append({
-                "company": company_map.get(cid, cid),
-                "current_week_tickets": latest_val,
-                "avg_weekly_tickets": round(avg_val, 1),
-                "spike_factor": round(latest_val / avg_val, 1),
-            })
-
-    # Recommendations
-    recommendations = []
-    for d in devices:
-        we = d.get("warranty_end_date", "")
-        if we:
-            try:
-                we_dt = datetime.strptime(str(we)[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
-                days_left = (we_dt - now_dt).days
-                if 0 < days_left <= 30:
-                    cname = company_map.get(d.get("company_id"), "Unknown")
-                    recommendations.append({
-                        "type": "warranty_expiring",
-                        "message": f"{d.get('brand', '')} device warranty expiring in {days_left}d for {cname}",
-                        "action": "Send AMC renewal offer",
-                        "priority": "high" if days_left <= 7 else "medium",
-                    })
-            except Exception:
-                pass
+            spikes.append((cid, latest_val, avg_val))
+
+    # Recommendations: urgent warranties, then contracts, then the rest
+    high = warranty_facets.get("high", [])
+    medium = warranty_facets.get("medium", [])
+    company_map = {
+        cid: c["name"] for cid, c in (await fetch_map(
+            "companies",
+            [cid for cid, _, _ in spikes] + collect_ids(high + medium + contracts, "company_id"),
+            {"name": 1}, {"organization_id": org_id}
+        )).items()
+    }
 
+    anomalies = [{
+        "company": company_map.get(cid, cid),
+        "current_week_tickets": latest_val,
+        "avg_weekly_tickets": round(avg_val, 1),
+        "spike_factor": round(latest_val / avg_val, 1),
+    } for cid, latest_val, avg_val in spikes]
+
+    def warranty_rec(d, priority):
+        cname = company_map.get(d.get("company_id"), "Unknown")
+        return {
+            "type": "warranty_expiring",
+            "message": f"{d.get('brand', '')} device warranty expiring in {int(d['days_left'])}d for {cname}",
+            "action": "Send AMC renewal offer",
+            "priority": priority,
+        }
+
+    recommendations = [warranty_rec(d, "high") for d in high]
     for c in contracts:
-        try:
-            end = datetime.strptime(c["end_date"][:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            days_left = (end - now_dt).days
-            if 0 < days_left <= 30:
-                cname = company_map.get(c.get("company_id"), "Unknown")
-                recommendations.append({
-                    "type": "contract_expiring",
-                    "message": f"AMC '{c.get('name','')}' expiring in {days_left}d for {cname}",
-                    "action": "Initiate renewal conversation",
-                    "priority": "high",
-                })
-        except Exception:
-            pass
+        cname = company_map.get(c.get("company_id"), "Unknown")
+        recommendations.append({
+            "type": "contract_expiring",
+            "message": f"AMC '{c.get('name','')}' expiring in {int(c['days_left'])}d for {cname}",
+            "action": "Initiate renewal conversation",
+            "priority": "high",
+        })
+    recommendations += [warranty_rec(d, "medium") for d in medium]
+    recommendations_count = pipelines.first(warranty_facets.get("count"), {"count": 0})["count"] + len(contracts)
 
     # Topic clustering (most common issues)
-    topic_counts = defaultdict(int)
-    for t in all_tickets:
-        if t.get("created_at", "") >= start_iso:
-            topic_counts[t.get("help_topic_name", "Other")] += 1
+    topic_counts = rollups.merge_counts([r for r in rows if r["date"] >= period_from], "topic")
 
     result = {
         "summary": {
             "trend_direction": trend_direction,
             "predicted_next_week": max(predicted_next, 0),
             "anomalies_detected": len(anomalies),
-            "recommendations_count": len(recommendations),
+            "recommendations_count": recommendations_count,
         },
         "weekly_trend": [{"week": k, "count": v} for k, v in sorted_weeks[-12:]],
         "anomalies": anomalies[:10],
-        "recommendations": sorted(recommendations, key=lambda x: 0 if x["priority"] == "high" else 1)[:20],
+        "recommendations": recommendations[:20],
         "top_issues": [{"topic": k, "count": v} for k, v in sorted(topic_counts.items(), key=lambda x: -x[1])[:10]],
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -1057,29 +905,29 @@ async def operational_intelligence(
 # ══════════════════════════════════════════════════════════
 
 @router.get("/executive-summary")
+@_cached_endpoint("exec", tags=("tickets", "contracts"))
 async def executive_summary(
     days: int = Query(30, ge=1, le=365),
     admin: dict = Depends(get_current_admin)
 ):
     org_id = admin.get("organization_id")
-    cache_key = f"exec:{org_id}:{days}"
-    cached = _cached(cache_key)
-    if cached:
-        return cached
-
     start_iso, _ = _parse_dates(days)
     prev_start = (datetime.now(timezone.utc) - timedelta(days=days * 2)).isoformat()
 
     base = {"organization_id": org_id, "is_deleted": {"$ne": True}}
-    all_tickets = await _db.tickets_v2.find(base, {"_id": 0}).to_list(5000)
+    totals = await rollups.load_totals(org_id)
+    period_from = rollups.period_start(days)
+    rows = await rollups.load_daily(org_id, rollups.period_start(days * 2), fields=["created", "created_open"])
     devices = await _db.devices.find({"organization_id": org_id}, {"_id": 0, "id": 1}).to_list(10000)
     companies = await _db.companies.find({"organization_id": org_id}, {"_id": 0, "id": 1}).to_list(500)
     engineers = await _db.engineers.find({"organization_id": org_id, "is_active": True}, {"_id": 0, "id": 1}).to_list(200)
     quotations = await _db.quotations.find({"organization_id": org_id}, {"_id": 0}).to_list(5000)
     contracts = await _db.amc_contracts.find({**base}, {"_id": 0}).to_list(500)
 
-    current = [t for t in all_tickets if t.get("created_at", "") >= start_iso]
-    previous = [t for t in all_tickets if prev_start <= t.get("created_at", "") < start_iso]
+    current = [r for r in rows if r["date"] >= period_from]
+    previous = [r for r in rows if r["date"] < period_from]
+    current_created = rollups.total(current, "created")
+    previous_created = rollups.total(previous, "created")
 
     # Calculate change percentages
     def pct_change(curr, prev):
@@ -1087,8 +935,8 @@ async def executive_summary(
             return 100 if curr > 0 else 0
         return round((curr - prev) / prev * 100, 1)
 
-    current_closed = sum(1 for t in current if not t.get("is_open"))
-    prev_closed = sum(1 for t in previous if not t.get("is_open"))
+    current_closed = current_created - rollups.total(current, "created_open")
+    prev_closed = previous_created - rollups.total(previous, "created_open")
 
     current_revenue = sum(q.get("total_amount", 0) for q in quotations if q.get("status") == "approved" and q.get("created_at", "") >= start_iso)
     prev_revenue = sum(q.get("total_amount", 0) for q in quotations if q.get("status") == "approved" and prev_start <= q.get("created_at", "") < start_iso)
@@ -1097,9 +945,9 @@ async def executive_summary(
 
     result = {
         "kpis": [
-            {"label": "Open Tickets", "value": sum(1 for t in all_tickets if t.get("is_open")), "change": pct_change(len(current), len(previous)), "type": "warning"},
+            {"label": "Open Tickets", "value": totals.get("open", 0), "change": pct_change(current_created, previous_created), "type": "warning"},
             {"label": "Resolved This Period", "value": current_closed, "change": pct_change(current_closed, prev_closed), "type": "success"},
-            {"label": "New Tickets", "value": len(current), "change": pct_change(len(current), len(previous)), "type": "info"},
+            {"label": "New Tickets", "value": current_created, "change": pct_change(current_created, previous_created), "type": "info"},
             {"label": "Revenue", "value": round(current_revenue, 2), "change": pct_change(current_revenue, prev_revenue), "type": "success", "prefix": "INR"},
             {"label": "Active Devices", "value": len(devices), "type": "neutral"},
             {"label": "Companies", "value": len(companies), "type": "neutral"},
@@ -1108,7 +956,6 @@ async def executive_summary(
         ],
         "period_days": days,
     }
-    _set_cache(cache_key, result)
     return result
 
 
@@ -1172,6 +1019,7 @@ async def update_service_cost_config(
             {"$set": update},
             upsert=True
         )
+        await invalidate_analytics(org_id, "cost_config")
     return {"success": True}
 
 
@@ -1209,287 +1057,55 @@ async def verify_profitability_password(
 # 11. DEVICE PROFITABILITY
 # ══════════════════════════════════════════════════════════
 
-def _get_travel_cost(distance_km: float, tiers: list) -> float:
-    """Calculate travel cost from distance using tier system"""
-    if not distance_km or distance_km <= 0:
-        # No distance recorded — use the lowest tier cost as default for on-site
-        return tiers[0]["cost"] if tiers else 200
-    for tier in sorted(tiers, key=lambda t: t["min_km"]):
-        if tier["min_km"] <= distance_km <= tier["max_km"]:
-            return tier["cost"]
-    return tiers[-1]["cost"] if tiers else 200
+PROFITABILITY_TAGS = ("tickets", "visits", "contracts", "cost_config")
+PROFITABILITY_TTL = 120
+
+
+async def _profitability_report(org_id: str) -> dict:
+    """Full report for the org, computed once per TTL and shared by all pages"""
+    async def compute():
+        settings = await _db.settings.find_one({"organization_id": org_id}, {"_id": 0}) or {}
+        travel_tiers = settings.get("travel_tiers", DEFAULT_TRAVEL_TIERS)
+        default_hourly = settings.get("default_hourly_rate", 500)
+        report = await profitability.build_report(org_id, travel_tiers, default_hourly)
+        report["config"] = {
+            "default_hourly_rate": default_hourly,
+            "per_km_rate": settings.get("per_km_rate", 10),
+            "travel_tiers": travel_tiers,
+        }
+        return report
+
+    return await analytics_cache.get_or_compute(
+        f"profitability:{org_id}", compute,
+        org_id=org_id, tags=PROFITABILITY_TAGS, ttl=PROFITABILITY_TTL
+    )
 
 
 @router.get("/profitability")
 async def device_profitability(
+    page: Optional[int] = Query(None, ge=1),
+    limit: int = Query(100, ge=1, le=1000),
     admin: dict = Depends(get_current_admin)
 ):
+    """
+    Per-device and per-company profit / loss (services/profitability.py).
+    Without `page` every device with calls is returned; with `page` the
+    `devices` list is paginated (worst first) and `pagination` is added.
+    """
     org_id = admin.get("organization_id")
-    cache_key = f"profitability:{org_id}"
-    cached = _cached(cache_key, ttl=120)
-    if cached:
-        return cached
-
-    # Load all required data
-    settings = await _db.settings.find_one({"organization_id": org_id}, {"_id": 0}) or {}
-    travel_tiers = settings.get("travel_tiers", DEFAULT_TRAVEL_TIERS)
-    default_hourly = settings.get("default_hourly_rate", 500)
-    per_km_rate = settings.get("per_km_rate", 10)
-
-    devices = await _db.devices.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(10000)
+    report = await _profitability_report(org_id)
+    if page is None:
+        return report
 
-    tickets = await _db.tickets_v2.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0, "id": 1, "device_id": 1, "device_name": 1, "company_id": 1,
-         "company_name": 1, "created_at": 1, "closed_at": 1, "is_open": 1,
-         "current_stage_name": 1, "help_topic_name": 1, "assigned_to_id": 1,
-         "assigned_to_name": 1, "device_warranty_type": 1}
-    ).to_list(10000)
-
-    visits = await _db.service_visits_new.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(10000)
-
-    engineers = await _db.engineers.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0, "id": 1, "name": 1, "hourly_rate": 1}
-    ).to_list(500)
-
-    contracts = await _db.amc_contracts.find(
-        {"organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0, "id": 1, "company_id": 1, "custom_price": 1, "name": 1,
-         "start_date": 1, "end_date": 1, "amc_type": 1}
-    ).to_list(500)
-
-    amc_assignments = await _db.amc_device_assignments.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(10000)
-
-    part_issues = await _db.ticket_part_issues.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(5000)
-
-    part_requests = await _db.parts_requests.find(
-        {"organization_id": org_id}, {"_id": 0}
-    ).to_list(5000)
-
-    # Build lookup maps
-    eng_rate_map = {e["id"]: e.get("hourly_rate") or default_hourly for e in engineers}
-    eng_name_map = {e["id"]: e["name"] for e in engineers}
-
-    # Map devices to AMC contracts and revenue
-    device_amc = {}  # device_id -> contract info
-    for assign in amc_assignments:
-        did = assign.get("device_id")
-        cid = assign.get("contract_id")
-        if did and cid:
-            contract = next((c for c in contracts if c["id"] == cid), None)
-            if contract:
-                device_amc[did] = {
-                    "contract_id": cid,
-                    "contract_name": contract.get("name", ""),
-                    "amc_type": contract.get("amc_type", ""),
-                    "annual_price": contract.get("custom_price", 0),
-                }
-
-    # Map tickets and visits to devices
-    device_tickets = defaultdict(list)
-    for t in tickets:
-        did = t.get("device_id")
-        if did:
-            device_tickets[did].append(t)
-
-    ticket_visits = defaultdict(list)
-    for v in visits:
-        tid = v.get("ticket_id")
-        if tid:
-            ticket_visits[tid].append(v)
-
-    # Map parts to tickets
-    ticket_parts_cost = defaultdict(float)
-    for pr in part_requests:
-        tid = pr.get("ticket_id")
-        if tid:
-            ticket_parts_cost[tid] += pr.get("grand_total", 0)
-    for pi in part_issues:
-        tid = pi.get("ticket_id")
-        if tid:
-            ticket_parts_cost[tid] += pi.get("total_cost", 0)
-
-    # Company map
-    companies = await _db.companies.find(
-        {"organization_id": org_id}, {"_id": 0, "id": 1, "name": 1}
-    ).to_list(500)
-    company_map = {c["id"]: c["name"] for c in companies}
-
-    # Calculate per-device profitability
-    device_results = []
-    company_rollup = defaultdict(lambda: {"revenue": 0, "cost": 0, "devices": 0, "calls": 0})
-
-    for device in devices:
-        did = device["id"]
-        d_tickets = device_tickets.get(did, [])
-        amc_info = device_amc.get(did)
-        amc_revenue = amc_info["annual_price"] if amc_info else 0
-
-        total_calls = len(d_tickets)
-        remote_calls = 0
-        onsite_calls = 0
-        total_labour_cost = 0
-        total_travel_cost = 0
-        total_parts_cost = 0
-        total_visit_hours = 0
-        call_details = []
-
-        for ticket in d_tickets:
-            tid = ticket["id"]
-            t_visits = ticket_visits.get(tid, [])
-            t_parts = ticket_parts_cost.get(tid, 0)
-            total_parts_cost += t_parts
-
-            if t_visits:
-                # Has on-site visits
-                for visit in t_visits:
-                    onsite_calls += 1
-                    duration_min = visit.get("duration_minutes") or 0
-                    duration_hrs = duration_min / 60
-
-                    # Use visit's own costs if filled, else calculate
-                    if visit.get("labour_cost") and visit["labour_cost"] > 0:
-                        labour = visit["labour_cost"]
-                    else:
-                        eng_id = visit.get("technician_id", "")
-                        rate = eng_rate_map.get(eng_id, default_hourly)
-                        labour = rate * max(duration_hrs, 1)  # Min 1 hour charge
-
-                    if visit.get("travel_cost") and visit["travel_cost"] > 0:
-                        travel = visit["travel_cost"]
-                    else:
-                        distance = visit.get("distance_km") or 0
-                        travel = _get_travel_cost(distance, travel_tiers)
-
-                    total_labour_cost += labour
-                    total_travel_cost += travel
-                    total_visit_hours += max(duration_hrs, 1)
-
-                    call_details.append({
-                        "type": "on-site",
-                        "date": visit.get("scheduled_date") or visit.get("created_at", "")[:10],
-                        "engineer": visit.get("technician_name", "Unknown"),
-                        "hours": round(max(duration_hrs, 1), 1),
-                        "labour": round(labour, 2),
-                        "travel": round(travel, 2),
-                        "parts": round(t_parts / max(len(t_visits), 1), 2),
-                    })
-            else:
-                # Remote call (no visits)
-                remote_calls += 1
-                # Estimate remote call cost: 30 min engineer time
-                eng_id = ticket.get("assigned_to_id", "")
-                rate = eng_rate_map.get(eng_id, default_hourly)
-                labour = rate * 0.5  # 30 min for remote
-                total_labour_cost += labour
-
-                call_details.append({
-                    "type": "remote",
-                    "date": ticket.get("created_at", "")[:10],
-                    "engineer": ticket.get("assigned_to_name") or "Unassigned",
-                    "hours": 0.5,
-                    "labour": round(labour, 2),
-                    "travel": 0,
-                    "parts": round(t_parts, 2),
-                })
-
-        total_cost = total_labour_cost + total_travel_cost + total_parts_cost
-        profit_loss = amc_revenue - total_cost
-
-        cid = device.get("company_id")
-        company_rollup[cid]["revenue"] += amc_revenue
-        company_rollup[cid]["cost"] += total_cost
-        company_rollup[cid]["devices"] += 1
-        company_rollup[cid]["calls"] += total_calls
-
-        device_results.append({
-            "device_id": did,
-            "device_name": device.get("device_name") or device.get("name") or f"{device.get('brand','')} {device.get('model','')}",
-            "serial_number": device.get("serial_number", ""),
-            "brand": device.get("brand", ""),
-            "model": device.get("model", ""),
-            "company_id": cid,
-            "company_name": company_map.get(cid, device.get("company_name", "Unknown")),
-            "warranty_type": device.get("warranty_type") or (amc_info["amc_type"] if amc_info else "none"),
-            "amc_revenue": round(amc_revenue, 2),
-            "total_calls": total_calls,
-            "remote_calls": remote_calls,
-            "onsite_calls": onsite_calls,
-            "total_visit_hours": round(total_visit_hours, 1),
-            "labour_cost": round(total_labour_cost, 2),
-            "travel_cost": round(total_travel_cost, 2),
-            "parts_cost": round(total_parts_cost, 2),
-            "total_cost": round(total_cost, 2),
-            "profit_loss": round(profit_loss, 2),
-            "call_details": call_details,
-        })
-
-    # Company-level rollup
-    company_profitability = []
-    for cid, data in company_rollup.items():
-        company_profitability.append({
-            "company_id": cid,
-            "company_name": company_map.get(cid, "Unknown"),
-            "devices": data["devices"],
-            "total_calls": data["calls"],
-            "amc_revenue": round(data["revenue"], 2),
-            "total_cost": round(data["cost"], 2),
-            "profit_loss": round(data["revenue"] - data["cost"], 2),
-            "margin_pct": round((data["revenue"] - data["cost"]) / data["revenue"] * 100, 1) if data["revenue"] > 0 else (0 if data["cost"] == 0 else -100),
-        })
-
-    # Summary
-    total_revenue = sum(d["amc_revenue"] for d in device_results)
-    total_cost = sum(d["total_cost"] for d in device_results)
-    profitable_devices = sum(1 for d in device_results if d["profit_loss"] >= 0 and d["total_calls"] > 0)
-    loss_devices = sum(1 for d in device_results if d["profit_loss"] < 0 and d["total_calls"] > 0)
-
-    # Worst ROI devices (highest loss)
-    worst_roi = sorted(
-        [d for d in device_results if d["total_calls"] > 0],
-        key=lambda x: x["profit_loss"]
-    )[:10]
-
-    # Most expensive devices (highest cost)
-    most_expensive = sorted(
-        [d for d in device_results if d["total_calls"] > 0],
-        key=lambda x: -x["total_cost"]
-    )[:10]
-
-    result = {
-        "summary": {
-            "total_devices": len(devices),
-            "devices_with_calls": sum(1 for d in device_results if d["total_calls"] > 0),
-            "total_amc_revenue": round(total_revenue, 2),
-            "total_service_cost": round(total_cost, 2),
-            "net_profit_loss": round(total_revenue - total_cost, 2),
-            "overall_margin_pct": round((total_revenue - total_cost) / total_revenue * 100, 1) if total_revenue > 0 else (0 if total_cost == 0 else -100),
-            "profitable_devices": profitable_devices,
-            "loss_making_devices": loss_devices,
-            "total_remote_calls": sum(d["remote_calls"] for d in device_results),
-            "total_onsite_calls": sum(d["onsite_calls"] for d in device_results),
-        },
-        "config": {
-            "default_hourly_rate": default_hourly,
-            "per_km_rate": per_km_rate,
-            "travel_tiers": travel_tiers,
+    devices = report["devices"]
+    skip = (page - 1) * limit
+    return {
+        **report,
+        "devices": devices[skip:skip + limit],
+        "pagination": {
+            "page": page,
+            "limit": limit,
+            "total": len(devices),
+            "pages": (len(devices) + limit - 1) // limit,
         },
-        "devices": sorted(
-            [d for d in device_results if d["total_calls"] > 0],
-            key=lambda x: x["profit_loss"]
-        ),
-        "worst_roi": worst_roi,
-        "most_expensive": most_expensive,
-        "company_profitability": sorted(company_profitability, key=lambda x: x["profit_loss"]),
     }
-    _set_cache(cache_key, result)
-    return result
@@ -15,6 +15,7 @@ from typing import Optional
 from services.tenant import get_org_from_token, get_current_organization
 from models.organization import SUBSCRIPTION_PLANS
 from utils.helpers import get_ist_isoformat
+from middleware.tenant import invalidate_tenant
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -250,6 +251,7 @@ async def verify_payment(
             "updated_at": get_ist_isoformat()
         }}
     )
+    invalidate_tenant(org_id=org["id"])
     
     # Update subscription record
     if subscription_doc:
@@ -342,6 +344,7 @@ async def handle_subscription_activated(data):
                 "updated_at": get_ist_isoformat()
             }}
         )
+        invalidate_tenant(org_id=org_id)
 
 
 async def handle_subscription_charged(data):
@@ -372,6 +375,7 @@ async def handle_subscription_charged(data):
                 "updated_at": get_ist_isoformat()
             }}
         )
+        invalidate_tenant(org_id=org_id)
 
 
 async def handle_subscription_cancelled(data):
@@ -389,6 +393,7 @@ async def handle_subscription_cancelled(data):
                 "updated_at": get_ist_isoformat()
             }}
         )
+        invalidate_tenant(org_id=org_id)
 
 
 async def handle_subscription_halted(data):
@@ -405,6 +410,7 @@ async def handle_subscription_halted(data):
                 "updated_at": get_ist_isoformat()
             }}
         )
+        invalidate_tenant(org_id=org_id)
 
 
 async def handle_payment_captured(data):
@@ -480,6 +486,7 @@ async def cancel_subscription(
             "updated_at": get_ist_isoformat()
         }}
     )
+    invalidate_tenant(org_id=org["id"])
     
     return {
         "message": "Subscription cancelled. Access will continue until the end of the billing period.",
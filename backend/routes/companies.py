@@ -7,10 +7,11 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 
 from database import db
 from models.company import Company, CompanyCreate, CompanyUpdate
-from models.site import Site
-from models.device import Device
-from models.supplies import SupplyCategory, SupplyProduct
 from services.auth import get_current_admin, get_password_hash, log_audit
+from services.bulk_import import IMPORTERS, run_import, start_import_job
+from services.jobs import public_job
+from services.search_index import sync_search_entries, sync_search_matching
+from services.tenant_counters import count_inserted, soft_delete_counted, soft_delete_many_counted
 from utils.helpers import get_ist_isoformat, is_warranty_active
 from utils.security import validate_password_strength
 
@@ -59,6 +60,8 @@ async def create_company(company_data: CompanyCreate, admin: dict = Depends(get_
     
     company = Company(**company_dict)
     await db.companies.insert_one(company.model_dump())
+    await count_inserted("companies", [company.model_dump()])
+    await sync_search_entries("companies", [company.id])
     await log_audit("company", company.id, "create", {"data": company_data.model_dump()}, admin)
     result = company.model_dump()
     result["label"] = result["name"]
@@ -84,6 +87,8 @@ async def quick_create_company(company_data: CompanyCreate, admin: dict = Depend
     
     company = Company(**company_dict)
     await db.companies.insert_one(company.model_dump())
+    await count_inserted("companies", [company.model_dump()])
+    await sync_search_entries("companies", [company.id])
     await log_audit("company", company.id, "quick_create", {"data": company_data.model_dump()}, admin)
     
     result = company.model_dump()
@@ -127,6 +132,7 @@ async def update_company(company_id: str, updates: CompanyUpdate, admin: dict =
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Company not found")
     
+    await sync_search_entries("companies", [company_id])
     await log_audit("company", company_id, "update", changes, admin)
     return await db.companies.find_one({"id": company_id}, {"_id": 0})
 
@@ -139,11 +145,12 @@ async def delete_company(company_id: str, admin: dict = Depends(get_current_admi
         raise HTTPException(status_code=403, detail="Organization context required")
     query = {"id": company_id, "organization_id": organization_id}
     
-    result = await db.companies.update_one(query, {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("companies", query):
         raise HTTPException(status_code=404, detail="Company not found")
     
-    await db.users.update_many({"company_id": company_id}, {"$set": {"is_deleted": True}})
+    await soft_delete_many_counted("users", {"company_id": company_id})
+    await sync_search_entries("companies", [company_id])
+    await sync_search_matching("users", {"company_id": company_id})
     await log_audit("company", company_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Company archived"}
 
@@ -292,6 +299,7 @@ async def create_company_portal_user(
     }
     
     await db.company_users.insert_one(new_user)
+    await count_inserted("company_users", [new_user])
     return {"message": "Portal user created successfully", "id": new_user["id"]}
 
 
@@ -302,12 +310,13 @@ async def delete_company_portal_user(
     admin: dict = Depends(get_current_admin)
 ):
     """Delete (soft) a portal user"""
-    result = await db.company_users.update_one(
-        {"id": user_id, "company_id": company_id},
-        {"$set": {"is_deleted": True, "deleted_at": get_ist_isoformat()}}
+    deleted = await soft_delete_counted(
+        "company_users",
+        {"id": user_id, "company_id": company_id, "is_deleted": {"$ne": True}},
+        {"deleted_at": get_ist_isoformat()}
     )
     
-    if result.modified_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Portal user not found")
     
     return {"message": "Portal user deleted"}
@@ -344,271 +353,53 @@ async def reset_portal_user_password(
     return {"message": "Password reset successfully"}
 
 
-# --- Bulk Import Endpoints ---
+# --- Bulk Import Endpoints (services/bulk_import.py) ---
 
-@router.post("/admin/bulk-import/companies")
-async def bulk_import_companies(data: dict, admin: dict = Depends(get_current_admin)):
-    """Bulk import companies from CSV data"""
+async def _bulk_import(kind: str, data: dict, admin: dict) -> dict:
     organization_id = admin.get("organization_id")
     if not organization_id:
         raise HTTPException(status_code=403, detail="Organization context required")
     records = data.get("records", [])
     if not records:
         raise HTTPException(status_code=400, detail="No records provided")
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            if not record.get("name"):
-                errors.append({"row": idx + 2, "message": "Company name is required"})
-                continue
-            
-            company_code = record.get("company_code") or record.get("code")
-            if company_code:
-                existing = await db.companies.find_one({
-                    "code": company_code,
-                    "organization_id": organization_id,
-                    "is_deleted": {"$ne": True}
-                })
-                if existing:
-                    errors.append({"row": idx + 2, "message": f"Company code {company_code} already exists"})
-                    continue
-            
-            company = Company(
-                name=record.get("name"),
-                code=company_code or f"C{str(uuid.uuid4())[:6].upper()}",
-                industry=record.get("industry"),
-                contact_name=record.get("contact_name"),
-                contact_email=record.get("contact_email"),
-                contact_phone=record.get("contact_phone"),
-                address=record.get("address"),
-                city=record.get("city"),
-                state=record.get("state"),
-                country=record.get("country", "India"),
-                pincode=record.get("pincode"),
-                gst_number=record.get("gst_number"),
-                notes=record.get("notes"),
-                status="active"
-            )
-            
-            company_dict = company.model_dump()
-            company_dict["organization_id"] = organization_id
-            await db.companies.insert_one(company_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    result = await run_import(kind, organization_id, records)
+    return {"success": result.success, "errors": result.errors}
+
+
+@router.post("/admin/bulk-import/companies")
+async def bulk_import_companies(data: dict, admin: dict = Depends(get_current_admin)):
+    """Bulk import companies from CSV data"""
+    return await _bulk_import("companies", data, admin)
 
 
 @router.post("/admin/bulk-import/sites")
 async def bulk_import_sites(data: dict, admin: dict = Depends(get_current_admin)):
     """Bulk import sites from CSV data"""
-    organization_id = admin.get("organization_id")
-    if not organization_id:
-        raise HTTPException(status_code=403, detail="Organization context required")
-    records = data.get("records", [])
-    if not records:
-        raise HTTPException(status_code=400, detail="No records provided")
-    
-    companies = await db.companies.find({"is_deleted": {"$ne": True}, "organization_id": organization_id}, {"_id": 0}).to_list(1000)
-    company_by_code = {c.get("code", "").upper(): c["id"] for c in companies if c.get("code")}
-    company_by_name = {c["name"].lower(): c["id"] for c in companies}
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            if not record.get("name"):
-                errors.append({"row": idx + 2, "message": "Site name is required"})
-                continue
-            
-            company_id = None
-            if record.get("company_code"):
-                company_id = company_by_code.get(record["company_code"].upper())
-            if not company_id and record.get("company_name"):
-                company_id = company_by_name.get(record["company_name"].lower())
-            
-            if not company_id:
-                errors.append({"row": idx + 2, "message": "Company not found"})
-                continue
-            
-            site = Site(
-                company_id=company_id,
-                name=record.get("name"),
-                site_code=record.get("site_code"),
-                address=record.get("address"),
-                city=record.get("city"),
-                state=record.get("state"),
-                pincode=record.get("pincode"),
-                country=record.get("country", "India"),
-                contact_person=record.get("contact_person"),
-                contact_phone=record.get("contact_phone"),
-                contact_email=record.get("contact_email"),
-                notes=record.get("notes"),
-                status="active"
-            )
-            
-            site_dict = site.model_dump()
-            site_dict["organization_id"] = organization_id
-            await db.sites.insert_one(site_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    return await _bulk_import("sites", data, admin)
 
 
 @router.post("/admin/bulk-import/devices")
 async def bulk_import_devices(data: dict, admin: dict = Depends(get_current_admin)):
     """Bulk import devices from CSV data"""
-    organization_id = admin.get("organization_id")
-    if not organization_id:
-        raise HTTPException(status_code=403, detail="Organization context required")
-    records = data.get("records", [])
-    if not records:
-        raise HTTPException(status_code=400, detail="No records provided")
-    
-    companies = await db.companies.find({"is_deleted": {"$ne": True}, "organization_id": organization_id}, {"_id": 0}).to_list(1000)
-    company_by_code = {c.get("code", "").upper(): c["id"] for c in companies if c.get("code")}
-    company_by_name = {c["name"].lower(): c["id"] for c in companies}
-    
-    employees = await db.company_employees.find({"is_deleted": {"$ne": True}, "organization_id": organization_id}, {"_id": 0}).to_list(10000)
-    employee_by_code = {}
-    employee_by_email = {}
-    for emp in employees:
-        if emp.get("employee_code"):
-            key = f"{emp['company_id']}_{emp['employee_code'].upper()}"
-            employee_by_code[key] = emp["id"]
-        if emp.get("email"):
-            key = f"{emp['company_id']}_{emp['email'].lower()}"
-            employee_by_email[key] = emp["id"]
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            if not record.get("serial_number"):
-                errors.append({"row": idx + 2, "message": "Serial number is required"})
-                continue
-            if not record.get("brand"):
-                errors.append({"row": idx + 2, "message": "Brand is required"})
-                continue
-            if not record.get("model"):
-                errors.append({"row": idx + 2, "message": "Model is required"})
-                continue
-            
-            company_id = None
-            if record.get("company_code"):
-                company_id = company_by_code.get(record["company_code"].upper())
-            if not company_id and record.get("company_name"):
-                company_id = company_by_name.get(record["company_name"].lower())
-            
-            if not company_id:
-                errors.append({"row": idx + 2, "message": "Company not found"})
-                continue
-            
-            assigned_employee_id = None
-            if record.get("employee_code"):
-                key = f"{company_id}_{record['employee_code'].upper()}"
-                assigned_employee_id = employee_by_code.get(key)
-            if not assigned_employee_id and record.get("employee_email"):
-                key = f"{company_id}_{record['employee_email'].lower()}"
-                assigned_employee_id = employee_by_email.get(key)
-            
-            existing = await db.devices.find_one({
-                "serial_number": record["serial_number"],
-                "organization_id": organization_id,
-                "is_deleted": {"$ne": True}
-            })
-            if existing:
-                errors.append({"row": idx + 2, "message": f"Serial number {record['serial_number']} already exists"})
-                continue
-            
-            device = Device(
-                company_id=company_id,
-                assigned_employee_id=assigned_employee_id,
-                device_type=record.get("device_type", "Laptop"),
-                brand=record.get("brand"),
-                model=record.get("model"),
-                serial_number=record.get("serial_number"),
-                asset_tag=record.get("asset_tag"),
-                purchase_date=record.get("purchase_date", get_ist_isoformat().split("T")[0]),
-                purchase_cost=float(record["purchase_cost"]) if record.get("purchase_cost") else None,
-                vendor=record.get("vendor"),
-                warranty_end_date=record.get("warranty_end_date"),
-                location=record.get("location"),
-                condition=record.get("condition", "good"),
-                status=record.get("status", "active"),
-                configuration=record.get("configuration"),
-                notes=record.get("notes")
-            )
-            
-            device_dict = device.model_dump()
-            device_dict["organization_id"] = organization_id
-            await db.devices.insert_one(device_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    return await _bulk_import("devices", data, admin)
 
 
 @router.post("/admin/bulk-import/supply-products")
 async def bulk_import_supply_products(data: dict, admin: dict = Depends(get_current_admin)):
     """Bulk import supply products from CSV data"""
+    return await _bulk_import("supply-products", data, admin)
+
+
+@router.post("/admin/bulk-import/{kind}/jobs")
+async def start_bulk_import_job(kind: str, data: dict, admin: dict = Depends(get_current_admin)):
+    """Bulk import in the background; poll GET /jobs/{id} for progress and the error report"""
+    if kind not in IMPORTERS:
+        raise HTTPException(status_code=404, detail=f"Unknown import type: {kind}")
     organization_id = admin.get("organization_id")
     if not organization_id:
         raise HTTPException(status_code=403, detail="Organization context required")
     records = data.get("records", [])
     if not records:
         raise HTTPException(status_code=400, detail="No records provided")
-    
-    categories = await db.supply_categories.find({"is_deleted": {"$ne": True}, "organization_id": organization_id}, {"_id": 0}).to_list(100)
-    category_by_name = {c["name"].lower(): c["id"] for c in categories}
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            if not record.get("name"):
-                errors.append({"row": idx + 2, "message": "Product name is required"})
-                continue
-            
-            category_id = None
-            if record.get("category"):
-                category_id = category_by_name.get(record["category"].lower())
-            
-            if not category_id:
-                if record.get("category"):
-                    new_cat = SupplyCategory(name=record["category"])
-                    await db.supply_categories.insert_one(new_cat.model_dump())
-                    category_id = new_cat.id
-                    category_by_name[record["category"].lower()] = category_id
-                else:
-                    errors.append({"row": idx + 2, "message": "Category is required"})
-                    continue
-            
-            product = SupplyProduct(
-                category_id=category_id,
-                name=record.get("name"),
-                description=record.get("description"),
-                unit=record.get("unit", "piece"),
-                internal_notes=record.get("internal_notes")
-            )
-            
-            await db.supply_products.insert_one(product.model_dump())
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    job = await start_import_job(kind, organization_id, records, admin.get("email", ""))
+    return public_job(job)
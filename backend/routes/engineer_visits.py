@@ -17,6 +17,9 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional, List
 from pydantic import BaseModel
 from services.auth import get_current_engineer, get_current_admin
+from services.ticket_rollups import sync_ticket_rollup
+from services.ticket_events import append_ticket_events
+from services.analytics_cache import invalidate_analytics
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -176,6 +179,7 @@ async def start_visit(data: StartVisitRequest, engineer: dict = Depends(get_curr
         "updated_at": now_ist(),
     }
     await _db.visits.insert_one(visit)
+    await invalidate_analytics(org_id, "visits")
     visit.pop("_id", None)
 
     # Update ticket status
@@ -186,11 +190,12 @@ async def start_visit(data: StartVisitRequest, engineer: dict = Depends(get_curr
         "user_name": eng["name"],
         "created_at": now_ist(),
     }
-    await _db.tickets_v2.update_one(
+    await append_ticket_events(
         {"id": data.ticket_id},
-        {"$set": {"current_stage_name": "In Progress", "updated_at": now_ist()},
-         "$push": {"timeline": timeline_entry}}
+        timeline_entry,
+        {"$set": {"current_stage_name": "In Progress", "updated_at": now_ist()}}
     )
+    await sync_ticket_rollup(data.ticket_id)
 
     return {"visit": visit, "message": "Visit started"}
 
@@ -332,10 +337,7 @@ async def request_parts(visit_id: str, data: RequestPartsRequest, engineer: dict
         "user_name": eng["name"],
         "created_at": now_ist(),
     }
-    await _db.tickets_v2.update_one(
-        {"id": visit.get("ticket_id")},
-        {"$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": visit.get("ticket_id")}, timeline_entry)
 
     return {
         "parts_request": parts_request,
@@ -392,6 +394,7 @@ async def checkout_visit(visit_id: str, data: CheckoutRequest, engineer: dict =
             visit_updates[field] = val
 
     await _db.visits.update_one({"id": visit_id}, {"$set": visit_updates})
+    await invalidate_analytics(eng["organization_id"], "visits")
 
     # Auto-deduct inventory for parts used during this visit
     parts_used = visit.get("parts_requested", [])
@@ -448,10 +451,8 @@ async def checkout_visit(visit_id: str, data: CheckoutRequest, engineer: dict =
         ticket_updates["is_open"] = False
         ticket_updates["closed_at"] = checkout_time
 
-    await _db.tickets_v2.update_one(
-        {"id": visit.get("ticket_id")},
-        {"$set": ticket_updates, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": visit.get("ticket_id")}, timeline_entry, {"$set": ticket_updates})
+    await sync_ticket_rollup(visit.get("ticket_id"))
 
     updated_visit = await _db.visits.find_one({"id": visit_id}, {"_id": 0})
     return {"visit": updated_visit, "next_stage": next_stage, "message": f"Visit completed. Ticket moved to '{next_stage}'"}
@@ -524,10 +525,7 @@ async def update_parts_request_status(
             "user_name": admin.get("name", "Admin"),
             "created_at": now_ist(),
         }
-        await _db.tickets_v2.update_one(
-            {"id": pr.get("ticket_id")},
-            {"$push": {"timeline": timeline_entry}}
-        )
+        await append_ticket_events({"id": pr.get("ticket_id")}, timeline_entry)
 
     if status == "delivered":
         timeline_entry = {
@@ -537,10 +535,11 @@ async def update_parts_request_status(
             "user_name": admin.get("name", "Admin"),
             "created_at": now_ist(),
         }
-        await _db.tickets_v2.update_one(
+        await append_ticket_events(
             {"id": pr.get("ticket_id")},
-            {"$set": {"current_stage_name": "Parts Delivered"},
-             "$push": {"timeline": timeline_entry}}
+            timeline_entry,
+            {"$set": {"current_stage_name": "Parts Delivered"}}
         )
+        await sync_ticket_rollup(pr.get("ticket_id"))
 
     return {"status": status, "message": f"Parts request updated to '{status}'"}
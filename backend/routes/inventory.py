@@ -15,6 +15,8 @@ from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from services.auth import get_current_admin, get_current_engineer
+from services.mail_queue import enqueue_email, smtp_configured
+from services.ticket_events import append_ticket_events
 from database import db
 from utils.helpers import get_ist_isoformat
 
@@ -564,16 +566,8 @@ async def upsert_pending_bill(org_id: str, ticket_id: str, parts: list, visit_id
 
 
 async def _send_billing_email(emails: list, ticket: dict, items: list, org_id: str):
-    """Send email notification to billing team about pending bill."""
-    import smtplib
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
-
-    # Get SMTP settings
-    smtp_settings = await db.settings.find_one(
-        {"organization_id": org_id}, {"_id": 0, "smtp_host": 1, "smtp_port": 1, "smtp_user": 1, "smtp_pass": 1, "smtp_from": 1}
-    )
-    if not smtp_settings or not smtp_settings.get("smtp_host"):
+    """Queue email notification to billing team about pending bill."""
+    if not await smtp_configured(org_id):
         logger.info("SMTP not configured, skipping billing email")
         return
 
@@ -613,20 +607,14 @@ async def _send_billing_email(emails: list, ticket: dict, items: list, org_id: s
     </div>
     """
 
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = f"Pending Bill: Job #{ticket.get('ticket_number','')} - {ticket.get('company_name','')}"
-    msg["From"] = smtp_settings.get("smtp_from", smtp_settings.get("smtp_user", ""))
-    msg["To"] = ", ".join(emails)
-    msg.attach(MIMEText(html, "html"))
-
-    try:
-        with smtplib.SMTP(smtp_settings["smtp_host"], int(smtp_settings.get("smtp_port", 587)), timeout=10) as server:
-            server.starttls()
-            server.login(smtp_settings["smtp_user"], smtp_settings["smtp_pass"])
-            server.send_message(msg)
-        logger.info(f"Billing email sent to {emails}")
-    except Exception as e:
-        logger.warning(f"SMTP send failed: {e}")
+    await enqueue_email(
+        emails,
+        f"Pending Bill: Job #{ticket.get('ticket_number','')} - {ticket.get('company_name','')}",
+        html,
+        org_id=org_id,
+        context={"ticket_id": ticket.get("id")}
+    )
+    logger.info(f"Billing email queued for {emails}")
 
 
 @router.get("/api/admin/pending-bills")
@@ -681,15 +669,12 @@ async def complete_bill(bill_id: str, data: CompleteBillRequest, admin: dict = D
 
     # Add timeline to ticket
     if bill.get("ticket_id"):
-        await db.tickets_v2.update_one(
-            {"id": bill["ticket_id"]},
-            {"$push": {"timeline": {
-                "id": str(uuid.uuid4()),
-                "type": "bill_generated",
-                "description": f"Invoice {data.bill_number} generated for parts consumed",
-                "user_name": admin.get("name", "Admin"),
-                "created_at": get_ist_isoformat(),
-            }}}
-        )
+        await append_ticket_events({"id": bill["ticket_id"], "organization_id": org_id}, {
+            "id": str(uuid.uuid4()),
+            "type": "bill_generated",
+            "description": f"Invoice {data.bill_number} generated for parts consumed",
+            "user_name": admin.get("name", "Admin"),
+            "created_at": get_ist_isoformat(),
+        })
 
     return {"status": "billed", "bill_number": data.bill_number, "message": f"Bill marked as done. Invoice: {data.bill_number}"}
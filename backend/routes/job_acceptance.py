@@ -1,16 +1,25 @@
 """
 Job Acceptance & Notification System
 ======================================
-Handles technician accept/decline workflow, in-app notifications,
-smart reassignment, and acceptance SLA tracking.
+Handles technician accept/decline workflow, in-app notifications (with
+their push streams), smart reassignment, and acceptance SLA tracking.
 """
 
 import uuid
 from datetime import datetime, timezone, timedelta
-from fastapi import APIRouter, HTTPException, Depends, Query, Body
+from fastapi import APIRouter, HTTPException, Depends, Query, Body, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, List
 from pydantic import BaseModel
 from services.auth import get_current_admin, get_current_engineer
+from services.ticket_rollups import sync_ticket_rollup
+from services.ticket_events import append_ticket_events
+from services.notifications import create_notification
+from services.push import audience_matches, sse_response
+from services.workload import (
+    AUTO_ESCALATION_HOURS, SLA_WINDOW_DAYS, active_engineers, engineer_workloads, rank_engineers, score_engineer,
+)
+from services.availability import ENGINEER_PROJECTION as AVAILABILITY_PROJECTION, day_range, load_calendar
 
 router = APIRouter()
 _db = None
@@ -31,8 +40,6 @@ DECLINE_REASONS = [
     {"id": "other", "label": "Other"},
 ]
 
-AUTO_ESCALATION_HOURS = 4  # hours before auto-escalation
-
 
 # ── Models ──
 
@@ -52,29 +59,6 @@ class RescheduleJobRequest(BaseModel):
     notes: Optional[str] = None
 
 
-# ── Notification Helpers ──
-
-async def create_notification(org_id: str, notif_type: str, title: str, message: str,
-                               target_roles: list = None, target_user_ids: list = None,
-                               ticket_id: str = None, metadata: dict = None):
-    """Create an in-app notification."""
-    notif = {
-        "id": str(uuid.uuid4()),
-        "organization_id": org_id,
-        "type": notif_type,
-        "title": title,
-        "message": message,
-        "target_roles": target_roles or ["admin", "back_office"],
-        "target_user_ids": target_user_ids or [],
-        "ticket_id": ticket_id,
-        "metadata": metadata or {},
-        "is_read": False,
-        "created_at": now_ist(),
-    }
-    await _db.notifications.insert_one(notif)
-    return {k: v for k, v in notif.items() if k != "_id"}
-
-
 # ── Technician Accept/Decline (Admin auth — for Technician Dashboard) ──
 
 @router.get("/ticketing/assignment/pending")
@@ -181,10 +165,8 @@ async def accept_assignment(data: AcceptJobRequest, admin: dict = Depends(get_cu
                 "created_at": now_ist(),
             })
 
-    await _db.tickets_v2.update_one(
-        {"id": data.ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": data.ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(data.ticket_id)
 
     # Track acceptance SLA
     assigned_at = ticket.get("assigned_at")
@@ -245,10 +227,8 @@ async def decline_assignment(data: DeclineJobRequest, admin: dict = Depends(get_
         "created_at": now_ist(),
     }
 
-    await _db.tickets_v2.update_one(
-        {"id": data.ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": data.ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(data.ticket_id)
 
     # Cancel related schedules
     await _db.ticket_schedules.update_many(
@@ -331,10 +311,8 @@ async def reschedule_assignment(data: RescheduleJobRequest, admin: dict = Depend
         "created_at": now_ist(),
     }
 
-    await _db.tickets_v2.update_one(
-        {"id": data.ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": data.ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(data.ticket_id)
 
     # Update or create schedule record
     await _db.ticket_schedules.update_many(
@@ -406,6 +384,40 @@ async def mark_all_read(admin: dict = Depends(get_current_admin)):
     return {"status": "all_read"}
 
 
+# ── Push streams (services/push.py) ──
+
+_stream_security = HTTPBearer(auto_error=False)
+
+
+def _stream_credentials(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_stream_security),
+) -> HTTPAuthorizationCredentials:
+    """Bearer header, or ?token= for EventSource, which cannot set headers."""
+    if credentials:
+        return credentials
+    if token:
+        return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+
+@router.get("/notifications/stream")
+async def notifications_stream(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(_stream_credentials)
+):
+    """Server-sent events: the org's notifications and ticket transitions, for the admin UI."""
+    admin = await get_current_admin(request, credentials)
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    user_ids = [admin.get("id")]
+    return sse_response(
+        request, lambda event: audience_matches(event, org_id, user_ids, is_admin=True), last_event_id
+    )
+
+
 # ── Smart Reassignment ──
 
 @router.get("/ticketing/assignment/suggest-reassign/{ticket_id}")
@@ -423,64 +435,9 @@ async def suggest_reassignment(ticket_id: str, admin: dict = Depends(get_current
 
     declined_by = ticket.get("assigned_to_id", "")
 
-    # Get all active engineers except the one who declined
-    engineers = await _db.engineers.find(
-        {"organization_id": org_id, "is_active": {"$ne": False}, "is_deleted": {"$ne": True},
-         "id": {"$ne": declined_by}},
-        {"_id": 0, "id": 1, "name": 1, "specialization": 1, "skills": 1, "working_hours": 1, "holidays": 1}
-    ).to_list(50)
-
-    suggestions = []
-    for eng in engineers:
-        # Score: lower is better
-        score = 50  # base
-
-        # Check workload (fewer open tickets = better)
-        open_tickets = await _db.tickets_v2.count_documents({
-            "assigned_to_id": eng["id"], "organization_id": org_id,
-            "is_open": True, "is_deleted": {"$ne": True}
-        })
-        score += open_tickets * 10
-
-        # Check if scheduled date is a working day for this engineer
-        sched_date = (ticket.get("scheduled_at") or "")[:10]
-        if sched_date:
-            from datetime import datetime as dt_cls
-            try:
-                day_name = dt_cls.strptime(sched_date, "%Y-%m-%d").strftime("%A").lower()
-                wh = eng.get("working_hours", {})
-                day_sched = wh.get(day_name, {})
-                if not day_sched.get("is_working", True):
-                    score += 100  # big penalty
-                if sched_date in (eng.get("holidays") or []):
-                    score += 200  # huge penalty
-            except ValueError:
-                pass
-
-        # Check pending + declined assignments for responsiveness
-        recent_declines = await _db.assignment_sla_logs.count_documents({
-            "engineer_id": eng["id"], "response": "declined",
-            "created_at": {"$gte": (datetime.now(IST) - timedelta(days=30)).isoformat()}
-        })
-        score += recent_declines * 15
-
-        # Check specialization match with help topic
-        if eng.get("specialization") and ticket.get("help_topic_name"):
-            if eng["specialization"].lower() in ticket["help_topic_name"].lower():
-                score -= 20  # bonus
-
-        suggestions.append({
-            "engineer_id": eng["id"],
-            "name": eng["name"],
-            "specialization": eng.get("specialization"),
-            "skills": eng.get("skills", []),
-            "open_tickets": open_tickets,
-            "recent_declines": recent_declines,
-            "score": score,
-            "available_on_date": score < 150,  # rough heuristic
-        })
-
-    suggestions.sort(key=lambda x: x["score"])
+    # All active engineers except the one who declined, scored on workload,
+    # responsiveness, working day and specialization (lower is better)
+    suggestions = await rank_engineers(org_id, ticket, exclude=[declined_by])
 
     return {"ticket": ticket, "suggestions": suggestions}
 
@@ -536,10 +493,8 @@ async def reassign_ticket(data: dict = Body(...), admin: dict = Depends(get_curr
         "created_at": now_ist(),
     }
 
-    await _db.tickets_v2.update_one(
-        {"id": ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(ticket_id)
 
     # Create new schedule if time provided
     if scheduled_at:
@@ -568,61 +523,32 @@ async def assignment_sla_stats(admin: dict = Depends(get_current_admin)):
     """Get acceptance SLA stats across all engineers."""
     org_id = admin.get("organization_id")
 
-    engineers = await _db.engineers.find(
-        {"organization_id": org_id, "is_active": {"$ne": False}, "is_deleted": {"$ne": True}},
-        {"_id": 0, "id": 1, "name": 1}
-    ).to_list(50)
+    engineers = await active_engineers(org_id)
+    workloads = await engineer_workloads(org_id, [eng["id"] for eng in engineers])
 
     stats = []
     for eng in engineers:
-        logs = await _db.assignment_sla_logs.find(
-            {"engineer_id": eng["id"], "organization_id": org_id},
-            {"_id": 0}
-        ).sort("created_at", -1).to_list(100)
-
-        total = len(logs)
-        accepted = len([entry for entry in logs if entry.get("response") == "accepted"])
-        declined = len([entry for entry in logs if entry.get("response") == "declined"])
-
-        # Calculate avg response time
-        response_times = []
-        for log in logs:
-            if log.get("assigned_at") and log.get("responded_at"):
-                try:
-                    a = datetime.fromisoformat(log["assigned_at"])
-                    r = datetime.fromisoformat(log["responded_at"])
-                    diff_mins = (r - a).total_seconds() / 60
-                    response_times.append(diff_mins)
-                except (ValueError, TypeError):
-                    pass
-
-        avg_response = sum(response_times) / len(response_times) if response_times else None
-
-        # Get decline reasons breakdown
-        reasons = {}
-        for log in logs:
-            if log.get("response") == "declined" and log.get("reason_id"):
-                reasons[log["reason_id"]] = reasons.get(log["reason_id"], 0) + 1
-
+        load = workloads[eng["id"]]
         stats.append({
             "engineer_id": eng["id"],
             "name": eng["name"],
-            "total_assignments": total,
-            "accepted": accepted,
-            "declined": declined,
-            "acceptance_rate": round(accepted / total * 100, 1) if total > 0 else None,
-            "avg_response_minutes": round(avg_response, 1) if avg_response else None,
-            "decline_reasons": reasons,
+            "total_assignments": load["sla_total"],
+            "accepted": load["accepted"],
+            "declined": load["sla_declined"],
+            "acceptance_rate": load["acceptance_rate"],
+            "avg_response_minutes": load["avg_response_minutes"],
+            "decline_reasons": load["decline_reasons"],
         })
 
-    return {"stats": stats}
+    return {"stats": stats, "window_days": SLA_WINDOW_DAYS}
 
 
 # ── Auto-Escalation Check ──
 
 @router.get("/ticketing/assignment/check-escalations")
 async def check_escalations(admin: dict = Depends(get_current_admin)):
-    """Check for pending assignments that have exceeded the response time limit."""
+    """List pending assignments that have exceeded the response time limit.
+    services/sla_scheduler.py escalates them as they come due; this only lists them."""
     org_id = admin.get("organization_id")
 
     cutoff = (datetime.now(IST) - timedelta(hours=AUTO_ESCALATION_HOURS)).isoformat()
@@ -742,10 +668,8 @@ async def engineer_accept(data: AcceptJobRequest, engineer: dict = Depends(get_c
         update["scheduled_at"] = data.proposed_time
         timeline_entry["description"] += f" (rescheduled to {data.proposed_time[:16]})"
 
-    await _db.tickets_v2.update_one(
-        {"id": data.ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": data.ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(data.ticket_id)
     # Update existing schedules or create one if none exist
     existing_schedules = await _db.ticket_schedules.count_documents(
         {"ticket_id": data.ticket_id, "engineer_id": eng["id"], "status": {"$ne": "cancelled"}}
@@ -818,10 +742,8 @@ async def engineer_decline(data: DeclineJobRequest, engineer: dict = Depends(get
         "description": f"{eng['name']} declined: {reason_label}" + (f" — {data.reason_detail}" if data.reason_detail else ""),
         "user_name": eng["name"], "created_at": now_ist(),
     }
-    await _db.tickets_v2.update_one(
-        {"id": data.ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": data.ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(data.ticket_id)
     await _db.ticket_schedules.update_many(
         {"ticket_id": data.ticket_id, "engineer_id": eng["id"]},
         {"$set": {"status": "cancelled"}}
@@ -849,129 +771,23 @@ async def engineer_decline(data: DeclineJobRequest, engineer: dict = Depends(get
 async def _get_engineer_available_slots(eng_id: str, org_id: str, date: str):
     """Shared logic to compute available 30-min slots for an engineer on a given date."""
     engineer = await _db.engineers.find_one(
-        {"id": eng_id, "organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0, "id": 1, "name": 1, "working_hours": 1, "holidays": 1}
+        {"id": eng_id, "organization_id": org_id, "is_deleted": {"$ne": True}}, AVAILABILITY_PROJECTION
     )
     if not engineer:
         # Try without org_id filter (for cross-collection resolution)
         engineer = await _db.engineers.find_one(
-            {"id": eng_id, "is_deleted": {"$ne": True}},
-            {"_id": 0, "id": 1, "name": 1, "working_hours": 1, "holidays": 1}
+            {"id": eng_id, "is_deleted": {"$ne": True}}, AVAILABILITY_PROJECTION
         )
-    holidays = (engineer or {}).get("holidays", [])
-    if date in holidays:
-        return {"date": date, "is_holiday": True, "is_working_day": False, "slots": [], "message": "This is a holiday for you"}
-
-    from datetime import datetime as dt_cls
-    date_obj = dt_cls.strptime(date, "%Y-%m-%d")
-    day_name = date_obj.strftime("%A").lower()
-
-    working_hours = (engineer or {}).get("working_hours", {})
-    if not working_hours:
-        working_hours = {
-            "monday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "tuesday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "wednesday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "thursday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "friday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "saturday": {"is_working": True, "start": "09:00", "end": "14:00"},
-            "sunday": {"is_working": False, "start": "09:00", "end": "18:00"},
-        }
-    day_schedule = working_hours.get(day_name, {"is_working": True, "start": "09:00", "end": "18:00"})
-
-    if not day_schedule.get("is_working", False):
-        return {"date": date, "is_holiday": False, "is_working_day": False, "slots": [], "message": f"Not a working day ({day_name.title()})"}
-
-    work_start = day_schedule.get("start", "09:00")
-    work_end = day_schedule.get("end", "18:00")
-    ws_h, ws_m = map(int, work_start.split(":"))
-    we_h, we_m = map(int, work_end.split(":"))
-    work_start_mins = ws_h * 60 + ws_m
-    work_end_mins = we_h * 60 + we_m
 
-    all_slots = []
-    t = work_start_mins
-    while t < work_end_mins:
-        h, m = divmod(t, 60)
-        all_slots.append(f"{h:02d}:{m:02d}")
-        t += 30
-
-    date_start = f"{date}T00:00:00"
-    date_end = f"{date}T23:59:59"
-
-    schedules = await _db.ticket_schedules.find({
-        "engineer_id": eng_id, "organization_id": org_id,
-        "scheduled_at": {"$gte": date_start, "$lte": date_end},
-        "status": {"$ne": "cancelled"}
-    }, {"_id": 0, "scheduled_at": 1, "scheduled_end_at": 1, "ticket_number": 1, "company_name": 1}).to_list(100)
-
-    scheduled_tickets = await _db.tickets_v2.find({
-        "assigned_to_id": eng_id, "organization_id": org_id,
-        "scheduled_at": {"$gte": date_start, "$lte": date_end},
-        "is_deleted": {"$ne": True}
-    }, {"_id": 0, "scheduled_at": 1, "scheduled_end_at": 1, "ticket_number": 1, "company_name": 1}).to_list(100)
-
-    blocked_ranges = []
-    bookings_info = []
-    for booking in schedules + scheduled_tickets:
-        sched_at = booking.get("scheduled_at", "")
-        if not sched_at or not sched_at.startswith(date):
-            continue
-        try:
-            time_part = sched_at[11:16]
-            bh, bm = map(int, time_part.split(":"))
-            booking_start = bh * 60 + bm
-        except (ValueError, IndexError):
-            continue
-        sched_end = booking.get("scheduled_end_at", "")
-        if sched_end and sched_end.startswith(date):
-            try:
-                eh, em = map(int, sched_end[11:16].split(":"))
-                booking_end = eh * 60 + em
-            except (ValueError, IndexError):
-                booking_end = booking_start + 60
-        else:
-            booking_end = booking_start + 60
-        blocked_end = booking_end + 60
-        blocked_ranges.append((booking_start, blocked_end))
-        bookings_info.append({
-            "time": time_part,
-            "ticket_number": booking.get("ticket_number", ""),
-            "company_name": booking.get("company_name", ""),
-        })
-
-    # Filter out past slots if date is today
-    now_dt = datetime.now(IST)
-    today_str = now_dt.strftime("%Y-%m-%d")
-    now_mins = now_dt.hour * 60 + now_dt.minute if date == today_str else -1
-
-    slots = []
-    for slot_time in all_slots:
-        sh, sm = map(int, slot_time.split(":"))
-        slot_mins = sh * 60 + sm
-
-        if date == today_str and slot_mins <= now_mins:
-            slots.append({"time": slot_time, "available": False, "blocked_by": "Past time"})
-            continue
-
-        available = True
-        blocked_by = None
-        for bstart, bend in blocked_ranges:
-            if bstart <= slot_mins < bend:
-                available = False
-                for bi in bookings_info:
-                    bih, bim = map(int, bi["time"].split(":"))
-                    if bih * 60 + bim <= slot_mins:
-                        blocked_by = f"#{bi['ticket_number']} - {bi['company_name']}"
-                        break
-                break
-        slots.append({"time": slot_time, "available": available, "blocked_by": blocked_by})
-
-    return {
-        "date": date, "is_holiday": False, "is_working_day": True,
-        "work_start": work_start, "work_end": work_end,
-        "slots": slots, "bookings": bookings_info
-    }
+    try:
+        start, days = day_range(date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    calendar = await load_calendar(org_id, start, days, [{**(engineer or {}), "id": eng_id}])
+    # Slots up to now are shown as "Past time"
+    return calendar.engineers[eng_id].day_slots(
+        0, now=calendar.minute_of(datetime.now(IST)), holiday_message="This is a holiday for you"
+    )
 
 
 @router.get("/engineer/available-slots")
@@ -1052,10 +868,8 @@ async def engineer_reschedule(data: RescheduleJobRequest, engineer: dict = Depen
         "description": f"{eng['name']} accepted & rescheduled to {data.proposed_time[:16]}",
         "user_name": eng["name"], "created_at": now_ist(),
     }
-    await _db.tickets_v2.update_one(
-        {"id": data.ticket_id},
-        {"$set": update, "$push": {"timeline": timeline_entry}}
-    )
+    await append_ticket_events({"id": data.ticket_id}, timeline_entry, {"$set": update})
+    await sync_ticket_rollup(data.ticket_id)
     await _db.ticket_schedules.update_many(
         {"ticket_id": data.ticket_id, "engineer_id": eng["id"]},
         {"$set": {"status": "cancelled"}}
@@ -1071,6 +885,18 @@ async def engineer_reschedule(data: RescheduleJobRequest, engineer: dict = Depen
     return {"status": "rescheduled", "ticket_id": data.ticket_id}
 
 
+@router.get("/engineer/stream")
+async def engineer_stream(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(_stream_credentials)
+):
+    """Server-sent events for the engineer portal: their notifications, assignments and ticket changes."""
+    eng = await _resolve_engineer(await get_current_engineer(credentials))
+    org_id, user_ids = eng.get("organization_id"), eng["all_ids"]
+    return sse_response(request, lambda event: audience_matches(event, org_id, user_ids), last_event_id)
+
+
 @router.get("/engineer/dashboard")
 async def engineer_dashboard(engineer: dict = Depends(get_current_engineer)):
     """Engineer's own dashboard data."""
@@ -1298,14 +1124,10 @@ async def workforce_overview(admin: dict = Depends(get_current_admin)):
     if not org_id:
         raise HTTPException(status_code=403, detail="Organization context required")
 
-    engineers = await _db.engineers.find(
-        {"organization_id": org_id, "is_active": {"$ne": False}, "is_deleted": {"$ne": True}},
-        {"_id": 0, "password_hash": 0}
-    ).to_list(50)
+    engineers = await active_engineers(org_id)
+    workloads = await engineer_workloads(org_id, [eng["id"] for eng in engineers])
 
-    from datetime import datetime as dt_cls
-    now = dt_cls.now(IST)
-    today_str = now.strftime("%Y-%m-%d")
+    now = datetime.now(IST)
     cutoff = (now - timedelta(hours=AUTO_ESCALATION_HOURS)).isoformat()
 
     workforce = []
@@ -1313,56 +1135,23 @@ async def workforce_overview(admin: dict = Depends(get_current_admin)):
     total_overdue = 0
 
     for eng in engineers:
-        eid = eng["id"]
-
-        open_count = await _db.tickets_v2.count_documents({
-            "assigned_to_id": eid, "organization_id": org_id,
-            "is_open": True, "is_deleted": {"$ne": True}
-        })
-        pending_count = await _db.tickets_v2.count_documents({
-            "assigned_to_id": eid, "organization_id": org_id,
-            "assignment_status": "pending", "is_open": True, "is_deleted": {"$ne": True}
-        })
-        declined_count = await _db.tickets_v2.count_documents({
-            "assigned_to_id": eid, "organization_id": org_id,
-            "assignment_status": "declined", "is_deleted": {"$ne": True}
-        })
-        visits_today = await _db.ticket_schedules.count_documents({
-            "engineer_id": eid, "organization_id": org_id,
-            "scheduled_at": {"$gte": f"{today_str}T00:00:00", "$lte": f"{today_str}T23:59:59"},
-            "status": {"$nin": ["cancelled"]}
-        })
-
-        # SLA
-        sla_logs = await _db.assignment_sla_logs.find(
-            {"engineer_id": eid, "organization_id": org_id}, {"_id": 0}
-        ).sort("created_at", -1).to_list(50)
-        total_sla = len(sla_logs)
-        accepted_sla = len([s for s in sla_logs if s.get("response") == "accepted"])
-        acceptance_rate = round(accepted_sla / total_sla * 100, 1) if total_sla > 0 else None
-
-        # Overdue pending
-        overdue = await _db.tickets_v2.count_documents({
-            "assigned_to_id": eid, "organization_id": org_id,
-            "assignment_status": "pending", "assigned_at": {"$lte": cutoff},
-            "is_open": True, "is_deleted": {"$ne": True}
-        })
-
-        total_pending += pending_count
-        total_overdue += overdue
+        load = workloads[eng["id"]]
+        total_pending += load["pending_acceptance"]
+        total_overdue += load["overdue_pending"]
 
         workforce.append({
-            "id": eid,
+            "id": eng["id"],
             "name": eng.get("name"),
             "email": eng.get("email"),
             "specialization": eng.get("specialization"),
             "is_active": eng.get("is_active", True),
-            "open_tickets": open_count,
-            "pending_acceptance": pending_count,
-            "declined": declined_count,
-            "visits_today": visits_today,
-            "acceptance_rate": acceptance_rate,
-            "overdue_pending": overdue,
+            "open_tickets": load["open_tickets"],
+            "pending_acceptance": load["pending_acceptance"],
+            "declined": load["declined"],
+            "visits_today": load["visits_today"],
+            "acceptance_rate": load["acceptance_rate"],
+            "overdue_pending": load["overdue_pending"],
+            "workload_score": score_engineer(eng, load),
             "salary": eng.get("salary"),
         })
 
@@ -0,0 +1,45 @@
+"""
+Background Job API Routes
+=========================
+Progress and downloads for long-running admin jobs (services/jobs.py).
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+
+from services.auth import get_current_admin
+from services.jobs import get_job, public_job, read_artifact
+
+router = APIRouter()
+
+
+async def _admin_job(job_id: str, admin: dict) -> dict:
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    job = await get_job(job_id, org_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, admin: dict = Depends(get_current_admin)):
+    """Status and progress of a background job"""
+    return public_job(await _admin_job(job_id, admin))
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_job_file(job_id: str, admin: dict = Depends(get_current_admin)):
+    """The file produced by a completed job"""
+    job = await _admin_job(job_id, admin)
+    if job["status"] != "completed" or not job.get("artifact"):
+        raise HTTPException(status_code=409, detail=f"Job has no file to download (status: {job['status']})")
+    artifact = job["artifact"]
+    return StreamingResponse(
+        read_artifact(job),
+        media_type=artifact["media_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename={artifact['filename']}",
+            "Content-Length": str(artifact["size"]),
+        }
+    )
@@ -21,6 +21,9 @@ from services.tenant import (
     require_org_role, check_resource_limit
 )
 from utils.helpers import get_ist_isoformat
+from utils.tenant_scope import invalidate_org_membership
+from middleware.tenant import invalidate_tenant
+from services.tenant_counters import load_org_counters, count_between
 
 router = APIRouter()
 
@@ -148,6 +151,8 @@ async def signup_organization(data: OrganizationCreate):
     await _db.organizations.insert_one(org.model_dump())
     await _db.organization_members.insert_one(member.model_dump())
     await _db.admins.insert_one(admin_record)  # FIX: Create admin record for login
+    invalidate_org_membership(member.email)
+    invalidate_tenant(org_id=org.id, slug=org.slug)
     
     # Create access token
     access_token = create_access_token(
@@ -251,25 +256,12 @@ async def get_current_org(auth_info: dict = Depends(get_org_from_token)):
     
     org = auth_info.get("organization", {})
     
-    # Get usage stats
-    companies_count = await _db.companies.count_documents({
-        "organization_id": org["id"],
-        "is_deleted": {"$ne": True}
-    })
-    devices_count = await _db.devices.count_documents({
-        "organization_id": org["id"],
-        "is_deleted": {"$ne": True}
-    })
-    users_count = await _db.company_users.count_documents({
-        "organization_id": org["id"],
-        "is_deleted": {"$ne": True}
-    })
-    
     # Add usage to response
+    counters = await load_org_counters(org["id"])
     org["usage"] = {
-        "companies": companies_count,
-        "devices": devices_count,
-        "users": users_count
+        "companies": counters.get("companies", 0),
+        "devices": counters.get("devices", 0),
+        "users": counters.get("company_users", 0)
     }
     
     # Get plan limits
@@ -301,6 +293,7 @@ async def update_current_org(
         {"id": org["id"]},
         {"$set": update_data}
     )
+    invalidate_tenant(org_id=org["id"])
     
     return await _db.organizations.find_one({"id": org["id"]}, {"_id": 0})
 
@@ -321,6 +314,7 @@ async def update_org_branding(
         {"id": org["id"]},
         {"$set": update_data}
     )
+    invalidate_tenant(org_id=org["id"])
     
     updated = await _db.organizations.find_one({"id": org["id"]}, {"_id": 0})
     return updated.get("branding", {})
@@ -342,6 +336,7 @@ async def update_org_settings(
         {"id": org["id"]},
         {"$set": update_data}
     )
+    invalidate_tenant(org_id=org["id"])
     
     updated = await _db.organizations.find_one({"id": org["id"]}, {"_id": 0})
     return updated.get("settings", {})
@@ -447,6 +442,7 @@ async def accept_invitation(token: str, name: str, password: str):
     )
     
     await _db.organization_members.insert_one(member.model_dump())
+    invalidate_org_membership(member.email)
     
     # Update invitation
     await _db.organization_invitations.update_one(
@@ -517,6 +513,7 @@ async def update_member(
             {"id": member_id},
             {"$set": update_data}
         )
+        invalidate_org_membership(target.get("email"))
     
     return await _db.organization_members.find_one(
         {"id": member_id},
@@ -555,6 +552,7 @@ async def remove_member(
         {"id": member_id},
         {"$set": {"is_deleted": True, "is_active": False}}
     )
+    invalidate_org_membership(target.get("email"))
     
     return {"message": "Member removed"}
 
@@ -610,6 +608,7 @@ async def upgrade_subscription(
             "updated_at": get_ist_isoformat()
         }}
     )
+    invalidate_tenant(org_id=org["id"])
     
     return {
         "message": f"Upgraded to {SUBSCRIPTION_PLANS[plan]['name']} plan",
@@ -623,29 +622,11 @@ async def get_usage_stats(auth_info: dict = Depends(get_org_from_token)):
     org = auth_info.get("organization", {})
     org_id = org["id"]
     
-    # Get counts
-    companies = await _db.companies.count_documents({
-        "organization_id": org_id,
-        "is_deleted": {"$ne": True}
-    })
-    devices = await _db.devices.count_documents({
-        "organization_id": org_id,
-        "is_deleted": {"$ne": True}
-    })
-    users = await _db.company_users.count_documents({
-        "organization_id": org_id,
-        "is_deleted": {"$ne": True}
-    })
-    
-    # Get tickets this month
-    from datetime import datetime
-    now = datetime.now(timezone.utc)
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    counters = await load_org_counters(org_id)
     
-    tickets_this_month = await _db.tickets.count_documents({
-        "organization_id": org_id,
-        "created_at": {"$gte": month_start.isoformat()}
-    })
+    # Tickets this month
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    tickets_this_month = count_between(counters.get("tickets_created"), start=month)
     
     # Get plan limits
     plan = org.get("subscription", {}).get("plan", "trial")
@@ -654,9 +635,9 @@ async def get_usage_stats(auth_info: dict = Depends(get_org_from_token)):
     
     return {
         "usage": {
-            "companies": companies,
-            "devices": devices,
-            "users": users,
+            "companies": counters.get("companies", 0),
+            "devices": counters.get("devices", 0),
+            "users": counters.get("company_users", 0),
             "tickets_this_month": tickets_this_month
         },
         "limits": limits,
@@ -1111,9 +1092,9 @@ async def test_email_settings(
     auth_info: dict = Depends(get_org_from_token)
 ):
     """Send a test email to verify SMTP configuration"""
+    import asyncio
     import smtplib
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
+    from services.mail_queue import SmtpPool, build_message
     
     org = auth_info.get("organization", {})
     
@@ -1132,15 +1113,6 @@ async def test_email_settings(
         raise HTTPException(status_code=400, detail=f"Missing required settings: {', '.join(missing)}")
     
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = 'Test Email from AfterSales'
-        msg['From'] = f"{settings.get('from_name', 'AfterSales')} <{settings['from_email']}>"
-        msg['To'] = data.email
-        
-        if settings.get('reply_to'):
-            msg['Reply-To'] = settings['reply_to']
-        
         # Email content
         text_content = f"""
 Hello,
@@ -1188,15 +1160,33 @@ AfterSales Team
         </html>
         """
         
-        msg.attach(MIMEText(text_content, 'plain'))
-        msg.attach(MIMEText(html_content, 'html'))
+        port = int(settings['smtp_port'])
+        account = {
+            "host": settings['smtp_host'], "port": port,
+            "username": settings['smtp_username'], "password": settings['smtp_password'],
+            "use_ssl": port == 465, "use_tls": settings.get('smtp_use_tls', True),
+        }
+        message = {
+            "to": data.email,
+            "subject": 'Test Email from AfterSales',
+            "html": html_content,
+            "text": text_content,
+            "from_addr": f"{settings.get('from_name', 'AfterSales')} <{settings['from_email']}>",
+            "reply_to": settings.get('reply_to'),
+        }
+        
+        # Send now (the caller needs the SMTP error), on a worker thread so the
+        # event loop is not blocked; a pool with no idle slots keeps no
+        # connection, so every test logs in with the current credentials
+        def send():
+            pool = SmtpPool(max_idle=0)
+            conn = pool.acquire(account)
+            try:
+                conn.send_message(build_message(message, account), to_addrs=[data.email])
+            finally:
+                pool.release(account, conn)
         
-        # Send email
-        with smtplib.SMTP(settings['smtp_host'], settings['smtp_port']) as server:
-            if settings.get('smtp_use_tls', True):
-                server.starttls()
-            server.login(settings['smtp_username'], settings['smtp_password'])
-            server.send_message(msg)
+        await asyncio.to_thread(send)
         
         return {"message": "Test email sent successfully", "recipient": data.email}
         
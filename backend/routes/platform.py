@@ -25,6 +25,10 @@ from models.plan import (
 from services.auth import get_password_hash, verify_password, create_access_token
 from config import SECRET_KEY, ALGORITHM
 from utils.helpers import get_ist_isoformat
+from utils.tenant_scope import invalidate_org_membership, get_membership_cache_stats
+from middleware.tenant import invalidate_tenant, get_tenant_cache_stats
+from services.analytics_cache import get_analytics_cache_stats
+from services.tenant_counters import load_org_counters, load_org_counters_many
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -248,12 +252,14 @@ async def list_organizations(
     organizations = await _db.organizations.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
     total = await _db.organizations.count_documents(query)
     
-    # Add usage stats for each org
+    # Add usage stats for each org (one counters read for the whole page)
+    counters = await load_org_counters_many(org["id"] for org in organizations)
     for org in organizations:
+        org_counters = counters.get(org["id"], {})
         org["stats"] = {
-            "companies": await _db.companies.count_documents({"organization_id": org["id"], "is_deleted": {"$ne": True}}),
-            "devices": await _db.devices.count_documents({"organization_id": org["id"], "is_deleted": {"$ne": True}}),
-            "users": await _db.company_users.count_documents({"organization_id": org["id"], "is_deleted": {"$ne": True}})
+            "companies": org_counters.get("companies", 0),
+            "devices": org_counters.get("devices", 0),
+            "users": org_counters.get("company_users", 0)
         }
     
     return {
@@ -331,6 +337,8 @@ async def create_organization(
     
     await _db.organizations.insert_one(org.model_dump())
     await _db.organization_members.insert_one(member.model_dump())
+    invalidate_org_membership(member.email)
+    invalidate_tenant(org_id=org.id, slug=org.slug)
     
     # Audit log
     await log_platform_audit(
@@ -378,12 +386,13 @@ async def get_organization_details(
     ).to_list(100)
     
     # Get usage stats
+    counters = await load_org_counters(org_id)
     stats = {
-        "companies": await _db.companies.count_documents({"organization_id": org_id, "is_deleted": {"$ne": True}}),
-        "devices": await _db.devices.count_documents({"organization_id": org_id, "is_deleted": {"$ne": True}}),
-        "users": await _db.company_users.count_documents({"organization_id": org_id, "is_deleted": {"$ne": True}}),
-        "tickets": await _db.tickets.count_documents({"organization_id": org_id}),
-        "amc_contracts": await _db.amc_contracts.count_documents({"organization_id": org_id, "is_deleted": {"$ne": True}})
+        "companies": counters.get("companies", 0),
+        "devices": counters.get("devices", 0),
+        "users": counters.get("company_users", 0),
+        "tickets": counters.get("tickets", 0),
+        "amc_contracts": counters.get("amc_contracts", 0)
     }
     
     # Get plan limits
@@ -433,6 +442,7 @@ async def update_organization(
     
     if update_data:
         await _db.organizations.update_one({"id": org_id}, {"$set": update_data})
+        invalidate_tenant(org_id=org_id)
     
     # Audit log
     if changes:
@@ -469,6 +479,7 @@ async def suspend_organization(
             "updated_at": get_ist_isoformat()
         }}
     )
+    invalidate_tenant(org_id=org_id)
     
     # Audit log
     await log_platform_audit(
@@ -505,6 +516,7 @@ async def reactivate_organization(
             "updated_at": get_ist_isoformat()
         }}
     )
+    invalidate_tenant(org_id=org_id)
     
     # Audit log
     await log_platform_audit(
@@ -566,6 +578,7 @@ async def update_organization_feature_flags(
     if update_flags:
         update_flags["updated_at"] = get_ist_isoformat()
         await _db.organizations.update_one({"id": org_id}, {"$set": update_flags})
+        invalidate_tenant(org_id=org_id)
     
     # Audit log
     if changes:
@@ -640,6 +653,7 @@ async def delete_organization(
             "updated_at": get_ist_isoformat()
         }}
     )
+    invalidate_tenant(org_id=org_id)
     
     # Audit log
     await log_platform_audit(
@@ -849,6 +863,18 @@ async def get_platform_dashboard_stats(admin: dict = Depends(get_current_platfor
     }
 
 
+@router.get("/cache/stats")
+async def get_cache_stats(
+    admin: dict = Depends(require_platform_permission("view_organizations"))
+):
+    """Hit/miss counters for this worker's in-process caches"""
+    return {
+        "tenant_resolution": get_tenant_cache_stats(),
+        "org_membership": get_membership_cache_stats(),
+        "analytics": get_analytics_cache_stats()
+    }
+
+
 # ==================== AUDIT LOGS ====================
 
 @router.get("/audit-logs")
@@ -19,6 +19,7 @@ def init_db(database):
 
 # Auth dependency
 from services.auth import get_current_admin
+from services.search_index import sync_search_entries
 
 
 # ══════════════════════════════════════════════════════════
@@ -551,6 +552,7 @@ async def update_portal_settings(
 
     if update:
         await _db.companies.update_one({"id": company_id}, {"$set": update})
+        await sync_search_entries("companies", [company_id])
     return {"success": True}
 
 
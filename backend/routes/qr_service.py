@@ -13,7 +13,9 @@ from pydantic import BaseModel
 from database import db
 from services.auth import get_current_admin
 from services.osticket import create_osticket
-from utils.helpers import get_ist_now, get_ist_isoformat, is_warranty_active
+from services.qr_labels import label_query, label_filename, label_pdf, frontend_base_url
+from services.jobs import create_job, set_progress, start_job, write_artifact, public_job
+from utils.helpers import get_ist_now, get_ist_isoformat, is_warranty_active, device_key_query
 
 router = APIRouter(tags=["QR & Quick Service"])
 
@@ -44,13 +46,7 @@ async def generate_device_qr_code(identifier: str):
     from PIL import Image
     
     device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]}
-        ]},
+        device_key_query(identifier),
         {"_id": 0, "serial_number": 1, "asset_tag": 1, "brand": 1, "model": 1}
     )
     
@@ -134,156 +130,58 @@ async def generate_bulk_qr_pdf(
     request: BulkQRRequest,
     admin: dict = Depends(get_current_admin)
 ):
-    """Generate a printable A4 PDF with multiple QR codes."""
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import inch
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.utils import ImageReader
-    from PIL import Image
-    
+    """Generate a printable A4 PDF with multiple QR codes, streamed page by page."""
     org_id = admin.get("organization_id")
     if not org_id:
         raise HTTPException(status_code=403, detail="Organization context required")
-    query = {"is_deleted": {"$ne": True}, "organization_id": org_id}
-    
-    if request.device_ids and len(request.device_ids) > 0:
-        query["id"] = {"$in": request.device_ids}
-    elif request.site_id:
-        query["site_id"] = request.site_id
-    elif request.company_id:
-        query["company_id"] = request.company_id
-    
-    devices = await db.devices.find(
-        query,
-        {"_id": 0, "id": 1, "serial_number": 1, "asset_tag": 1, "brand": 1, "model": 1}
-    ).sort("serial_number", 1).to_list(500)
-    
-    if not devices:
+    query = label_query(org_id, request.device_ids, request.site_id, request.company_id)
+    if not await db.devices.find_one(query, {"_id": 1}):
         raise HTTPException(status_code=404, detail="No devices found matching criteria")
     
-    frontend_url = os.environ.get('FRONTEND_URL', '')
-    if not frontend_url:
-        cors_origins = os.environ.get('CORS_ORIGINS', '')
-        if cors_origins and cors_origins != '*':
-            frontend_url = cors_origins.split(',')[0].strip()
-        else:
-            frontend_url = "https://your-portal-url.com"
-    
-    page_width, page_height = A4
-    
-    qr_size = 1.5 * inch
-    label_height = 0.35 * inch
-    cell_padding = 0.15 * inch
-    
-    cell_width = qr_size + cell_padding
-    cell_height = qr_size + label_height + cell_padding
-    
-    margin_x = (page_width - (4 * cell_width)) / 2
-    margin_y = 0.5 * inch
-    
-    columns = 4
-    rows_per_page = 5
-    
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    
-    current_row = 0
-    current_col = 0
-    
-    for device in devices:
-        x = margin_x + (current_col * cell_width)
-        y = page_height - margin_y - ((current_row + 1) * cell_height)
-        
-        device_url = f"{frontend_url}/device/{device['serial_number']}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=1,
-        )
-        qr.add_data(device_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        qr_img = qr_img.resize((300, 300), Image.Resampling.LANCZOS)
-        
-        qr_buffer = BytesIO()
-        qr_img.save(qr_buffer, format='PNG')
-        qr_buffer.seek(0)
-        qr_reader = ImageReader(qr_buffer)
-        
-        qr_x = x + (cell_width - qr_size) / 2
-        qr_y = y + label_height
-        c.drawImage(qr_reader, qr_x, qr_y, width=qr_size, height=qr_size)
-        
-        serial = device.get('serial_number', 'N/A')
-        asset_tag = device.get('asset_tag', '')
-        text_x = x + cell_width / 2
-        
-        c.setFont("Helvetica-Bold", 7)
-        c.setFillColorRGB(0, 0, 0)
-        serial_display = serial if len(serial) <= 20 else serial[:17] + "..."
-        c.drawCentredString(text_x, y + label_height - 12, f"S/N: {serial_display}")
-        
-        if asset_tag:
-            c.setFont("Helvetica", 6)
-            c.setFillColorRGB(0.3, 0.3, 0.3)
-            tag_display = asset_tag if len(asset_tag) <= 20 else asset_tag[:17] + "..."
-            c.drawCentredString(text_x, y + label_height - 22, f"Tag: {tag_display}")
-        
-        c.setStrokeColorRGB(0.85, 0.85, 0.85)
-        c.setLineWidth(0.5)
-        c.rect(x + 2, y + 2, cell_width - 4, cell_height - 4)
-        
-        c.setFillColorRGB(0, 0, 0)
-        
-        current_col += 1
-        if current_col >= columns:
-            current_col = 0
-            current_row += 1
-            
-            if current_row >= rows_per_page:
-                c.showPage()
-                current_row = 0
-    
-    c.setFont("Helvetica", 7)
-    c.setFillColorRGB(0.5, 0.5, 0.5)
-    c.drawString(margin_x, 12, f"Generated: {get_ist_now().strftime('%Y-%m-%d %H:%M')} | {len(devices)} QR codes | Size: 1.5\" x 1.5\"")
-    
-    c.save()
-    buffer.seek(0)
-    
-    filename_parts = ["QR_Codes"]
-    if request.company_id:
-        company = await db.companies.find_one({"id": request.company_id}, {"_id": 0, "name": 1})
-        if company:
-            filename_parts.append(company["name"].replace(" ", "_")[:20])
-    if request.site_id:
-        site = await db.sites.find_one({"id": request.site_id}, {"_id": 0, "name": 1})
-        if site:
-            filename_parts.append(site["name"].replace(" ", "_")[:20])
-    
-    filename_parts.append(get_ist_now().strftime('%Y%m%d'))
-    filename = "_".join(filename_parts) + ".pdf"
-    
+    filename = await label_filename(org_id, request.site_id, request.company_id)
     return StreamingResponse(
-        buffer,
+        label_pdf(query, frontend_base_url()),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
+@router.post("/devices/bulk-qr-pdf/jobs")
+async def start_bulk_qr_pdf_job(
+    request: BulkQRRequest,
+    admin: dict = Depends(get_current_admin)
+):
+    """Build the bulk QR PDF in the background; poll GET /jobs/{id} for progress."""
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    query = label_query(org_id, request.device_ids, request.site_id, request.company_id)
+    total = await db.devices.count_documents(query)
+    if not total:
+        raise HTTPException(status_code=404, detail="No devices found matching criteria")
+    
+    filename = await label_filename(org_id, request.site_id, request.company_id)
+    base_url = frontend_base_url()
+    job = await create_job(org_id, "qr_labels", admin.get("email", ""), params={
+        "site_id": request.site_id, "company_id": request.company_id,
+        "device_count": len(request.device_ids or [])
+    }, total=total)
+    
+    async def work(job):
+        async def progress(done):
+            await set_progress(job["id"], done)
+        artifact = await write_artifact(job, filename, "application/pdf", label_pdf(query, base_url, progress))
+        return {"filename": filename, "size": artifact["size"]}
+    
+    start_job(job, work)
+    return public_job(job)
+
+
 @router.get("/device/{identifier}/info")
 async def get_public_device_info(identifier: str):
     """Get public device information including warranty status and service history."""
     device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]}
-        ]},
+        device_key_query(identifier),
         {"_id": 0}
     )
     
@@ -378,13 +276,7 @@ async def get_public_device_info(identifier: str):
 async def create_quick_service_request(identifier: str, request: QuickServiceRequest):
     """Create a quick service request without login."""
     device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]}
-        ]},
+        device_key_query(identifier),
         {"_id": 0}
     )
     
@@ -5,8 +5,6 @@ Complete API for the new workflow-driven ticketing system.
 """
 
 import uuid
-import random
-import string
 import os
 from datetime import datetime, timezone, timedelta
 from fastapi import APIRouter, HTTPException, Depends, Query, Body
@@ -22,9 +20,26 @@ from models.ticketing_v2 import (
 )
 from models.ticketing_v2_seed import generate_seed_data
 from services.auth import get_current_admin
+from services.ticket_rollups import record_first_response, sync_ticket_rollup, ticketing_stats
+from services.mail_queue import enqueue_email, smtp_configured
+from utils.pagination import after_cursor, keyset_sort, page_of
+from services.ticket_events import append_ticket_events, record_events, list_ticket_events, migrate_ticket
+from services.ticket_search import ticket_search_terms, search_words
+from services.workload import AUTO_ASSIGN_METHODS, pick_engineer
+from services.sla_timers import find_sla_policy, sla_deadlines
+from services.availability import (
+    ENGINEER_PROJECTION as AVAILABILITY_PROJECTION, SLOT_MINUTES, day_range, find_availability, find_engineers,
+    load_calendar,
+)
+from services.ticket_sequence import (
+    allocate_ticket_number, insert_numbered_ticket, get_number_format, set_number_format
+)
 
 router = APIRouter()
 
+# Largest total counted for list_tickets(count="approx")
+APPROX_COUNT_CAP = 10000
+
 # Database will be injected
 _db = None
 
@@ -38,18 +53,6 @@ def get_ist_isoformat():
     return datetime.now(ist).isoformat()
 
 
-async def generate_ticket_number(db, org_id: str) -> str:
-    """Generate unique 6-char ticket number"""
-    while True:
-        number = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        exists = await db.tickets_v2.find_one({
-            "organization_id": org_id,
-            "ticket_number": number
-        })
-        if not exists:
-            return number
-
-
 # ============================================================
 # SEED DATA
 # ============================================================
@@ -1328,6 +1331,31 @@ async def delete_canned_response(response_id: str, admin: dict = Depends(get_cur
 # TICKETS (NEW)
 # ============================================================
 
+@router.get("/ticketing/ticket-number-format")
+async def get_ticket_number_format(admin: dict = Depends(get_current_admin)):
+    """Get the format new ticket numbers are rendered with"""
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    return {"format": await get_number_format(org_id)}
+
+
+@router.put("/ticketing/ticket-number-format")
+async def update_ticket_number_format(data: dict = Body(...), admin: dict = Depends(get_current_admin)):
+    """
+    Set the ticket number format, e.g. "{seq:06d}" or "T{yy}{month}-{seq:04d}".
+    An empty format restores the default. Existing tickets keep their numbers.
+    """
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    try:
+        fmt = await set_number_format(org_id, (data.get("format") or "").strip() or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"format": fmt}
+
+
 @router.get("/ticketing/tickets")
 async def list_tickets(
     status: Optional[str] = None,
@@ -1339,10 +1367,17 @@ async def list_tickets(
     assigned: Optional[bool] = None,
     search: Optional[str] = None,
     page: int = 1,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|approx|none)$"),
     admin: dict = Depends(get_current_admin)
 ):
-    """List tickets with filtering"""
+    """
+    List tickets with filtering, newest first.
+    Pages are keyset-paginated: pass the returned `next_cursor` as `cursor`
+    (`page` still works for the first pages of old clients). `count` picks an
+    exact total, one capped at APPROX_COUNT_CAP, or none.
+    """
     org_id = admin.get("organization_id")
     if not org_id:
         raise HTTPException(status_code=403, detail="Organization context required")
@@ -1362,36 +1397,41 @@ async def list_tickets(
     if status:
         query["current_stage_name"] = status
     if assigned is not None:
-        if assigned:
-            query["assigned_to_id"] = {"$ne": None}
-            query["assigned_to_name"] = {"$ne": None}
-        else:
-            query["$or"] = [
-                {"assigned_to_id": None},
-                {"assigned_to_id": {"$exists": False}},
-                {"assigned_to_name": None},
-                {"assigned_to_name": {"$exists": False}}
-            ]
-    if search:
-        search_conditions = [
-            {"ticket_number": {"$regex": search, "$options": "i"}},
-            {"subject": {"$regex": search, "$options": "i"}}
-        ]
-        if "$or" in query:
-            query["$and"] = [{"$or": query.pop("$or")}, {"$or": search_conditions}]
-        else:
-            query["$or"] = search_conditions
+        query["is_assigned"] = True if assigned else {"$ne": True}
+    words = search_words(search)
+    if words:
+        query["search_terms"] = {"$all": words}
+    
+    page_filter = dict(query)
+    skip = 0
+    if cursor:
+        try:
+            page_filter = {"$and": [query, after_cursor(cursor)]}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        skip = (max(page, 1) - 1) * limit
     
-    skip = (page - 1) * limit
+    tickets = await _db.tickets_v2.find(
+        page_filter, {"_id": 0, "timeline": 0, "search_terms": 0}
+    ).sort(keyset_sort()).skip(skip).limit(limit + 1).to_list(limit + 1)
+    tickets, next_cursor = page_of(tickets, limit)
     
-    tickets = await _db.tickets_v2.find(query, {"_id": 0, "timeline": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    total = await _db.tickets_v2.count_documents(query)
+    total = None
+    total_is_exact = count == "exact"
+    if count == "exact":
+        total = await _db.tickets_v2.count_documents(query)
+    elif count == "approx":
+        total = await _db.tickets_v2.count_documents(query, limit=APPROX_COUNT_CAP)
+        total_is_exact = total < APPROX_COUNT_CAP
     
     return {
         "tickets": tickets,
+        "next_cursor": next_cursor,
         "total": total,
+        "total_is_exact": total_is_exact,
         "page": page,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit if total is not None else None
     }
 
 
@@ -1404,7 +1444,7 @@ async def get_ticket(ticket_id: str, admin: dict = Depends(get_current_admin)):
     
     ticket = await _db.tickets_v2.find_one(
         {"id": ticket_id, "organization_id": org_id, "is_deleted": {"$ne": True}},
-        {"_id": 0}
+        {"_id": 0, "search_terms": 0}
     )
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
@@ -1434,6 +1474,44 @@ async def get_ticket(ticket_id: str, admin: dict = Depends(get_current_admin)):
     return ticket
 
 
+@router.get("/ticketing/tickets/{ticket_id}/events")
+async def get_ticket_events(
+    ticket_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    include_internal: bool = True,
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Page through a ticket's full history. Pass the returned `next_cursor` as
+    `cursor` for the next page; it is null on the last page.
+    """
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
+    
+    ticket = await _db.tickets_v2.find_one(
+        {"id": ticket_id, "organization_id": org_id, "is_deleted": {"$ne": True}},
+        {"_id": 0, "id": 1, "organization_id": 1, "event_count": 1, "events_migrated": 1}
+    )
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    if not ticket.get("events_migrated"):
+        # History still embedded (pre-ticket_events ticket): move it over first
+        legacy = await _db.tickets_v2.find_one({"id": ticket_id}, {"_id": 0, "id": 1, "organization_id": 1, "timeline": 1})
+        ticket["event_count"] = await migrate_ticket(legacy)
+    
+    try:
+        page = await list_ticket_events(
+            org_id, ticket_id, limit, cursor, newest_first=order == "desc", include_internal=include_internal
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page["total"] = ticket.get("event_count")
+    return page
+
+
 @router.get("/ticketing/tickets/{ticket_id}/full")
 async def get_ticket_full(ticket_id: str, admin: dict = Depends(get_current_admin)):
     """Get ticket with company, site, employee, device, repair history for calendar/detail views"""
@@ -1442,7 +1520,7 @@ async def get_ticket_full(ticket_id: str, admin: dict = Depends(get_current_admi
         raise HTTPException(status_code=403, detail="Organization context required")
     
     ticket = await _db.tickets_v2.find_one(
-        {"id": ticket_id, "organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0}
+        {"id": ticket_id, "organization_id": org_id, "is_deleted": {"$ne": True}}, {"_id": 0, "search_terms": 0}
     )
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
@@ -1494,8 +1572,8 @@ async def create_ticket(data: TicketCreateV2, admin: dict = Depends(get_current_
     if not topic:
         raise HTTPException(status_code=404, detail="Help topic not found")
     
-    # Generate ticket number
-    ticket_number = await generate_ticket_number(_db, org_id)
+    # Next number of the org's ticket sequence
+    ticket_number = await allocate_ticket_number(org_id)
     
     # Get initial stage from workflow
     current_stage_id = None
@@ -1621,7 +1699,8 @@ async def create_ticket(data: TicketCreateV2, admin: dict = Depends(get_current_
         assigned_team_id=topic.get("default_team_id"),
         source=data.source,
         created_by_id=admin.get("id"),
-        created_by_name=admin.get("name")
+        created_by_name=admin.get("name"),
+        **sla_deadlines(await find_sla_policy(org_id, topic.get("sla_policy_id")), priority_name),
     )
     
     # Get team name
@@ -1640,8 +1719,34 @@ async def create_ticket(data: TicketCreateV2, admin: dict = Depends(get_current_
         "is_internal": False,
         "created_at": get_ist_isoformat()
     }]
+
+    # Auto-assign to the best-scored engineer (workload, responsiveness, skills)
+    if topic.get("auto_assign") and topic.get("assignment_method") in AUTO_ASSIGN_METHODS:
+        candidate = await pick_engineer(
+            org_id, {"help_topic_name": topic["name"]}, topic["assignment_method"], ticket.assigned_team_id
+        )
+        if candidate:
+            ticket.assigned_to_id = candidate["engineer_id"]
+            ticket.assigned_to_name = candidate["name"]
+            ticket.is_assigned = bool(candidate["name"])
+            ticket.assignment_status = "pending"
+            ticket.assigned_at = get_ist_isoformat()
+            ticket.timeline.append({
+                "id": str(uuid.uuid4()),
+                "type": "assignment",
+                "description": f"Auto-assigned to {candidate['name']} (pending acceptance)",
+                "details": {"method": topic["assignment_method"], "score": candidate["score"]},
+                "user_id": admin.get("id"),
+                "user_name": admin.get("name"),
+                "is_internal": False,
+                "created_at": get_ist_isoformat()
+            })
+    ticket.event_count = len(ticket.timeline)
     
-    await _db.tickets_v2.insert_one(ticket.model_dump())
+    inserted = await insert_numbered_ticket(ticket.model_dump())
+    ticket.ticket_number = inserted["ticket_number"]
+    await record_events(org_id, ticket.id, inserted["timeline"])
+    await sync_ticket_rollup(ticket.id)
     
     # Update help topic ticket count
     await _db.ticket_help_topics.update_one(
@@ -1661,6 +1766,11 @@ async def update_ticket(ticket_id: str, data: TicketUpdateV2, admin: dict = Depe
     
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     update_data["updated_at"] = get_ist_isoformat()
+    if "subject" in update_data:
+        current = await _db.tickets_v2.find_one(
+            {"id": ticket_id, "organization_id": org_id}, {"_id": 0, "ticket_number": 1}
+        ) or {}
+        update_data["search_terms"] = ticket_search_terms({**current, **update_data})
     
     result = await _db.tickets_v2.update_one(
         {"id": ticket_id, "organization_id": org_id, "is_deleted": {"$ne": True}},
@@ -1669,8 +1779,9 @@ async def update_ticket(ticket_id: str, data: TicketUpdateV2, admin: dict = Depe
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Ticket not found")
+    await sync_ticket_rollup(ticket_id)
     
-    return await _db.tickets_v2.find_one({"id": ticket_id}, {"_id": 0, "timeline": 0})
+    return await _db.tickets_v2.find_one({"id": ticket_id}, {"_id": 0, "timeline": 0, "search_terms": 0})
 
 
 @router.post("/ticketing/tickets/{ticket_id}/assign")
@@ -1704,6 +1815,7 @@ async def assign_ticket(ticket_id: str, data: dict = Body(...), admin: dict = De
         if user:
             update_data["assigned_to_id"] = data["assigned_to_id"]
             update_data["assigned_to_name"] = user.get("name", user.get("email", ""))
+            update_data["is_assigned"] = bool(update_data["assigned_to_name"])
             update_data["assignment_status"] = "pending"
             update_data["assigned_at"] = get_ist_isoformat()
             update_data["assignment_responded_at"] = None
@@ -1716,15 +1828,10 @@ async def assign_ticket(ticket_id: str, data: dict = Body(...), admin: dict = De
             update_data["assigned_team_name"] = team["name"]
             timeline_entry["description"] = f"Assigned to team: {team['name']}"
     
-    await _db.tickets_v2.update_one(
-        {"id": ticket_id},
-        {
-            "$set": update_data,
-            "$push": {"timeline": timeline_entry}
-        }
-    )
+    await append_ticket_events({"id": ticket_id}, timeline_entry, {"$set": update_data})
+    await sync_ticket_rollup(ticket_id)
     
-    return await _db.tickets_v2.find_one({"id": ticket_id}, {"_id": 0, "timeline": 0})
+    return await _db.tickets_v2.find_one({"id": ticket_id}, {"_id": 0, "timeline": 0, "search_terms": 0})
 
 
 @router.post("/ticketing/tickets/{ticket_id}/transition")
@@ -1807,6 +1914,7 @@ async def transition_ticket(ticket_id: str, data: StageTransitionRequest, admin:
         if engineer:
             update_data["assigned_to_id"] = data.assigned_to_id
             update_data["assigned_to_name"] = engineer.get("name", engineer.get("email", ""))
+            update_data["is_assigned"] = bool(update_data["assigned_to_name"])
             update_data["assignment_status"] = "pending"
             update_data["assigned_at"] = get_ist_isoformat()
             update_data["assignment_responded_at"] = None
@@ -1901,13 +2009,8 @@ async def transition_ticket(ticket_id: str, data: StageTransitionRequest, admin:
         "created_at": get_ist_isoformat()
     }
     
-    await _db.tickets_v2.update_one(
-        {"id": ticket_id},
-        {
-            "$set": update_data,
-            "$push": {"timeline": timeline_entry}
-        }
-    )
+    await append_ticket_events({"id": ticket_id}, timeline_entry, {"$set": update_data})
+    await sync_ticket_rollup(ticket_id)
     
     # Execute entry actions for the new stage
     for action in target_stage.get("entry_actions", []):
@@ -1969,16 +2072,16 @@ async def add_comment(ticket_id: str, data: dict = Body(...), admin: dict = Depe
         "created_at": get_ist_isoformat()
     }
     
-    result = await _db.tickets_v2.update_one(
+    ticket = await append_ticket_events(
         {"id": ticket_id, "organization_id": org_id, "is_deleted": {"$ne": True}},
-        {
-            "$push": {"timeline": timeline_entry},
-            "$set": {"updated_at": get_ist_isoformat()}
-        }
+        timeline_entry,
+        {"$set": {"updated_at": get_ist_isoformat()}}
     )
     
-    if result.matched_count == 0:
+    if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
+    if not timeline_entry["is_internal"]:
+        await record_first_response(ticket_id, timeline_entry["created_at"])
     
     return timeline_entry
 
@@ -2080,12 +2183,10 @@ async def complete_task(task_id: str, data: dict = Body(...), admin: dict = Depe
         "created_at": get_ist_isoformat()
     }
     
-    await _db.tickets_v2.update_one(
+    await append_ticket_events(
         {"id": task["ticket_id"]},
-        {
-            "$push": {"timeline": timeline_entry},
-            "$set": {"updated_at": get_ist_isoformat()}
-        }
+        timeline_entry,
+        {"$set": {"updated_at": get_ist_isoformat()}}
     )
     
     return await _db.ticket_tasks.find_one({"id": task_id}, {"_id": 0})
@@ -2102,61 +2203,16 @@ async def get_ticketing_stats(admin: dict = Depends(get_current_admin)):
     if not org_id:
         raise HTTPException(status_code=403, detail="Organization context required")
     
-    base_q = {"organization_id": org_id, "is_deleted": {"$ne": True}}
-    
-    # Total tickets
-    total = await _db.tickets_v2.count_documents(base_q)
-    open_count = await _db.tickets_v2.count_documents({**base_q, "is_open": True})
-    closed_count = await _db.tickets_v2.count_documents({**base_q, "is_open": False})
-    
-    # Unassigned count
-    unassigned_count = await _db.tickets_v2.count_documents({
-        **base_q,
-        "$or": [
-            {"assigned_to_id": None},
-            {"assigned_to_id": {"$exists": False}},
-            {"assigned_to_name": None},
-            {"assigned_to_name": {"$exists": False}}
-        ]
-    })
-    
-    # By priority
-    priority_pipeline = [
-        {"$match": {**base_q, "is_open": True}},
-        {"$group": {"_id": "$priority_name", "count": {"$sum": 1}}}
-    ]
-    by_priority = {doc["_id"]: doc["count"] async for doc in _db.tickets_v2.aggregate(priority_pipeline)}
-    
-    # By help topic
-    topic_pipeline = [
-        {"$match": {**base_q, "is_open": True}},
-        {"$group": {"_id": "$help_topic_name", "count": {"$sum": 1}}}
-    ]
-    by_topic = {doc["_id"]: doc["count"] async for doc in _db.tickets_v2.aggregate(topic_pipeline)}
-    
-    # By stage (for filter pills)
-    stage_pipeline = [
-        {"$match": {**base_q, "is_deleted": {"$ne": True}}},
-        {"$group": {"_id": "$current_stage_name", "count": {"$sum": 1}}}
-    ]
-    by_stage = {doc["_id"]: doc["count"] async for doc in _db.tickets_v2.aggregate(stage_pipeline)}
+    # Live per-org counters maintained by sync_ticket_rollup
+    stats = await ticketing_stats(org_id)
     
     # Pending tasks
-    pending_tasks = await _db.ticket_tasks.count_documents({
+    stats["pending_tasks"] = await _db.ticket_tasks.count_documents({
         "organization_id": org_id,
         "status": "pending"
     })
     
-    return {
-        "total": total,
-        "open": open_count,
-        "closed": closed_count,
-        "unassigned": unassigned_count,
-        "by_priority": by_priority,
-        "by_topic": by_topic,
-        "by_stage": by_stage,
-        "pending_tasks": pending_tasks
-    }
+    return stats
 
 
 # ============================================================
@@ -2281,147 +2337,47 @@ async def get_available_slots(
     if not org_id:
         raise HTTPException(status_code=403, detail="Organization context required")
 
-    # Get engineer details including working hours and holidays
     engineer = await _db.engineers.find_one(
-        {"id": engineer_id, "organization_id": org_id},
-        {"_id": 0, "id": 1, "name": 1, "working_hours": 1, "holidays": 1}
+        {"id": engineer_id, "organization_id": org_id}, AVAILABILITY_PROJECTION
     )
     if not engineer:
         raise HTTPException(status_code=404, detail="Engineer not found")
 
-    # Check if date is a holiday
-    holidays = engineer.get("holidays", [])
-    if date in holidays:
-        return {"date": date, "is_holiday": True, "is_working_day": False, "slots": [], "message": "This is a holiday for this technician"}
-
-    # Check working hours for the day of week
-    from datetime import datetime as dt_cls
-    date_obj = dt_cls.strptime(date, "%Y-%m-%d")
-    day_name = date_obj.strftime("%A").lower()
-
-    working_hours = engineer.get("working_hours", {})
-    if not working_hours:
-        # Default working hours if not configured
-        working_hours = {
-            "monday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "tuesday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "wednesday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "thursday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "friday": {"is_working": True, "start": "09:00", "end": "18:00"},
-            "saturday": {"is_working": True, "start": "09:00", "end": "14:00"},
-            "sunday": {"is_working": False, "start": "09:00", "end": "18:00"},
-        }
-    day_schedule = working_hours.get(day_name, {"is_working": True, "start": "09:00", "end": "18:00"})
-
-    if not day_schedule.get("is_working", False):
-        return {"date": date, "is_holiday": False, "is_working_day": False, "slots": [], "message": f"Not a working day ({day_name.title()})"}
-
-    work_start = day_schedule.get("start", "09:00")
-    work_end = day_schedule.get("end", "18:00")
-
-    # Parse working hours into minutes from midnight
-    ws_h, ws_m = map(int, work_start.split(":"))
-    we_h, we_m = map(int, work_end.split(":"))
-    work_start_mins = ws_h * 60 + ws_m
-    work_end_mins = we_h * 60 + we_m
-
-    # Generate 30-min slots within working hours
-    all_slots = []
-    t = work_start_mins
-    while t < work_end_mins:
-        h, m = divmod(t, 60)
-        all_slots.append(f"{h:02d}:{m:02d}")
-        t += 30
-
-    # Get existing bookings for this date
-    date_start = f"{date}T00:00:00"
-    date_end = f"{date}T23:59:59"
-
-    schedules = await _db.ticket_schedules.find({
-        "engineer_id": engineer_id,
-        "organization_id": org_id,
-        "scheduled_at": {"$gte": date_start, "$lte": date_end},
-        "status": {"$ne": "cancelled"}
-    }, {"_id": 0, "scheduled_at": 1, "scheduled_end_at": 1, "ticket_number": 1, "company_name": 1, "subject": 1}).to_list(100)
-
-    scheduled_tickets = await _db.tickets_v2.find({
-        "assigned_to_id": engineer_id,
-        "organization_id": org_id,
-        "scheduled_at": {"$gte": date_start, "$lte": date_end},
-        "is_deleted": {"$ne": True}
-    }, {"_id": 0, "scheduled_at": 1, "scheduled_end_at": 1, "ticket_number": 1, "company_name": 1, "subject": 1}).to_list(100)
-
-    # Collect all booked time ranges (start_mins, end_mins_with_buffer)
-    blocked_ranges = []
-    bookings_info = []
-    for booking in schedules + scheduled_tickets:
-        sched_at = booking.get("scheduled_at", "")
-        if not sched_at or not sched_at.startswith(date):
-            continue
-        # Parse start time
-        try:
-            time_part = sched_at[11:16]  # HH:MM
-            bh, bm = map(int, time_part.split(":"))
-            booking_start = bh * 60 + bm
-        except (ValueError, IndexError):
-            continue
-
-        # Parse end time if available, else assume booking_start + 1hr
-        sched_end = booking.get("scheduled_end_at", "")
-        if sched_end and sched_end.startswith(date):
-            try:
-                eh, em = map(int, sched_end[11:16].split(":"))
-                booking_end = eh * 60 + em
-            except (ValueError, IndexError):
-                booking_end = booking_start + 60
-        else:
-            booking_end = booking_start + 60
-
-        # Block from booking_start to booking_end + 60 mins (1hr gap)
-        blocked_end = booking_end + 60
-        blocked_ranges.append((booking_start, blocked_end))
-        bookings_info.append({
-            "time": time_part,
-            "ticket_number": booking.get("ticket_number", ""),
-            "company_name": booking.get("company_name", ""),
-            "subject": booking.get("subject", ""),
-            "start_mins": booking_start,
-            "end_mins": booking_end
-        })
-
-    # Build slot list with availability
-    slots = []
-    for slot_time in all_slots:
-        sh, sm = map(int, slot_time.split(":"))
-        slot_mins = sh * 60 + sm
-
-        available = True
-        blocked_by = None
-        for bstart, bend in blocked_ranges:
-            if bstart <= slot_mins < bend:
-                available = False
-                # Find which booking blocked it
-                for bi in bookings_info:
-                    if bi["start_mins"] <= slot_mins < bi["end_mins"] + 60:
-                        blocked_by = f"#{bi['ticket_number']} - {bi['company_name'] or bi['subject']}"
-                        break
-                break
-
-        slots.append({
-            "time": slot_time,
-            "available": available,
-            "blocked_by": blocked_by
-        })
+    try:
+        start, days = day_range(date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    calendar = await load_calendar(org_id, start, days, [engineer])
+    return calendar.engineers[engineer_id].day_slots(0)
+
+
+@router.get("/ticketing/availability")
+async def get_engineer_availability(
+    date_from: Optional[str] = Query(None, description="YYYY-MM-DD (default today)"),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD (default a week from date_from)"),
+    duration: int = Query(60, ge=SLOT_MINUTES, le=24 * 60, description="Slot length in minutes"),
+    engineer_ids: Optional[str] = Query(None, description="Comma-separated engineer ids"),
+    team_id: Optional[str] = None,
+    skill: Optional[str] = None,
+    first: bool = Query(False, description="Only return the earliest free slot"),
+    admin: dict = Depends(get_current_admin)
+):
+    """Free time of many engineers over many days in one call, e.g. the first
+    free 1-hour slot for any member of a team this week (?team_id=...&first=true).
+    """
+    org_id = admin.get("organization_id")
+    if not org_id:
+        raise HTTPException(status_code=403, detail="Organization context required")
 
-    return {
-        "date": date,
-        "is_holiday": False,
-        "is_working_day": True,
-        "work_start": work_start,
-        "work_end": work_end,
-        "slots": slots,
-        "bookings": bookings_info
-    }
+    ids = [i.strip() for i in engineer_ids.split(",") if i.strip()] if engineer_ids else None
+    try:
+        engineers = await find_engineers(org_id, ids, team_id, skill)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        return await find_availability(org_id, date_from, date_to, duration, engineers, first_only=first)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/ticketing/engineers/{engineer_id}/device-history")
@@ -2480,7 +2436,7 @@ async def technician_dashboard(admin: dict = Depends(get_current_admin)):
         "organization_id": org_id,
         "is_open": True,
         "is_deleted": {"$ne": True}
-    }, {"_id": 0, "timeline": 0}).sort("created_at", -1).to_list(50)
+    }, {"_id": 0, "timeline": 0, "search_terms": 0}).sort("created_at", -1).to_list(50)
     
     # Assigned tasks
     assigned_tasks = await _db.ticket_tasks.find({
@@ -2537,9 +2493,6 @@ async def send_ticket_notification(
     Body: { "notification_type": "assigned|awaiting_parts|billing|quote|general" }
     Returns: { "success": true, "wa_phone": "...", "wa_message": "..." } for WhatsApp link generation on frontend.
     """
-    import smtplib
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
     import logging
     logger = logging.getLogger("ticketing")
 
@@ -2694,46 +2647,34 @@ async def send_ticket_notification(
         email_subject = f"Ticket Update: #{ticket_num} - {stage}"
         email_html = _build_notification_email(ticket, "general", engineer_name)
 
-    # Send email if we have recipients and SMTP is configured
+    # Queue email if we have recipients and SMTP is configured
     email_sent = False
     if email_to:
         try:
-            smtp_settings = await _db.settings.find_one(
-                {"organization_id": org_id},
-                {"_id": 0, "smtp_host": 1, "smtp_port": 1, "smtp_user": 1, "smtp_pass": 1, "smtp_from": 1}
-            )
-            if smtp_settings and smtp_settings.get("smtp_host"):
-                msg = MIMEMultipart("alternative")
-                msg["Subject"] = email_subject
-                msg["From"] = smtp_settings.get("smtp_from", smtp_settings.get("smtp_user", ""))
-                msg["To"] = ", ".join(email_to)
-                msg.attach(MIMEText(email_html, "html"))
-
-                with smtplib.SMTP(smtp_settings["smtp_host"], int(smtp_settings.get("smtp_port", 587)), timeout=10) as server:
-                    server.starttls()
-                    server.login(smtp_settings["smtp_user"], smtp_settings["smtp_pass"])
-                    server.send_message(msg)
+            if await smtp_configured(org_id):
+                await enqueue_email(
+                    email_to, email_subject, email_html, org_id=org_id,
+                    context={"ticket_id": ticket_id, "notification_type": notification_type}
+                )
                 email_sent = True
-                logger.info(f"Notification email sent to {email_to} for ticket {ticket_num}")
+                logger.info(f"Notification email queued for {email_to} for ticket {ticket_num}")
             else:
                 logger.info("SMTP not configured, skipping email")
         except Exception as e:
-            logger.warning(f"Failed to send notification email: {e}")
+            logger.warning(f"Failed to queue notification email: {e}")
 
     # Add timeline entry
-    await _db.tickets_v2.update_one(
+    await append_ticket_events(
         {"id": ticket_id},
         {
-            "$push": {"timeline": {
-                "id": str(uuid.uuid4()),
-                "type": "notification",
-                "description": f"Notification sent ({notification_type}){' - Email sent to ' + ', '.join(email_to) if email_sent else ''}",
-                "user_name": admin.get("name", "Admin"),
-                "is_internal": True,
-                "created_at": get_ist_isoformat()
-            }},
-            "$set": {"updated_at": get_ist_isoformat()}
-        }
+            "id": str(uuid.uuid4()),
+            "type": "notification",
+            "description": f"Notification sent ({notification_type}){' - Email sent to ' + ', '.join(email_to) if email_sent else ''}",
+            "user_name": admin.get("name", "Admin"),
+            "is_internal": True,
+            "created_at": get_ist_isoformat()
+        },
+        {"$set": {"updated_at": get_ist_isoformat()}}
     )
 
     return {
@@ -2813,9 +2754,7 @@ async def send_quotation_approval_email(
     """Send quotation approval email to customer with approve/deny buttons.
     Body: { "customer_email": "...", "customer_name": "...", "quotation_details": "..." }
     """
-    import smtplib, hashlib, hmac
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
+    import hashlib, hmac
 
     org_id = admin.get("organization_id")
     if not org_id:
@@ -2902,40 +2841,32 @@ async def send_quotation_approval_email(
     </div>
     """
 
-    # Send email
+    # Queue email
     email_sent = False
     try:
-        smtp_settings = await _db.settings.find_one(
-            {"organization_id": org_id},
-            {"_id": 0, "smtp_host": 1, "smtp_port": 1, "smtp_user": 1, "smtp_pass": 1, "smtp_from": 1}
-        )
-        if smtp_settings and smtp_settings.get("smtp_host"):
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = f"Quotation Approval Required - Job #{ticket_num}"
-            msg["From"] = smtp_settings.get("smtp_from", smtp_settings.get("smtp_user", ""))
-            msg["To"] = customer_email
-            msg.attach(MIMEText(html, "html"))
-
-            with smtplib.SMTP(smtp_settings["smtp_host"], int(smtp_settings.get("smtp_port", 587)), timeout=10) as server:
-                server.starttls()
-                server.login(smtp_settings["smtp_user"], smtp_settings["smtp_pass"])
-                server.send_message(msg)
+        if await smtp_configured(org_id):
+            await enqueue_email(
+                customer_email, f"Quotation Approval Required - Job #{ticket_num}", html,
+                org_id=org_id, dedup_key=f"quotation:{approval_token}",
+                context={"ticket_id": ticket_id, "approval_token": approval_token}
+            )
             email_sent = True
     except Exception as e:
         import logging
-        logging.getLogger("ticketing").warning(f"Failed to send quotation email: {e}")
+        logging.getLogger("ticketing").warning(f"Failed to queue quotation email: {e}")
 
     # Add timeline entry
-    await _db.tickets_v2.update_one(
+    await append_ticket_events(
         {"id": ticket_id},
-        {"$push": {"timeline": {
+        {
             "id": str(uuid.uuid4()),
             "type": "quotation_sent",
-            "description": f"Quotation approval email sent to {customer_email}" + (" (delivered)" if email_sent else " (SMTP not configured - use approval links manually)"),
+            "description": f"Quotation approval email sent to {customer_email}" + (" (queued for delivery)" if email_sent else " (SMTP not configured - use approval links manually)"),
             "user_name": admin.get("name", "Admin"),
             "is_internal": False,
             "created_at": get_ist_isoformat()
-        }}, "$set": {"updated_at": get_ist_isoformat()}}
+        },
+        {"$set": {"updated_at": get_ist_isoformat()}}
     )
 
     return {
@@ -3022,20 +2953,19 @@ async def quotation_response(token: str, action: str = Query(...)):
     if new_stage_id:
         update_data["current_stage_id"] = new_stage_id
 
-    await _db.tickets_v2.update_one(
+    await append_ticket_events(
         {"id": ticket_id},
         {
-            "$set": update_data,
-            "$push": {"timeline": {
-                "id": str(uuid.uuid4()),
-                "type": "quotation_response",
-                "description": f"Customer {new_status} the quotation via email",
-                "user_name": approval.get("customer_email", "Customer"),
-                "is_internal": False,
-                "created_at": get_ist_isoformat()
-            }}
-        }
+            "id": str(uuid.uuid4()),
+            "type": "quotation_response",
+            "description": f"Customer {new_status} the quotation via email",
+            "user_name": approval.get("customer_email", "Customer"),
+            "is_internal": False,
+            "created_at": get_ist_isoformat()
+        },
+        {"$set": update_data}
     )
+    await sync_ticket_rollup(ticket_id)
 
     # HTML response
     if action == "approve":
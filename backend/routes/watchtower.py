@@ -12,7 +12,11 @@ import logging
 
 from services.auth import get_current_admin, get_current_company_user
 from utils.tenant_scope import get_admin_org_id, scope_query
+from utils.helpers import with_lookup_keys
 from services.watchtower import WatchTowerService, WatchTowerConfig, map_agent_to_device
+from services.search_index import sync_search_entries
+from services.expiries import sync_expiries
+from services.tenant_counters import count_inserted
 
 logger = logging.getLogger(__name__)
 
@@ -260,11 +264,16 @@ async def sync_rmm_agents(request: AgentSyncRequest, admin: dict = Depends(get_c
                     {"id": existing["id"]},
                     {"$set": update_data}
                 )
+                await sync_search_entries("devices", [existing["id"]])
+                await sync_expiries("devices", [existing["id"]])
                 updated += 1
             else:
                 # Create new device
                 device = map_agent_to_device(agent, request.company_id, org_id)
-                await _db.devices.insert_one(device)
+                await _db.devices.insert_one(with_lookup_keys(device))
+                await count_inserted("devices", [device])
+                await sync_search_entries("devices", [device["id"]])
+                await sync_expiries("devices", [device["id"]])
                 synced += 1
                 
         except Exception as e:
@@ -449,6 +458,8 @@ async def get_device_watchtower_status(device_id: str, user: dict = Depends(get_
                         "rmm_last_sync": datetime.utcnow().isoformat()
                     }}
                 )
+                await sync_search_entries("devices", [device_id])
+                await sync_expiries("devices", [device_id])
                 
                 return {
                     "integrated": True,
@@ -631,6 +642,8 @@ async def auto_sync_all_agents(admin: dict = Depends(get_current_admin)):
                         "is_deleted": False
                     }
                     await _db.companies.insert_one(company)
+                    await count_inserted("companies", [company])
+                    await sync_search_entries("companies", [company["id"]])
                     company_lookup[client_name.lower()] = company
                     created_companies.append(client_name)
                 
@@ -653,6 +666,7 @@ async def auto_sync_all_agents(admin: dict = Depends(get_current_admin)):
                         "is_deleted": False
                     }
                     await _db.sites.insert_one(site)
+                    await sync_search_entries("sites", [site["id"]])
                     site_lookup[site_key] = site
                     created_sites.append(f"{client_name}/{site_name}")
                 
@@ -727,6 +741,8 @@ async def auto_sync_all_agents(admin: dict = Depends(get_current_admin)):
                         "updated_at": now
                     }
                     await _db.devices.update_one({"id": existing["id"]}, {"$set": update_data})
+                    await sync_search_entries("devices", [existing["id"]])
+                    await sync_expiries("devices", [existing["id"]])
                     updated += 1
                 else:
                     # Create new device
@@ -770,7 +786,10 @@ async def auto_sync_all_agents(admin: dict = Depends(get_current_admin)):
                         "updated_at": now,
                         "is_deleted": False
                     }
-                    await _db.devices.insert_one(new_device)
+                    await _db.devices.insert_one(with_lookup_keys(new_device))
+                    await count_inserted("devices", [new_device])
+                    await sync_search_entries("devices", [new_device["id"]])
+                    await sync_expiries("devices", [new_device["id"]])
                     synced += 1
                     
             except Exception as e:
@@ -896,6 +915,7 @@ async def generate_agent_download_for_company(
                 "watchtower_provisioned_at": datetime.utcnow().isoformat()
             }}
         )
+        await sync_search_entries("companies", [company_id])
         
         return {
             "success": True,
@@ -1038,6 +1058,7 @@ async def company_generate_agent_download(
                     "watchtower_provisioned_at": datetime.utcnow().isoformat()
                 }}
             )
+            await sync_search_entries("companies", [company_id])
         
         response = {
             "success": True,
@@ -0,0 +1,33 @@
+"""
+Backfill Serial / Asset Tag Lookup Keys and Device Categories
+=============================================================
+Adds the normalized serial_key / asset_tag_key fields to devices and parts,
+and the canonical device_category (utils/synonyms.py) to devices, for records
+created before they were maintained on write. Only records missing a field
+are touched, so it is safe to re-run. The app runs it once at startup
+(services/backfills.py); this script re-runs it by hand.
+
+Usage:
+    python scripts/backfill_lookup_keys.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.warranty_lookup import backfill_lookup_keys  # noqa: E402
+
+
+async def main():
+    print("=" * 60)
+    print("Lookup Key Backfill")
+    print("=" * 60)
+    stats = await backfill_lookup_keys()
+    print(f"   Devices updated: {stats['devices']}")
+    print(f"   Parts updated: {stats['parts']}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+"""
+Backfill Ticket Search Terms
+============================
+Adds `search_terms` (services/ticket_search.py) to tickets_v2 documents
+created before ticket search used the index. Only tickets missing the field
+are touched, so it is safe to re-run. Until it has run, older tickets are not
+found by `GET /ticketing/tickets?search=`.
+
+Usage:
+    python scripts/backfill_ticket_search_terms.py                # all organizations
+    python scripts/backfill_ticket_search_terms.py --org <org_id>  # one organization
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_search import backfill_search_terms  # noqa: E402
+
+
+async def main(org_id=None):
+    print("=" * 60)
+    print("Ticket Search Terms Backfill")
+    print("=" * 60)
+    updated = await backfill_search_terms(org_id)
+    print(f"   Tickets updated: {updated}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill ticket search terms")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only backfill this organization")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id))
@@ -0,0 +1,175 @@
+"""
+Benchmark: Ticket Analytics Strategies
+======================================
+Seeds a synthetic organization into a scratch database and times the
+ticket intelligence numbers computed three ways:
+
+1. python   - load every ticket and group in Python (the former approach)
+2. facet    - one $facet aggregation (services/analytics_pipelines.py)
+3. rollups  - read daily rollup rows (services/ticket_rollups.py)
+
+The scratch database is dropped afterwards unless --keep is given.
+Never point --db at a live database.
+
+Usage:
+    python scripts/benchmark_analytics.py                       # 100k tickets
+    python scripts/benchmark_analytics.py --tickets 20000 --runs 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+DEFAULT_DB = "warranty_portal_benchmark"
+
+# The services read DB_NAME at import time; point them at the scratch database first.
+_args = argparse.ArgumentParser(description="Benchmark ticket analytics strategies")
+_args.add_argument("--tickets", type=int, default=100_000)
+_args.add_argument("--days", type=int, default=30)
+_args.add_argument("--runs", type=int, default=3)
+_args.add_argument("--db", default=DEFAULT_DB)
+_args.add_argument("--keep", action="store_true", help="Keep the scratch database")
+ARGS = _args.parse_args()
+os.environ["DB_NAME"] = ARGS.db
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db  # noqa: E402
+from config import IST  # noqa: E402
+from services import ticket_rollups as rollups  # noqa: E402
+from services import analytics_pipelines as pipelines  # noqa: E402
+
+ORG_ID = "bench-org"
+STAGES = ["New", "Assigned", "In Progress", "Pending Parts", "Resolved", "Closed"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+TOPICS = [f"Topic {i}" for i in range(25)]
+SOURCES = ["web", "email", "phone", "api"]
+
+
+def synthetic_ticket(now: datetime) -> dict:
+    created = now - timedelta(days=random.uniform(0, 720))
+    is_open = random.random() < 0.2
+    closed_at = None if is_open else created + timedelta(hours=random.expovariate(1 / 36))
+    return {
+        "id": str(uuid.uuid4()),
+        "organization_id": ORG_ID,
+        "is_deleted": False,
+        "is_open": is_open,
+        "created_at": created.isoformat(),
+        "closed_at": closed_at.isoformat() if closed_at else None,
+        "current_stage_name": random.choice(STAGES[:4]) if is_open else "Closed",
+        "priority_name": random.choice(PRIORITIES),
+        "help_topic_name": random.choice(TOPICS),
+        "source": random.choice(SOURCES),
+        "assigned_to_id": f"eng-{random.randint(1, 40)}" if random.random() < 0.8 else None,
+        "company_id": f"company-{random.randint(1, 300)}",
+        "sla_breached": random.random() < 0.1,
+        "timeline": [],
+    }
+
+
+async def seed(count: int) -> None:
+    now = datetime.now(IST)
+    batch = []
+    for _ in range(count):
+        batch.append(synthetic_ticket(now))
+        if len(batch) == 5000:
+            await db.tickets_v2.insert_many(batch)
+            batch = []
+    if batch:
+        await db.tickets_v2.insert_many(batch)
+    await db.tickets_v2.create_index([("organization_id", 1), ("created_at", -1)])
+
+
+async def python_loop(period_from: str) -> dict:
+    tickets = await db.tickets_v2.find(
+        {"organization_id": ORG_ID, "is_deleted": {"$ne": True}}, {"_id": 0}
+    ).to_list(None)
+    period = [t for t in tickets if t.get("created_at", "") >= period_from]
+    stage, priority, topic = defaultdict(int), defaultdict(int), defaultdict(int)
+    hours = []
+    for t in tickets:
+        if t.get("is_open"):
+            stage[t.get("current_stage_name", "Unknown")] += 1
+        if t.get("closed_at"):
+            created = datetime.fromisoformat(t["created_at"])
+            hours.append((datetime.fromisoformat(t["closed_at"]) - created).total_seconds() / 3600)
+    for t in period:
+        priority[t.get("priority_name", "medium")] += 1
+        topic[t.get("help_topic_name", "Unknown")] += 1
+    hours.sort()
+    return {
+        "total": len(tickets),
+        "period": len(period),
+        "p95": hours[int(len(hours) * 0.95)] if hours else 0,
+    }
+
+
+async def facet(period_from: str) -> dict:
+    docs = await db.tickets_v2.aggregate(
+        pipelines.ticket_intelligence_pipeline(ORG_ID, period_from)
+    ).to_list(1)
+    facets = pipelines.facet_result(docs)
+    hist = pipelines.histogram_from_buckets(facets.get("resolution_hist", []))
+    return {
+        "total": pipelines.first(facets.get("totals")).get("total", 0),
+        "period": sum(r["count"] for r in facets.get("volume_by_day", [])),
+        "p95": rollups.histogram_percentile(hist, 0.95),
+    }
+
+
+async def from_rollups(period_from: str) -> dict:
+    totals = await rollups.load_totals(ORG_ID)
+    rows = await rollups.load_daily(ORG_ID, period_from, fields=["created", "priority", "topic"])
+    rollups.merge_counts(rows, "priority")
+    rollups.merge_counts(rows, "topic")
+    return {
+        "total": totals.get("total", 0),
+        "period": rollups.total(rows, "created"),
+        "p95": rollups.histogram_percentile(totals.get("resolution_hist"), 0.95),
+    }
+
+
+async def timed(label: str, fn, period_from: str, runs: int) -> None:
+    samples = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await fn(period_from)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    print(f"   {label:<8} median {samples[len(samples) // 2] * 1000:9.1f} ms   "
+          f"total={result['total']} period={result['period']} p95={result['p95']:.1f}h")
+
+
+async def main() -> None:
+    print("=" * 60)
+    print(f"Ticket analytics benchmark ({ARGS.tickets} tickets, {ARGS.days}-day window)")
+    print("=" * 60)
+    if await db.tickets_v2.count_documents({"organization_id": ORG_ID}) != ARGS.tickets:
+        await db.tickets_v2.delete_many({"organization_id": ORG_ID})
+        started = time.perf_counter()
+        await seed(ARGS.tickets)
+        print(f"   Seeded in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = await rollups.rebuild_rollups(ORG_ID)
+    print(f"   Rollup rebuild: {time.perf_counter() - started:.1f}s ({stats['daily_rows']} daily rows)")
+
+    period_from = rollups.period_start(ARGS.days)
+    await timed("python", python_loop, period_from, ARGS.runs)
+    await timed("facet", facet, period_from, ARGS.runs)
+    await timed("rollups", from_rollups, period_from, ARGS.runs)
+
+    if not ARGS.keep:
+        await db.client.drop_database(ARGS.db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+Benchmark: Engineer Availability
+================================
+Seeds synthetic engineers (with working hours and personal holidays), org
+holidays, emergency hours and bookings (ticket_schedules plus scheduled
+tickets_v2) into a scratch database and times availability for every
+engineer over every day three ways:
+
+1. per-day  - one calendar load per engineer per day, the access pattern of
+              the former single-engineer, single-date slot endpoints
+2. one call - services/availability.find_availability for all engineers and
+              days at once (full free lists, then first free slot only)
+3. compute  - building the interval sets from already loaded documents, no I/O
+
+The scratch database is dropped afterwards unless --keep is given. Never
+point --db at a live database.
+
+Usage:
+    python scripts/benchmark_availability.py                     # 200 engineers, 30 days
+    python scripts/benchmark_availability.py --engineers 50 --days 7
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+DEFAULT_DB = "availability_benchmark"
+
+# The services read DB_NAME at import time; point them at the scratch database first.
+_args = argparse.ArgumentParser(description="Benchmark engineer availability")
+_args.add_argument("--engineers", type=int, default=200)
+_args.add_argument("--days", type=int, default=30)
+_args.add_argument("--bookings-per-day", type=int, default=3, help="Per engineer, on average")
+_args.add_argument("--db", default=DEFAULT_DB)
+_args.add_argument("--keep", action="store_true", help="Keep the scratch database")
+ARGS = _args.parse_args()
+os.environ["DB_NAME"] = ARGS.db
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db  # noqa: E402
+from services import availability  # noqa: E402
+
+ORG_ID = "bench-org"
+START = datetime(2026, 3, 2)  # a Monday
+NOW = START.replace(hour=0)
+
+
+def day(n: int) -> str:
+    return (START + timedelta(days=n)).strftime("%Y-%m-%d")
+
+
+def synthetic_engineer(n: int) -> dict:
+    hours = {name: dict(spec) for name, spec in availability.DEFAULT_WORKING_HOURS.items()}
+    if n % 4 == 0:
+        hours["monday"] = {"is_working": True, "start": "12:00", "end": "21:00"}
+    return {
+        "id": f"eng-{n}", "organization_id": ORG_ID, "name": f"Engineer {n:04d}",
+        "skills": ["L2"] if n % 3 == 0 else ["L1"],
+        "working_hours": hours,
+        "holidays": [day(random.randrange(ARGS.days)) for _ in range(2)],
+        "is_active": True, "is_deleted": False,
+    }
+
+
+def synthetic_bookings(n: int) -> tuple:
+    schedules, tickets = [], []
+    for d in range(ARGS.days):
+        for _ in range(random.randint(0, ARGS.bookings_per_day * 2)):
+            start = datetime.strptime(day(d), "%Y-%m-%d") + timedelta(minutes=random.randrange(8 * 60, 19 * 60, 30))
+            number = f"{random.randrange(10 ** 6):06d}"
+            booking = {
+                "id": str(uuid.uuid4()), "organization_id": ORG_ID, "ticket_number": number,
+                "company_name": f"Company {random.randrange(500)}", "subject": "Site visit",
+                "scheduled_at": start.isoformat(),
+                "scheduled_end_at": (start + timedelta(minutes=random.choice([30, 60, 90, 120]))).isoformat(),
+            }
+            if random.random() < 0.7:
+                schedules.append({**booking, "engineer_id": f"eng-{n}", "status": "scheduled"})
+            else:
+                tickets.append({**booking, "assigned_to_id": f"eng-{n}", "is_deleted": False})
+    return schedules, tickets
+
+
+async def seed() -> None:
+    engineers = [synthetic_engineer(n) for n in range(ARGS.engineers)]
+    await db.engineers.insert_many(engineers)
+    for n in range(ARGS.engineers):
+        schedules, tickets = synthetic_bookings(n)
+        if schedules:
+            await db.ticket_schedules.insert_many(schedules)
+        if tickets:
+            await db.tickets_v2.insert_many(tickets)
+    await db.org_holidays.insert_one({"id": "h1", "organization_id": ORG_ID, "name": "Holi", "date": day(10)})
+    await db.org_emergency_hours.insert_one({
+        "id": "e1", "organization_id": ORG_ID, "date": day(13), "reason": "Outage", "start": "18:00", "end": "22:00"
+    })
+    await db.engineers.create_index([("organization_id", 1), ("id", 1)])
+    await db.ticket_schedules.create_index([("organization_id", 1), ("engineer_id", 1), ("scheduled_at", 1)])
+    await db.tickets_v2.create_index([("organization_id", 1), ("assigned_to_id", 1), ("scheduled_at", 1)])
+    for collection in (db.org_holidays, db.org_emergency_hours):
+        await collection.create_index([("organization_id", 1), ("date", 1)])
+
+
+async def per_day(engineers: list) -> int:
+    """The former pattern: every (engineer, date) is its own request with its own reads"""
+    free_slots = 0
+    for engineer in engineers:
+        for d in range(ARGS.days):
+            start, days = availability.day_range(day(d))
+            calendar = await availability.load_calendar(ORG_ID, start, days, [engineer])
+            result = calendar.engineers[engineer["id"]].day_slots(0)
+            free_slots += sum(1 for s in result["slots"] if s["available"])
+    return free_slots
+
+
+async def timed(label: str, coro) -> object:
+    started = time.perf_counter()
+    result = await coro
+    print(f"   {label:<24} {(time.perf_counter() - started) * 1000:10.1f} ms")
+    return result
+
+
+async def main() -> None:
+    print("=" * 60)
+    print(f"Availability benchmark ({ARGS.engineers} engineers, {ARGS.days} days)")
+    print("=" * 60)
+    if await db.engineers.count_documents({"organization_id": ORG_ID}) != ARGS.engineers:
+        await db.client.drop_database(ARGS.db)
+        started = time.perf_counter()
+        await seed()
+        print(f"   Seeded in {time.perf_counter() - started:.1f}s")
+
+    engineers = await availability.find_engineers(ORG_ID)
+    date_to = day(ARGS.days - 1)
+
+    await timed("per-day", per_day(engineers))
+    listing = await timed("one call (free lists)", availability.find_availability(
+        ORG_ID, day(0), date_to, 60, engineers, now=NOW))
+    await timed("one call (first slot)", availability.find_availability(
+        ORG_ID, day(0), date_to, 60, engineers, first_only=True, now=NOW))
+    l2 = await availability.find_engineers(ORG_ID, skill="L2")
+    first = await timed("first L2 hour, 7 days", availability.find_availability(
+        ORG_ID, day(0), day(6), 60, l2, first_only=True, now=NOW))
+
+    start, days = availability.day_range(day(0), date_to)
+    calendar = await availability.load_calendar(ORG_ID, start, days, engineers)
+    bookings = [b for s in calendar.engineers.values() for b in s.bookings]
+    docs = [{"engineer_id": eid, "ticket_number": b["ticket_number"],
+             "scheduled_at": calendar.timestamp(b["start"]), "scheduled_end_at": calendar.timestamp(b["end"])}
+            for eid, s in calendar.engineers.items() for b in s.bookings]
+    rounds = 20
+    started = time.perf_counter()
+    for _ in range(rounds):
+        availability.Calendar(start, days, engineers, bookings=docs).first_free(60)
+    print(f"   {'compute (no I/O)':<24} {(time.perf_counter() - started) * 1000 / rounds:10.1f} ms")
+
+    windows = sum(len(e["free"]) for e in listing["engineers"])
+    print(f"   {len(bookings)} bookings, {windows} free windows; first L2 hour: {first['first_slot']}")
+
+    if not ARGS.keep:
+        await db.client.drop_database(ARGS.db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+"""
+Benchmark: Universal Search
+===========================
+Seeds a synthetic tenant (200k entities across the seven searchable
+collections by default) into a scratch database and times the omnibox
+search two ways:
+
+1. regex  - unanchored case-insensitive $regex per collection with synonym
+            alternations (the former `GET /search` query path)
+2. index  - one aggregation over search_index (services/search_index.py)
+
+Only the lookup is timed; result-card formatting is identical for both.
+The scratch database is dropped afterwards unless --keep is given.
+Never point --db at a live database.
+
+Usage:
+    python scripts/benchmark_search.py                         # 200k entities
+    python scripts/benchmark_search.py --entities 50000 --queries 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+DEFAULT_DB = "warranty_portal_benchmark"
+
+# The services read DB_NAME at import time; point them at the scratch database first.
+_args = argparse.ArgumentParser(description="Benchmark universal search strategies")
+_args.add_argument("--entities", type=int, default=200_000)
+_args.add_argument("--queries", type=int, default=200)
+_args.add_argument("--db", default=DEFAULT_DB)
+_args.add_argument("--keep", action="store_true", help="Keep the scratch database")
+ARGS = _args.parse_args()
+os.environ["DB_NAME"] = ARGS.db
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db  # noqa: E402
+from services import search_index  # noqa: E402
+from utils.synonyms import expand_search_query, get_brand_variants  # noqa: E402
+
+ORG_ID = "bench-org"
+LIMIT = 5
+# Share of the tenant's entities per collection
+MIX = {"companies": 0.01, "sites": 0.04, "users": 0.2, "devices": 0.5,
+       "deployments": 0.05, "amc_contracts": 0.02, "service_history": 0.18}
+WORDS = ["alpha", "bravo", "cedar", "delta", "ember", "falcon", "granite", "harbor", "indigo", "juniper",
+         "kestrel", "lotus", "maple", "nimbus", "orchid", "pioneer", "quartz", "raven", "summit", "tundra"]
+CITIES = ["Mumbai", "Pune", "Delhi", "Chennai", "Kolkata", "Bengaluru", "Hyderabad", "Ahmedabad"]
+DEVICE_TYPES = ["Laptop", "Desktop", "Printer", "IP Camera", "NVR", "Router", "Switch", "UPS", "Firewall"]
+BRANDS = ["Dell", "HP", "Lenovo", "Hikvision", "Cisco", "APC", "Canon", "Fortinet"]
+
+
+def name(i: int) -> str:
+    return f"{WORDS[i % len(WORDS)].title()} {WORDS[(i // len(WORDS)) % len(WORDS)].title()} {i}"
+
+
+def synthetic(collection: str, i: int) -> dict:
+    base = {"id": f"{collection}-{i}", "organization_id": ORG_ID, "is_deleted": False}
+    if collection == "companies":
+        return {**base, "name": f"{name(i)} Pvt Ltd", "contact_email": f"it{i}@{WORDS[i % 20]}.example.com",
+                "gst_number": f"27AAB{i:06d}Z5", "address": f"{i} Ring Road, {random.choice(CITIES)}"}
+    if collection == "sites":
+        return {**base, "name": f"{name(i)} Office", "city": random.choice(CITIES), "address": f"Plot {i}",
+                "company_id": f"companies-{i % 2000}", "contact_number": f"98{i:08d}"}
+    if collection == "users":
+        return {**base, "name": name(i), "email": f"user{i}@example.com", "phone": f"99{i:08d}",
+                "designation": random.choice(["Engineer", "Manager", "Analyst", "Admin"])}
+    if collection == "devices":
+        return {**base, "brand": random.choice(BRANDS), "model": f"X{i % 900}", "serial_number": f"SN{i:09d}",
+                "asset_tag": f"AT-{i:07d}", "device_type": random.choice(DEVICE_TYPES),
+                "location": f"Floor {i % 12}", "company_id": f"companies-{i % 2000}",
+                "notes": "Installed during " + WORDS[i % 20] + " rollout"}
+    if collection == "deployments":
+        return {**base, "name": f"{name(i)} Rollout", "installed_by": name(i + 7), "site_id": f"sites-{i % 8000}",
+                "items": [{"category": random.choice(DEVICE_TYPES), "brand": random.choice(BRANDS),
+                           "model": f"X{i % 900}", "serial_numbers": [f"DS{i:07d}{n}" for n in range(3)]}]}
+    if collection == "amc_contracts":
+        return {**base, "name": f"{name(i)} AMC", "amc_type": random.choice(["comprehensive", "non_comprehensive"]),
+                "company_id": f"companies-{i % 2000}", "start_date": "2025-01-01", "end_date": "2026-12-31"}
+    return {**base, "ticket_id": f"TKT-{i:07d}", "action_taken": f"Replaced {random.choice(['fan', 'battery', 'toner'])}",
+            "problem_reported": f"{WORDS[i % 20]} issue", "technician_name": name(i + 3),
+            "device_id": f"devices-{i}", "service_type": "repair"}
+
+
+async def seed(total: int) -> None:
+    for collection, share in MIX.items():
+        batch = []
+        for i in range(int(total * share)):
+            batch.append(synthetic(collection, i))
+            if len(batch) == 5000:
+                await db[collection].insert_many(batch)
+                batch = []
+        if batch:
+            await db[collection].insert_many(batch)
+    await db.search_index.create_index("key", unique=True)
+    await db.search_index.create_index([("organization_id", 1), ("terms", 1)])
+
+
+def sample_queries(total: int, n: int) -> list:
+    devices = int(total * MIX["devices"])
+    choices = [
+        lambda: random.choice(WORDS),
+        lambda: random.choice(WORDS)[:3],
+        lambda: f"{random.choice(WORDS)} {random.choice(WORDS)}",
+        lambda: f"SN{random.randrange(devices):09d}",
+        lambda: f"{random.randrange(devices):09d}"[-5:],
+        lambda: random.choice(["laptop", "surveillance", "cctv", "hewlett packard", "printer"]),
+        lambda: random.choice(CITIES).lower(),
+        lambda: "nomatchxyz",
+    ]
+    return [random.choice(choices)() for _ in range(n)]
+
+
+async def regex_search(q: str) -> int:
+    """The former lookup: one unanchored regex query per collection"""
+    rx = {"$regex": q, "$options": "i"}
+    synonym_rx = expand_search_query(q)
+    brand_rx = {"$regex": "|".join(get_brand_variants(q)), "$options": "i"}
+    live = {"is_deleted": {"$ne": True}}
+    queries = {
+        "companies": [{"name": rx}, {"contact_email": rx}, {"gst_number": rx}, {"address": rx}],
+        "sites": [{"name": rx}, {"address": rx}, {"city": rx}, {"primary_contact_name": rx}, {"contact_number": rx}],
+        "users": [{"name": rx}, {"email": rx}, {"phone": rx}, {"designation": rx}],
+        "devices": [{"serial_number": rx}, {"asset_tag": rx}, {"brand": brand_rx}, {"model": rx},
+                    {"device_type": synonym_rx}, {"location": rx}, {"notes": synonym_rx}],
+        "deployments": [{"name": rx}, {"installed_by": rx}, {"notes": rx}, {"items": {"$elemMatch": {"$or": [
+            {"serial_numbers": rx}, {"category": rx}, {"brand": rx}, {"model": rx}]}}}],
+        "amc_contracts": [{"name": rx}, {"amc_type": rx}, {"internal_notes": rx}],
+        "service_history": [{"ticket_id": rx}, {"action_taken": rx}, {"problem_reported": rx},
+                            {"technician_name": rx}, {"notes": rx}],
+    }
+    found = 0
+    for collection, clauses in queries.items():
+        found += len(await db[collection].find({**live, "$or": clauses}, {"_id": 0}).limit(LIMIT).to_list(LIMIT))
+    return found
+
+
+async def index_search(q: str) -> int:
+    groups = await search_index.search(ORG_ID, q, LIMIT)
+    return sum(len(hits) for hits in groups.values())
+
+
+async def timed(label: str, fn, queries: list) -> None:
+    samples = []
+    found = 0
+    for q in queries:
+        started = time.perf_counter()
+        found += await fn(q)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f"   {label:<6} p50 {p50:9.2f} ms   p99 {p99:9.2f} ms   hits={found}")
+
+
+async def main() -> None:
+    print("=" * 60)
+    print(f"Universal search benchmark ({ARGS.entities} entities, {ARGS.queries} queries)")
+    print("=" * 60)
+    if await db.devices.count_documents({"organization_id": ORG_ID}) != int(ARGS.entities * MIX["devices"]):
+        await db.client.drop_database(ARGS.db)
+        started = time.perf_counter()
+        await seed(ARGS.entities)
+        print(f"   Seeded in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        await search_index.rebuild_search_index(ORG_ID)
+        print(f"   Indexed in {time.perf_counter() - started:.1f}s")
+
+    queries = sample_queries(ARGS.entities, ARGS.queries)
+    await timed("regex", regex_search, queries)
+    await timed("index", index_search, queries)
+
+    if not ARGS.keep:
+        await db.client.drop_database(ARGS.db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
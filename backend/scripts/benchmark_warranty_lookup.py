@@ -0,0 +1,201 @@
+"""
+Benchmark: Warranty Lookup
+==========================
+Seeds synthetic devices (with parts, AMC assignments and service history)
+into a scratch database and times the public warranty search two ways:
+
+1. regex  - anchored case-insensitive $regex on serial_number / asset_tag
+            followed by per-document follow-up queries (the former approach)
+2. keyed  - indexed equality on serial_key / asset_tag_key with the
+            follow-ups joined in one aggregation (services/warranty_lookup.py)
+
+Queries mix serial hits, asset tag hits, part serial hits and misses, in
+random letter case. The scratch database is dropped afterwards unless
+--keep is given. Never point --db at a live database.
+
+Usage:
+    python scripts/benchmark_warranty_lookup.py                       # 1M devices
+    python scripts/benchmark_warranty_lookup.py --devices 100000 --queries 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+DEFAULT_DB = "warranty_portal_benchmark"
+
+# The services read DB_NAME at import time; point them at the scratch database first.
+_args = argparse.ArgumentParser(description="Benchmark the public warranty lookup")
+_args.add_argument("--devices", type=int, default=1_000_000)
+_args.add_argument("--queries", type=int, default=200)
+_args.add_argument("--db", default=DEFAULT_DB)
+_args.add_argument("--keep", action="store_true", help="Keep the scratch database")
+ARGS = _args.parse_args()
+os.environ["DB_NAME"] = ARGS.db
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db  # noqa: E402
+from utils.helpers import with_lookup_keys  # noqa: E402
+from services import warranty_lookup  # noqa: E402
+
+ORG_ID = "bench-org"
+COMPANIES = 500
+USERS = 5000
+
+
+def serial(n: int) -> str:
+    return f"SN{n:09d}X"
+
+
+def asset_tag(n: int) -> str:
+    return f"AT-{n:08d}"
+
+
+def part_serial(n: int) -> str:
+    return f"PT{n:09d}"
+
+
+def synthetic_device(n: int) -> dict:
+    return with_lookup_keys({
+        "id": f"dev-{n}",
+        "organization_id": ORG_ID,
+        "company_id": f"company-{n % COMPANIES}",
+        "assigned_user_id": f"user-{n % USERS}" if n % 3 else None,
+        "device_type": random.choice(["Laptop", "Desktop", "Printer", "Router"]),
+        "brand": random.choice(["Dell", "HP", "Lenovo", "Cisco"]),
+        "model": f"Model {n % 97}",
+        "serial_number": serial(n),
+        "asset_tag": asset_tag(n),
+        "warranty_end_date": f"{random.randint(2023, 2029)}-06-30",
+        "status": "active",
+        "is_deleted": False,
+    })
+
+
+async def insert_batched(collection, docs) -> None:
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == 10_000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+
+
+async def seed(count: int) -> None:
+    await db.companies.insert_many([
+        {"id": f"company-{i}", "organization_id": ORG_ID, "name": f"Company {i}", "is_deleted": False}
+        for i in range(COMPANIES)
+    ])
+    await db.users.insert_many([
+        {"id": f"user-{i}", "organization_id": ORG_ID, "name": f"User {i}", "is_deleted": False}
+        for i in range(USERS)
+    ])
+    await insert_batched(db.devices, (synthetic_device(n) for n in range(count)))
+    await insert_batched(db.parts, (with_lookup_keys({
+        "id": f"part-{n}", "device_id": f"dev-{n}", "part_name": "SSD", "serial_number": part_serial(n),
+        "warranty_expiry_date": "2027-01-01", "is_deleted": False
+    }) for n in range(0, count, 10)))
+    await insert_batched(db.amc_device_assignments, ({
+        "id": str(uuid.uuid4()), "device_id": f"dev-{n}", "amc_contract_id": "amc-1", "status": "active",
+        "coverage_start": "2025-01-01", "coverage_end": "2030-12-31"
+    } for n in range(0, count, 4)))
+    await db.amc_contracts.insert_one({"id": "amc-1", "name": "Gold", "amc_type": "comprehensive", "is_deleted": False})
+    await insert_batched(db.service_history, ({
+        "id": str(uuid.uuid4()), "device_id": f"dev-{n % count}", "action_taken": "Checked"
+    } for n in range(count // 2)))
+    await db.amc_device_assignments.create_index([("device_id", 1), ("status", 1)])
+    for collection, field in ((db.devices, "id"), (db.companies, "id"), (db.users, "id"), (db.parts, "device_id"),
+                              (db.amc, "device_id"), (db.service_history, "device_id")):
+        await collection.create_index(field)
+    for collection in (db.devices, db.parts):
+        await collection.create_index([("serial_key", 1), ("is_deleted", 1)])
+    await db.devices.create_index([("asset_tag_key", 1), ("is_deleted", 1)])
+
+
+def random_case(value: str) -> str:
+    return "".join(c.lower() if random.random() < 0.5 else c for c in value)
+
+
+def sample_queries(count: int, n: int) -> list:
+    queries = []
+    for _ in range(n):
+        i = random.randrange(count)
+        kind = random.random()
+        if kind < 0.5:
+            queries.append(random_case(serial(i)))
+        elif kind < 0.75:
+            queries.append(random_case(asset_tag(i)))
+        elif kind < 0.9:
+            queries.append(random_case(part_serial(i - i % 10)))
+        else:
+            queries.append(f"NOPE{i}")
+    return queries
+
+
+async def regex_lookup(q: str):
+    """The former request path: regex probes plus one query per follow-up"""
+    regex = {"$regex": f"^{q}$", "$options": "i"}
+    part = await db.parts.find_one({"is_deleted": {"$ne": True}, "serial_number": regex}, {"_id": 0})
+    if part:
+        device = await db.devices.find_one({"id": part["device_id"], "is_deleted": {"$ne": True}}, {"_id": 0})
+        if device:
+            await db.companies.find_one({"id": device["company_id"], "is_deleted": {"$ne": True}}, {"_id": 0, "name": 1})
+        return part
+    device = await db.devices.find_one(
+        {"is_deleted": {"$ne": True}, "$or": [{"serial_number": regex}, {"asset_tag": regex}]}, {"_id": 0}
+    )
+    if not device:
+        return None
+    await db.companies.find_one({"id": device["company_id"], "is_deleted": {"$ne": True}}, {"_id": 0, "name": 1})
+    if device.get("assigned_user_id"):
+        await db.users.find_one({"id": device["assigned_user_id"], "is_deleted": {"$ne": True}}, {"_id": 0, "name": 1})
+    assignment = await db.amc_device_assignments.find_one({"device_id": device["id"], "status": "active"}, {"_id": 0})
+    if assignment:
+        await db.amc_contracts.find_one({"id": assignment["amc_contract_id"], "is_deleted": {"$ne": True}}, {"_id": 0})
+    await db.amc.find_one({"device_id": device["id"], "is_deleted": {"$ne": True}}, {"_id": 0})
+    await db.parts.find({"device_id": device["id"], "is_deleted": {"$ne": True}}, {"_id": 0}).to_list(None)
+    await db.service_history.count_documents({"device_id": device["id"]})
+    return device
+
+
+async def timed(label: str, fn, queries: list) -> None:
+    samples = []
+    found = 0
+    for q in queries:
+        started = time.perf_counter()
+        found += 1 if await fn(q) else 0
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f"   {label:<6} p50 {p50:9.2f} ms   p99 {p99:9.2f} ms   found={found}/{len(queries)}")
+
+
+async def main() -> None:
+    print("=" * 60)
+    print(f"Warranty lookup benchmark ({ARGS.devices} devices, {ARGS.queries} queries)")
+    print("=" * 60)
+    if await db.devices.count_documents({"organization_id": ORG_ID}) != ARGS.devices:
+        await db.client.drop_database(ARGS.db)
+        started = time.perf_counter()
+        await seed(ARGS.devices)
+        print(f"   Seeded in {time.perf_counter() - started:.1f}s")
+
+    queries = sample_queries(ARGS.devices, ARGS.queries)
+    # The regex path scans, so keep its sample small enough to finish
+    await timed("regex", regex_lookup, queries[:max(10, ARGS.queries // 10)])
+    await timed("keyed", warranty_lookup.search_warranty, queries)
+
+    if not ARGS.keep:
+        await db.client.drop_database(ARGS.db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
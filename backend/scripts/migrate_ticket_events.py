@@ -0,0 +1,40 @@
+"""
+Migrate Ticket Timelines to ticket_events
+=========================================
+Moves the embedded `timeline` array of every tickets_v2 document that has
+not been migrated yet into the `ticket_events` collection, then trims the
+ticket's timeline to its last few entries (services/ticket_events.py).
+
+Safe to re-run and to run while the app is serving: events are upserted by
+id, and tickets migrated on first write in the meantime are skipped. The app
+also runs it once at startup (services/backfills.py).
+
+Usage:
+    python scripts/migrate_ticket_events.py                # all organizations
+    python scripts/migrate_ticket_events.py --org <org_id>  # one organization
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_events import migrate_tickets  # noqa: E402
+
+
+async def main(org_id=None):
+    print("=" * 60)
+    print("Ticket Timeline Migration")
+    print("=" * 60)
+    stats = await migrate_tickets(org_id)
+    print(f"   Tickets migrated: {stats['tickets']}")
+    print(f"   Events moved: {stats['events']}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move ticket timelines into ticket_events")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only migrate this organization")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id))
@@ -0,0 +1,38 @@
+"""
+Rebuild Expiry Index
+====================
+Recomputes the `expiries` collection from devices, parts, amc, amc_contracts,
+licenses and email_subscriptions. Run once after deploying the expiry index
+(backfill), or any time it is suspected to have drifted (reconciliation).
+
+Usage:
+    python scripts/rebuild_expiries.py                # all organizations
+    python scripts/rebuild_expiries.py --org <org_id>  # one organization
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.expiries import rebuild_expiries  # noqa: E402
+
+
+async def main(org_id=None):
+    print("=" * 60)
+    print("Expiry Index Rebuild")
+    print("=" * 60)
+    stats = await rebuild_expiries(org_id)
+    for collection, scanned in stats.items():
+        if collection != "removed":
+            print(f"   {collection} scanned: {scanned}")
+    print(f"   Stale rows removed: {stats['removed']}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the expiry alerts index")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only rebuild this organization")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id))
@@ -0,0 +1,36 @@
+"""
+Rebuild Universal Search Index
+==============================
+Re-indexes companies, sites, users, devices, deployments, AMC contracts and
+service records into search_index. Run once after deploying the search index
+(backfill), or any time entries are suspected to have drifted.
+
+Usage:
+    python scripts/rebuild_search_index.py                # all organizations
+    python scripts/rebuild_search_index.py --org <org_id>  # one organization
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search_index import rebuild_search_index  # noqa: E402
+
+
+async def main(org_id=None):
+    print("=" * 60)
+    print("Search Index Rebuild")
+    print("=" * 60)
+    stats = await rebuild_search_index(org_id)
+    for collection, count in stats.items():
+        print(f"   {collection}: {count}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the universal search index")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only rebuild this organization")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id))
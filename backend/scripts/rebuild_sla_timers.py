@@ -0,0 +1,40 @@
+"""
+Rebuild SLA Timers
+==================
+Backfills the sla_timers due-queue (services/sla_timers.py) from open
+tickets. Run once after deploying the SLA scheduler; tickets written since
+then keep their timers up to date on their own. Deadlines already past are
+recorded as fired unless --fire-overdue is given, in which case the
+scheduler escalates them on its next tick.
+
+Usage:
+    python scripts/rebuild_sla_timers.py                 # all organizations
+    python scripts/rebuild_sla_timers.py --org <org_id>   # one organization
+    python scripts/rebuild_sla_timers.py --fire-overdue
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sla_timers import rebuild_sla_timers  # noqa: E402
+
+
+async def main(org_id=None, fire_overdue=False):
+    print("=" * 60)
+    print("SLA Timer Rebuild")
+    print("=" * 60)
+    stats = await rebuild_sla_timers(org_id, fire_overdue=fire_overdue)
+    print(f"   Open tickets scanned: {stats['tickets']}")
+    print(f"   Timers: {stats['timers']} ({stats['overdue']} already overdue, recorded as fired)")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill SLA timers for open tickets")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only this organization")
+    parser.add_argument("--fire-overdue", action="store_true", help="Let the scheduler escalate past deadlines")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id, args.fire_overdue))
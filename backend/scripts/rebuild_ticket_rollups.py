@@ -0,0 +1,38 @@
+"""
+Rebuild Ticket Analytics Rollups
+================================
+Recomputes ticket_rollups_daily / ticket_rollup_totals from tickets_v2 and
+sets each ticket's derived is_assigned flag. Run once after deploying the
+rollup store or a new ROLLUP_SCHEMA (backfill), or any time the rollups are
+suspected to have drifted (reconciliation).
+
+Usage:
+    python scripts/rebuild_ticket_rollups.py                # all organizations
+    python scripts/rebuild_ticket_rollups.py --org <org_id>  # one organization
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_rollups import rebuild_rollups  # noqa: E402
+
+
+async def main(org_id=None):
+    print("=" * 60)
+    print("Ticket Rollup Rebuild")
+    print("=" * 60)
+    stats = await rebuild_rollups(org_id)
+    print(f"   Organizations: {stats['organizations']}")
+    print(f"   Tickets scanned: {stats['tickets']}")
+    print(f"   Daily rows written: {stats['daily_rows']}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild ticket analytics rollups")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only rebuild this organization")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id))
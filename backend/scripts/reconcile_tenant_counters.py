@@ -0,0 +1,36 @@
+"""
+Reconcile Tenant Counters
+=========================
+Recomputes the tenant_counters documents behind the dashboard stats from the
+source collections. The app does this periodically (CounterReconciler); run
+this after bulk data fixes done directly in the database.
+
+Usage:
+    python scripts/reconcile_tenant_counters.py                # all organizations
+    python scripts/reconcile_tenant_counters.py --org <org_id>  # one organization
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tenant_counters import reconcile_counters  # noqa: E402
+
+
+async def main(org_id=None):
+    print("=" * 60)
+    print("Tenant Counter Reconciliation")
+    print("=" * 60)
+    stats = await reconcile_counters(org_id)
+    print(f"   Counter documents written: {stats['documents']}")
+    print(f"   Stale documents removed: {stats['removed']}")
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile tenant dashboard counters")
+    parser.add_argument("--org", dest="org_id", default=None, help="Only reconcile this organization")
+    args = parser.parse_args()
+    asyncio.run(main(args.org_id))
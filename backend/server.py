@@ -6,7 +6,7 @@ Models, services, and utilities are now in separate modules.
 """
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Query, Body
 from fastapi.security import HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -17,11 +17,6 @@ from datetime import datetime, timezone, timedelta
 import httpx
 import base64
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.units import inch
 import shutil
 import json
 import qrcode
@@ -30,7 +25,10 @@ from pydantic import BaseModel, Field
 # Import from modular structure
 from config import ROOT_DIR, UPLOAD_DIR, OSTICKET_URL, OSTICKET_API_KEY, SECRET_KEY, ALGORITHM, IST
 from database import db, client
-from utils.helpers import get_ist_now, get_ist_isoformat, calculate_warranty_expiry, is_warranty_active, days_until_expiry
+from utils.helpers import (
+    get_ist_now, get_ist_isoformat, calculate_warranty_expiry, is_warranty_active,
+    normalize_lookup_key, with_lookup_keys, lookup_key_fields, device_key_query
+)
 from services.auth import (
     verify_password, get_password_hash, create_access_token,
     get_current_admin, get_current_company_user, require_company_admin,
@@ -90,6 +88,29 @@ from models.device_model import (
 from services.device_lookup import get_or_create_device_model
 from utils.security import limiter, RATE_LIMITS, validate_password_strength, sanitize_input
 from utils.tenant_scope import get_admin_org_id, scope_query, get_scoped_query, insert_with_org_id
+from services.batch_join import (
+    collect_ids, fetch_map, attach_names, attach_device_amc,
+    fetch_active_amc_assignments, amc_status_pipeline
+)
+from services.ticket_rollups import sync_ticket_rollup
+from services.ticket_events import append_ticket_events
+from services.analytics_cache import invalidate_analytics
+from services.warranty_lookup import search_warranty as lookup_warranty
+from services.warranty_report import load_report as load_warranty_report, report_pdf as warranty_report_pdf, etag_matches
+from utils.synonyms import device_category, device_type_filter, expand_search_query, get_brand_variants
+from services import search_index
+from services.search_index import rebuild_search_index, sync_search_entries, sync_search_matching
+from services.qr_labels import label_query, label_filename, label_pdf, frontend_base_url
+from services.render_pool import shutdown_render_pool
+from services.jobs import create_job, set_progress, start_job, write_artifact, public_job
+from services.bulk_import import IMPORTERS, run_import, start_import_job, read_table
+from services.expiries import (
+    rebuild_expiries, sync_expiries, sync_expiries_matching, expiry_window, hydrate as hydrate_expiries
+)
+from services.tenant_counters import (
+    count_inserted, count_change, update_counted, soft_delete_counted, soft_delete_many_counted,
+    load_org_counters, load_company_counters, count_between, days_from_today
+)
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request
@@ -301,7 +322,7 @@ async def get_public_masters(
 async def search_warranty(q: str):
     """
     Search warranty by serial number or asset tag
-    Searches both Devices and Parts
+    Searches both Devices and Parts (services/warranty_lookup.py)
     
     P0 FIX - AMC OVERRIDE RULE:
     IF device has ACTIVE AMC:
@@ -312,395 +333,30 @@ async def search_warranty(q: str):
     if not q or len(q.strip()) < 2:
         raise HTTPException(status_code=400, detail="Search query too short")
     
-    q = q.strip()
-    
-    # First, search for a Part by serial number
-    part = await db.parts.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"serial_number": {"$regex": f"^{q}$", "$options": "i"}}
-        ]},
-        {"_id": 0}
-    )
-    
-    if part:
-        # Found a part - get the parent device info
-        device = await db.devices.find_one(
-            {"id": part["device_id"], "is_deleted": {"$ne": True}},
-            {"_id": 0}
-        )
-        
-        company_name = "Unknown"
-        if device:
-            company = await db.companies.find_one({"id": device["company_id"], "is_deleted": {"$ne": True}}, {"_id": 0, "name": 1})
-            company_name = company.get("name") if company else "Unknown"
-        
-        # Part warranty status
-        part_warranty_active = is_warranty_active(part.get("warranty_expiry_date", ""))
-        
-        return {
-            "search_type": "part",
-            "part": {
-                "id": part.get("id"),
-                "part_type": part.get("part_type"),
-                "part_name": part.get("part_name"),
-                "brand": part.get("brand"),
-                "model_number": part.get("model_number"),
-                "serial_number": part.get("serial_number"),
-                "capacity": part.get("capacity"),
-                "purchase_date": part.get("purchase_date"),
-                "replaced_date": part.get("replaced_date"),
-                "warranty_months": part.get("warranty_months"),
-                "warranty_expiry_date": part.get("warranty_expiry_date"),
-                "warranty_active": part_warranty_active,
-                "vendor": part.get("vendor")
-            },
-            "parent_device": {
-                "id": device.get("id") if device else None,
-                "device_type": device.get("device_type") if device else None,
-                "brand": device.get("brand") if device else None,
-                "model": device.get("model") if device else None,
-                "serial_number": device.get("serial_number") if device else None
-            } if device else None,
-            "company_name": company_name,
-            "coverage_source": "part_warranty",
-            "effective_coverage_end": part.get("warranty_expiry_date")
-        }
-    
-    # Search device by serial number or asset tag
-    device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{q}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{q}$", "$options": "i"}}
-            ]}
-        ]},
-        {"_id": 0}
-    )
-    
-    if not device:
+    result = await lookup_warranty(q)
+    if not result:
         raise HTTPException(status_code=404, detail="No records found for this Serial Number / Asset Tag. Please verify the Serial Number or Asset Tag and try again.")
-    
-    # Check if device is retired/scrapped
-    if device.get("status") in ["retired", "scrapped"]:
-        return {
-            "device": {
-                "id": device.get("id"),
-                "device_type": device.get("device_type"),
-                "brand": device.get("brand"),
-                "model": device.get("model"),
-                "serial_number": device.get("serial_number"),
-                "asset_tag": device.get("asset_tag"),
-                "status": device.get("status"),
-                "message": "This asset is no longer active"
-            },
-            "company_name": None,
-            "assigned_user": None,
-            "parts": [],
-            "amc": None,
-            "amc_contract": None,
-            "coverage_source": None,
-            "service_count": 0
-        }
-    
-    # Get company info (only name, no sensitive data)
-    company = await db.companies.find_one({"id": device["company_id"], "is_deleted": {"$ne": True}}, {"_id": 0, "name": 1})
-    company_name = company.get("name") if company else "Unknown"
-    
-    # Get assigned user (only name, no sensitive data)
-    assigned_user = None
-    if device.get("assigned_user_id"):
-        user = await db.users.find_one({"id": device["assigned_user_id"], "is_deleted": {"$ne": True}}, {"_id": 0, "name": 1})
-        assigned_user = user.get("name") if user else None
-    
-    # Calculate device warranty status
-    device_warranty_expiry = device.get("warranty_end_date")
-    device_warranty_active = is_warranty_active(device_warranty_expiry) if device_warranty_expiry else False
-    
-    # P0 FIX: Check AMC from amc_device_assignments JOIN (not old amc collection)
-    active_amc_assignment = await db.amc_device_assignments.find_one({
-        "device_id": device["id"],
-        "status": "active"
-    }, {"_id": 0})
-    
-    amc_contract_info = None
-    amc_coverage_active = False
-    coverage_source = "device_warranty"  # Default
-    effective_coverage_end = device_warranty_expiry
-    
-    if active_amc_assignment:
-        # Check if AMC coverage is still valid
-        amc_coverage_active = is_warranty_active(active_amc_assignment.get("coverage_end", ""))
-        
-        if amc_coverage_active:
-            # Get full AMC contract details
-            amc_contract = await db.amc_contracts.find_one({
-                "id": active_amc_assignment["amc_contract_id"],
-                "is_deleted": {"$ne": True}
-            }, {"_id": 0})
-            
-            if amc_contract:
-                coverage_source = "amc_contract"
-                effective_coverage_end = active_amc_assignment.get("coverage_end")
-                
-                amc_contract_info = {
-                    "contract_id": amc_contract["id"],
-                    "name": amc_contract.get("name"),
-                    "amc_type": amc_contract.get("amc_type"),
-                    "coverage_start": active_amc_assignment.get("coverage_start"),
-                    "coverage_end": active_amc_assignment.get("coverage_end"),
-                    "active": True,
-                    "coverage_includes": amc_contract.get("coverage_includes"),
-                    "entitlements": amc_contract.get("entitlements")
-                }
-    
-    # Also check legacy AMC collection for backward compatibility
-    legacy_amc = await db.amc.find_one({"device_id": device["id"], "is_deleted": {"$ne": True}}, {"_id": 0})
-    legacy_amc_info = None
-    if legacy_amc:
-        legacy_amc_active = is_warranty_active(legacy_amc.get("end_date", ""))
-        legacy_amc_info = {
-            "start_date": legacy_amc.get("start_date"),
-            "end_date": legacy_amc.get("end_date"),
-            "active": legacy_amc_active
-        }
-        
-        # If no active AMC contract but legacy AMC is active, use it
-        if not amc_coverage_active and legacy_amc_active:
-            coverage_source = "legacy_amc"
-            effective_coverage_end = legacy_amc.get("end_date")
-    
-    # Get parts and their warranty status
-    parts_cursor = db.parts.find({"device_id": device["id"], "is_deleted": {"$ne": True}}, {"_id": 0})
-    parts = []
-    async for part in parts_cursor:
-        part_warranty_active = is_warranty_active(part.get("warranty_expiry_date", ""))
-        parts.append({
-            "part_name": part.get("part_name"),
-            "replaced_date": part.get("replaced_date"),
-            "warranty_months": part.get("warranty_months"),
-            "warranty_expiry_date": part.get("warranty_expiry_date"),
-            "warranty_active": part_warranty_active
-        })
-    
-    # Get service history count (public sees count, not details)
-    service_count = await db.service_history.count_documents({"device_id": device["id"]})
-    
-    # Determine final warranty status based on AMC OVERRIDE RULE
-    # AMC takes priority over device warranty
-    final_warranty_active = amc_coverage_active or device_warranty_active
-    if amc_coverage_active:
-        final_warranty_active = True  # AMC overrides even if device warranty expired
-    
-    return {
-        "search_type": "device",
-        "device": {
-            "id": device.get("id"),
-            "device_type": device.get("device_type"),
-            "brand": device.get("brand"),
-            "model": device.get("model"),
-            "serial_number": device.get("serial_number"),
-            "asset_tag": device.get("asset_tag"),
-            "purchase_date": device.get("purchase_date"),
-            "warranty_end_date": device_warranty_expiry,
-            "warranty_active": final_warranty_active,
-            "device_warranty_active": device_warranty_active,  # Original device warranty status
-            "condition": device.get("condition"),
-            "status": device.get("status")
-        },
-        "company_name": company_name,
-        "assigned_user": assigned_user,
-        "parts": parts,
-        "amc": legacy_amc_info,  # Legacy AMC for backward compatibility
-        "amc_contract": amc_contract_info,  # New AMC contract info
-        "coverage_source": coverage_source,  # "amc_contract", "legacy_amc", or "device_warranty"
-        "effective_coverage_end": effective_coverage_end,
-        "service_count": service_count
-    }
+    return result
 
 @api_router.get("/warranty/pdf/{serial_number}")
-async def generate_warranty_pdf(serial_number: str):
-    """Generate PDF warranty report"""
-    device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{serial_number}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{serial_number}$", "$options": "i"}}
-            ]}
-        ]},
-        {"_id": 0}
-    )
-    
-    if not device:
+async def generate_warranty_pdf(serial_number: str, request: Request):
+    """
+    Generate PDF warranty report (services/warranty_report.py).
+    Cached by content; the ETag changes whenever the device, parts, AMC or
+    settings it is built from change, and If-None-Match revalidates to a 304.
+    """
+    report = await load_warranty_report(serial_number)
+    if not report:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    company = await db.companies.find_one({"id": device["company_id"]}, {"_id": 0, "name": 1})
-    company_name = company.get("name") if company else "Unknown"
-    
-    parts_cursor = db.parts.find({"device_id": device["id"], "is_deleted": {"$ne": True}}, {"_id": 0})
-    parts = []
-    async for part in parts_cursor:
-        parts.append(part)
-    
-    # P0 FIX: Check AMC from amc_device_assignments JOIN (not old amc collection)
-    active_amc_assignment = await db.amc_device_assignments.find_one({
-        "device_id": device["id"],
-        "status": "active"
-    }, {"_id": 0})
-    
-    amc_contract_info = None
-    if active_amc_assignment:
-        # Check if AMC coverage is still valid
-        if is_warranty_active(active_amc_assignment.get("coverage_end", "")):
-            # Get full AMC contract details
-            amc_contract = await db.amc_contracts.find_one({
-                "id": active_amc_assignment["amc_contract_id"],
-                "is_deleted": {"$ne": True}
-            }, {"_id": 0})
-            
-            if amc_contract:
-                amc_contract_info = {
-                    "name": amc_contract.get("name"),
-                    "amc_type": amc_contract.get("amc_type"),
-                    "coverage_start": active_amc_assignment.get("coverage_start"),
-                    "coverage_end": active_amc_assignment.get("coverage_end"),
-                    "coverage_includes": amc_contract.get("coverage_includes"),
-                    "entitlements": amc_contract.get("entitlements")
-                }
-    
-    settings = await db.settings.find_one({"id": "settings"}, {"_id": 0})
-    portal_name = settings.get("company_name", "Warranty Portal") if settings else "Warranty Portal"
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20, textColor=colors.HexColor('#0F172A'))
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, spaceAfter=10, textColor=colors.HexColor('#0F172A'))
-    body_style = ParagraphStyle('Body', parent=styles['Normal'], fontSize=10, spaceAfter=5, textColor=colors.HexColor('#64748B'))
-    
-    story.append(Paragraph(f"{portal_name} - Warranty Report", title_style))
-    story.append(Paragraph(f"Generated: {get_ist_now().strftime('%d %B %Y, %H:%M')}", body_style))
-    story.append(Spacer(1, 20))
-    
-    story.append(Paragraph("Device Information", heading_style))
-    device_data = [
-        ["Device Type", device.get("device_type", "-")],
-        ["Brand", device.get("brand", "-")],
-        ["Model", device.get("model", "-")],
-        ["Serial Number", device.get("serial_number", "-")],
-        ["Asset Tag", device.get("asset_tag", "-") or "-"],
-        ["Company", company_name],
-        ["Purchase Date", device.get("purchase_date", "-")],
-        ["Condition", device.get("condition", "-").title()],
-        ["Warranty Expiry", device.get("warranty_end_date", "-") or "Not specified"],
-        ["Warranty Status", "Active" if is_warranty_active(device.get("warranty_end_date", "")) else "Expired / Not Covered"]
-    ]
-    
-    device_table = Table(device_data, colWidths=[2*inch, 4*inch])
-    device_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F8FAFC')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#0F172A')),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
-    ]))
-    story.append(device_table)
-    story.append(Spacer(1, 20))
-    
-    if parts:
-        story.append(Paragraph("Parts Warranty Status", heading_style))
-        parts_data = [["Part Name", "Replaced Date", "Warranty", "Expiry", "Status"]]
-        for part in parts:
-            status = "Active" if is_warranty_active(part.get("warranty_expiry_date", "")) else "Expired"
-            parts_data.append([
-                part.get("part_name", "-"),
-                part.get("replaced_date", "-"),
-                f"{part.get('warranty_months', 0)} months",
-                part.get("warranty_expiry_date", "-"),
-                status
-            ])
-        
-        parts_table = Table(parts_data, colWidths=[1.5*inch, 1.2*inch, 1*inch, 1.2*inch, 1*inch])
-        parts_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0F62FE')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ]))
-        story.append(parts_table)
-        story.append(Spacer(1, 20))
-    
-    story.append(Paragraph("AMC / Service Coverage", heading_style))
-    if amc_contract_info:
-        amc_type_display = (amc_contract_info.get("amc_type") or "standard").replace("_", " ").title()
-        coverage_includes = amc_contract_info.get("coverage_includes", {})
-        
-        # Build coverage details string
-        coverage_items = []
-        if coverage_includes.get("onsite_support"):
-            coverage_items.append("Onsite Support")
-        if coverage_includes.get("remote_support"):
-            coverage_items.append("Remote Support")
-        if coverage_includes.get("preventive_maintenance"):
-            coverage_items.append("Preventive Maintenance")
-        coverage_str = ", ".join(coverage_items) if coverage_items else "Standard Coverage"
-        
-        # Build entitlements string
-        entitlements = amc_contract_info.get("entitlements", {})
-        entitlement_items = []
-        if entitlements.get("onsite_visits_per_year"):
-            visits = entitlements["onsite_visits_per_year"]
-            entitlement_items.append(f"{visits} Onsite Visits/Year" if visits != -1 else "Unlimited Onsite Visits")
-        if entitlements.get("remote_support_count"):
-            remote = entitlements["remote_support_count"]
-            entitlement_items.append(f"{remote} Remote Support Sessions" if remote != -1 else "Unlimited Remote Support")
-        entitlement_str = ", ".join(entitlement_items) if entitlement_items else "-"
-        
-        amc_data = [
-            ["Contract Name", amc_contract_info.get("name", "-")],
-            ["AMC Type", amc_type_display],
-            ["Coverage Start", amc_contract_info.get("coverage_start", "-")],
-            ["Coverage End", amc_contract_info.get("coverage_end", "-")],
-            ["Status", "Active"],
-            ["Coverage Includes", coverage_str],
-            ["Entitlements", entitlement_str]
-        ]
-    else:
-        amc_data = [["Status", "No active AMC found for this device"]]
-    
-    amc_table = Table(amc_data, colWidths=[2*inch, 4*inch])
-    amc_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F8FAFC')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#0F172A')),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
-    ]))
-    story.append(amc_table)
-    story.append(Spacer(1, 30))
-    
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.HexColor('#94A3B8'))
-    story.append(Paragraph("This document is auto-generated and valid as of the date mentioned above.", footer_style))
-    story.append(Paragraph("For any discrepancies, please contact support.", footer_style))
-    
-    doc.build(story)
-    buffer.seek(0)
+    headers = {"ETag": report["etag"], "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), report["etag"]):
+        return Response(status_code=304, headers=headers)
     
+    pdf = await warranty_report_pdf(report)
     filename = f"warranty_report_{serial_number}_{get_ist_now().strftime('%Y%m%d')}.pdf"
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
 
 # ==================== DEVICE MODEL CATALOG (AI-POWERED) ====================
 
@@ -992,13 +648,8 @@ async def osticket_webhook(
         }
         
         if ticket:
-            await db.tickets_v2.update_one(
-                {"id": ticket["id"]},
-                {
-                    "$set": update_data,
-                    "$push": {"timeline": timeline_entry}
-                }
-            )
+            await append_ticket_events({"id": ticket["id"]}, timeline_entry, {"$set": update_data})
+            await sync_ticket_rollup(ticket["id"])
         elif quick_request:
             await db.quick_service_requests.update_one(
                 {"id": quick_request["id"]},
@@ -1010,6 +661,7 @@ async def osticket_webhook(
                 {"id": ticket["id"]},
                 {"$set": update_data}
             )
+            await sync_ticket_rollup(ticket["id"])
         elif quick_request:
             await db.quick_service_requests.update_one(
                 {"id": quick_request["id"]},
@@ -1063,13 +715,7 @@ async def generate_device_qr_code(identifier: str):
     
     # Find device by serial number or asset tag
     device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]}
-        ]},
+        device_key_query(identifier),
         {"_id": 0, "serial_number": 1, "asset_tag": 1, "brand": 1, "model": 1}
     )
     
@@ -1178,163 +824,54 @@ async def generate_bulk_qr_pdf(
     Generate a printable A4 PDF with multiple QR codes.
     Each QR code is 1.5 inch x 1.5 inch with Serial Number and Asset Tag.
     A4 paper fits 4 columns x 5 rows = 20 QR codes per page.
+    The PDF is streamed page by page; for large batches prefer
+    POST /devices/bulk-qr-pdf/jobs, which reports progress.
     """
     org_id = await get_admin_org_id(admin.get("email", ""))
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import inch
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.utils import ImageReader
-    from PIL import Image
-    
-    # Build query based on filters
-    query = {"is_deleted": {"$ne": True}}
-    
-    if request.device_ids and len(request.device_ids) > 0:
-        query["id"] = {"$in": request.device_ids}
-    elif request.site_id:
-        query["site_id"] = request.site_id
-    elif request.company_id:
-        query["company_id"] = request.company_id
-    
-    # Fetch devices
-    devices = await db.devices.find(
-        query,
-        {"_id": 0, "id": 1, "serial_number": 1, "asset_tag": 1, "brand": 1, "model": 1}
-    ).sort("serial_number", 1).to_list(500)
-    
-    if not devices:
+    query = label_query(org_id, request.device_ids, request.site_id, request.company_id)
+    if not await db.devices.find_one(query, {"_id": 1}):
         raise HTTPException(status_code=404, detail="No devices found matching criteria")
     
-    # Get frontend URL for QR codes
-    frontend_url = os.environ.get('FRONTEND_URL', '')
-    if not frontend_url:
-        cors_origins = os.environ.get('CORS_ORIGINS', '')
-        if cors_origins and cors_origins != '*':
-            frontend_url = cors_origins.split(',')[0].strip()
-        else:
-            frontend_url = "https://your-portal-url.com"
-    
-    # PDF settings - Fixed 1.5 inch QR codes
-    page_width, page_height = A4  # 595 x 842 points (8.27 x 11.69 inches)
-    
-    # QR code size: 1.5 inch x 1.5 inch
-    qr_size = 1.5 * inch  # 108 points
-    label_height = 0.35 * inch  # Space for text below QR
-    cell_padding = 0.15 * inch  # Padding between cells
-    
-    cell_width = qr_size + cell_padding
-    cell_height = qr_size + label_height + cell_padding
-    
-    # Calculate grid: how many fit on A4
-    margin_x = (page_width - (4 * cell_width)) / 2  # Center 4 columns
-    margin_y = 0.5 * inch  # Top/bottom margin
-    
-    columns = 4  # 4 columns of 1.5 inch QR codes fit on A4 width
-    rows_per_page = 5  # 5 rows fit on A4 height
-    
-    # Create PDF
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    
-    current_row = 0
-    current_col = 0
-    
-    for device in devices:
-        # Calculate position
-        x = margin_x + (current_col * cell_width)
-        y = page_height - margin_y - ((current_row + 1) * cell_height)
-        
-        # Generate QR code for this device
-        device_url = f"{frontend_url}/device/{device['serial_number']}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=1,
-        )
-        qr.add_data(device_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        qr_img = qr_img.resize((300, 300), Image.Resampling.LANCZOS)  # High res for print
-        
-        # Convert PIL image to ReportLab ImageReader
-        qr_buffer = BytesIO()
-        qr_img.save(qr_buffer, format='PNG')
-        qr_buffer.seek(0)
-        qr_reader = ImageReader(qr_buffer)
-        
-        # Draw QR code (1.5 inch x 1.5 inch)
-        qr_x = x + (cell_width - qr_size) / 2
-        qr_y = y + label_height
-        c.drawImage(qr_reader, qr_x, qr_y, width=qr_size, height=qr_size)
-        
-        # Draw labels below QR
-        serial = device.get('serial_number', 'N/A')
-        asset_tag = device.get('asset_tag', '')
-        text_x = x + cell_width / 2
-        
-        # Serial Number (bold)
-        c.setFont("Helvetica-Bold", 7)
-        c.setFillColorRGB(0, 0, 0)
-        serial_display = serial if len(serial) <= 20 else serial[:17] + "..."
-        c.drawCentredString(text_x, y + label_height - 12, f"S/N: {serial_display}")
-        
-        # Asset Tag (if exists)
-        if asset_tag:
-            c.setFont("Helvetica", 6)
-            c.setFillColorRGB(0.3, 0.3, 0.3)
-            tag_display = asset_tag if len(asset_tag) <= 20 else asset_tag[:17] + "..."
-            c.drawCentredString(text_x, y + label_height - 22, f"Tag: {tag_display}")
-        
-        # Draw cutting guide border
-        c.setStrokeColorRGB(0.85, 0.85, 0.85)
-        c.setLineWidth(0.5)
-        c.rect(x + 2, y + 2, cell_width - 4, cell_height - 4)
-        
-        # Reset fill color
-        c.setFillColorRGB(0, 0, 0)
-        
-        # Move to next cell
-        current_col += 1
-        if current_col >= columns:
-            current_col = 0
-            current_row += 1
-            
-            # Check if we need a new page
-            if current_row >= rows_per_page:
-                c.showPage()
-                current_row = 0
-    
-    # Footer with generation info
-    c.setFont("Helvetica", 7)
-    c.setFillColorRGB(0.5, 0.5, 0.5)
-    c.drawString(margin_x, 12, f"Generated: {get_ist_now().strftime('%Y-%m-%d %H:%M')} | {len(devices)} QR codes | Size: 1.5\" x 1.5\"")
-    
-    c.save()
-    buffer.seek(0)
-    
-    # Generate filename
-    filename_parts = ["QR_Codes"]
-    if request.company_id:
-        company = await db.companies.find_one(scope_query({"id": request.company_id}, org_id), {"_id": 0, "name": 1})
-        if company:
-            filename_parts.append(company["name"].replace(" ", "_")[:20])
-    if request.site_id:
-        site = await db.sites.find_one(scope_query({"id": request.site_id}, org_id), {"_id": 0, "name": 1})
-        if site:
-            filename_parts.append(site["name"].replace(" ", "_")[:20])
-    
-    filename_parts.append(get_ist_now().strftime('%Y%m%d'))
-    filename = "_".join(filename_parts) + ".pdf"
-    
+    filename = await label_filename(org_id, request.site_id, request.company_id)
     return StreamingResponse(
-        buffer,
+        label_pdf(query, frontend_base_url()),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
+@api_router.post("/devices/bulk-qr-pdf/jobs")
+async def start_bulk_qr_pdf_job(
+    request: BulkQRRequest,
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Build the bulk QR PDF in the background.
+    Poll GET /jobs/{id} for progress; download from GET /jobs/{id}/download.
+    """
+    org_id = await get_admin_org_id(admin.get("email", ""))
+    query = label_query(org_id, request.device_ids, request.site_id, request.company_id)
+    total = await db.devices.count_documents(query)
+    if not total:
+        raise HTTPException(status_code=404, detail="No devices found matching criteria")
+    
+    filename = await label_filename(org_id, request.site_id, request.company_id)
+    base_url = frontend_base_url()
+    job = await create_job(org_id, "qr_labels", admin.get("email", ""), params={
+        "site_id": request.site_id, "company_id": request.company_id,
+        "device_count": len(request.device_ids or [])
+    }, total=total)
+    
+    async def work(job):
+        async def progress(done):
+            await set_progress(job["id"], done)
+        artifact = await write_artifact(job, filename, "application/pdf", label_pdf(query, base_url, progress))
+        return {"filename": filename, "size": artifact["size"]}
+    
+    start_job(job, work)
+    return public_job(job)
+
+
 @api_router.get("/device/{identifier}/info")
 async def get_public_device_info(identifier: str):
     """
@@ -1343,13 +880,7 @@ async def get_public_device_info(identifier: str):
     """
     # Find device by serial number or asset tag
     device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]}
-        ]},
+        device_key_query(identifier),
         {"_id": 0}
     )
     
@@ -1455,13 +986,7 @@ async def create_quick_service_request(identifier: str, request: QuickServiceReq
     """
     # Find device
     device = await db.devices.find_one(
-        {"$and": [
-            {"is_deleted": {"$ne": True}},
-            {"$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]}
-        ]},
+        device_key_query(identifier),
         {"_id": 0}
     )
     
@@ -1907,6 +1432,8 @@ async def create_company(company_data: CompanyCreate, admin: dict = Depends(get_
     
     company = Company(**company_dict)
     await db.companies.insert_one(company.model_dump())
+    await count_inserted("companies", [company.model_dump()])
+    await sync_search_entries("companies", [company.id])
     await log_audit("company", company.id, "create", {"data": company_data.model_dump()}, admin)
     result = company.model_dump()
     result.get("label", result.get("name", "Unknown")) or result.get("name", "Unknown"); result["label"] = result.get("name", "Unknown")
@@ -1944,6 +1471,8 @@ async def quick_create_company(company_data: CompanyCreate, admin: dict = Depend
     
     company = Company(**company_dict)
     await db.companies.insert_one(company.model_dump())
+    await count_inserted("companies", [company.model_dump()])
+    await sync_search_entries("companies", [company.id])
     await log_audit("company", company.id, "quick_create", {"data": company_data.model_dump()}, admin)
     
     result = company.model_dump()
@@ -1982,6 +1511,7 @@ async def update_company(company_id: str, updates: CompanyUpdate, admin: dict =
     result = await db.companies.update_one(query, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Company not found")
+    await sync_search_entries("companies", [company_id])
     
     await log_audit("company", company_id, "update", changes, admin)
     return await db.companies.find_one({"id": company_id}, {"_id": 0})
@@ -1993,14 +1523,15 @@ async def delete_company(company_id: str, admin: dict = Depends(get_current_admi
     query = {"id": company_id}
     query = scope_query(query, org_id)
     
-    result = await db.companies.update_one(query, {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("companies", query):
         raise HTTPException(status_code=404, detail="Company not found")
     
     # Soft delete related users (also scoped)
     user_query = {"company_id": company_id}
     user_query = scope_query(user_query, org_id)
-    await db.users.update_many(user_query, {"$set": {"is_deleted": True}})
+    await soft_delete_many_counted("users", user_query)
+    await sync_search_entries("companies", [company_id])
+    await sync_search_matching("users", user_query)
     await log_audit("company", company_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Company archived"}
 
@@ -2062,6 +1593,7 @@ async def add_company_domain(company_id: str, data: dict, admin: dict = Depends(
         {"id": company_id},
         {"$addToSet": {"email_domains": domain}}
     )
+    await sync_search_entries("companies", [company_id])
     
     await log_audit("company", company_id, "add_domain", {"domain": domain}, admin)
     return {"message": "Domain added", "domain": domain}
@@ -2081,6 +1613,7 @@ async def remove_company_domain(company_id: str, domain: str, admin: dict = Depe
         {"id": company_id},
         {"$pull": {"email_domains": domain}}
     )
+    await sync_search_entries("companies", [company_id])
     
     await log_audit("company", company_id, "remove_domain", {"domain": domain}, admin)
     return {"message": "Domain removed"}
@@ -2103,298 +1636,53 @@ async def list_all_company_domains(admin: dict = Depends(get_current_admin)):
 
 
 # ==================== BULK IMPORT ENDPOINTS ====================
+# Validation and writes are set-based (services/bulk_import.py). The
+# endpoints below answer synchronously; large files should go through
+# POST /admin/bulk-import/{kind}/jobs, which reports progress on
+# GET /jobs/{id} and offers the failed rows on GET /jobs/{id}/download.
 
-@api_router.post("/admin/bulk-import/companies")
-async def bulk_import_companies(data: dict, admin: dict = Depends(get_current_admin)):
-    """Bulk import companies from CSV data"""
+async def _bulk_import(kind: str, data: dict, admin: dict) -> dict:
     org_id = await get_admin_org_id(admin.get("email", ""))
     records = data.get("records", [])
     if not records:
         raise HTTPException(status_code=400, detail="No records provided")
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            # Check required fields
-            if not record.get("name"):
-                errors.append({"row": idx + 2, "message": "Company name is required"})
-                continue
-            
-            # Check for duplicate company code (field is 'code' in Company model)
-            company_code = record.get("company_code") or record.get("code")
-            if company_code:
-                existing = await db.companies.find_one(scope_query({
-                    "code": company_code,
-                    "is_deleted": {"$ne": True}
-                }, org_id))
-                if existing:
-                    errors.append({"row": idx + 2, "message": f"Company code {company_code} already exists"})
-                    continue
-            
-            # Enforce UNIQUE(organization_id, contact_email) within tenant
-            contact_email = record.get("contact_email")
-            if contact_email:
-                email_dup = await db.companies.find_one(scope_query({
-                    "contact_email": contact_email,
-                    "is_deleted": {"$ne": True}
-                }, org_id))
-                if email_dup:
-                    errors.append({"row": idx + 2, "message": f"Email {contact_email} already exists in your tenant"})
-                    continue
-            
-            company = Company(
-                name=record.get("name"),
-                code=company_code or f"C{str(uuid.uuid4())[:6].upper()}",
-                industry=record.get("industry"),
-                contact_name=record.get("contact_name"),
-                contact_email=record.get("contact_email"),
-                contact_phone=record.get("contact_phone"),
-                address=record.get("address"),
-                city=record.get("city"),
-                state=record.get("state"),
-                country=record.get("country", "India"),
-                pincode=record.get("pincode"),
-                gst_number=record.get("gst_number"),
-                notes=record.get("notes"),
-                status="active"
-            )
-            
-            company_ins_dict = company.model_dump()
-            company_ins_dict["organization_id"] = org_id
-            await db.companies.insert_one(company_ins_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    result = await run_import(kind, org_id, records)
+    return {"success": result.success, "errors": result.errors}
+
+@api_router.post("/admin/bulk-import/companies")
+async def bulk_import_companies(data: dict, admin: dict = Depends(get_current_admin)):
+    """Bulk import companies from CSV data"""
+    return await _bulk_import("companies", data, admin)
 
 @api_router.post("/admin/bulk-import/sites")
 async def bulk_import_sites(data: dict, admin: dict = Depends(get_current_admin)):
     """Bulk import sites from CSV data"""
-    org_id = await get_admin_org_id(admin.get("email", ""))
-    records = data.get("records", [])
-    if not records:
-        raise HTTPException(status_code=400, detail="No records provided")
-    
-    # Get company mapping by code and name
-    companies = await db.companies.find({"is_deleted": {"$ne": True}}, {"_id": 0}).to_list(1000)
-    company_by_code = {c.get("code", "").upper(): c["id"] for c in companies if c.get("code")}
-    company_by_name = {c["name"].lower(): c["id"] for c in companies}
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            if not record.get("name"):
-                errors.append({"row": idx + 2, "message": "Site name is required"})
-                continue
-            
-            # Find company by code or name
-            company_id = None
-            if record.get("company_code"):
-                company_id = company_by_code.get(record["company_code"].upper())
-            if not company_id and record.get("company_name"):
-                company_id = company_by_name.get(record["company_name"].lower())
-            
-            if not company_id:
-                errors.append({"row": idx + 2, "message": "Company not found"})
-                continue
-            
-            site = Site(
-                company_id=company_id,
-                name=record.get("name"),
-                site_code=record.get("site_code"),
-                address=record.get("address"),
-                city=record.get("city"),
-                state=record.get("state"),
-                pincode=record.get("pincode"),
-                country=record.get("country", "India"),
-                contact_person=record.get("contact_person"),
-                contact_phone=record.get("contact_phone"),
-                contact_email=record.get("contact_email"),
-                notes=record.get("notes"),
-                status="active"
-            )
-            
-            site_ins_dict = site.model_dump()
-            site_ins_dict["organization_id"] = org_id
-            await db.sites.insert_one(site_ins_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    return await _bulk_import("sites", data, admin)
 
 @api_router.post("/admin/bulk-import/devices")
 async def bulk_import_devices(data: dict, admin: dict = Depends(get_current_admin)):
     """Bulk import devices from CSV data"""
-    org_id = await get_admin_org_id(admin.get("email", ""))
-    records = data.get("records", [])
-    if not records:
-        raise HTTPException(status_code=400, detail="No records provided")
-    
-    # Get lookups
-    companies = await db.companies.find({"is_deleted": {"$ne": True}}, {"_id": 0}).to_list(1000)
-    company_by_code = {c.get("code", "").upper(): c["id"] for c in companies if c.get("code")}
-    company_by_name = {c["name"].lower(): c["id"] for c in companies}
-    
-    # Get employees for lookup
-    employees = await db.company_employees.find({"is_deleted": {"$ne": True}}, {"_id": 0}).to_list(10000)
-    employee_by_code = {}
-    employee_by_email = {}
-    for emp in employees:
-        if emp.get("employee_code"):
-            key = f"{emp['company_id']}_{emp['employee_code'].upper()}"
-            employee_by_code[key] = emp["id"]
-        if emp.get("email"):
-            key = f"{emp['company_id']}_{emp['email'].lower()}"
-            employee_by_email[key] = emp["id"]
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            # Required fields
-            if not record.get("serial_number"):
-                errors.append({"row": idx + 2, "message": "Serial number is required"})
-                continue
-            if not record.get("brand"):
-                errors.append({"row": idx + 2, "message": "Brand is required"})
-                continue
-            if not record.get("model"):
-                errors.append({"row": idx + 2, "message": "Model is required"})
-                continue
-            
-            # Find company
-            company_id = None
-            if record.get("company_code"):
-                company_id = company_by_code.get(record["company_code"].upper())
-            if not company_id and record.get("company_name"):
-                company_id = company_by_name.get(record["company_name"].lower())
-            
-            if not company_id:
-                errors.append({"row": idx + 2, "message": "Company not found"})
-                continue
-            
-            # Find employee (device user)
-            assigned_employee_id = None
-            if record.get("employee_code"):
-                key = f"{company_id}_{record['employee_code'].upper()}"
-                assigned_employee_id = employee_by_code.get(key)
-            if not assigned_employee_id and record.get("employee_email"):
-                key = f"{company_id}_{record['employee_email'].lower()}"
-                assigned_employee_id = employee_by_email.get(key)
-            
-            # Check for duplicate serial number
-            existing = await db.devices.find_one({
-                "serial_number": record["serial_number"],
-                "is_deleted": {"$ne": True}
-            })
-            if existing:
-                errors.append({"row": idx + 2, "message": f"Serial number {record['serial_number']} already exists"})
-                continue
-            
-            device = Device(
-                company_id=company_id,
-                assigned_employee_id=assigned_employee_id,
-                device_type=record.get("device_type", "Laptop"),
-                brand=record.get("brand"),
-                model=record.get("model"),
-                serial_number=record.get("serial_number"),
-                asset_tag=record.get("asset_tag"),
-                purchase_date=record.get("purchase_date", get_ist_isoformat().split("T")[0]),
-                purchase_cost=float(record["purchase_cost"]) if record.get("purchase_cost") else None,
-                vendor=record.get("vendor"),
-                warranty_end_date=record.get("warranty_end_date"),
-                location=record.get("location"),
-                condition=record.get("condition", "good"),
-                status=record.get("status", "active"),
-                configuration=record.get("configuration"),
-                notes=record.get("notes")
-            )
-            
-            device_ins_dict = device.model_dump()
-            device_ins_dict["organization_id"] = org_id
-            await db.devices.insert_one(device_ins_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    return await _bulk_import("devices", data, admin)
 
 @api_router.post("/admin/bulk-import/supply-products")
 async def bulk_import_supply_products(data: dict, admin: dict = Depends(get_current_admin)):
     """Bulk import supply products from CSV data"""
+    return await _bulk_import("supply-products", data, admin)
+
+@api_router.post("/admin/bulk-import/{kind}/jobs")
+async def start_bulk_import_job(kind: str, data: dict, admin: dict = Depends(get_current_admin)):
+    """
+    Bulk import in the background (companies, sites, devices, employees, supply-products).
+    Poll GET /jobs/{id}; failed rows can be downloaded from GET /jobs/{id}/download.
+    """
+    if kind not in IMPORTERS:
+        raise HTTPException(status_code=404, detail=f"Unknown import type: {kind}")
     org_id = await get_admin_org_id(admin.get("email", ""))
     records = data.get("records", [])
     if not records:
         raise HTTPException(status_code=400, detail="No records provided")
-    
-    # Get category mapping
-    categories = await db.supply_categories.find({"is_deleted": {"$ne": True}}, {"_id": 0}).to_list(100)
-    category_by_name = {c["name"].lower(): c["id"] for c in categories}
-    
-    success_count = 0
-    errors = []
-    
-    for idx, record in enumerate(records):
-        try:
-            if not record.get("name"):
-                errors.append({"row": idx + 2, "message": "Product name is required"})
-                continue
-            
-            # Find category
-            category_id = None
-            if record.get("category"):
-                category_id = category_by_name.get(record["category"].lower())
-            
-            if not category_id:
-                # Create category if it doesn't exist
-                if record.get("category"):
-                    new_cat = SupplyCategory(name=record["category"])
-                    new_cat_ins_dict = new_cat.model_dump()
-                    new_cat_ins_dict["organization_id"] = org_id
-                    await db.supply_categories.insert_one(new_cat_ins_dict)
-                    category_id = new_cat.id
-                    category_by_name[record["category"].lower()] = category_id
-                else:
-                    errors.append({"row": idx + 2, "message": "Category is required"})
-                    continue
-            
-            # Parse price if provided
-            price = None
-            if record.get("price"):
-                try:
-                    price = float(str(record["price"]).replace(",", "").replace("₹", "").strip())
-                except (ValueError, TypeError):
-                    pass
-            
-            product = SupplyProduct(
-                category_id=category_id,
-                name=record.get("name"),
-                description=record.get("description"),
-                unit=record.get("unit", "piece"),
-                price=price,
-                sku=record.get("sku"),
-                internal_notes=record.get("internal_notes")
-            )
-            
-            product_ins_dict = product.model_dump()
-            product_ins_dict["organization_id"] = org_id
-            await db.supply_products.insert_one(product_ins_dict)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append({"row": idx + 2, "message": str(e)})
-    
-    return {"success": success_count, "errors": errors}
+    job = await start_import_job(kind, org_id, records, admin.get("email", ""))
+    return public_job(job)
 
 @api_router.get("/admin/companies/{company_id}/overview")
 async def get_company_overview(company_id: str, admin: dict = Depends(get_current_admin)):
@@ -2559,6 +1847,7 @@ async def create_company_portal_user(
     
     new_user["organization_id"] = org_id
     await db.company_users.insert_one(new_user)
+    await count_inserted("company_users", [new_user])
     
     return {"message": "Portal user created successfully", "id": new_user["id"]}
 
@@ -2570,12 +1859,13 @@ async def delete_company_portal_user(
 ):
     """Delete (soft) a portal user"""
     org_id = await get_admin_org_id(admin.get("email", ""))
-    result = await db.company_users.update_one(
-        {"id": user_id, "company_id": company_id},
-        {"$set": {"is_deleted": True, "deleted_at": get_ist_isoformat()}}
+    deleted = await soft_delete_counted(
+        "company_users",
+        {"id": user_id, "company_id": company_id, "is_deleted": {"$ne": True}},
+        {"deleted_at": get_ist_isoformat()}
     )
     
-    if result.modified_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Portal user not found")
     
     return {"message": "Portal user deleted"}
@@ -2674,6 +1964,8 @@ async def create_user(user_data: UserCreate, admin: dict = Depends(get_current_a
     
     user = User(**user_dict)
     await db.users.insert_one(user.model_dump())
+    await count_inserted("users", [user.model_dump()])
+    await sync_search_entries("users", [user.id])
     await log_audit("user", user.id, "create", {"data": user_data.model_dump()}, admin)
     result = user.model_dump()
     result.get("label", result.get("name", "Unknown")) or result.get("name", "Unknown"); result["label"] = result.get("name", "Unknown")
@@ -2700,6 +1992,8 @@ async def quick_create_user(user_data: UserCreate, admin: dict = Depends(get_cur
     user_ins_dict = user.model_dump()
     user_ins_dict["organization_id"] = org_id
     await db.users.insert_one(user_ins_dict)
+    await count_inserted("users", [user_ins_dict])
+    await sync_search_entries("users", [user.id])
     await log_audit("user", user.id, "quick_create", {"data": user_data.model_dump()}, admin)
     
     result = user.model_dump()
@@ -2728,15 +2022,16 @@ async def update_user(user_id: str, updates: UserUpdate, admin: dict = Depends(g
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
     result = await db.users.update_one(scope_query({"id": user_id}, org_id), {"$set": update_data})
+    await sync_search_entries("users", [user_id])
     await log_audit("user", user_id, "update", changes, admin)
     return await db.users.find_one(scope_query({"id": user_id}, org_id), {"_id": 0})
 
 @api_router.delete("/admin/users/{user_id}")
 async def delete_user(user_id: str, admin: dict = Depends(get_current_admin)):
     org_id = await get_admin_org_id(admin.get("email", ""))
-    result = await db.users.update_one(scope_query({"id": user_id}, org_id), {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("users", scope_query({"id": user_id}, org_id)):
         raise HTTPException(status_code=404, detail="User not found")
+    await sync_search_entries("users", [user_id])
     await log_audit("user", user_id, "delete", {"is_deleted": True}, admin)
     return {"message": "User archived"}
 
@@ -2968,109 +2263,57 @@ async def delete_company_employee(employee_id: str, admin: dict = Depends(get_cu
     result = await db.company_employees.update_one(scope_query({"id": employee_id}, org_id), {"$set": {"is_deleted": True}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Employee not found")
-    await log_audit("company_employee", employee_id, "delete", {"is_deleted": True}, admin)
-    return {"message": "Employee archived"}
-
-
-@api_router.post("/admin/company-employees/bulk-import")
-async def bulk_import_company_employees(
-    file: UploadFile = File(...),
-    admin: dict = Depends(get_current_admin)
-):
-    """
-    Bulk import company employees from CSV/Excel file.
-    Required columns: company_code OR company_name, name
-    Optional columns: employee_id, email, phone, department, designation, location
-    """
-    org_id = await get_admin_org_id(admin.get("email", ""))
-    import pandas as pd
-    
-    # Read file
-    content = await file.read()
-    filename = file.filename.lower()
-    
-    try:
-        if filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(BytesIO(content))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format. Use CSV or Excel.")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
-    
-    # Normalize column names
-    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-    
-    # Check required columns
-    if 'name' not in df.columns:
-        raise HTTPException(status_code=400, detail="Missing required column: name")
-    
-    if 'company_code' not in df.columns and 'company_name' not in df.columns:
-        raise HTTPException(status_code=400, detail="Missing required column: company_code or company_name")
-    
-    # Build company lookup
-    companies = await db.companies.find({"is_deleted": {"$ne": True}}, {"_id": 0, "id": 1, "name": 1, "code": 1}).to_list(1000)
-    company_by_code = {c["code"].upper(): c for c in companies if c.get("code")}
-    company_by_name = {c["name"].lower(): c for c in companies}
-    
-    results = {"created": 0, "errors": [], "skipped": 0}
-    
-    for idx, row in df.iterrows():
-        row_num = idx + 2  # Excel row (1-indexed + header)
-        
-        try:
-            name = str(row.get('name', '')).strip()
-            if not name or name == 'nan':
-                results["errors"].append({"row": row_num, "error": "Name is required"})
-                continue
-            
-            # Find company
-            company = None
-            company_code = str(row.get('company_code', '')).strip().upper()
-            company_name = str(row.get('company_name', '')).strip().lower()
-            
-            if company_code and company_code != 'NAN':
-                company = company_by_code.get(company_code)
-                if not company:
-                    results["errors"].append({"row": row_num, "error": f"Company code '{company_code}' not found"})
-                    continue
-            elif company_name and company_name != 'nan':
-                company = company_by_name.get(company_name)
-                if not company:
-                    results["errors"].append({"row": row_num, "error": f"Company name '{company_name}' not found"})
-                    continue
-            else:
-                results["errors"].append({"row": row_num, "error": "Company code or name is required"})
-                continue
-            
-            # Create employee
-            employee_data = {
-                "company_id": company["id"],
-                "name": name,
-                "employee_id": str(row.get('employee_id', '')).strip() if pd.notna(row.get('employee_id')) else None,
-                "email": str(row.get('email', '')).strip() if pd.notna(row.get('email')) else None,
-                "phone": str(row.get('phone', '')).strip() if pd.notna(row.get('phone')) else None,
-                "department": str(row.get('department', '')).strip() if pd.notna(row.get('department')) else None,
-                "designation": str(row.get('designation', '')).strip() if pd.notna(row.get('designation')) else None,
-                "location": str(row.get('location', '')).strip() if pd.notna(row.get('location')) else None,
-            }
-            
-            # Clean None values that are empty strings
-            employee_data = {k: (v if v and v != 'nan' else None) for k, v in employee_data.items()}
-            employee_data["company_id"] = company["id"]  # Ensure company_id is set
-            employee_data["name"] = name
-            
-            new_employee = CompanyEmployee(**employee_data)
-            new_employee_ins_dict = new_employee.model_dump()
-            new_employee_ins_dict["organization_id"] = org_id
-            await db.company_employees.insert_one(new_employee_ins_dict)
-            results["created"] += 1
-            
-        except Exception as e:
-            results["errors"].append({"row": row_num, "error": str(e)})
+    await log_audit("company_employee", employee_id, "delete", {"is_deleted": True}, admin)
+    return {"message": "Employee archived"}
+
+
+async def _employee_import_records(file: UploadFile) -> list:
+    """Rows of an employee import file, after checking the required columns"""
+    try:
+        records = read_table(file.filename, await file.read())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
     
-    return results
+    columns = set(records[0]) if records else set()
+    if 'name' not in columns:
+        raise HTTPException(status_code=400, detail="Missing required column: name")
+    if 'company_code' not in columns and 'company_name' not in columns:
+        raise HTTPException(status_code=400, detail="Missing required column: company_code or company_name")
+    return records
+
+
+@api_router.post("/admin/company-employees/bulk-import")
+async def bulk_import_company_employees(
+    file: UploadFile = File(...),
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Bulk import company employees from CSV/Excel file.
+    Required columns: company_code OR company_name, name
+    Optional columns: employee_id, email, phone, department, designation, location
+    """
+    org_id = await get_admin_org_id(admin.get("email", ""))
+    records = await _employee_import_records(file)
+    result = await run_import("employees", org_id, records)
+    return {
+        "created": result.success,
+        "errors": [{"row": e["row"], "error": e["message"]} for e in result.errors],
+        "skipped": 0
+    }
+
+
+@api_router.post("/admin/company-employees/bulk-import/jobs")
+async def start_company_employees_import_job(
+    file: UploadFile = File(...),
+    admin: dict = Depends(get_current_admin)
+):
+    """Bulk import company employees from CSV/Excel file in the background (see GET /jobs/{id})"""
+    org_id = await get_admin_org_id(admin.get("email", ""))
+    records = await _employee_import_records(file)
+    job = await start_import_job("employees", org_id, records, admin.get("email", ""))
+    return public_job(job)
 
 
 @api_router.get("/admin/company-employees/template/download")
@@ -3120,8 +2363,6 @@ async def list_devices(
     admin: dict = Depends(get_current_admin)
 ):
     """List devices with AMC status and smart search with synonyms"""
-    from utils.synonyms import expand_search_query, get_brand_variants
-    
     query = {"is_deleted": {"$ne": True}}
     
     # Apply tenant scoping
@@ -3149,79 +2390,46 @@ async def list_devices(
             {"asset_tag": {"$regex": search_term, "$options": "i"}},
             {"brand": brand_regex},
             {"model": {"$regex": search_term, "$options": "i"}},
-            {"device_type": synonym_regex},  # Smart search with synonyms
+            device_type_filter(search_term),  # Smart search with synonyms (indexed device_category)
             {"name": {"$regex": search_term, "$options": "i"}},
             {"display_name": {"$regex": search_term, "$options": "i"}},
             {"notes": synonym_regex}
         ]
     
     skip = (page - 1) * limit
-    devices = await db.devices.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+    if amc_status:
+        # Filter on derived AMC status before paginating so pages are not short
+        pipeline = amc_status_pipeline(query, amc_status) + [{"$skip": skip}, {"$limit": limit}]
+        devices = await db.devices.aggregate(pipeline).to_list(limit)
+    else:
+        devices = await db.devices.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+    
+    # Batched enrichment: one query per related collection for the whole page
+    await attach_names(devices, "companies", "company_id", "company_name", default="Unknown")
+    await attach_names(devices, "users", "assigned_user_id", "assigned_user_name", only_present=True)
+    await attach_device_amc(devices)
+    
+    # Add deployment info if device was created from deployment
+    deployed = [d for d in devices if d.get("source") == "deployment" and d.get("deployment_id")]
+    deployments = await fetch_map(
+        "deployments", collect_ids(deployed, "deployment_id"),
+        {"name": 1, "site_id": 1}, {"is_deleted": {"$ne": True}}
+    )
+    sites = await fetch_map("sites", collect_ids(deployments.values(), "site_id"), {"name": 1})
     
-    # Enrich each device with AMC status from amc_device_assignments JOIN
-    result = []
     for device in devices:
-        # Get company name
-        company = await db.companies.find_one({"id": device.get("company_id")}, {"_id": 0, "name": 1})
-        device["company_name"] = company.get("name") if company else "Unknown"
-        
-        # Get assigned user name
-        if device.get("assigned_user_id"):
-            user = await db.users.find_one({"id": device["assigned_user_id"]}, {"_id": 0, "name": 1})
-            device["assigned_user_name"] = user.get("name") if user else None
-        
-        # JOIN amc_device_assignments to get AMC status
-        amc_assignment = await db.amc_device_assignments.find_one({
-            "device_id": device["id"],
-            "status": "active"
-        }, {"_id": 0})
-        
-        if amc_assignment:
-            # Check if coverage is still valid
-            coverage_active = is_warranty_active(amc_assignment.get("coverage_end", ""))
-            if coverage_active:
-                # Get AMC contract details
-                amc_contract = await db.amc_contracts.find_one({
-                    "id": amc_assignment["amc_contract_id"],
-                    "is_deleted": {"$ne": True}
-                }, {"_id": 0, "name": 1, "amc_type": 1})
-                
-                device["amc_status"] = "active"
-                device["amc_contract_id"] = amc_assignment["amc_contract_id"]
-                device["amc_contract_name"] = amc_contract.get("name") if amc_contract else None
-                device["amc_coverage_end"] = amc_assignment.get("coverage_end")
-            else:
-                device["amc_status"] = "expired"
-                device["amc_contract_id"] = amc_assignment["amc_contract_id"]
-                device["amc_coverage_end"] = amc_assignment.get("coverage_end")
-        else:
-            device["amc_status"] = "none"
-            device["amc_contract_id"] = None
-            device["amc_contract_name"] = None
-            device["amc_coverage_end"] = None
-        
         # Add SmartSelect label
         device["label"] = f"{device.get('brand', '')} {device.get('model', '')} - {device.get('serial_number', '')}"
         
-        # Add deployment info if device was created from deployment
-        if device.get("source") == "deployment" and device.get("deployment_id"):
-            deployment = await db.deployments.find_one(
-                {"id": device["deployment_id"], "is_deleted": {"$ne": True}}, 
-                {"_id": 0, "name": 1, "site_id": 1}
-            )
-            if deployment:
-                device["deployment_name"] = deployment.get("name")
-                # Get site name
-                site = await db.sites.find_one({"id": deployment.get("site_id")}, {"_id": 0, "name": 1})
-                device["site_name"] = site.get("name") if site else None
-        
-        # Filter by AMC status if requested
-        if amc_status and device["amc_status"] != amc_status:
+        if device.get("source") != "deployment":
             continue
-        
-        result.append(device)
+        deployment = deployments.get(device.get("deployment_id"))
+        if deployment:
+            device["deployment_name"] = deployment.get("name")
+            site = sites.get(deployment.get("site_id"))
+            device["site_name"] = site.get("name") if site else None
     
-    return result
+    return devices
 
 @api_router.post("/admin/devices")
 async def create_device(device_data: DeviceCreate, admin: dict = Depends(get_current_admin)):
@@ -3246,7 +2454,10 @@ async def create_device(device_data: DeviceCreate, admin: dict = Depends(get_cur
         device_dict["organization_id"] = org_id
     
     device = Device(**device_dict)
-    await db.devices.insert_one(device.model_dump())
+    await db.devices.insert_one(with_lookup_keys(device.model_dump()))
+    await count_inserted("devices", [device.model_dump()])
+    await sync_search_entries("devices", [device.id])
+    await sync_expiries("devices", [device.id])
     
     # Log initial assignment if user is assigned
     if device_data.assigned_user_id:
@@ -3389,20 +2600,26 @@ async def update_device(device_id: str, updates: DeviceUpdate, admin: dict = Dep
     
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
-    result = await db.devices.update_one(scope_query({"id": device_id}, org_id), {"$set": update_data})
+    result = await db.devices.update_one(scope_query({"id": device_id}, org_id), {"$set": {**update_data, **lookup_key_fields(update_data)}})
+    await count_change("devices", existing, {**existing, **update_data})
+    await sync_search_entries("devices", [device_id])
+    await sync_expiries("devices", [device_id])
     await log_audit("device", device_id, "update", changes, admin)
     return await db.devices.find_one(scope_query({"id": device_id}, org_id), {"_id": 0})
 
 @api_router.delete("/admin/devices/{device_id}")
 async def delete_device(device_id: str, admin: dict = Depends(get_current_admin)):
     org_id = await get_admin_org_id(admin.get("email", ""))
-    result = await db.devices.update_one(scope_query({"id": device_id}, org_id), {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("devices", scope_query({"id": device_id}, org_id)):
         raise HTTPException(status_code=404, detail="Device not found")
     
     # Soft delete related data
-    await db.parts.update_many(scope_query({"device_id": device_id}, org_id), {"$set": {"is_deleted": True}})
-    await db.amc.update_many(scope_query({"device_id": device_id}, org_id), {"$set": {"is_deleted": True}})
+    await soft_delete_many_counted("parts", scope_query({"device_id": device_id}, org_id))
+    await soft_delete_many_counted("amc", scope_query({"device_id": device_id}, org_id))
+    await sync_search_entries("devices", [device_id])
+    await sync_expiries("devices", [device_id])
+    await sync_expiries_matching("parts", scope_query({"device_id": device_id}, org_id))
+    await sync_expiries_matching("amc", scope_query({"device_id": device_id}, org_id))
     await log_audit("device", device_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Device archived"}
 
@@ -3758,6 +2975,8 @@ async def create_service(service_data: ServiceHistoryCreate, admin: dict = Depen
     service_ins_dict = service.model_dump()
     service_ins_dict["organization_id"] = org_id
     await db.service_history.insert_one(service_ins_dict)
+    await count_inserted("service_history", [service_ins_dict])
+    await sync_search_entries("service_history", [service.id])
     await log_audit("service", service.id, "create", {"data": service_data.model_dump()}, admin)
     return service.model_dump()
 
@@ -3834,6 +3053,7 @@ async def update_service(service_id: str, updates: ServiceHistoryUpdate, admin:
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
     result = await db.service_history.update_one(scope_query({"id": service_id}, org_id), {"$set": update_data})
+    await sync_search_entries("service_history", [service_id])
     await log_audit("service", service_id, "update", changes, admin)
     return await db.service_history.find_one(scope_query({"id": service_id}, org_id), {"_id": 0})
 
@@ -3921,6 +3141,7 @@ async def update_service_stage(
             }
         }
     )
+    await sync_search_entries("service_history", [service_id])
     
     await log_audit("service", service_id, "stage_update", {
         "stage_key": stage_key,
@@ -4014,6 +3235,7 @@ async def add_custom_stage(
             }
         }
     )
+    await sync_search_entries("service_history", [service_id])
     
     await log_audit("service", service_id, "stage_add", {"stage_key": stage_key}, admin)
     
@@ -4068,6 +3290,7 @@ async def upload_service_attachment(
         {"id": service_id},
         {"$set": {"attachments": attachments}}
     )
+    await sync_search_entries("service_history", [service_id])
     
     await log_audit("service", service_id, "attachment_upload", {"filename": file.filename}, admin)
     return {"message": "Attachment uploaded", "attachment": attachment.model_dump()}
@@ -4096,6 +3319,7 @@ async def delete_service_attachment(service_id: str, attachment_id: str, admin:
         {"id": service_id},
         {"$set": {"attachments": attachments}}
     )
+    await sync_search_entries("service_history", [service_id])
     
     await log_audit("service", service_id, "attachment_delete", {"attachment_id": attachment_id}, admin)
     return {"message": "Attachment deleted"}
@@ -4134,7 +3358,9 @@ async def create_part(part_data: PartCreate, admin: dict = Depends(get_current_a
     if org_id:
         part_dict["organization_id"] = org_id
     
-    await db.parts.insert_one(part_dict)
+    await db.parts.insert_one(with_lookup_keys(part_dict))
+    await count_inserted("parts", [part_dict])
+    await sync_expiries("parts", [part.id])
     await log_audit("part", part.id, "create", {"data": part_data.model_dump()}, admin)
     return part.model_dump()
 
@@ -4172,7 +3398,8 @@ async def update_part(part_id: str, updates: PartUpdate, admin: dict = Depends(g
     
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
-    result = await db.parts.update_one(query, {"$set": update_data})
+    result = await db.parts.update_one(query, {"$set": {**update_data, **lookup_key_fields(update_data)}})
+    await sync_expiries("parts", [part_id])
     await log_audit("part", part_id, "update", changes, admin)
     return await db.parts.find_one({"id": part_id}, {"_id": 0})
 
@@ -4183,9 +3410,9 @@ async def delete_part(part_id: str, admin: dict = Depends(get_current_admin)):
     query = {"id": part_id}
     query = scope_query(query, org_id)
     
-    result = await db.parts.update_one(query, {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("parts", query):
         raise HTTPException(status_code=404, detail="Part not found")
+    await sync_expiries("parts", [part_id])
     await log_audit("part", part_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Part archived"}
 
@@ -4221,6 +3448,8 @@ async def create_amc(amc_data: AMCCreate, admin: dict = Depends(get_current_admi
     amc_ins_dict = amc.model_dump()
     amc_ins_dict["organization_id"] = org_id
     await db.amc.insert_one(amc_ins_dict)
+    await count_inserted("amc", [amc_ins_dict])
+    await sync_expiries("amc", [amc.id])
     await log_audit("amc", amc.id, "create", {"data": amc_data.model_dump()}, admin)
     return amc.model_dump()
 
@@ -4246,15 +3475,17 @@ async def update_amc(amc_id: str, updates: AMCUpdate, admin: dict = Depends(get_
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
     result = await db.amc.update_one(scope_query({"id": amc_id}, org_id), {"$set": update_data})
+    await count_change("amc", existing, {**existing, **update_data})
+    await sync_expiries("amc", [amc_id])
     await log_audit("amc", amc_id, "update", changes, admin)
     return await db.amc.find_one(scope_query({"id": amc_id}, org_id), {"_id": 0})
 
 @api_router.delete("/admin/amc/{amc_id}")
 async def delete_amc(amc_id: str, admin: dict = Depends(get_current_admin)):
     org_id = await get_admin_org_id(admin.get("email", ""))
-    result = await db.amc.update_one(scope_query({"id": amc_id}, org_id), {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("amc", scope_query({"id": amc_id}, org_id)):
         raise HTTPException(status_code=404, detail="AMC not found")
+    await sync_expiries("amc", [amc_id])
     await log_audit("amc", amc_id, "delete", {"is_deleted": True}, admin)
     return {"message": "AMC archived"}
 
@@ -4406,6 +3637,10 @@ async def create_amc_contract(data: AMCContractCreate, admin: dict = Depends(get
     
     contract = AMCContract(**contract_data)
     await db.amc_contracts.insert_one(contract.model_dump())
+    await count_inserted("amc_contracts", [contract.model_dump()])
+    await invalidate_analytics(org_id, "contracts")
+    await sync_search_entries("amc_contracts", [contract.id])
+    await sync_expiries("amc_contracts", [contract.id])
     await log_audit("amc_contract", contract.id, "create", {"data": contract_data}, admin)
     
     result = contract.model_dump()
@@ -4490,6 +3725,10 @@ async def update_amc_contract(contract_id: str, updates: AMCContractUpdate, admi
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
     await db.amc_contracts.update_one(scope_query({"id": contract_id}, org_id), {"$set": update_data})
+    await count_change("amc_contracts", existing, {**existing, **update_data})
+    await invalidate_analytics(org_id, "contracts")
+    await sync_search_entries("amc_contracts", [contract_id])
+    await sync_expiries("amc_contracts", [contract_id])
     await log_audit("amc_contract", contract_id, "update", changes, admin)
     
     result = await db.amc_contracts.find_one(scope_query({"id": contract_id}, org_id), {"_id": 0})
@@ -4500,9 +3739,11 @@ async def update_amc_contract(contract_id: str, updates: AMCContractUpdate, admi
 async def delete_amc_contract(contract_id: str, admin: dict = Depends(get_current_admin)):
     """Soft delete AMC contract"""
     org_id = await get_admin_org_id(admin.get("email", ""))
-    result = await db.amc_contracts.update_one(scope_query({"id": contract_id}, org_id), {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("amc_contracts", scope_query({"id": contract_id}, org_id)):
         raise HTTPException(status_code=404, detail="AMC Contract not found")
+    await invalidate_analytics(org_id, "contracts")
+    await sync_search_entries("amc_contracts", [contract_id])
+    await sync_expiries("amc_contracts", [contract_id])
     await log_audit("amc_contract", contract_id, "delete", {"is_deleted": True}, admin)
     return {"message": "AMC Contract archived"}
 
@@ -4684,6 +3925,7 @@ async def create_site(data: SiteCreate, admin: dict = Depends(get_current_admin)
     
     site = Site(**site_dict)
     await db.sites.insert_one(site.model_dump())
+    await sync_search_entries("sites", [site.id])
     await log_audit("site", site.id, "create", {"data": data.model_dump()}, admin)
     
     result = site.model_dump()
@@ -4716,6 +3958,7 @@ async def quick_create_site(data: SiteCreate, admin: dict = Depends(get_current_
     if org_id:
         site_dict["organization_id"] = org_id
     await db.sites.insert_one(site_dict)
+    await sync_search_entries("sites", [site.id])
     await log_audit("site", site.id, "quick_create", {"data": data.model_dump()}, admin)
     
     result = {k: v for k, v in site_dict.items() if k != "_id"}
@@ -4790,6 +4033,7 @@ async def update_site(site_id: str, updates: SiteUpdate, admin: dict = Depends(g
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
     await db.sites.update_one(scope_query({"id": site_id}, org_id), {"$set": update_data})
+    await sync_search_entries("sites", [site_id])
     await log_audit("site", site_id, "update", changes, admin)
     
     return await db.sites.find_one(scope_query({"id": site_id}, org_id), {"_id": 0})
@@ -4801,6 +4045,7 @@ async def delete_site(site_id: str, admin: dict = Depends(get_current_admin)):
     result = await db.sites.update_one(scope_query({"id": site_id}, org_id), {"$set": {"is_deleted": True}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Site not found")
+    await sync_search_entries("sites", [site_id])
     await log_audit("site", site_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Site archived"}
 
@@ -4923,8 +4168,12 @@ async def create_deployment(data: DeploymentCreate, admin: dict = Depends(get_cu
                     "created_at": get_ist_isoformat()
                 }
                 device_data["organization_id"] = org_id
-                await db.devices.insert_one(device_data)
+                await db.devices.insert_one(with_lookup_keys(device_data))
+                await count_inserted("devices", [device_data])
     
+    await sync_search_entries("deployments", [deployment.id])
+    await sync_search_matching("devices", {"deployment_id": deployment.id})
+    await sync_expiries_matching("devices", {"deployment_id": deployment.id})
     await log_audit("deployment", deployment.id, "create", {"data": data.model_dump()}, admin)
     
     result = deployment.model_dump()
@@ -4995,6 +4244,7 @@ async def update_deployment(deployment_id: str, updates: DeploymentUpdate, admin
     update_data["updated_at"] = get_ist_isoformat()
     
     await db.deployments.update_one(scope_query({"id": deployment_id}, org_id), {"$set": update_data})
+    await sync_search_entries("deployments", [deployment_id])
     await log_audit("deployment", deployment_id, "update", update_data, admin)
     
     return await db.deployments.find_one(scope_query({"id": deployment_id}, org_id), {"_id": 0})
@@ -5008,10 +4258,10 @@ async def delete_deployment(deployment_id: str, admin: dict = Depends(get_curren
         raise HTTPException(status_code=404, detail="Deployment not found")
     
     # Also soft-delete devices created from this deployment
-    await db.devices.update_many(
-        {"deployment_id": deployment_id, "source": "deployment"},
-        {"$set": {"is_deleted": True}}
-    )
+    await soft_delete_many_counted("devices", {"deployment_id": deployment_id, "source": "deployment"})
+    await sync_search_entries("deployments", [deployment_id])
+    await sync_search_matching("devices", {"deployment_id": deployment_id})
+    await sync_expiries_matching("devices", {"deployment_id": deployment_id})
     
     await log_audit("deployment", deployment_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Deployment and linked devices archived"}
@@ -5050,7 +4300,8 @@ async def add_deployment_item(deployment_id: str, item_data: dict, admin: dict =
                 "created_at": get_ist_isoformat()
             }
             device_data["organization_id"] = org_id
-            await db.devices.insert_one(device_data)
+            await db.devices.insert_one(with_lookup_keys(device_data))
+            await count_inserted("devices", [device_data])
             linked_device_ids.append(device_data["id"])
         
         item.linked_device_ids = linked_device_ids
@@ -5063,6 +4314,9 @@ async def add_deployment_item(deployment_id: str, item_data: dict, admin: dict =
             "$set": {"updated_at": get_ist_isoformat()}
         }
     )
+    await sync_search_entries("deployments", [deployment_id])
+    await sync_search_matching("devices", {"deployment_id": deployment_id})
+    await sync_expiries_matching("devices", {"deployment_id": deployment_id})
     
     return item.model_dump()
 
@@ -5103,18 +4357,20 @@ async def update_deployment_item(
                 if i < len(old_linked_ids) and old_linked_ids[i]:
                     # Update existing device
                     device_id = old_linked_ids[i]
-                    await db.devices.update_one(
-                        {"id": device_id},
-                        {"$set": {
+                    await update_counted(
+                        "devices", {"id": device_id},
+                        {
                             "serial_number": serial,
+                            "serial_key": normalize_lookup_key(serial),
                             "device_type": updated_item.get("category"),
+                            "device_category": device_category(updated_item.get("category")),
                             "category": updated_item.get("category"),
                             "brand": updated_item.get("brand") or "Unknown",
                             "model": updated_item.get("model") or "Unknown",
                             "warranty_end_date": updated_item.get("warranty_end_date"),
                             "location": updated_item.get("zone_location"),
                             "updated_at": get_ist_isoformat()
-                        }}
+                        }
                     )
                     new_linked_ids.append(device_id)
                 else:
@@ -5140,7 +4396,8 @@ async def update_deployment_item(
                         "created_at": get_ist_isoformat()
                     }
                     device_data["organization_id"] = org_id
-                    await db.devices.insert_one(device_data)
+                    await db.devices.insert_one(with_lookup_keys(device_data))
+                    await count_inserted("devices", [device_data])
                     new_linked_ids.append(device_data["id"])
         
         updated_item["linked_device_ids"] = new_linked_ids
@@ -5155,6 +4412,9 @@ async def update_deployment_item(
             "updated_at": get_ist_isoformat()
         }}
     )
+    await sync_search_entries("deployments", [deployment_id])
+    await sync_search_matching("devices", {"deployment_id": deployment_id})
+    await sync_expiries_matching("devices", {"deployment_id": deployment_id})
     
     await log_audit("deployment", deployment_id, "update_item", {"item_index": item_index, "updates": item_data}, admin)
     
@@ -5189,17 +4449,18 @@ async def sync_deployment_devices(deployment_id: str, admin: dict = Depends(get_
                 
                 if existing_device:
                     # Update existing device
-                    await db.devices.update_one(
-                        {"id": existing_device["id"]},
-                        {"$set": {
+                    await update_counted(
+                        "devices", {"id": existing_device["id"]},
+                        {
                             "device_type": item.get("category"),
+                            "device_category": device_category(item.get("category")),
                             "category": item.get("category"),
                             "brand": item.get("brand") or "Unknown",
                             "model": item.get("model") or "Unknown",
                             "warranty_end_date": item.get("warranty_end_date"),
                             "location": item.get("zone_location"),
                             "updated_at": get_ist_isoformat()
-                        }}
+                        }
                     )
                     new_linked_ids.append(existing_device["id"])
                     updated_count += 1
@@ -5226,7 +4487,8 @@ async def sync_deployment_devices(deployment_id: str, admin: dict = Depends(get_
                         "created_at": get_ist_isoformat()
                     }
                     device_data["organization_id"] = org_id
-                    await db.devices.insert_one(device_data)
+                    await db.devices.insert_one(with_lookup_keys(device_data))
+                    await count_inserted("devices", [device_data])
                     new_linked_ids.append(device_data["id"])
                     created_count += 1
             
@@ -5237,6 +4499,10 @@ async def sync_deployment_devices(deployment_id: str, admin: dict = Depends(get_
                     {"$set": {f"items.{item_idx}.linked_device_ids": new_linked_ids}}
                 )
     
+    await sync_search_entries("deployments", [deployment_id])
+    await sync_search_matching("devices", {"deployment_id": deployment_id})
+    await sync_expiries_matching("devices", {"deployment_id": deployment_id})
+    
     return {
         "message": f"Sync complete. Created {created_count} devices, updated {updated_count} devices.",
         "created": created_count,
@@ -5254,9 +4520,9 @@ async def universal_search(
     """
     Universal search across all entities with smart synonym support.
     Returns grouped results from companies, sites, users, assets, deployments, AMCs, and services.
+    Served from the per-tenant search index (services/search_index.py).
     """
     org_id = await get_admin_org_id(admin.get("email", ""))
-    from utils.synonyms import expand_search_query, get_brand_variants
     
     if not q or len(q.strip()) < 1:
         return {
@@ -5270,15 +4536,7 @@ async def universal_search(
         }
     
     query = q.strip()
-    # Create case-insensitive regex pattern for partial matching
-    regex_pattern = {"$regex": query, "$options": "i"}
-    
-    # Get synonym-expanded search for device types
-    synonym_regex = expand_search_query(query)
-    
-    # Get brand variants
-    brand_variants = get_brand_variants(query)
-    brand_regex = {"$regex": "|".join(brand_variants), "$options": "i"}
+    hits = await search_index.search(org_id, query, limit)
     
     results = {
         "companies": [],
@@ -5292,18 +4550,7 @@ async def universal_search(
         "total_count": 0
     }
     
-    # Search Companies
-    companies = await db.companies.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"name": regex_pattern},
-            {"contact_email": regex_pattern},
-            {"gst_number": regex_pattern},
-            {"address": regex_pattern}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
-    for c in companies:
+    for c in hits.get("companies", []):
         results["companies"].append({
             "id": c["id"],
             "type": "company",
@@ -5313,20 +4560,10 @@ async def universal_search(
             "icon": "building"
         })
     
-    # Search Sites
-    sites = await db.sites.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"name": regex_pattern},
-            {"address": regex_pattern},
-            {"city": regex_pattern},
-            {"primary_contact_name": regex_pattern},
-            {"contact_number": regex_pattern}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
+    sites = hits.get("sites", [])
+    site_companies = await fetch_map("companies", collect_ids(sites, "company_id"), {"name": 1}, {"organization_id": org_id})
     for s in sites:
-        company = await db.companies.find_one(scope_query({"id": s.get("company_id")}, org_id), {"_id": 0, "name": 1})
+        company = site_companies.get(s.get("company_id"))
         results["sites"].append({
             "id": s["id"],
             "type": "site",
@@ -5336,18 +4573,7 @@ async def universal_search(
             "icon": "map-pin"
         })
     
-    # Search Users
-    users = await db.users.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"name": regex_pattern},
-            {"email": regex_pattern},
-            {"phone": regex_pattern},
-            {"designation": regex_pattern}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
-    for u in users:
+    for u in hits.get("users", []):
         results["users"].append({
             "id": u["id"],
             "type": "user",
@@ -5357,22 +4583,10 @@ async def universal_search(
             "icon": "user"
         })
     
-    # Search Assets/Devices with synonym support
-    devices = await db.devices.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"serial_number": regex_pattern},
-            {"asset_tag": regex_pattern},
-            {"brand": brand_regex},  # Brand with aliases
-            {"model": regex_pattern},
-            {"device_type": synonym_regex},  # Device type with synonyms
-            {"location": regex_pattern},
-            {"notes": synonym_regex}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
+    devices = hits.get("devices", [])
+    device_companies = await fetch_map("companies", collect_ids(devices, "company_id"), {"name": 1}, {"organization_id": org_id})
     for d in devices:
-        company = await db.companies.find_one(scope_query({"id": d.get("company_id")}, org_id), {"_id": 0, "name": 1})
+        company = device_companies.get(d.get("company_id"))
         results["assets"].append({
             "id": d["id"],
             "type": "asset",
@@ -5384,60 +4598,23 @@ async def universal_search(
             "asset_tag": d.get("asset_tag")
         })
     
-    # Search Deployments
-    deployments = await db.deployments.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"name": regex_pattern},
-            {"installed_by": regex_pattern},
-            {"notes": regex_pattern}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
-    # Also search deployment items for serial numbers and categories
-    deployment_items_search = await db.deployments.find({
-        "is_deleted": {"$ne": True},
-        "items": {
-            "$elemMatch": {
-                "$or": [
-                    {"serial_numbers": regex_pattern},
-                    {"category": regex_pattern},
-                    {"brand": regex_pattern},
-                    {"model": regex_pattern}
-                ]
-            }
-        }
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
-    # Combine and dedupe
-    all_deployments = {d["id"]: d for d in deployments}
-    for d in deployment_items_search:
-        if d["id"] not in all_deployments:
-            all_deployments[d["id"]] = d
-    
-    for d in list(all_deployments.values())[:limit]:
-        site = await db.sites.find_one(scope_query({"id": d.get("site_id")}, org_id), {"_id": 0, "name": 1})
+    deployments = hits.get("deployments", [])
+    deployment_sites = await fetch_map("sites", collect_ids(deployments, "site_id"), {"name": 1}, {"organization_id": org_id})
+    for d in deployments:
+        site = deployment_sites.get(d.get("site_id"))
         results["deployments"].append({
             "id": d["id"],
             "type": "deployment",
             "title": d.get("name"),
-            "subtitle": f"{site.get('name', '') if site else ''} • {len(d.get('items', []))} items",
+            "subtitle": f"{site.get('name', '') if site else ''} • {d.get('item_count', 0)} items",
             "link": f"/admin/deployments",
             "icon": "package"
         })
     
-    # Search AMC Contracts
-    amcs = await db.amc_contracts.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"name": regex_pattern},
-            {"amc_type": regex_pattern},
-            {"internal_notes": regex_pattern}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
+    amcs = hits.get("amc_contracts", [])
+    amc_companies = await fetch_map("companies", collect_ids(amcs, "company_id"), {"name": 1}, {"organization_id": org_id})
     for a in amcs:
-        company = await db.companies.find_one(scope_query({"id": a.get("company_id")}, org_id), {"_id": 0, "name": 1})
+        company = amc_companies.get(a.get("company_id"))
         status = get_amc_status(a.get("start_date", ""), a.get("end_date", ""))
         results["amcs"].append({
             "id": a["id"],
@@ -5449,24 +4626,18 @@ async def universal_search(
             "status": status
         })
     
-    # Search Service History
-    services = await db.service_history.find({
-        "is_deleted": {"$ne": True},
-        "$or": [
-            {"ticket_id": regex_pattern},
-            {"action_taken": regex_pattern},
-            {"problem_reported": regex_pattern},
-            {"technician_name": regex_pattern},
-            {"notes": regex_pattern}
-        ]
-    }, {"_id": 0}).limit(limit).to_list(limit)
-    
+    services = hits.get("service_history", [])
+    service_devices = await fetch_map(
+        "devices", collect_ids(services, "device_id"),
+        {"brand": 1, "model": 1, "serial_number": 1}, {"organization_id": org_id}
+    )
     for s in services:
-        device = await db.devices.find_one(scope_query({"id": s.get("device_id")}, org_id), {"_id": 0, "brand": 1, "model": 1, "serial_number": 1})
+        device = service_devices.get(s.get("device_id"))
+        action_taken = s.get("action_taken") or ""
         results["services"].append({
             "id": s["id"],
             "type": "service",
-            "title": s.get("action_taken", "")[:50] + ("..." if len(s.get("action_taken", "")) > 50 else ""),
+            "title": action_taken[:50] + ("..." if len(action_taken) > 50 else ""),
             "subtitle": f"{device.get('brand', '')} {device.get('model', '')} • {s.get('service_type', '')}".strip() if device else s.get("service_type", ""),
             "link": f"/admin/service-history",
             "icon": "wrench",
@@ -5628,6 +4799,7 @@ async def create_license(data: LicenseCreate, admin: dict = Depends(get_current_
     
     lic = License(**license_data)
     await db.licenses.insert_one(lic.model_dump())
+    await sync_expiries("licenses", [lic.id])
     await log_audit("license", lic.id, "create", {"data": data.model_dump()}, admin)
     
     result = lic.model_dump()
@@ -5688,6 +4860,7 @@ async def update_license(license_id: str, updates: LicenseUpdate, admin: dict =
     changes = {k: {"old": existing.get(k), "new": v} for k, v in update_data.items() if existing.get(k) != v}
     
     await db.licenses.update_one(scope_query({"id": license_id}, org_id), {"$set": update_data})
+    await sync_expiries("licenses", [license_id])
     await log_audit("license", license_id, "update", changes, admin)
     
     return await db.licenses.find_one(scope_query({"id": license_id}, org_id), {"_id": 0})
@@ -5700,6 +4873,7 @@ async def delete_license(license_id: str, admin: dict = Depends(get_current_admi
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="License not found")
     
+    await sync_expiries("licenses", [license_id])
     await log_audit("license", license_id, "delete", {"is_deleted": True}, admin)
     return {"message": "License deleted"}
 
@@ -5819,6 +4993,7 @@ async def assign_device_to_amc(
     assignment_ins_dict = assignment.model_dump()
     assignment_ins_dict["organization_id"] = org_id
     await db.amc_device_assignments.insert_one(assignment_ins_dict)
+    await invalidate_analytics(org_id, "contracts")
     
     return assignment.model_dump()
 
@@ -5850,13 +5025,7 @@ async def preview_bulk_amc_assignment(
             continue
         
         # Search by serial number or asset tag
-        device = await db.devices.find_one({
-            "is_deleted": {"$ne": True},
-            "$or": [
-                {"serial_number": {"$regex": f"^{identifier}$", "$options": "i"}},
-                {"asset_tag": {"$regex": f"^{identifier}$", "$options": "i"}}
-            ]
-        }, {"_id": 0})
+        device = await db.devices.find_one(device_key_query(identifier), {"_id": 0})
         
         if not device:
             results["not_found"].append({"identifier": identifier, "reason": "Device not found"})
@@ -5932,6 +5101,8 @@ async def confirm_bulk_amc_assignment(
         assignment_ins_dict["organization_id"] = org_id
         await db.amc_device_assignments.insert_one(assignment_ins_dict)
         assigned.append(assignment.model_dump())
+    if assigned:
+        await invalidate_analytics(org_id, "contracts")
     
     return {
         "assigned_count": len(assigned),
@@ -5958,6 +5129,7 @@ async def unassign_device_from_amc(
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Assignment not found")
+    await invalidate_analytics(org_id, "contracts")
     
     return {"message": "Device unassigned from contract"}
 
@@ -5966,35 +5138,22 @@ async def unassign_device_from_amc(
 @api_router.get("/admin/dashboard")
 async def get_dashboard_stats(admin: dict = Depends(get_current_admin)):
     org_id = await get_admin_org_id(admin.get("email", ""))
-    base = {"is_deleted": {"$ne": True}}
-    scoped = scope_query(base.copy(), org_id)
-    
-    companies_count = await db.companies.count_documents(scoped)
-    users_count = await db.users.count_documents(scope_query({"is_deleted": {"$ne": True}}, org_id))
-    devices_count = await db.devices.count_documents(scope_query({"is_deleted": {"$ne": True}}, org_id))
-    parts_count = await db.parts.count_documents(scope_query({"is_deleted": {"$ne": True}}, org_id))
-    services_count = await db.service_history.count_documents(scope_query({}, org_id))
+    counters = await load_org_counters(org_id)
+    devices_count = counters.get("devices", 0)
     
     today = get_ist_now().strftime('%Y-%m-%d')
-    active_warranties = await db.devices.count_documents(scope_query({
-        "is_deleted": {"$ne": True},
-        "warranty_end_date": {"$gte": today}
-    }, org_id))
-    
-    active_amc = await db.amc.count_documents(scope_query({
-        "is_deleted": {"$ne": True},
-        "end_date": {"$gte": today}
-    }, org_id))
+    active_warranties = count_between(counters.get("warranty_end"), start=today)
+    active_amc = count_between(counters.get("amc_end"), start=today)
     
     recent_devices = await db.devices.find(scope_query({"is_deleted": {"$ne": True}}, org_id), {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
     recent_services = await db.service_history.find(scope_query({}, org_id), {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
     
     return {
-        "companies_count": companies_count,
-        "users_count": users_count,
+        "companies_count": counters.get("companies", 0),
+        "users_count": counters.get("users", 0),
         "devices_count": devices_count,
-        "parts_count": parts_count,
-        "services_count": services_count,
+        "parts_count": counters.get("parts", 0),
+        "services_count": counters.get("services", 0),
         "active_warranties": active_warranties,
         "expired_warranties": devices_count - active_warranties,
         "active_amc": active_amc,
@@ -6002,145 +5161,99 @@ async def get_dashboard_stats(admin: dict = Depends(get_current_admin)):
         "recent_services": recent_services
     }
 
+# (label, first day, last day) from today for the dashboard expiry alerts
+DASHBOARD_ALERT_BUCKETS = [("7_days", 1, 7), ("15_days", 8, 15), ("30_days", 16, 30)]
+
 @api_router.get("/admin/dashboard/alerts")
 async def get_dashboard_alerts(admin: dict = Depends(get_current_admin)):
     """Get warranty and AMC expiry alerts"""
     org_id = await get_admin_org_id(admin.get("email", ""))
-    today = get_ist_now()
-    
-    alerts = {
-        "warranty_expiring_7_days": [],
-        "warranty_expiring_15_days": [],
-        "warranty_expiring_30_days": [],
-        "amc_expiring_7_days": [],
-        "amc_expiring_15_days": [],
-        "amc_expiring_30_days": [],
-        "devices_in_repair": [],
-        "devices_lost": []
-    }
-    
-    # Get all devices with warranty - SCOPED
-    devices = await db.devices.find(
-        scope_query({"is_deleted": {"$ne": True}, "warranty_end_date": {"$ne": None}}, org_id),
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for device in devices:
-        days = days_until_expiry(device.get("warranty_end_date", ""))
-        if 0 < days <= 7:
-            alerts["warranty_expiring_7_days"].append({
-                "device_id": device.get("id"),
-                "brand": device.get("brand"),
-                "model": device.get("model"),
-                "serial_number": device.get("serial_number"),
-                "expiry_date": device.get("warranty_end_date"),
-                "days_remaining": days
-            })
-        elif 7 < days <= 15:
-            alerts["warranty_expiring_15_days"].append({
-                "device_id": device.get("id"),
-                "brand": device.get("brand"),
-                "model": device.get("model"),
-                "serial_number": device.get("serial_number"),
-                "expiry_date": device.get("warranty_end_date"),
-                "days_remaining": days
-            })
-        elif 15 < days <= 30:
-            alerts["warranty_expiring_30_days"].append({
-                "device_id": device.get("id"),
+    live = scope_query({"is_deleted": {"$ne": True}}, org_id)
+    
+    # Expiring in 1-7 / 8-15 / 16-30 days: one range scan of the expiry index
+    window = await expiry_window(org_id, ["warranty", "amc", "amc_contract"], DASHBOARD_ALERT_BUCKETS)
+    items, counts = window["items"], window["counts"]
+    
+    alerts = {"counts": {}}
+    for label, _, _ in DASHBOARD_ALERT_BUCKETS:
+        alerts[f"warranty_expiring_{label}"] = [{
+            "device_id": row["source_id"],
+            "brand": row["doc"].get("brand"),
+            "model": row["doc"].get("model"),
+            "serial_number": row["doc"].get("serial_number"),
+            "expiry_date": row["expiry_date"],
+            "days_remaining": row["days_remaining"]
+        } for row in items["warranty"][label]]
+        alerts["counts"][f"warranty_expiring_{label}"] = counts["warranty"][label]
+    
+    # AMC alerts (legacy per-device AMC)
+    amc_rows = [row for label, _, _ in DASHBOARD_ALERT_BUCKETS for row in items["amc"][label]]
+    amc_devices = await fetch_map(
+        "devices", [row["doc"].get("device_id") for row in amc_rows],
+        {"_id": 0, "id": 1, "brand": 1, "model": 1, "serial_number": 1}
+    )
+    for label, _, _ in DASHBOARD_ALERT_BUCKETS:
+        alerts[f"amc_expiring_{label}"] = []
+        for row in items["amc"][label]:
+            device = amc_devices.get(row["doc"].get("device_id"))
+            if not device:
+                continue
+            alerts[f"amc_expiring_{label}"].append({
+                "amc_id": row["source_id"],
+                "device_id": device["id"],
                 "brand": device.get("brand"),
                 "model": device.get("model"),
                 "serial_number": device.get("serial_number"),
-                "expiry_date": device.get("warranty_end_date"),
-                "days_remaining": days
-            })
-        
-        # Status alerts
-        if device.get("status") == "in_repair":
-            alerts["devices_in_repair"].append({
-                "device_id": device.get("id"),
-                "brand": device.get("brand"),
-                "model": device.get("model"),
-                "serial_number": device.get("serial_number")
-            })
-        elif device.get("status") == "lost":
-            alerts["devices_lost"].append({
-                "device_id": device.get("id"),
-                "brand": device.get("brand"),
-                "model": device.get("model"),
-                "serial_number": device.get("serial_number")
+                "expiry_date": row["expiry_date"],
+                "days_remaining": row["days_remaining"]
             })
+        alerts["counts"][f"amc_expiring_{label}"] = counts["amc"][label]
     
-    # AMC alerts - SCOPED
-    amc_list = await db.amc.find(scope_query({"is_deleted": {"$ne": True}}, org_id), {"_id": 0}).to_list(1000)
-    for amc in amc_list:
-        days = days_until_expiry(amc.get("end_date", ""))
-        device = await db.devices.find_one({"id": amc.get("device_id")}, {"_id": 0, "brand": 1, "model": 1, "serial_number": 1})
-        if not device:
-            continue
-            
-        alert_item = {
-            "amc_id": amc.get("id"),
-            "device_id": amc.get("device_id"),
+    # AMC Contract (v2) alerts
+    for label, _, _ in DASHBOARD_ALERT_BUCKETS:
+        alerts[f"amc_contracts_expiring_{label}"] = [{
+            "contract_id": row["source_id"],
+            "contract_name": row["doc"].get("name"),
+            "company_id": row.get("company_id"),
+            "amc_type": row["doc"].get("amc_type"),
+            "expiry_date": row["expiry_date"],
+            "days_remaining": row["days_remaining"]
+        } for row in items["amc_contract"][label]]
+        await attach_names(alerts[f"amc_contracts_expiring_{label}"], "companies", "company_id", "company_name",
+                           default="Unknown", org_id=org_id)
+        alerts["counts"][f"amc_contracts_expiring_{label}"] = counts["amc_contract"][label]
+    
+    # Status alerts
+    status_devices = await db.devices.find(
+        {**live, "status": {"$in": ["in_repair", "lost"]}},
+        {"_id": 0, "id": 1, "brand": 1, "model": 1, "serial_number": 1, "status": 1}
+    ).to_list(1000)
+    alerts["devices_in_repair"] = []
+    alerts["devices_lost"] = []
+    for device in status_devices:
+        target = "devices_in_repair" if device.get("status") == "in_repair" else "devices_lost"
+        alerts[target].append({
+            "device_id": device.get("id"),
             "brand": device.get("brand"),
             "model": device.get("model"),
-            "serial_number": device.get("serial_number"),
-            "expiry_date": amc.get("end_date"),
-            "days_remaining": days
-        }
-        
-        if 0 < days <= 7:
-            alerts["amc_expiring_7_days"].append(alert_item)
-        elif 7 < days <= 15:
-            alerts["amc_expiring_15_days"].append(alert_item)
-        elif 15 < days <= 30:
-            alerts["amc_expiring_30_days"].append(alert_item)
-    
-    # AMC Contract (v2) alerts
-    alerts["amc_contracts_expiring_7_days"] = []
-    alerts["amc_contracts_expiring_15_days"] = []
-    alerts["amc_contracts_expiring_30_days"] = []
-    alerts["companies_without_amc"] = []
-    
-    contracts = await db.amc_contracts.find(scope_query({"is_deleted": {"$ne": True}}, org_id), {"_id": 0}).to_list(1000)
-    for contract in contracts:
-        days = days_until_expiry(contract.get("end_date", ""))
-        company = await db.companies.find_one({"id": contract.get("company_id")}, {"_id": 0, "name": 1})
-        
-        alert_item = {
-            "contract_id": contract.get("id"),
-            "contract_name": contract.get("name"),
-            "company_id": contract.get("company_id"),
-            "company_name": company.get("name") if company else "Unknown",
-            "amc_type": contract.get("amc_type"),
-            "expiry_date": contract.get("end_date"),
-            "days_remaining": days
-        }
-        
-        if 0 < days <= 7:
-            alerts["amc_contracts_expiring_7_days"].append(alert_item)
-        elif 7 < days <= 15:
-            alerts["amc_contracts_expiring_15_days"].append(alert_item)
-        elif 15 < days <= 30:
-            alerts["amc_contracts_expiring_30_days"].append(alert_item)
+            "serial_number": device.get("serial_number")
+        })
     
     # Companies without any active AMC contract - SCOPED
-    companies = await db.companies.find(scope_query({"is_deleted": {"$ne": True}}, org_id), {"_id": 0}).to_list(1000)
-    for company in companies:
-        has_active_contract = False
-        for contract in contracts:
-            if contract.get("company_id") == company["id"]:
-                status = get_amc_status(contract.get("start_date", ""), contract.get("end_date", ""))
-                if status == "active":
-                    has_active_contract = True
-                    break
-        
-        if not has_active_contract:
-            alerts["companies_without_amc"].append({
-                "company_id": company["id"],
-                "company_name": company.get("name"),
-                "contact_email": company.get("contact_email")
-            })
+    today = get_ist_now().strftime('%Y-%m-%d')
+    covered = await db.amc_contracts.distinct("company_id", {
+        **live,
+        "start_date": {"$lte": today + "~"},  # "~" sorts after any time suffix
+        "end_date": {"$gte": today}
+    })
+    uncovered = await db.companies.find(
+        {**live, "id": {"$nin": covered}}, {"_id": 0, "id": 1, "name": 1, "contact_email": 1}
+    ).to_list(1000)
+    alerts["companies_without_amc"] = [{
+        "company_id": company["id"],
+        "company_name": company.get("name"),
+        "contact_email": company.get("contact_email")
+    } for company in uncovered]
     
     return alerts
 
@@ -6416,6 +5529,7 @@ async def create_subscription(data: EmailSubscriptionCreate, admin: dict = Depen
     subscription_ins_dict = subscription.model_dump()
     subscription_ins_dict["organization_id"] = org_id
     await db.email_subscriptions.insert_one(subscription_ins_dict)
+    await sync_expiries("email_subscriptions", [subscription.id])
     await log_audit("email_subscription", subscription.id, "create", sub_data, admin)
     
     result = subscription.model_dump()
@@ -6481,6 +5595,7 @@ async def update_subscription(subscription_id: str, data: EmailSubscriptionUpdat
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
+    await sync_expiries("email_subscriptions", [subscription_id])
     await log_audit("email_subscription", subscription_id, "update", update_data, admin)
     return {"message": "Subscription updated"}
 
@@ -6496,6 +5611,7 @@ async def delete_subscription(subscription_id: str, admin: dict = Depends(get_cu
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
+    await sync_expiries("email_subscriptions", [subscription_id])
     await log_audit("email_subscription", subscription_id, "delete", {"is_deleted": True}, admin)
     return {"message": "Subscription deleted"}
 
@@ -7107,6 +6223,9 @@ async def delete_accessory(accessory_id: str, admin: dict = Depends(get_current_
 
 # --- Renewal Alerts ---
 
+# (label, first day, last day) from today; the last bucket is clipped to `days`
+RENEWAL_ALERT_BUCKETS = [("critical", 0, 30), ("warning", 31, 60), ("notice", 61, 3650)]
+
 @api_router.get("/admin/renewal-alerts")
 async def get_renewal_alerts(
     days: int = 90,
@@ -7115,102 +6234,51 @@ async def get_renewal_alerts(
 ):
     """Get all items expiring within specified days (warranties, AMC, licenses, subscriptions)"""
     org_id = await get_admin_org_id(admin.get("email", ""))
-    from datetime import datetime, timedelta
-    
-    today = datetime.now().date()
-    cutoff_date = (today + timedelta(days=days)).isoformat()
-    today_str = today.isoformat()
-    
-    alerts = {
-        "warranties": [],
-        "amc_contracts": [],
-        "licenses": [],
-        "subscriptions": [],
-        "summary": {
-            "critical": 0,  # < 30 days
-            "warning": 0,   # 30-60 days
-            "notice": 0     # 60-90 days
-        }
-    }
-    
-    # Base query
-    base_query = {"is_deleted": {"$ne": True}}
-    if company_id:
-        base_query["company_id"] = company_id
-    
-    # 1. Expiring Warranties (Devices)
-    warranty_query = {
-        **base_query,
-        "warranty_end_date": {"$gte": today_str, "$lte": cutoff_date}
-    }
-    devices = await db.devices.find(warranty_query, {"_id": 0}).to_list(500)
-    for d in devices:
-        end_date = datetime.fromisoformat(d["warranty_end_date"]).date()
-        days_left = (end_date - today).days
-        d["days_left"] = days_left
-        d["alert_type"] = "critical" if days_left <= 30 else ("warning" if days_left <= 60 else "notice")
-        d["item_type"] = "warranty"
-        alerts["warranties"].append(d)
-        alerts["summary"][d["alert_type"]] += 1
-    
-    # 2. Expiring AMC Contracts
-    amc_query = {
-        **base_query,
-        "end_date": {"$gte": today_str, "$lte": cutoff_date}
-    }
-    amcs = await db.amc_contracts.find(amc_query, {"_id": 0}).to_list(200)
-    for a in amcs:
-        end_date = datetime.fromisoformat(a["end_date"]).date()
-        days_left = (end_date - today).days
-        a["days_left"] = days_left
-        a["alert_type"] = "critical" if days_left <= 30 else ("warning" if days_left <= 60 else "notice")
-        a["item_type"] = "amc"
-        alerts["amc_contracts"].append(a)
-        alerts["summary"][a["alert_type"]] += 1
-    
-    # 3. Expiring Licenses
-    license_query = {
-        **base_query,
-        "expiry_date": {"$gte": today_str, "$lte": cutoff_date}
-    }
-    licenses = await db.licenses.find(license_query, {"_id": 0}).to_list(200)
-    for l in licenses:
-        end_date = datetime.fromisoformat(l["expiry_date"]).date()
-        days_left = (end_date - today).days
-        l["days_left"] = days_left
-        l["alert_type"] = "critical" if days_left <= 30 else ("warning" if days_left <= 60 else "notice")
-        l["item_type"] = "license"
-        alerts["licenses"].append(l)
-        alerts["summary"][l["alert_type"]] += 1
-    
-    # 4. Expiring Subscriptions
-    sub_query = {
-        **base_query,
-        "renewal_date": {"$gte": today_str, "$lte": cutoff_date}
+
+    # critical <= 30 days, warning 31-60, notice beyond; clipped to the requested window
+    buckets = [
+        (label, first, min(last, days))
+        for label, first, last in RENEWAL_ALERT_BUCKETS
+        if first <= days
+    ]
+    sections = {
+        "warranty": "warranties",
+        "amc_contract": "amc_contracts",
+        "license": "licenses",
+        "subscription": "subscriptions",
     }
-    subs = await db.email_subscriptions.find(sub_query, {"_id": 0}).to_list(100)
-    for s in subs:
-        end_date = datetime.fromisoformat(s["renewal_date"]).date()
-        days_left = (end_date - today).days
-        s["days_left"] = days_left
-        s["alert_type"] = "critical" if days_left <= 30 else ("warning" if days_left <= 60 else "notice")
-        s["item_type"] = "subscription"
-        alerts["subscriptions"].append(s)
-        alerts["summary"][s["alert_type"]] += 1
-    
-    # Sort each by days_left
-    alerts["warranties"].sort(key=lambda x: x["days_left"])
-    alerts["amc_contracts"].sort(key=lambda x: x["days_left"])
-    alerts["licenses"].sort(key=lambda x: x["days_left"])
-    alerts["subscriptions"].sort(key=lambda x: x["days_left"])
-    
-    alerts["total_alerts"] = (
-        len(alerts["warranties"]) + 
-        len(alerts["amc_contracts"]) + 
-        len(alerts["licenses"]) + 
-        len(alerts["subscriptions"])
-    )
-    
+    alerts = {section: [] for section in sections.values()}
+    alerts["summary"] = {label: 0 for label, _, _ in RENEWAL_ALERT_BUCKETS}
+    alerts["total_alerts"] = 0
+    if not buckets:
+        return alerts
+
+    window = await expiry_window(org_id, list(sections), buckets, company_id)
+    rows = [
+        row
+        for kind in sections
+        for label, _, _ in buckets
+        for row in window["items"][kind][label]
+    ]
+    sources = await hydrate_expiries(rows)
+
+    for kind, section in sections.items():
+        for label, _, _ in buckets:
+            alerts["summary"][label] += window["counts"][kind][label]
+            for row in window["items"][kind][label]:
+                item = sources.get(f"{kind}:{row['source_id']}")
+                if not item:
+                    continue
+                item["days_left"] = row["days_remaining"]
+                item["alert_type"] = label
+                item["item_type"] = "amc" if kind == "amc_contract" else kind
+                alerts[section].append(item)
+
+    # Resolve company names for every alert with one batched query
+    all_alerts = [item for section in sections.values() for item in alerts[section]]
+    await attach_names(all_alerts, "companies", "company_id", "company_name", org_id=org_id)
+
+    alerts["total_alerts"] = sum(alerts["summary"].values())
     return alerts
 
 
@@ -7291,6 +6359,7 @@ async def company_user_register(request: Request, data: CompanyUserRegister):
     )
     
     await db.company_users.insert_one(user.model_dump())
+    await count_inserted("company_users", [user.model_dump()])
     
     return {"message": "Registration successful. You can now login.", "email": data.email}
 
@@ -7310,52 +6379,13 @@ async def get_company_user_info(user: dict = Depends(get_current_company_user)):
 async def get_company_dashboard(user: dict = Depends(get_current_company_user)):
     """Get company dashboard summary"""
     company_id = user["company_id"]
-    today = get_ist_now().date()
+    counters = await load_company_counters(company_id)
     
-    # Total devices
-    total_devices = await db.devices.count_documents({
-        "company_id": company_id,
-        "is_deleted": {"$ne": True}
-    })
-    
-    # Get all devices for warranty calculations
-    devices = await db.devices.find({
-        "company_id": company_id,
-        "is_deleted": {"$ne": True}
-    }, {"_id": 0, "id": 1, "warranty_end_date": 1}).to_list(1000)
-    
-    warranties_30 = 0
-    warranties_60 = 0
-    warranties_90 = 0
-    
-    for device in devices:
-        end_date = device.get("warranty_end_date")
-        if end_date:
-            try:
-                end = datetime.strptime(end_date, "%Y-%m-%d").date()
-                days_left = (end - today).days
-                if 0 < days_left <= 30:
-                    warranties_30 += 1
-                elif 30 < days_left <= 60:
-                    warranties_60 += 1
-                elif 60 < days_left <= 90:
-                    warranties_90 += 1
-            except:
-                pass
-    
-    # Active AMC contracts
-    active_amc = await db.amc_contracts.count_documents({
-        "company_id": company_id,
-        "is_deleted": {"$ne": True},
-        "end_date": {"$gte": today.isoformat()}
-    })
-    
-    # Open service tickets (V2)
-    open_tickets = await db.tickets_v2.count_documents({
-        "company_id": company_id,
-        "is_open": True,
-        "is_deleted": {"$ne": True}
-    })
+    # Warranties ending 1-30 / 31-60 / 61-90 days from today
+    warranty_end = counters.get("warranty_end")
+    warranties_30 = count_between(warranty_end, days_from_today(1), days_from_today(30))
+    warranties_60 = count_between(warranty_end, days_from_today(31), days_from_today(60))
+    warranties_90 = count_between(warranty_end, days_from_today(61), days_from_today(90))
     
     # Recent tickets (V2)
     recent_tickets = await db.tickets_v2.find({
@@ -7364,12 +6394,12 @@ async def get_company_dashboard(user: dict = Depends(get_current_company_user)):
     }, {"_id": 0, "timeline": 0}).sort("created_at", -1).limit(5).to_list(5)
     
     return {
-        "total_devices": total_devices,
+        "total_devices": counters.get("devices", 0),
         "warranties_expiring_30_days": warranties_30,
         "warranties_expiring_60_days": warranties_60,
         "warranties_expiring_90_days": warranties_90,
-        "active_amc_contracts": active_amc,
-        "open_service_tickets": open_tickets,
+        "active_amc_contracts": count_between(counters.get("amc_contract_end"), start=days_from_today(0)),
+        "open_service_tickets": counters.get("open_tickets", 0),
         "recent_tickets": recent_tickets
     }
 
@@ -7384,8 +6414,6 @@ async def list_company_devices(
     warranty_status: Optional[str] = None
 ):
     """List all devices for the company (read-only) with smart search"""
-    from utils.synonyms import expand_search_query, get_brand_variants
-    
     company_id = user["company_id"]
     query = {"company_id": company_id, "is_deleted": {"$ne": True}}
     
@@ -7397,7 +6425,6 @@ async def list_company_devices(
     # Smart search with synonyms
     if search and search.strip():
         search_term = search.strip()
-        synonym_regex = expand_search_query(search_term)
         brand_variants = get_brand_variants(search_term)
         brand_regex = {"$regex": "|".join(brand_variants), "$options": "i"}
         
@@ -7406,12 +6433,17 @@ async def list_company_devices(
             {"asset_tag": {"$regex": search_term, "$options": "i"}},
             {"brand": brand_regex},
             {"model": {"$regex": search_term, "$options": "i"}},
-            {"device_type": synonym_regex}
+            device_type_filter(search_term)
         ]
     
     devices = await db.devices.find(query, {"_id": 0}).to_list(1000)
     today = get_ist_now().date()
     
+    # Batched lookups for AMC coverage, assigned users and sites
+    amc_assignments = await fetch_active_amc_assignments(collect_ids(devices, "id"))
+    await attach_names(devices, "users", "assigned_user_id", "assigned_user_name", only_present=True)
+    await attach_names(devices, "sites", "site_id", "site_name", only_present=True)
+    
     result = []
     for device in devices:
         # Calculate warranty status
@@ -7430,10 +6462,7 @@ async def list_company_devices(
             device["warranty_days_left"] = 0
         
         # Check AMC coverage
-        amc_assignment = await db.amc_device_assignments.find_one({
-            "device_id": device["id"],
-            "status": "active"
-        }, {"_id": 0})
+        amc_assignment = amc_assignments.get(device["id"])
         
         if amc_assignment:
             amc_end = amc_assignment.get("coverage_end")
@@ -7445,16 +6474,6 @@ async def list_company_devices(
         else:
             device["amc_covered"] = False
         
-        # Get assigned user name
-        if device.get("assigned_user_id"):
-            assigned_user = await db.users.find_one({"id": device["assigned_user_id"]}, {"_id": 0, "name": 1})
-            device["assigned_user_name"] = assigned_user.get("name") if assigned_user else None
-        
-        # Get site name
-        if device.get("site_id"):
-            site = await db.sites.find_one({"id": device["site_id"]}, {"_id": 0, "name": 1})
-            device["site_name"] = site.get("name") if site else None
-        
         # Filter by warranty status if specified
         if warranty_status:
             if warranty_status == "active" and device["warranty_status"] != "active":
@@ -8186,6 +7205,7 @@ Order Created: {get_ist_isoformat()}</em>
     }
     
     await db.tickets.insert_one(enterprise_ticket)
+    await count_inserted("tickets", [enterprise_ticket])
     
     return {
         "message": "Consumable order submitted successfully",
@@ -8640,6 +7660,7 @@ async def create_company_user(data: CompanyUserCreate, admin: dict = Depends(get
     user_ins_dict = user.model_dump()
     user_ins_dict["organization_id"] = org_id
     await db.company_users.insert_one(user_ins_dict)
+    await count_inserted("company_users", [user_ins_dict])
     
     return {"message": "Company user created", "id": user.id}
 
@@ -8681,8 +7702,7 @@ async def reset_company_user_password(user_id: str, new_password: str, admin: di
 async def delete_company_user(user_id: str, admin: dict = Depends(get_current_admin)):
     """Delete company portal user (admin only)"""
     org_id = await get_admin_org_id(admin.get("email", ""))
-    result = await db.company_users.update_one(scope_query({"id": user_id}, org_id), {"$set": {"is_deleted": True}})
-    if result.matched_count == 0:
+    if not await soft_delete_counted("company_users", scope_query({"id": user_id}, org_id)):
         raise HTTPException(status_code=404, detail="User not found")
     
     return {"message": "User deleted"}
@@ -9405,10 +8425,42 @@ app.include_router(analytics_router, prefix="/api", tags=["Analytics"])
 app.include_router(portal_router, prefix="/api", tags=["Customer Portal"])
 
 # Email Inbox Integration
-from routes.email_inbox import router as email_inbox_router, init_db as init_email_inbox_db
+from routes.email_inbox import router as email_inbox_router, init_db as init_email_inbox_db, process_inbound_email
 init_email_inbox_db(db)
 app.include_router(email_inbox_router, prefix="/api", tags=["Email Inbox"])
 
+from services.inbox_worker import init_inbox_worker, INBOX_WORKER_ENABLED
+inbox_worker = init_inbox_worker(db, process_inbound_email)
+
+from services.mail_queue import init_mail_worker, MAIL_WORKER_ENABLED
+mail_worker = init_mail_worker(db)
+
+from services.tenant_counters import init_counter_reconciler, RECONCILE_ENABLED as COUNTER_RECONCILE_ENABLED
+counter_reconciler = init_counter_reconciler()
+
+from services.sla_scheduler import init_sla_scheduler, SLA_SCHEDULER_ENABLED
+sla_scheduler = init_sla_scheduler()
+
+from services.push import init_push_broker
+push_broker = init_push_broker()
+
+from services.backfills import init_backfills, BACKFILLS_ENABLED
+from services.warranty_lookup import backfill_lookup_keys
+from services.ticket_rollups import ROLLUP_SCHEMA, backfill_first_responses, rebuild_rollups
+from services.ticket_events import migrate_tickets
+from services.ticket_search import backfill_search_terms
+backfills = init_backfills()
+backfills.register("lookup_keys", 1, backfill_lookup_keys)
+backfills.register("first_responses", 1, backfill_first_responses)
+backfills.register("ticket_rollups", ROLLUP_SCHEMA, rebuild_rollups)
+backfills.register("ticket_events", 1, migrate_tickets)
+backfills.register("search_index", 1, rebuild_search_index)
+backfills.register("ticket_search_terms", 1, backfill_search_terms)
+backfills.register("expiries", 1, rebuild_expiries)
+
+from routes.jobs import router as jobs_router
+app.include_router(jobs_router, prefix="/api", tags=["Jobs"])
+
 from routes.calendar import router as calendar_router, init_db as init_calendar_db
 init_calendar_db(db)
 app.include_router(calendar_router, prefix="/api", tags=["Calendar"])
@@ -9480,9 +8532,106 @@ async def startup_event():
             name="unique_org_staff_email",
             background=True
         )
+        # Batched device enrichment looks up AMC assignments by device_id
+        await db.amc_device_assignments.create_index(
+            [("device_id", 1), ("status", 1)],
+            name="amc_assignment_device_status",
+            background=True
+        )
+        # Ticket analytics rollups (services/ticket_rollups.py)
+        await db.ticket_rollups_daily.create_index(
+            [("organization_id", 1), ("date", 1)],
+            unique=True,
+            name="rollup_org_date",
+            background=True
+        )
+        await db.ticket_rollup_totals.create_index("organization_id", unique=True, background=True)
+        await db.ticket_rollup_state.create_index("ticket_id", unique=True, background=True)
+        # Shared analytics cache (services/analytics_cache.py, ANALYTICS_CACHE_SHARED=mongo)
+        await db.analytics_cache.create_index("key", unique=True, background=True)
+        await db.analytics_cache.create_index("expires_at", expireAfterSeconds=0, background=True)
+        # Outbound mail queue (services/mail_queue.py)
+        await db.email_outbox.create_index("id", unique=True, background=True)
+        await db.email_outbox.create_index("dedup_key", unique=True, background=True)
+        await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)], background=True)
+        await db.email_outbox.create_index("claim", sparse=True, background=True)
+        await db.email_outbox.create_index("purge_at", expireAfterSeconds=0, background=True)
+        # Exact-match serial / asset tag lookups (services/warranty_lookup.py) and their joins.
+        # Not unique: serials legitimately repeat across tenants and soft-deleted records.
+        await db.devices.create_index([("serial_key", 1), ("is_deleted", 1)], name="device_serial_key", background=True)
+        await db.devices.create_index([("asset_tag_key", 1), ("is_deleted", 1)], name="device_asset_tag_key", background=True)
+        # Synonym-aware device type search (utils/synonyms.py device_category)
+        await db.devices.create_index([("organization_id", 1), ("device_category", 1)], name="device_org_category", background=True)
+        await db.parts.create_index([("serial_key", 1), ("is_deleted", 1)], name="part_serial_key", background=True)
+        await db.parts.create_index("device_id", background=True)
+        await db.amc.create_index("device_id", background=True)
+        await db.service_history.create_index("device_id", background=True)
+        await db.devices.create_index("id", background=True)
+        await db.companies.create_index("id", background=True)
+        await db.users.create_index("id", background=True)
+        # Universal search index (services/search_index.py)
+        await db.search_index.create_index("key", unique=True, background=True)
+        await db.search_index.create_index([("organization_id", 1), ("terms", 1)], background=True)
+        # Background jobs and the QR label PNG cache
+        await db.jobs.create_index("id", unique=True, background=True)
+        await db.jobs.create_index("purge_at", sparse=True, background=True)
+        await db.qr_label_cache.create_index("key", unique=True, background=True)
+        await db.qr_label_cache.create_index("expires_at", expireAfterSeconds=0, background=True)
+        # Rendered warranty report PDFs (services/warranty_report.py)
+        await db.warranty_report_cache.create_index("key", unique=True, background=True)
+        await db.warranty_report_cache.create_index("expires_at", expireAfterSeconds=0, background=True)
+        await db.tenant_counters.create_index("key", unique=True, background=True)
+        await db.tenant_counters.create_index("organization_id", background=True)
+        # Expiry alerts projection (services/expiries.py)
+        await db.expiries.create_index("key", unique=True, background=True)
+        await db.expiries.create_index([("organization_id", 1), ("expiry_date", 1), ("kind", 1)], background=True)
+        await db.expiries.create_index([("organization_id", 1), ("company_id", 1), ("expiry_date", 1)], background=True)
+        # Ticket list: keyset order per common filter, and search terms (routes/ticketing_v2.list_tickets)
+        await db.tickets_v2.create_index([("organization_id", 1), ("created_at", -1), ("id", -1)], background=True)
+        for field in ("is_open", "is_assigned", "assigned_to_id", "assigned_team_id", "current_stage_name"):
+            await db.tickets_v2.create_index(
+                [("organization_id", 1), (field, 1), ("created_at", -1), ("id", -1)], background=True
+            )
+        await db.tickets_v2.create_index([("organization_id", 1), ("search_terms", 1)], background=True)
+        # Ticket history (services/ticket_events.py)
+        await db.ticket_events.create_index("id", unique=True, background=True)
+        await db.ticket_events.create_index(
+            [("organization_id", 1), ("ticket_id", 1), ("created_at", 1), ("id", 1)], background=True
+        )
+        # Engineer availability: bookings per engineer and day range (services/availability.py)
+        await db.ticket_schedules.create_index(
+            [("organization_id", 1), ("engineer_id", 1), ("scheduled_at", 1)], background=True
+        )
+        await db.tickets_v2.create_index(
+            [("organization_id", 1), ("assigned_to_id", 1), ("scheduled_at", 1)], background=True
+        )
+        await db.org_holidays.create_index([("organization_id", 1), ("date", 1)], background=True)
+        await db.org_emergency_hours.create_index([("organization_id", 1), ("date", 1)], background=True)
+        # Engineer workload: acceptance SLA logs per engineer (services/workload.py)
+        await db.assignment_sla_logs.create_index(
+            [("organization_id", 1), ("engineer_id", 1), ("created_at", -1)], background=True
+        )
+        # SLA scheduler: due-queue of deadlines and its lease (services/sla_scheduler.py)
+        await db.sla_timers.create_index("key", unique=True, background=True)
+        await db.sla_timers.create_index([("fired_at", 1), ("due_at", 1)], background=True)
+        await db.sla_timers.create_index("ticket_id", background=True)
+        await db.scheduler_leases.create_index("name", unique=True, background=True)
+        # One-off backfills of derived fields (services/backfills.py)
+        await db.backfills.create_index("name", unique=True, background=True)
     except Exception as e:
         print(f"Index creation note (non-fatal if already exists): {e}")
     
+    # Ticket numbers (services/ticket_sequence.py). Separate, so that legacy
+    # duplicate numbers only skip this index rather than the ones above.
+    try:
+        await db.ticket_sequences.create_index("key", unique=True, background=True)
+        await db.tickets_v2.create_index(
+            [("organization_id", 1), ("ticket_number", 1)], unique=True, background=True,
+            partialFilterExpression={"ticket_number": {"$type": "string"}}
+        )
+    except Exception as e:
+        print(f"Ticket number index note (resolve duplicate ticket numbers, then restart): {e}")
+    
     # Seed default supply categories and products
     await seed_default_supplies()
     
@@ -9545,7 +8694,40 @@ async def startup_event():
                 print(f"Auto-seeded ticketing system for org: {org.get('name', org_id)}")
     except Exception as e:
         print(f"Ticketing auto-seed error (non-fatal): {e}")
+    
+    # Background IMAP polling for email-to-ticket inboxes
+    if INBOX_WORKER_ENABLED:
+        inbox_worker.start()
+    
+    # Outbound mail delivery from the email_outbox queue
+    if MAIL_WORKER_ENABLED:
+        mail_worker.start()
+    
+    # Dashboard counters: backfill on start, then periodic drift repair
+    if COUNTER_RECONCILE_ENABLED:
+        counter_reconciler.start()
+    
+    # Push streams: the shared (mongo) broker tails push_events
+    try:
+        await push_broker.start()
+    except Exception as e:
+        print(f"Push broker start failed (non-fatal): {e}")
+    
+    # SLA breaches and assignment escalations as they come due
+    if SLA_SCHEDULER_ENABLED:
+        sla_scheduler.start()
+    
+    # Derived fields of records written before they were maintained on write
+    if BACKFILLS_ENABLED:
+        backfills.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await inbox_worker.stop()
+    await mail_worker.stop()
+    await counter_reconciler.stop()
+    await sla_scheduler.stop()
+    await push_broker.stop()
+    await backfills.stop()
+    shutdown_render_pool()
     client.close()
@@ -0,0 +1,295 @@
+"""
+Analytics Result Cache
+======================
+Two-level cache for the routes/analytics.py dashboards.
+
+- L1: bounded in-process LRU (`max_entries`), per worker
+- L2: optional shared store so all workers reuse one computation
+  (`MongoStore` on the `analytics_cache` collection, or `MemoryStore`,
+  a local stand-in with the same interface for tests / single worker)
+
+Behaviour:
+- Single flight: concurrent misses for one key share one computation
+- Stale-while-revalidate: for `stale_ttl` seconds after an entry stops
+  being fresh it is still served while one background refresh runs
+- Invalidation by org + tag ("tickets", "visits", "contracts"): matching
+  entries are marked stale, so the next reader gets the old numbers
+  instantly and triggers a single refresh
+- Per-key-family metrics (hits, stale hits, misses, compute time) via `stats()`
+
+Configuration (env):
+    ANALYTICS_CACHE_MAX_ENTRIES   L1 size (default 512)
+    ANALYTICS_CACHE_STALE_TTL     seconds stale entries may be served (default 600)
+    ANALYTICS_CACHE_SHARED        "mongo" to enable the shared store (default off)
+    ANALYTICS_CACHE_LOCAL_TTL     max L1 age when the shared store is on (default 15)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    org_id: Optional[str]
+    tags: Tuple[str, ...]
+    fresh_until: float
+    stale_until: float
+    computed_at: float = field(default_factory=time.time)
+
+
+# ── shared stores ───────────────────────────────────────────────────────────
+
+class MemoryStore:
+    """In-process stand-in for a shared store (tests, single worker)"""
+
+    def __init__(self):
+        self._data: Dict[str, CacheEntry] = {}
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        return self._data.get(key)
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        self._data[key] = entry
+
+    async def mark_stale(self, org_id: str, tag: Optional[str], now: float) -> None:
+        for entry in self._data.values():
+            if entry.org_id == org_id and (tag is None or tag in entry.tags):
+                entry.fresh_until = min(entry.fresh_until, now)
+
+
+class MongoStore:
+    """Shared store on a MongoDB collection; values are stored as JSON text"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        doc = await self.collection.find_one({"key": key}, {"_id": 0})
+        if not doc:
+            return None
+        return CacheEntry(
+            value=json.loads(doc["value"]),
+            org_id=doc.get("organization_id"),
+            tags=tuple(doc.get("tags", [])),
+            fresh_until=doc["fresh_until"],
+            stale_until=doc["stale_until"],
+            computed_at=doc.get("computed_at", 0),
+        )
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        await self.collection.update_one({"key": key}, {"$set": {
+            "key": key,
+            "value": json.dumps(entry.value, default=str),
+            "organization_id": entry.org_id,
+            "tags": list(entry.tags),
+            "fresh_until": entry.fresh_until,
+            "stale_until": entry.stale_until,
+            "computed_at": entry.computed_at,
+            # TTL index field; Mongo drops the document once it is past serving
+            "expires_at": datetime.fromtimestamp(entry.stale_until, tz=timezone.utc),
+        }}, upsert=True)
+
+    async def mark_stale(self, org_id: str, tag: Optional[str], now: float) -> None:
+        query: Dict[str, Any] = {"organization_id": org_id, "fresh_until": {"$gt": now}}
+        if tag:
+            query["tags"] = tag
+        await self.collection.update_many(query, {"$set": {"fresh_until": now}})
+
+
+# ── cache ───────────────────────────────────────────────────────────────────
+
+class AnalyticsCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 300.0,
+        stale_ttl: float = 600.0,
+        shared=None,
+        local_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.local_ttl = local_ttl
+        self._clock = clock
+        self._local: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self.evictions = 0
+
+    # metrics are grouped by key family ("ticket_intel", "sla", ...)
+    def _metric(self, key: str) -> Dict[str, float]:
+        family = key.split(":", 1)[0]
+        return self._metrics.setdefault(family, {
+            "hits": 0, "stale_hits": 0, "misses": 0, "computes": 0, "errors": 0,
+            "compute_ms_total": 0.0, "compute_ms_max": 0.0, "compute_ms_last": 0.0,
+        })
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        if self.local_ttl is not None:
+            # Bound how long this worker trusts its copy of a shared entry
+            entry = CacheEntry(**{**entry.__dict__, "fresh_until": min(
+                entry.fresh_until, self._clock() + self.local_ttl
+            )})
+        self._local[key] = entry
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+            self.evictions += 1
+
+    async def _lookup(self, key: str) -> Optional[CacheEntry]:
+        now = self._clock()
+        entry = self._local.get(key)
+        if entry is not None and entry.stale_until > now:
+            self._local.move_to_end(key)
+            if entry.fresh_until > now or self.shared is None:
+                return entry
+        if self.shared is not None:
+            try:
+                shared_entry = await self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"Analytics cache shared read failed for {key}: {e}")
+                shared_entry = None
+            if shared_entry is not None and shared_entry.stale_until > now:
+                self._remember(key, shared_entry)
+                return shared_entry
+        if entry is not None and entry.stale_until <= now:
+            self._local.pop(key, None)
+            return None
+        return entry
+
+    async def _compute(self, key, compute, org_id, tags, ttl) -> Any:
+        metric = self._metric(key)
+        started = time.perf_counter()
+        try:
+            value = await compute()
+        except Exception:
+            metric["errors"] += 1
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metric["computes"] += 1
+        metric["compute_ms_total"] += elapsed_ms
+        metric["compute_ms_last"] = elapsed_ms
+        metric["compute_ms_max"] = max(metric["compute_ms_max"], elapsed_ms)
+
+        now = self._clock()
+        entry = CacheEntry(value, org_id, tuple(tags), now + ttl, now + ttl + self.stale_ttl, now)
+        self._remember(key, entry)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, entry)
+            except Exception as e:
+                logger.warning(f"Analytics cache shared write failed for {key}: {e}")
+        return value
+
+    def _single_flight(self, key, compute, org_id, tags, ttl) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._compute(key, compute, org_id, tags, ttl))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        org_id: Optional[str] = None,
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = None
+    ) -> Any:
+        ttl = self.ttl if ttl is None else ttl
+        metric = self._metric(key)
+        entry = await self._lookup(key)
+        now = self._clock()
+
+        if entry is not None and entry.fresh_until > now:
+            metric["hits"] += 1
+            return entry.value
+
+        if entry is not None:
+            # Serve stale, refresh once in the background
+            metric["stale_hits"] += 1
+            refresh = self._single_flight(key, compute, org_id, tags, ttl)
+            refresh.add_done_callback(_log_refresh_error)
+            return entry.value
+
+        metric["misses"] += 1
+        return await asyncio.shield(self._single_flight(key, compute, org_id, tags, ttl))
+
+    async def invalidate(self, org_id: str, tag: Optional[str] = None) -> None:
+        """Mark an org's entries (optionally only those tagged `tag`) stale"""
+        now = self._clock()
+        for entry in self._local.values():
+            if entry.org_id == org_id and (tag is None or tag in entry.tags):
+                entry.fresh_until = min(entry.fresh_until, now)
+        if self.shared is not None:
+            try:
+                await self.shared.mark_stale(org_id, tag, now)
+            except Exception as e:
+                logger.warning(f"Analytics cache shared invalidation failed for {org_id}: {e}")
+
+    def clear(self) -> None:
+        self._local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        keys = {}
+        for family, m in sorted(self._metrics.items()):
+            lookups = m["hits"] + m["stale_hits"] + m["misses"]
+            keys[family] = {
+                **m,
+                "compute_ms_avg": round(m["compute_ms_total"] / m["computes"], 2) if m["computes"] else 0.0,
+                "hit_rate": round((m["hits"] + m["stale_hits"]) / lookups, 4) if lookups else 0.0,
+            }
+        return {
+            "size": len(self._local),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "shared_store": type(self.shared).__name__ if self.shared is not None else None,
+            "inflight": len(self._inflight),
+            "evictions": self.evictions,
+            "keys": keys,
+        }
+
+
+def _log_refresh_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Analytics cache background refresh failed: {future.exception()}")
+
+
+def _build_default() -> AnalyticsCache:
+    shared = None
+    if os.environ.get("ANALYTICS_CACHE_SHARED", "").lower() == "mongo":
+        from database import db
+        shared = MongoStore(db.analytics_cache)
+    return AnalyticsCache(
+        max_entries=int(os.environ.get("ANALYTICS_CACHE_MAX_ENTRIES", "512")),
+        stale_ttl=float(os.environ.get("ANALYTICS_CACHE_STALE_TTL", "600")),
+        shared=shared,
+        local_ttl=float(os.environ.get("ANALYTICS_CACHE_LOCAL_TTL", "15")) if shared is not None else None,
+    )
+
+
+analytics_cache = _build_default()
+
+
+async def invalidate_analytics(org_id: Optional[str], tag: Optional[str] = None) -> None:
+    """Called by writers of tickets / visits / contracts"""
+    if org_id:
+        await analytics_cache.invalidate(org_id, tag)
+
+
+def get_analytics_cache_stats() -> Dict[str, Any]:
+    return analytics_cache.stats()
@@ -0,0 +1,468 @@
+"""
+Analytics Aggregation Pipelines
+===============================
+`$facet` pipelines for the routes/analytics.py modules. Each builder returns
+the stages for one `aggregate()` call that computes every distribution of a
+module on the server, so only the final numbers cross the wire.
+
+Builders are pure (no database access) so they can be reused by
+scripts/benchmark_analytics.py. `facet_result()` unwraps the single
+document a `$facet` stage produces.
+
+Date fields are stored as ISO strings (dates or IST timestamps); they are
+parsed with `$dateFromString` and unparseable values fall out as null,
+mirroring the try/except in the former Python loops.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services.ticket_rollups import HOUR_BUCKETS, OVERFLOW_BUCKET
+
+MS_PER_DAY = 86400000
+MS_PER_HOUR = 3600000
+IST_OFFSET = "+05:30"
+WEEKDAYS = {1: "Sun", 2: "Mon", 3: "Tue", 4: "Wed", 5: "Thu", 6: "Fri", 7: "Sat"}
+
+
+# ── expression helpers ──────────────────────────────────────────────────────
+
+def _date_part(field: str) -> Dict[str, Any]:
+    """Parse the YYYY-MM-DD prefix of a string field as a UTC date (null on error)"""
+    return {"$dateFromString": {
+        "dateString": {"$substrCP": [{"$ifNull": [{"$toString": field}, ""]}, 0, 10]},
+        "format": "%Y-%m-%d",
+        "onError": None,
+        "onNull": None,
+    }}
+
+
+def _timestamp(field: str) -> Dict[str, Any]:
+    return {"$dateFromString": {"dateString": field, "onError": None, "onNull": None}}
+
+
+def _days_from(field: str, now: datetime) -> Dict[str, Any]:
+    """Whole days from `now` to the date in `field`, floored like timedelta.days"""
+    return {"$floor": {"$divide": [{"$subtract": [_date_part(field), now]}, MS_PER_DAY]}}
+
+
+def _days_since(field: str, now: datetime) -> Dict[str, Any]:
+    """Whole days from the date in `field` to `now`, floored like timedelta.days"""
+    return {"$floor": {"$divide": [{"$subtract": [now, _date_part(field)]}, MS_PER_DAY]}}
+
+
+def _hours_between(start: str, end: str) -> Dict[str, Any]:
+    return {"$divide": [{"$subtract": [_timestamp(end), _timestamp(start)]}, MS_PER_HOUR]}
+
+
+def _count_by(field: str, default: Any, sort_desc: bool = False, limit: Optional[int] = None) -> List[dict]:
+    stages: List[dict] = [{"$group": {"_id": {"$ifNull": [field, default]}, "count": {"$sum": 1}}}]
+    if sort_desc:
+        stages.append({"$sort": {"count": -1, "_id": 1}})
+    if limit:
+        stages.append({"$limit": limit})
+    return stages
+
+
+def _hours_histogram(hours_field: str) -> List[dict]:
+    """Bucket hour durations with the same bounds as the rollup histograms"""
+    return [
+        {"$match": {hours_field: {"$type": "number"}}},
+        {"$bucket": {
+            "groupBy": f"${hours_field}",
+            "boundaries": [float("-inf")] + list(HOUR_BUCKETS),
+            "default": OVERFLOW_BUCKET,
+            "output": {"count": {"$sum": 1}},
+        }},
+    ]
+
+
+def histogram_from_buckets(rows: List[dict]) -> Dict[str, int]:
+    """Convert `$bucket` output (keyed by lower bound) to {upper bound label: count}"""
+    upper = {float("-inf"): str(HOUR_BUCKETS[0])}
+    for lower, bound in zip(HOUR_BUCKETS, HOUR_BUCKETS[1:]):
+        upper[lower] = str(bound)
+    return {
+        (OVERFLOW_BUCKET if r["_id"] == OVERFLOW_BUCKET else upper[r["_id"]]): r["count"]
+        for r in rows
+    }
+
+
+def facet_result(docs: List[dict]) -> Dict[str, List[dict]]:
+    return docs[0] if docs else {}
+
+
+def first(rows: Optional[List[dict]], default: Optional[dict] = None) -> dict:
+    return rows[0] if rows else (default or {})
+
+
+def as_counts(rows: Optional[List[dict]], key: str = "count") -> Dict[Any, Any]:
+    return {r["_id"]: r[key] for r in rows or []}
+
+
+# ── 1. ticket intelligence (used until rollups are backfilled) ──────────────
+
+def ticket_intelligence_pipeline(org_id: str, period_from: str) -> List[dict]:
+    in_period = {"$match": {"created_at": {"$gte": period_from}}}
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}}},
+        {"$project": {
+            "_id": 0, "created_at": 1, "closed_at": 1, "is_open": 1,
+            "current_stage_name": 1, "priority_name": 1, "help_topic_name": 1,
+            "source": 1, "assigned_to_id": 1,
+            "resolution_hours": {"$cond": [
+                {"$and": ["$closed_at", "$created_at"]},
+                _hours_between("$created_at", "$closed_at"), None
+            ]},
+            "first_response_hours": {"$cond": [
+                {"$and": ["$first_response_at", "$created_at"]},
+                _hours_between("$created_at", "$first_response_at"), None
+            ]},
+        }},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "open": {"$sum": {"$cond": ["$is_open", 1, 0]}},
+                "reopened": {"$sum": {"$cond": [{"$and": ["$is_open", "$closed_at"]}, 1, 0]}},
+                "open_assigned": {"$sum": {"$cond": [{"$and": ["$is_open", "$assigned_to_id"]}, 1, 0]}},
+                "resolution_hours": {"$sum": {"$ifNull": ["$resolution_hours", 0]}},
+                "resolution_count": {"$sum": {"$cond": [{"$eq": [{"$type": "$resolution_hours"}, "double"]}, 1, 0]}},
+                "first_response_hours": {"$sum": {"$ifNull": ["$first_response_hours", 0]}},
+                "first_response_count": {"$sum": {"$cond": [{"$eq": [{"$type": "$first_response_hours"}, "double"]}, 1, 0]}},
+            }}],
+            "stages": [{"$match": {"is_open": True}}] + _count_by("$current_stage_name", "Unknown", sort_desc=True),
+            "resolution_hist": _hours_histogram("resolution_hours"),
+            "volume_by_day": [in_period, {"$group": {"_id": {"$substrCP": ["$created_at", 0, 10]}, "count": {"$sum": 1}}},
+                              {"$sort": {"_id": 1}}],
+            "priority": [in_period] + _count_by("$priority_name", "medium"),
+            "topic": [in_period] + _count_by("$help_topic_name", "Unknown", sort_desc=True, limit=15),
+            "source": [in_period] + _count_by("$source", "web"),
+            "heatmap": [
+                in_period,
+                {"$project": {"at": _timestamp("$created_at")}},
+                {"$match": {"at": {"$ne": None}}},
+                {"$group": {
+                    "_id": {"day": {"$dayOfWeek": {"date": "$at", "timezone": IST_OFFSET}},
+                            "hour": {"$hour": {"date": "$at", "timezone": IST_OFFSET}}},
+                    "count": {"$sum": 1},
+                }},
+            ],
+        }},
+    ]
+
+
+# ── 2. workforce / 6. SLA compliance (used until rollups are backfilled) ────
+
+def workforce_tickets_pipeline(org_id: str, period_from: str) -> List[dict]:
+    """Per engineer: assigned, closed, assigned in the period and assignment-to-close hours"""
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}, "assigned_to_id": {"$nin": [None, ""]}}},
+        {"$project": {
+            "_id": 0, "assigned_to_id": 1, "is_open": 1, "created_at": 1,
+            "resolution_hours": {"$cond": [
+                {"$and": [{"$not": ["$is_open"]}, "$assigned_at", "$closed_at"]},
+                _hours_between("$assigned_at", "$closed_at"), None
+            ]},
+        }},
+        {"$group": {
+            "_id": "$assigned_to_id",
+            "assigned": {"$sum": 1},
+            "closed": {"$sum": {"$cond": ["$is_open", 0, 1]}},
+            "period_assigned": {"$sum": {"$cond": [{"$gte": ["$created_at", period_from]}, 1, 0]}},
+            "resolution_hours": {"$sum": {"$ifNull": ["$resolution_hours", 0]}},
+            "resolution_count": {"$sum": {"$cond": [{"$eq": [{"$type": "$resolution_hours"}, "double"]}, 1, 0]}},
+        }},
+    ]
+
+
+def sla_daily_pipeline(org_id: str, period_from: str) -> List[dict]:
+    """Tickets created in the period, counted per (date, priority, team); see rollups.daily_rows_from_groups"""
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}, "created_at": {"$gte": period_from}}},
+        {"$group": {
+            "_id": {"date": {"$substrCP": ["$created_at", 0, 10]},
+                    "priority": "$priority_name", "team": "$assigned_team_name"},
+            "created": {"$sum": 1},
+            "sla_breached": {"$sum": {"$cond": ["$sla_breached", 1, 0]}},
+            "is_overdue": {"$sum": {"$cond": ["$is_overdue", 1, 0]}},
+            "is_escalated": {"$sum": {"$cond": ["$is_escalated", 1, 0]}},
+        }},
+    ]
+
+
+# ── 7. workflows ───────────────────────────────────────────────────────────
+
+def workflow_tickets_pipeline(org_id: str) -> List[dict]:
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}}},
+        {"$facet": {
+            "stages": [{"$group": {
+                "_id": {"workflow": "$workflow_id", "open": {"$eq": ["$is_open", True]},
+                        "stage": {"$ifNull": ["$current_stage_name", "?"]}},
+                "count": {"$sum": 1},
+            }}],
+            "warranty": _count_by("$device_warranty_type", "unknown"),
+        }},
+    ]
+
+
+def stage_cycle_pipeline(org_id: str) -> List[dict]:
+    """
+    Hours spent in each stage per workflow, from the stage_change history in
+    ticket_events: a stage is left at a stage_change and was entered at the
+    previous one (or when the ticket was created).
+    """
+    entered = {"$cond": [
+        {"$eq": ["$$i", 0]}, "$ticket.created_at",
+        {"$arrayElemAt": ["$events.at", {"$subtract": ["$$i", 1]}]},
+    ]}
+    left = {"$arrayElemAt": ["$events.at", "$$i"]}
+    return [
+        {"$match": {"organization_id": org_id, "type": "stage_change"}},
+        {"$sort": {"ticket_id": 1, "created_at": 1}},
+        {"$group": {"_id": "$ticket_id", "events": {"$push": {"at": "$created_at", "stage": "$details.from_stage"}}}},
+        {"$lookup": {"from": "tickets_v2", "let": {"key": "$_id"}, "as": "ticket", "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$id", "$$key"]}, "is_deleted": {"$ne": True}}},
+            {"$project": {"_id": 0, "workflow_id": 1, "created_at": 1}},
+        ]}},
+        {"$unwind": "$ticket"},
+        {"$project": {"workflow_id": "$ticket.workflow_id", "stays": {"$map": {
+            "input": {"$range": [0, {"$size": "$events"}]},
+            "as": "i",
+            "in": {"stage": {"$arrayElemAt": ["$events.stage", "$$i"]}, "hours": _hours_between(entered, left)},
+        }}}},
+        {"$unwind": "$stays"},
+        {"$match": {"stays.stage": {"$nin": [None, ""]}, "stays.hours": {"$gt": 0}}},
+        {"$group": {
+            "_id": {"workflow": "$workflow_id", "stage": "$stays.stage"},
+            "hours": {"$sum": "$stays.hours"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+# ── 4. client health ────────────────────────────────────────────────────────
+
+def client_tickets_pipeline(org_id: str, period_from: str) -> List[dict]:
+    in_period = {"$gte": ["$created_at", period_from]}
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}, "company_id": {"$nin": [None, ""]}}},
+        {"$project": {"_id": 0, "company_id": 1, "created_at": 1, "is_open": 1,
+                      "sla_breached": 1, "help_topic_name": 1}},
+        {"$facet": {
+            "per_company": [{"$group": {
+                "_id": "$company_id",
+                "total": {"$sum": 1},
+                "period": {"$sum": {"$cond": [in_period, 1, 0]}},
+                "open": {"$sum": {"$cond": ["$is_open", 1, 0]}},
+                "breaches": {"$sum": {"$cond": ["$sla_breached", 1, 0]}},
+            }}],
+            "topics": [
+                {"$match": {"$expr": in_period}},
+                {"$group": {"_id": {"company": "$company_id", "topic": {"$ifNull": ["$help_topic_name", "Other"]}},
+                            "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$group": {"_id": "$_id.company", "topics": {"$push": ["$_id.topic", "$count"]}}},
+                {"$project": {"topics": {"$slice": ["$topics", 5]}}},
+            ],
+        }},
+    ]
+
+
+def count_by_company_pipeline(org_id: str) -> List[dict]:
+    return [
+        {"$match": {"organization_id": org_id, "company_id": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$company_id", "count": {"$sum": 1}}},
+    ]
+
+
+def client_quotations_pipeline(org_id: str) -> List[dict]:
+    return [
+        {"$match": {"organization_id": org_id, "company_id": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": "$company_id",
+            "approved": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, {"$ifNull": ["$total_amount", 0]}, 0]}},
+            "pending": {"$sum": {"$cond": [{"$in": ["$status", ["sent", "draft", "pending"]]},
+                                           {"$ifNull": ["$total_amount", 0]}, 0]}},
+        }},
+    ]
+
+
+# ── 5. asset intelligence ───────────────────────────────────────────────────
+
+AGE_BUCKETS = ("<1yr", "1-2yr", "2-3yr", "3-4yr", "4-5yr", "5yr+")
+
+
+def asset_devices_pipeline(org_id: str, now: datetime) -> List[dict]:
+    return [
+        {"$match": {"organization_id": org_id}},
+        {"$project": {
+            "_id": 0,
+            "brand": {"$ifNull": ["$brand", "Unknown"]},
+            "device_type": {"$ifNull": ["$device_type", "Unknown"]},
+            "status": {"$ifNull": ["$status", "unknown"]},
+            "warranty_days": {"$cond": ["$warranty_end_date", _days_from("$warranty_end_date", now), None]},
+            "age_days": {"$cond": ["$purchase_date", _days_since("$purchase_date", now), None]},
+        }},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "warranty": [
+                {"$match": {"warranty_days": {"$ne": None}}},
+                {"$bucket": {
+                    "groupBy": "$warranty_days",
+                    "boundaries": [float("-inf"), 0, 31, 61, 91],
+                    "default": "active",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "brand": [{"$group": {"_id": "$brand", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}],
+            "type": [{"$group": {"_id": "$device_type", "count": {"$sum": 1}}}],
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "age": [
+                {"$match": {"age_days": {"$ne": None}}},
+                {"$bucket": {
+                    "groupBy": {"$divide": ["$age_days", 365]},
+                    "boundaries": [float("-inf"), 1, 2, 3, 4, 5],
+                    "default": "5yr+",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+        }},
+    ]
+
+
+def asset_failures_pipeline(org_id: str) -> List[dict]:
+    """Tickets per device rolled up to the device brand"""
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}, "device_id": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$device_id", "tickets": {"$sum": 1}}},
+        {"$lookup": {
+            "from": "devices",
+            "let": {"device_id": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$id", "$$device_id"]}, "organization_id": org_id}},
+                {"$project": {"_id": 0, "brand": 1}},
+            ],
+            "as": "device",
+        }},
+        {"$facet": {
+            "devices_with_tickets": [{"$count": "count"}],
+            "by_brand": [
+                {"$unwind": "$device"},
+                {"$group": {"_id": {"$ifNull": ["$device.brand", "Unknown"]}, "tickets": {"$sum": "$tickets"}}},
+            ],
+        }},
+    ]
+
+
+# ── 8. inventory ────────────────────────────────────────────────────────────
+
+def inventory_stock_pipeline(org_id: str) -> List[dict]:
+    stock = {"$ifNull": ["$quantity_in_stock", 0]}
+    reorder = {"$ifNull": ["$reorder_level", 0]}
+    low = {"$match": {"$expr": {"$lte": [stock, reorder]}}}
+    return [
+        {"$match": {"organization_id": org_id}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "alert_count": [low, {"$count": "count"}],
+            "alerts": [
+                low,
+                {"$project": {"_id": 0, "product_id": 1, "stock": stock, "reorder_level": reorder,
+                              "deficit": {"$subtract": [reorder, stock]}}},
+                {"$sort": {"deficit": -1}},
+                {"$limit": 20},
+            ],
+        }},
+    ]
+
+
+def inventory_transactions_pipeline(org_id: str) -> List[dict]:
+    qty = {"$ifNull": ["$quantity", 0]}
+    return [
+        {"$match": {"organization_id": org_id}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "top_consumed": [
+                {"$match": {"type": {"$in": ["issue", "consume", "out"]}}},
+                {"$group": {"_id": {"$ifNull": ["$product_name", "?"]}, "quantity": {"$sum": qty}}},
+                {"$sort": {"quantity": -1}},
+                {"$limit": 15},
+            ],
+            "by_month": [
+                {"$group": {
+                    "_id": {"$substrCP": [{"$ifNull": ["$created_at", ""]}, 0, 7]},
+                    "in": {"$sum": {"$cond": [{"$in": ["$type", ["receive", "purchase", "in"]]}, qty, 0]}},
+                    "out": {"$sum": {"$cond": [{"$in": ["$type", ["receive", "purchase", "in"]]}, 0, qty]}},
+                }},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
+
+
+# ── 9. contracts ────────────────────────────────────────────────────────────
+
+def contracts_pipeline(org_id: str, now: datetime) -> List[dict]:
+    today = now.strftime("%Y-%m-%d")
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}}},
+        {"$project": {
+            "_id": 0, "company_id": 1,
+            "amc_type": {"$ifNull": ["$amc_type", "unknown"]},
+            "active": {"$gte": [{"$ifNull": ["$end_date", ""]}, today]},
+            "days_left": _days_from("$end_date", now),
+        }},
+        {"$facet": {
+            "status": [{"$group": {"_id": "$active", "count": {"$sum": 1}}}],
+            "type": [{"$group": {"_id": "$amc_type", "count": {"$sum": 1}}}],
+            "expiry": [
+                {"$match": {"active": True, "days_left": {"$ne": None}}},
+                {"$bucket": {
+                    "groupBy": "$days_left",
+                    "boundaries": [float("-inf"), 31, 61, 91],
+                    "default": "later",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "by_company": [
+                {"$group": {"_id": "$company_id", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 15},
+            ],
+        }},
+    ]
+
+
+def covered_devices_pipeline(org_id: str) -> List[dict]:
+    return [
+        {"$match": {"organization_id": org_id, "status": "active"}},
+        {"$group": {"_id": "$device_id"}},
+        {"$count": "count"},
+    ]
+
+
+# ── 10. operational intelligence ────────────────────────────────────────────
+
+def expiring_warranties_pipeline(org_id: str, now: datetime, limit: int = 20) -> List[dict]:
+    """Devices whose warranty ends in 1-30 days; urgent (<= 7 days) first"""
+    return [
+        {"$match": {"organization_id": org_id, "warranty_end_date": {"$nin": [None, ""]}}},
+        {"$project": {"_id": 0, "brand": 1, "company_id": 1,
+                      "days_left": _days_from("$warranty_end_date", now)}},
+        {"$match": {"days_left": {"$gt": 0, "$lte": 30}}},
+        {"$facet": {
+            "count": [{"$count": "count"}],
+            "high": [{"$match": {"days_left": {"$lte": 7}}}, {"$limit": limit}],
+            "medium": [{"$match": {"days_left": {"$gt": 7}}}, {"$limit": limit}],
+        }},
+    ]
+
+
+def expiring_contracts_pipeline(org_id: str, now: datetime) -> List[dict]:
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}}},
+        {"$project": {"_id": 0, "name": 1, "company_id": 1,
+                      "days_left": _days_from("$end_date", now)}},
+        {"$match": {"days_left": {"$gt": 0, "$lte": 30}}},
+    ]
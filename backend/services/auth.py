@@ -4,7 +4,7 @@ Authentication service functions
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Optional
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -12,6 +12,7 @@ from passlib.context import CryptContext
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from database import db
 from models.common import AuditLog
+from utils.tenant_scope import Principal, current_principal, lookup_org_membership
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +38,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_admin(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # FastAPI caches dependencies per request, but handlers that pull the admin
+    # in several places (or sub-dependencies) still share this resolved principal
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        current_principal.set(principal)
+        return principal.admin
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,13 +62,15 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
     if admin is None:
         raise credentials_exception
     
-    # Fetch organization_id from organization_members for multi-tenancy
-    org_member = await db.organization_members.find_one(
-        {"email": email, "is_active": True, "is_deleted": {"$ne": True}},
-        {"_id": 0, "organization_id": 1}
-    )
-    if org_member and org_member.get("organization_id"):
-        admin["organization_id"] = org_member["organization_id"]
+    # Fetch organization_id from organization_members for multi-tenancy (cached)
+    org_id = await lookup_org_membership(email)
+    if org_id:
+        admin["organization_id"] = org_id
+    
+    # Resolve once per request; scoping helpers read it back instead of re-querying
+    principal = Principal(email=email, admin=admin, organization_id=org_id)
+    request.state.principal = principal
+    current_principal.set(principal)
     
     return admin
 
@@ -142,13 +152,10 @@ async def get_admin_from_token(credentials: HTTPAuthorizationCredentials = Depen
                 }
             admin = await db.admins.find_one({"email": admin_id})
             if admin:
-                org_member = await db.organization_members.find_one(
-                    {"email": admin.get("email"), "is_active": True, "is_deleted": {"$ne": True}},
-                    {"_id": 0, "organization_id": 1}
-                )
+                member_org_id = await lookup_org_membership(admin.get("email"))
                 return {
                     "id": admin.get("id", admin_id),
-                    "organization_id": org_member.get("organization_id") if org_member else admin.get("organization_id", organization_id),
+                    "organization_id": member_org_id or admin.get("organization_id", organization_id),
                     "email": admin.get("email", admin_id),
                     "name": admin.get("name", admin_id)
                 }
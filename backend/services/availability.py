@@ -0,0 +1,430 @@
+"""
+Engineer Availability
+=====================
+One scheduling engine for "when is this engineer free?", shared by the admin
+slot picker (GET /ticketing/engineers/{id}/available-slots), the engineer
+portal (GET /engineer/available-slots, reschedule) and the multi-engineer
+search (GET /ticketing/availability).
+
+Times are minutes from midnight of the first day of a range, so any number
+of days is one timeline, and every set below is a sorted list of disjoint
+half-open (start, end) intervals:
+
+    working = regular hours (engineer.working_hours; none on org holidays)
+              + org_emergency_hours
+              - the engineer's personal holidays
+    busy    = ticket_schedules (not cancelled) + scheduled tickets_v2,
+              each blocking [start, end + BOOKING_BUFFER_MINUTES)
+    free    = working - busy
+
+`load_calendar` reads a set of engineers over a set of days with one query
+per collection; everything after that is a linear sweep over the sets, so
+"first free hour for any engineer of the L2 team this week" is one call.
+scripts/benchmark_availability.py times 200 engineers over 30 days.
+"""
+import asyncio
+import bisect
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database import db
+from utils.helpers import get_ist_now
+
+Interval = Tuple[int, int]
+
+DAY_MINUTES = 24 * 60
+SLOT_MINUTES = 30
+DEFAULT_BOOKING_MINUTES = 60
+BOOKING_BUFFER_MINUTES = 60
+DEFAULT_RANGE_DAYS = 7
+MAX_RANGE_DAYS = 62
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+DEFAULT_DAY = {"is_working": True, "start": "09:00", "end": "18:00"}
+DEFAULT_WORKING_HOURS = {
+    **{day: DEFAULT_DAY for day in WEEKDAYS[:5]},
+    "saturday": {"is_working": True, "start": "09:00", "end": "14:00"},
+    "sunday": {"is_working": False, "start": "09:00", "end": "18:00"},
+}
+
+ENGINEER_PROJECTION = {"_id": 0, "id": 1, "name": 1, "working_hours": 1, "holidays": 1}
+BOOKING_PROJECTION = {
+    "_id": 0, "scheduled_at": 1, "scheduled_end_at": 1, "ticket_number": 1, "company_name": 1, "subject": 1,
+}
+
+PERSONAL_HOLIDAY = "personal_holiday"
+ORG_HOLIDAY = "org_holiday"
+DAY_OFF = "day_off"
+
+
+# ── interval sets ───────────────────────────────────────────────────────────
+
+def merge(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sorted, disjoint union of intervals (empty ones dropped)"""
+    merged: List[Interval] = []
+    for start, end in sorted(i for i in intervals if i[0] < i[1]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(base: List[Interval], cut: List[Interval]) -> List[Interval]:
+    """`base` minus `cut` (both merged), in one sweep over the two lists"""
+    result: List[Interval] = []
+    j = 0
+    for start, end in base:
+        while j < len(cut) and cut[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(cut) and cut[k][0] < end:
+            if cut[k][0] > start:
+                result.append((start, cut[k][0]))
+            start = max(start, cut[k][1])
+            k += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def contains(intervals: List[Interval], point: int) -> bool:
+    i = bisect.bisect_right(intervals, (point, float("inf"))) - 1
+    return i >= 0 and intervals[i][0] <= point < intervals[i][1]
+
+
+def first_fit(free: List[Interval], duration: int, not_before: int = 0,
+              step: int = SLOT_MINUTES) -> Optional[int]:
+    """Earliest start on the `step` grid, not before `not_before`, with [start, start + duration) free"""
+    i = max(0, bisect.bisect_right(free, (not_before, float("inf"))) - 1)
+    for start, end in free[i:]:
+        t = max(start, not_before)
+        t += -t % step
+        if t + duration <= end:
+            return t
+    return None
+
+
+# ── parsing ─────────────────────────────────────────────────────────────────
+
+def to_minutes(hhmm: str) -> int:
+    """Minutes from midnight of "HH:MM" (or the "HH:MM" at the start of a longer string)"""
+    if hhmm[2:3] == ":":
+        return int(hhmm[:2]) * 60 + int(hhmm[3:5])
+    hours, minutes = map(int, hhmm.split(":")[:2])
+    return hours * 60 + minutes
+
+
+def clock(minute: int) -> str:
+    hours, minutes = divmod(minute % DAY_MINUTES, 60)
+    return f"{hours:02d}:{minutes:02d}"
+
+
+def day_range(date_from: str, date_to: Optional[str] = None) -> Tuple[date, int]:
+    """(first day, number of days) for YYYY-MM-DD bounds; ValueError if invalid"""
+    try:
+        first = datetime.strptime(date_from, "%Y-%m-%d").date()
+        last = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else first
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+    days = (last - first).days + 1
+    if days < 1:
+        raise ValueError("date_to must not be before date_from")
+    if days > MAX_RANGE_DAYS:
+        raise ValueError(f"Date range is limited to {MAX_RANGE_DAYS} days")
+    return first, days
+
+
+def booking_label(booking: dict) -> str:
+    return f"#{booking.get('ticket_number', '')} - {booking.get('company_name') or booking.get('subject') or ''}"
+
+
+# ── calendar ────────────────────────────────────────────────────────────────
+
+class EngineerSchedule:
+    """One engineer's working, busy and free interval sets over a Calendar's days"""
+
+    def __init__(self, calendar: "Calendar", engineer: dict, bookings: List[dict]):
+        self.calendar = calendar
+        self.engineer = engineer
+        hours = engineer.get("working_hours") or DEFAULT_WORKING_HOURS
+        personal = set(engineer.get("holidays") or [])
+
+        self.day_status: List[Optional[str]] = []
+        self.day_working: List[List[Interval]] = []
+        for index in range(calendar.days):
+            day = calendar.start + timedelta(days=index)
+            status, intervals = None, []
+            if day.isoformat() in personal:
+                status = PERSONAL_HOLIDAY
+            else:
+                offset = index * DAY_MINUTES
+                intervals = list(calendar.emergency.get(index, []))
+                day_schedule = hours.get(WEEKDAYS[day.weekday()], DEFAULT_DAY)
+                if day.isoformat() in calendar.org_holidays:
+                    status = ORG_HOLIDAY
+                elif not day_schedule.get("is_working", False):
+                    status = DAY_OFF
+                else:
+                    try:
+                        intervals.append((offset + to_minutes(day_schedule.get("start", "09:00")),
+                                          offset + to_minutes(day_schedule.get("end", "18:00"))))
+                    except (ValueError, AttributeError):
+                        pass
+                intervals = merge(intervals)
+                # Emergency hours open a day that would otherwise be off
+                status = None if intervals else (status or DAY_OFF)
+            self.day_status.append(status)
+            self.day_working.append(intervals)
+        self.working = [i for day in self.day_working for i in day]
+
+        self.bookings = sorted(bookings, key=lambda b: b["start"])
+        self.busy = merge((b["start"], b["end"] + BOOKING_BUFFER_MINUTES) for b in self.bookings)
+        self.free = subtract(self.working, self.busy)
+
+    def blocked_by(self, minute: int) -> Optional[dict]:
+        """The booking (with its buffer) covering `minute`, if any"""
+        if not contains(self.busy, minute):
+            return None
+        return next((b for b in self.bookings
+                     if b["start"] <= minute < b["end"] + BOOKING_BUFFER_MINUTES), None)
+
+    def day_slots(self, index: int, now: Optional[int] = None,
+                  holiday_message: str = "This is a holiday for this technician") -> Dict[str, Any]:
+        """
+        The 30-minute slot picker for one day: each slot start is available
+        unless a booking (plus buffer) covers it, or it is at or before `now`.
+        """
+        day = self.calendar.start + timedelta(days=index)
+        date_str = day.isoformat()
+        status = self.day_status[index]
+        if status == PERSONAL_HOLIDAY:
+            return {"date": date_str, "is_holiday": True, "is_working_day": False, "slots": [], "message": holiday_message}
+        if status == ORG_HOLIDAY:
+            name = self.calendar.org_holidays[date_str]
+            return {"date": date_str, "is_holiday": True, "is_working_day": False, "slots": [],
+                    "message": f"Organization holiday ({name})"}
+        if status == DAY_OFF:
+            return {"date": date_str, "is_holiday": False, "is_working_day": False, "slots": [],
+                    "message": f"Not a working day ({WEEKDAYS[day.weekday()].title()})"}
+
+        slots = []
+        for start, end in self.day_working[index]:
+            for minute in range(start, end, SLOT_MINUTES):
+                if now is not None and minute <= now:
+                    slots.append({"time": clock(minute), "available": False, "blocked_by": "Past time"})
+                    continue
+                booking = self.blocked_by(minute)
+                slots.append({
+                    "time": clock(minute),
+                    "available": booking is None,
+                    "blocked_by": booking_label(booking) if booking else None,
+                })
+
+        offset = index * DAY_MINUTES
+        bookings = [{
+            "time": clock(b["start"]),
+            "ticket_number": b.get("ticket_number", ""),
+            "company_name": b.get("company_name", ""),
+            "subject": b.get("subject", ""),
+            "start_mins": b["start"] - offset,
+            "end_mins": b["end"] - offset,
+        } for b in self.bookings if offset <= b["start"] < offset + DAY_MINUTES]
+        working = self.day_working[index]
+        return {
+            "date": date_str,
+            "is_holiday": False,
+            "is_working_day": True,
+            "work_start": clock(working[0][0]),
+            "work_end": clock(working[-1][1]),
+            "slots": slots,
+            "bookings": bookings,
+        }
+
+
+class Calendar:
+    """
+    Availability of a set of engineers over `days` consecutive days from
+    `start`. `load_calendar` builds one from the database; building one from
+    documents directly does no I/O.
+    """
+
+    def __init__(self, start: date, days: int, engineers: List[dict], holidays: Iterable[dict] = (),
+                 emergency_hours: Iterable[dict] = (), bookings: Iterable[dict] = ()):
+        self.start = start
+        self.days = days
+        self._day_cache: Dict[str, int] = {}
+        self.org_holidays = {h["date"]: h.get("name") or "Holiday" for h in holidays if h.get("date")}
+
+        self.emergency: Dict[int, List[Interval]] = {}
+        for entry in emergency_hours:
+            index = self.day_index(entry.get("date"))
+            if index is None:
+                continue
+            try:
+                offset = index * DAY_MINUTES
+                self.emergency.setdefault(index, []).append(
+                    (offset + to_minutes(entry["start"]), offset + to_minutes(entry["end"]))
+                )
+            except (KeyError, ValueError, AttributeError):
+                continue
+
+        by_engineer: Dict[str, List[dict]] = {}
+        seen = set()
+        for booking in bookings:
+            start = self.minute(booking.get("scheduled_at"))
+            if start is None:
+                continue
+            # A scheduled ticket usually also has a ticket_schedules row for the same visit
+            key = (booking.get("engineer_id"), booking.get("ticket_number"), start)
+            if key in seen:
+                continue
+            seen.add(key)
+            end = self.minute(booking.get("scheduled_end_at"))
+            by_engineer.setdefault(booking.get("engineer_id"), []).append({
+                **{k: booking.get(k, "") for k in ("ticket_number", "company_name", "subject")},
+                "start": start,
+                "end": end if end is not None and end > start else start + DEFAULT_BOOKING_MINUTES,
+            })
+
+        self.engineers: Dict[str, EngineerSchedule] = {
+            engineer["id"]: EngineerSchedule(self, engineer, by_engineer.get(engineer["id"], []))
+            for engineer in engineers
+        }
+
+    def _days_from_start(self, date_str: str) -> int:
+        # Bookings repeat the same few dates; parse each once
+        days = self._day_cache.get(date_str)
+        if days is None:
+            days = self._day_cache[date_str] = (date.fromisoformat(date_str) - self.start).days
+        return days
+
+    def day_index(self, date_str: Optional[str]) -> Optional[int]:
+        try:
+            index = self._days_from_start(date_str[:10])
+        except (TypeError, ValueError):
+            return None
+        return index if 0 <= index < self.days else None
+
+    def minute(self, iso: Optional[str]) -> Optional[int]:
+        """Timeline minute of a local "YYYY-MM-DDTHH:MM..." timestamp (may fall outside the range)"""
+        try:
+            return self._days_from_start(iso[:10]) * DAY_MINUTES + to_minutes(iso[11:16])
+        except (TypeError, ValueError):
+            return None
+
+    def minute_of(self, moment: datetime) -> int:
+        return (moment.date() - self.start).days * DAY_MINUTES + moment.hour * 60 + moment.minute
+
+    def timestamp(self, minute: int) -> str:
+        day = self.start + timedelta(days=minute // DAY_MINUTES)
+        return f"{day.isoformat()}T{clock(minute)}"
+
+    def first_free(self, duration: int, not_before: int = 0) -> Optional[Tuple[str, int]]:
+        """(engineer id, start minute) of the earliest free slot of `duration` minutes"""
+        best: Optional[Tuple[str, int]] = None
+        for engineer_id, schedule in self.engineers.items():
+            start = first_fit(schedule.free, duration, not_before)
+            if start is not None and (best is None or start < best[1]):
+                best = (engineer_id, start)
+        return best
+
+    def free_windows(self, engineer_id: str, duration: int, not_before: int = 0) -> List[Interval]:
+        """Free intervals (from `not_before`) long enough for a `duration`-minute slot"""
+        windows = []
+        for start, end in self.engineers[engineer_id].free:
+            start = max(start, not_before)
+            start += -start % SLOT_MINUTES
+            if start + duration <= end:
+                windows.append((start, end))
+        return windows
+
+
+# ── loading ─────────────────────────────────────────────────────────────────
+
+async def find_engineers(org_id: str, engineer_ids: Optional[List[str]] = None,
+                         team_id: Optional[str] = None, skill: Optional[str] = None) -> List[dict]:
+    """Active engineers of an org, optionally limited to ids, a ticketing team's members or a skill"""
+    query: Dict[str, Any] = {"organization_id": org_id, "is_deleted": {"$ne": True}, "is_active": {"$ne": False}}
+    if team_id:
+        team = await db.ticket_teams.find_one({"id": team_id, "organization_id": org_id}, {"_id": 0, "members": 1})
+        if not team:
+            raise ValueError("Team not found")
+        members = [m.get("user_id") for m in team.get("members") or []]
+        engineer_ids = [i for i in engineer_ids if i in members] if engineer_ids else members
+    if engineer_ids is not None:
+        query["id"] = {"$in": engineer_ids}
+    if skill:
+        query["$or"] = [{"skills": skill}, {"specialization": skill}]
+    return await db.engineers.find(query, ENGINEER_PROJECTION).sort("name", 1).to_list(None)
+
+
+async def load_calendar(org_id: str, start: date, days: int, engineers: List[dict]) -> Calendar:
+    """Calendar for `engineers` over `days` days: four queries, whatever the number of engineers or days"""
+    ids = [engineer["id"] for engineer in engineers]
+    first, last = start.isoformat(), (start + timedelta(days=days - 1)).isoformat()
+    dates = {"$gte": first, "$lte": last}
+    span = {"$gte": f"{first}T00:00:00", "$lte": f"{last}T23:59:59"}
+    holidays, emergency_hours, schedules, tickets = await asyncio.gather(
+        db.org_holidays.find(
+            {"organization_id": org_id, "date": dates}, {"_id": 0, "date": 1, "name": 1}
+        ).to_list(None),
+        db.org_emergency_hours.find(
+            {"organization_id": org_id, "date": dates}, {"_id": 0, "date": 1, "start": 1, "end": 1}
+        ).to_list(None),
+        db.ticket_schedules.find({
+            "engineer_id": {"$in": ids}, "organization_id": org_id,
+            "scheduled_at": span, "status": {"$ne": "cancelled"},
+        }, {**BOOKING_PROJECTION, "engineer_id": 1}).to_list(None),
+        db.tickets_v2.find({
+            "assigned_to_id": {"$in": ids}, "organization_id": org_id,
+            "scheduled_at": span, "is_deleted": {"$ne": True},
+        }, {**BOOKING_PROJECTION, "assigned_to_id": 1}).to_list(None),
+    )
+    bookings = schedules + [{**t, "engineer_id": t.get("assigned_to_id")} for t in tickets]
+    return Calendar(start, days, engineers, holidays, emergency_hours, bookings)
+
+
+async def find_availability(org_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                            duration: int = 60, engineers: Optional[List[dict]] = None,
+                            first_only: bool = False, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Free time of several engineers over several days (default: the week from
+    today), from now on:
+    {"first_slot": {...} | None, "engineers": [{"engineer_id", "engineer_name", "free": [...]}]}
+    (`engineers` is left out with first_only).
+    """
+    now = now or get_ist_now()
+    if date_from:
+        start, days = day_range(date_from, date_to)
+    else:
+        start = now.date()
+        days = day_range(start.isoformat(), date_to)[1] if date_to else DEFAULT_RANGE_DAYS
+    engineers = engineers if engineers is not None else await find_engineers(org_id)
+    calendar = await load_calendar(org_id, start, days, engineers)
+    not_before = max(0, calendar.minute_of(now) + 1)
+
+    def slot(engineer_id: str, begin: int, end: int) -> dict:
+        return {
+            "engineer_id": engineer_id,
+            "engineer_name": calendar.engineers[engineer_id].engineer.get("name"),
+            "start": calendar.timestamp(begin),
+            "end": calendar.timestamp(end),
+        }
+
+    first = calendar.first_free(duration, not_before)
+    result: Dict[str, Any] = {
+        "date_from": start.isoformat(),
+        "date_to": (start + timedelta(days=days - 1)).isoformat(),
+        "duration": duration,
+        "first_slot": slot(first[0], first[1], first[1] + duration) if first else None,
+    }
+    if not first_only:
+        result["engineers"] = [{
+            "engineer_id": engineer_id,
+            "engineer_name": schedule.engineer.get("name"),
+            "free": [{"start": calendar.timestamp(s), "end": calendar.timestamp(e)}
+                     for s, e in calendar.free_windows(engineer_id, duration, not_before)],
+        } for engineer_id, schedule in calendar.engineers.items()]
+    return result
@@ -0,0 +1,113 @@
+"""
+Startup Backfills
+=================
+Derived fields and projections (lookup keys, search entries, ...) are kept
+up to date on every write, but records written before they existed need a
+one-off backfill. Instead of relying on someone to run the script by hand
+after a deploy, each backfill is registered here and runs in the background
+when the app starts, the way the tenant counters are reconciled.
+
+Collection `backfills`, one document per backfill:
+- `done_version`  the version that last completed; a backfill runs again
+                  only when it is registered with a newer version
+- `lease_owner` / `lease_until`  the process running it, so concurrent
+                  workers don't run the same backfill twice
+
+Every registered job must be safe to re-run (a lapsed lease starts it over).
+
+Configuration (env):
+    STARTUP_BACKFILLS    "0" disables running backfills at startup (default on)
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.helpers import get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+BACKFILLS_ENABLED = os.environ.get("STARTUP_BACKFILLS", "1") != "0"
+LEASE_SECONDS = 3600
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class BackfillRunner:
+    """Runs each registered backfill once per version, one app process at a time"""
+
+    def __init__(self, lease_seconds: int = LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.jobs: List[Tuple[str, int, Job]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, version: int, job: Job) -> None:
+        self.jobs.append((name, version, job))
+
+    async def _acquire(self, name: str, version: int) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await db.backfills.find_one_and_update(
+                {"name": name, "done_version": {"$not": {"$gte": version}},
+                 "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"lease_owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False  # already done, or another process is running it
+        return bool(lease) and lease.get("lease_owner") == self.owner
+
+    async def run_one(self, name: str, version: int, job: Job) -> bool:
+        """Run a backfill unless this version is done or running elsewhere; True if it ran"""
+        if not await self._acquire(name, version):
+            return False
+        try:
+            result = await job()
+        except Exception:
+            await db.backfills.update_one({"name": name, "lease_owner": self.owner}, {"$set": {"lease_until": None}})
+            raise
+        await db.backfills.update_one(
+            {"name": name, "lease_owner": self.owner},
+            {"$set": {"done_version": version, "lease_until": None, "completed_at": get_ist_isoformat()}}
+        )
+        logger.info(f"Backfill {name} v{version} done: {result}")
+        return True
+
+    async def run_all(self) -> None:
+        for name, version, job in self.jobs:
+            try:
+                await self.run_one(name, version, job)
+            except Exception as e:
+                logger.error(f"Backfill {name} failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_all())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# Global instance
+_runner: Optional[BackfillRunner] = None
+
+
+def init_backfills() -> BackfillRunner:
+    """Initialize the startup backfill runner"""
+    global _runner
+    _runner = BackfillRunner()
+    return _runner
+
+
+def get_backfills() -> Optional[BackfillRunner]:
+    """Get the startup backfill runner instance"""
+    return _runner
@@ -0,0 +1,226 @@
+"""
+Batched Join Service
+====================
+Resolves related documents for a page of results with one `$in` query
+per related collection, instead of a `find_one` per row.
+
+Typical usage:
+    devices = await db.devices.find(query, {"_id": 0}).to_list(limit)
+    await attach_names(devices, "companies", "company_id", "company_name", default="Unknown")
+    await attach_device_amc(devices)
+"""
+import logging
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterable
+from database import db
+from utils.helpers import get_ist_now, is_warranty_active
+
+logger = logging.getLogger(__name__)
+
+
+def collect_ids(docs: Iterable[dict], field: str) -> List[str]:
+    """Collect the distinct, non-empty values of `field` across docs (order preserved)"""
+    seen = {}
+    for doc in docs:
+        value = doc.get(field)
+        if value and value not in seen:
+            seen[value] = True
+    return list(seen)
+
+
+async def fetch_map(
+    collection_name: str,
+    ids: Iterable[str],
+    projection: Optional[Dict[str, Any]] = None,
+    extra_query: Optional[Dict[str, Any]] = None,
+    key: str = "id"
+) -> Dict[str, dict]:
+    """
+    Fetch documents whose `key` is in `ids` with a single query.
+    Returns a dict of key value → document.
+    """
+    ids = [i for i in ids if i]
+    if not ids:
+        return {}
+
+    query = {key: {"$in": ids}, **(extra_query or {})}
+    fields = {"_id": 0, **(projection or {})}
+    if projection:
+        fields[key] = 1
+
+    docs = await db[collection_name].find(query, fields).to_list(len(ids))
+    return {d[key]: d for d in docs if d.get(key)}
+
+
+async def fetch_grouped(
+    collection_name: str,
+    field: str,
+    ids: Iterable[str],
+    projection: Optional[Dict[str, Any]] = None,
+    extra_query: Optional[Dict[str, Any]] = None,
+    limit: int = 10000
+) -> Dict[str, List[dict]]:
+    """
+    Fetch one-to-many children whose `field` is in `ids` with a single query.
+    Returns a dict of parent id → list of child documents.
+    """
+    ids = [i for i in ids if i]
+    if not ids:
+        return {}
+
+    query = {field: {"$in": ids}, **(extra_query or {})}
+    fields = {"_id": 0, **(projection or {})}
+    if projection:
+        fields[field] = 1
+
+    grouped: Dict[str, List[dict]] = {}
+    fetched = 0
+    async for doc in db[collection_name].find(query, fields).limit(limit):
+        grouped.setdefault(doc[field], []).append(doc)
+        fetched += 1
+    if fetched >= limit:
+        logger.warning(
+            f"fetch_grouped hit its limit of {limit} {collection_name} rows for {len(ids)} {field} values; "
+            f"results are incomplete"
+        )
+    return grouped
+
+
+async def attach_names(
+    docs: List[dict],
+    collection_name: str,
+    id_field: str,
+    target_field: str,
+    source_field: str = "name",
+    default: Any = None,
+    org_id: Optional[str] = None,
+    only_present: bool = False
+) -> Dict[str, dict]:
+    """
+    Set doc[target_field] to the related document's `source_field` for every doc.
+
+    When `only_present` is True, docs without `id_field` are left untouched
+    (mirrors handlers that only set the field when the reference exists).
+    Returns the fetched map so callers can reuse it.
+    """
+    extra = {"organization_id": org_id} if org_id else None
+    related = await fetch_map(
+        collection_name, collect_ids(docs, id_field), {source_field: 1}, extra
+    )
+    for doc in docs:
+        ref = doc.get(id_field)
+        if only_present and not ref:
+            continue
+        match = related.get(ref) if ref else None
+        doc[target_field] = match.get(source_field) if match else default
+    return related
+
+
+def coverage_active(coverage_end: Any) -> bool:
+    """
+    Whether an assignment's coverage_end (a date, or a timestamp whose first
+    ten characters are its date) is today or later. amc_status_pipeline
+    applies the same rule in the database.
+    """
+    return is_warranty_active(str(coverage_end or "")[:10])
+
+
+def _pick_assignment(assignments: List[dict]) -> Optional[dict]:
+    """Prefer an assignment with valid coverage, else the latest-ending one"""
+    if not assignments:
+        return None
+    for a in assignments:
+        if coverage_active(a.get("coverage_end")):
+            return a
+    return max(assignments, key=lambda a: a.get("coverage_end") or "")
+
+
+async def fetch_active_amc_assignments(device_ids: Iterable[str]) -> Dict[str, dict]:
+    """Return device id → the active AMC assignment that governs its coverage"""
+    grouped = await fetch_grouped(
+        "amc_device_assignments", "device_id", device_ids,
+        extra_query={"status": "active"}
+    )
+    return {device_id: _pick_assignment(rows) for device_id, rows in grouped.items()}
+
+
+async def attach_device_amc(devices: List[dict], include_contract_name: bool = True) -> None:
+    """
+    Set amc_status / amc_contract_id / amc_contract_name / amc_coverage_end on each device
+    using two batched queries (assignments, then contracts).
+    """
+    assignments = await fetch_active_amc_assignments(collect_ids(devices, "id"))
+
+    contracts: Dict[str, dict] = {}
+    if include_contract_name:
+        contracts = await fetch_map(
+            "amc_contracts",
+            collect_ids(assignments.values(), "amc_contract_id"),
+            {"name": 1, "amc_type": 1},
+            {"is_deleted": {"$ne": True}}
+        )
+
+    for device in devices:
+        assignment = assignments.get(device.get("id"))
+        if not assignment:
+            device["amc_status"] = "none"
+            device["amc_contract_id"] = None
+            device["amc_contract_name"] = None
+            device["amc_coverage_end"] = None
+            continue
+
+        device["amc_contract_id"] = assignment["amc_contract_id"]
+        device["amc_coverage_end"] = assignment.get("coverage_end")
+        if coverage_active(assignment.get("coverage_end")):
+            contract = contracts.get(assignment["amc_contract_id"])
+            device["amc_status"] = "active"
+            device["amc_contract_name"] = contract.get("name") if contract else None
+        else:
+            device["amc_status"] = "expired"
+
+
+def amc_status_pipeline(query: Dict[str, Any], amc_status: str) -> List[dict]:
+    """
+    Aggregation stages that filter devices matching `query` by derived AMC status
+    ("active", "expired" or "none") before pagination is applied.
+    """
+    today = datetime.strptime(get_ist_now().strftime("%Y-%m-%d"), "%Y-%m-%d")
+    # coverage_end's date part, parsed like coverage_active (unparseable -> null, never active)
+    coverage_day = {"$dateFromString": {
+        "dateString": {"$substrCP": [{"$toString": {"$ifNull": ["$$this.coverage_end", ""]}}, 0, 10]},
+        "format": "%Y-%m-%d",
+        "onError": None,
+        "onNull": None,
+    }}
+    return [
+        {"$match": query},
+        {"$lookup": {
+            "from": "amc_device_assignments",
+            "let": {"device_id": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$device_id", "$$device_id"]},
+                    {"$eq": ["$status", "active"]}
+                ]}}},
+                {"$project": {"_id": 0, "coverage_end": 1}}
+            ],
+            "as": "_amc"
+        }},
+        {"$addFields": {"_amc_status": {"$cond": [
+            {"$eq": [{"$size": "$_amc"}, 0]},
+            "none",
+            {"$cond": [
+                {"$gt": [{"$size": {"$filter": {
+                    "input": "$_amc",
+                    "cond": {"$let": {
+                        "vars": {"day": coverage_day},
+                        "in": {"$and": [{"$ne": ["$$day", None]}, {"$gte": ["$$day", today]}]}
+                    }}
+                }}}, 0]},
+                "active",
+                "expired"
+            ]}
+        ]}}},
+        {"$match": {"_amc_status": amc_status}},
+        {"$project": {"_id": 0, "_amc": 0, "_amc_status": 0}},
+    ]
@@ -0,0 +1,482 @@
+"""
+Bulk Import Engine
+==================
+Set-based CSV / Excel imports behind the company, site, device, company
+employee and supply product bulk-import endpoints.
+
+Rows are processed in chunks of CHUNK_SIZE:
+1. The chunk becomes a DataFrame; values are trimmed and blanks / "nan"
+   become nulls
+2. Validation is columnar: required fields, company / employee / category
+   resolution against tenant-scoped lookups, and duplicates against the file
+   itself and against existing records (one `$in` query per chunk and
+   unique field)
+3. Valid rows are built into model documents and written with a single
+   unordered bulk_write; rows the server rejects are reported like
+   validation errors
+
+Failed rows are reported as {"row": <spreadsheet row>, "message": ...}; row 2
+is the first data row under the header.
+
+`run_import` serves the synchronous endpoints directly; `start_import_job`
+runs it as a background job (services/jobs.py) with progress and an error
+report CSV (the failed rows with their error) to download.
+"""
+import csv
+import io
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+from pydantic import ValidationError
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from database import db
+from models.company import Company, CompanyEmployee
+from models.device import Device
+from models.site import Site
+from models.supplies import SupplyCategory, SupplyProduct
+from services.jobs import create_job, set_progress, start_job, write_artifact
+from services.search_index import sync_search_entries
+from services.tenant_counters import COUNTED, count_inserted
+from services import expiries
+from utils.helpers import get_ist_now, get_ist_isoformat, with_lookup_keys
+
+CHUNK_SIZE = 1000
+ERROR_PREVIEW = 100  # errors kept on the job result; the full list is in the report
+NULL_STRINGS = ["", "nan", "NaN", "None", "null", "NULL"]
+LIVE = {"is_deleted": {"$ne": True}}
+
+# progress(rows processed, total rows)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+# ── columnar helpers ────────────────────────────────────────────────────────
+
+def clean_frame(records: List[Dict[str, Any]], offset: int = 0) -> pd.DataFrame:
+    """Records as a frame of trimmed strings / None, indexed by spreadsheet row"""
+    df = pd.DataFrame.from_records(records)
+    for col in df.columns:
+        missing = df[col].isna()
+        text = df[col].astype(str).str.strip()
+        df[col] = text.where(~(missing | text.isin(NULL_STRINGS)), None)
+    df.index = range(offset + 2, offset + 2 + len(df))
+    df["_error"] = None
+    return df
+
+
+def column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def nulls(series: pd.Series) -> pd.Series:
+    """NaN -> None, so values can go straight into documents"""
+    return series.astype(object).where(series.notna(), None)
+
+
+def valid(df: pd.DataFrame) -> pd.Series:
+    return df["_error"].isna()
+
+
+def fail(df: pd.DataFrame, mask: pd.Series, message) -> None:
+    """Record `message` (a string or per-row Series) on rows in `mask` that have no error yet"""
+    mask = mask.fillna(False).astype(bool) & valid(df)
+    if isinstance(message, pd.Series):
+        df.loc[mask, "_error"] = message[mask]
+    else:
+        df.loc[mask, "_error"] = message
+
+
+def read_table(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """Rows of an uploaded CSV / Excel file, column names normalized to snake_case"""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(content), dtype=str)
+    elif name.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(io.BytesIO(content), dtype=str)
+    else:
+        raise ValueError("Unsupported file format. Use CSV or Excel.")
+    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    return df.to_dict("records")
+
+
+# ── importers ───────────────────────────────────────────────────────────────
+
+class Importer:
+    """One import kind: required fields, lookups, columnar validation and document building"""
+
+    collection: str = ""
+    search_collection: Optional[str] = None
+    required: List[Tuple[str, str]] = []
+    unique_fields: Tuple[str, ...] = ()
+
+    def __init__(self, org_id: str):
+        self.org_id = org_id
+        self.seen: Dict[str, Set[str]] = defaultdict(set)
+
+    def scope(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        return {**query, "organization_id": self.org_id}
+
+    async def prepare(self) -> None:
+        """Lookups loaded once per import"""
+
+    async def validate(self, df: pd.DataFrame) -> None:
+        """Kind-specific checks; fills resolved columns and records errors"""
+
+    def build(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def remember(self, docs: List[Dict[str, Any]]) -> None:
+        for name in self.unique_fields:
+            self.seen[name].update(doc[name] for doc in docs if doc.get(name))
+
+    async def fail_duplicates(self, df: pd.DataFrame, values: pd.Series, db_field: str,
+                              message: pd.Series, query: Optional[Dict[str, Any]] = None) -> None:
+        """Fail rows whose value already exists (one $in query) or repeats an earlier row"""
+        candidates = valid(df) & values.notna()
+        keys = values[candidates].unique().tolist()
+        existing = set()
+        if keys:
+            base = self.scope(LIVE) if query is None else query
+            existing = set(await db[self.collection].distinct(db_field, {**base, db_field: {"$in": keys}}))
+        taken = values.isin(existing | self.seen[db_field]) | values.where(candidates).duplicated()
+        fail(df, candidates & taken, message)
+
+    async def company_lookup(self) -> None:
+        companies = await db.companies.find(self.scope(LIVE), {"_id": 0, "id": 1, "name": 1, "code": 1}).to_list(None)
+        self.company_by_code = {c["code"].upper(): c["id"] for c in companies if c.get("code")}
+        self.company_by_name = {c["name"].lower(): c["id"] for c in companies if c.get("name")}
+
+    def resolve_company(self, df: pd.DataFrame) -> pd.Series:
+        """Company id by company_code, else by company_name"""
+        by_code = column(df, "company_code").str.upper().map(self.company_by_code)
+        by_name = column(df, "company_name").str.lower().map(self.company_by_name)
+        return nulls(by_code.where(by_code.notna(), by_name))
+
+    def with_org(self, model) -> Dict[str, Any]:
+        doc = model.model_dump()
+        doc["organization_id"] = self.org_id
+        return doc
+
+
+class CompanyImporter(Importer):
+    collection = "companies"
+    search_collection = "companies"
+    required = [("name", "Company name is required")]
+    unique_fields = ("code", "contact_email")
+
+    async def validate(self, df):
+        code = column(df, "company_code")
+        df["code"] = code.where(code.notna(), column(df, "code"))
+        # UNIQUE(organization_id, code) and UNIQUE(organization_id, contact_email) within tenant
+        await self.fail_duplicates(df, df["code"], "code", "Company code " + df["code"] + " already exists")
+        email = column(df, "contact_email")
+        await self.fail_duplicates(df, email, "contact_email", "Email " + email + " already exists in your tenant")
+
+    def build(self, row):
+        return self.with_org(Company(
+            name=row.get("name"),
+            code=row.get("code") or f"C{str(uuid.uuid4())[:6].upper()}",
+            industry=row.get("industry"),
+            contact_name=row.get("contact_name"),
+            contact_email=row.get("contact_email"),
+            contact_phone=row.get("contact_phone"),
+            address=row.get("address"),
+            city=row.get("city"),
+            state=row.get("state"),
+            country=row.get("country") or "India",
+            pincode=row.get("pincode"),
+            gst_number=row.get("gst_number"),
+            notes=row.get("notes"),
+            status="active"
+        ))
+
+
+class SiteImporter(Importer):
+    collection = "sites"
+    search_collection = "sites"
+    required = [("name", "Site name is required")]
+
+    async def prepare(self):
+        await self.company_lookup()
+
+    async def validate(self, df):
+        df["company_id"] = self.resolve_company(df)
+        fail(df, df["company_id"].isna(), "Company not found")
+
+    def build(self, row):
+        return self.with_org(Site(
+            company_id=row["company_id"],
+            name=row.get("name"),
+            site_code=row.get("site_code"),
+            address=row.get("address"),
+            city=row.get("city"),
+            state=row.get("state"),
+            pincode=row.get("pincode"),
+            country=row.get("country") or "India",
+            contact_person=row.get("contact_person"),
+            contact_phone=row.get("contact_phone"),
+            contact_email=row.get("contact_email"),
+            notes=row.get("notes"),
+            status="active"
+        ))
+
+
+class DeviceImporter(Importer):
+    collection = "devices"
+    search_collection = "devices"
+    required = [
+        ("serial_number", "Serial number is required"),
+        ("brand", "Brand is required"),
+        ("model", "Model is required"),
+    ]
+    unique_fields = ("serial_key",)
+
+    async def prepare(self):
+        await self.company_lookup()
+
+    async def employee_lookup(self, company_ids: List[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Employees of the chunk's companies keyed "<company_id>_<CODE>" / "<company_id>_<email>" """
+        by_code, by_email = {}, {}
+        if not company_ids:
+            return by_code, by_email
+        cursor = db.company_employees.find(
+            self.scope({**LIVE, "company_id": {"$in": company_ids}}),
+            {"_id": 0, "id": 1, "company_id": 1, "employee_id": 1, "employee_code": 1, "email": 1}
+        )
+        async for emp in cursor:
+            code = emp.get("employee_id") or emp.get("employee_code")
+            if code:
+                by_code[f"{emp['company_id']}_{str(code).upper()}"] = emp["id"]
+            if emp.get("email"):
+                by_email[f"{emp['company_id']}_{emp['email'].lower()}"] = emp["id"]
+        return by_code, by_email
+
+    async def validate(self, df):
+        df["company_id"] = self.resolve_company(df)
+        fail(df, df["company_id"].isna(), "Company not found")
+
+        by_code, by_email = await self.employee_lookup(df["company_id"][valid(df)].dropna().unique().tolist())
+        employee = (df["company_id"] + "_" + column(df, "employee_code").str.upper()).map(by_code)
+        employee_by_email = (df["company_id"] + "_" + column(df, "employee_email").str.lower()).map(by_email)
+        df["assigned_employee_id"] = nulls(employee.where(employee.notna(), employee_by_email))
+
+        # Serial numbers are unique across live devices (the public QR / warranty lookup is global)
+        serial = column(df, "serial_number")
+        df["serial_key"] = serial.str.lower()
+        await self.fail_duplicates(df, df["serial_key"], "serial_key",
+                                   "Serial number " + serial + " already exists", query=LIVE)
+
+        raw_cost = column(df, "purchase_cost")
+        cost = pd.to_numeric(raw_cost, errors="coerce")
+        fail(df, raw_cost.notna() & cost.isna(), "Invalid purchase cost " + raw_cost)
+        df["purchase_cost"] = nulls(cost)
+
+    def build(self, row):
+        return with_lookup_keys(self.with_org(Device(
+            company_id=row["company_id"],
+            assigned_employee_id=row.get("assigned_employee_id"),
+            device_type=row.get("device_type") or "Laptop",
+            brand=row.get("brand"),
+            model=row.get("model"),
+            serial_number=row.get("serial_number"),
+            asset_tag=row.get("asset_tag"),
+            purchase_date=row.get("purchase_date") or get_ist_isoformat().split("T")[0],
+            purchase_cost=row.get("purchase_cost"),
+            vendor=row.get("vendor"),
+            warranty_end_date=row.get("warranty_end_date"),
+            location=row.get("location"),
+            condition=row.get("condition") or "good",
+            status=row.get("status") or "active",
+            configuration=row.get("configuration"),
+            notes=row.get("notes")
+        )))
+
+
+class EmployeeImporter(Importer):
+    collection = "company_employees"
+    required = [("name", "Name is required")]
+
+    async def prepare(self):
+        await self.company_lookup()
+
+    async def validate(self, df):
+        code = column(df, "company_code").str.upper()
+        name = column(df, "company_name").str.lower()
+        by_code = code.map(self.company_by_code)
+        by_name = name.map(self.company_by_name)
+        fail(df, code.isna() & name.isna(), "Company code or name is required")
+        fail(df, code.notna() & by_code.isna(), "Company code '" + code + "' not found")
+        fail(df, code.isna() & by_name.isna(), "Company name '" + name + "' not found")
+        df["company_id"] = nulls(by_code.where(code.notna(), by_name))
+
+    def build(self, row):
+        return self.with_org(CompanyEmployee(
+            company_id=row["company_id"],
+            name=row.get("name"),
+            employee_id=row.get("employee_id"),
+            email=row.get("email"),
+            phone=row.get("phone"),
+            department=row.get("department"),
+            designation=row.get("designation"),
+            location=row.get("location"),
+        ))
+
+
+class SupplyProductImporter(Importer):
+    collection = "supply_products"
+    required = [("name", "Product name is required"), ("category", "Category is required")]
+
+    async def prepare(self):
+        categories = await db.supply_categories.find(self.scope(LIVE), {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        self.category_by_name = {c["name"].lower(): c["id"] for c in categories}
+
+    async def validate(self, df):
+        category = column(df, "category")
+        wanted = category[valid(df)].dropna()
+        # Create categories that don't exist yet, once each
+        new = wanted[~wanted.str.lower().isin(self.category_by_name)].groupby(wanted.str.lower()).first()
+        if len(new):
+            docs = [self.with_org(SupplyCategory(name=name)) for name in new.tolist()]
+            await db.supply_categories.insert_many(docs)
+            self.category_by_name.update({doc["name"].lower(): doc["id"] for doc in docs})
+        df["category_id"] = nulls(category.str.lower().map(self.category_by_name))
+
+        # Invalid prices are ignored
+        price = column(df, "price").str.replace(",", "").str.replace("₹", "").str.strip()
+        df["price"] = nulls(pd.to_numeric(price, errors="coerce"))
+
+    def build(self, row):
+        return self.with_org(SupplyProduct(
+            category_id=row["category_id"],
+            name=row.get("name"),
+            description=row.get("description"),
+            unit=row.get("unit") or "piece",
+            price=row.get("price"),
+            sku=row.get("sku"),
+            internal_notes=row.get("internal_notes")
+        ))
+
+
+IMPORTERS = {
+    "companies": CompanyImporter,
+    "sites": SiteImporter,
+    "devices": DeviceImporter,
+    "employees": EmployeeImporter,
+    "supply-products": SupplyProductImporter,
+}
+
+
+# ── engine ──────────────────────────────────────────────────────────────────
+
+@dataclass
+class ImportResult:
+    total: int = 0
+    success: int = 0
+    ids: List[str] = field(default_factory=list)
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    failed_records: List[Dict[str, Any]] = field(default_factory=list)
+
+
+async def _write(collection: str, docs: List[Dict], rows: List[int], df: pd.DataFrame) -> List[Dict]:
+    """Unordered bulk insert; rejected documents are marked on their rows"""
+    if not docs:
+        return []
+    try:
+        await db[collection].bulk_write([InsertOne(doc) for doc in docs], ordered=False)
+        return docs
+    except BulkWriteError as e:
+        rejected = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+        for index, message in rejected.items():
+            df.at[rows[index], "_error"] = message
+        return [doc for index, doc in enumerate(docs) if index not in rejected]
+
+
+async def import_chunk(importer: Importer, records: List[Dict[str, Any]], offset: int) -> Tuple[List[str], pd.DataFrame]:
+    """Validate and write one chunk; returns the inserted ids and the frame with its errors"""
+    df = clean_frame(records, offset)
+    for name, message in importer.required:
+        fail(df, column(df, name).isna(), message)
+    await importer.validate(df)
+
+    docs, rows = [], []
+    good = df[valid(df)]
+    for row_num, row in zip(good.index, good.to_dict("records")):
+        try:
+            docs.append(importer.build(row))
+            rows.append(row_num)
+        except (ValidationError, ValueError, TypeError) as e:
+            df.at[row_num, "_error"] = str(e)
+
+    written = await _write(importer.collection, docs, rows, df)
+    importer.remember(written)
+    if importer.collection in COUNTED:
+        await count_inserted(importer.collection, written)
+    return [doc["id"] for doc in written], df
+
+
+async def run_import(kind: str, org_id: str, records: List[Dict[str, Any]],
+                     progress: Optional[ProgressCallback] = None) -> ImportResult:
+    importer = IMPORTERS[kind](org_id)
+    await importer.prepare()
+    result = ImportResult(total=len(records))
+    for offset in range(0, len(records), CHUNK_SIZE):
+        chunk = records[offset:offset + CHUNK_SIZE]
+        ids, df = await import_chunk(importer, chunk, offset)
+        result.ids.extend(ids)
+        result.success += len(ids)
+        for row_num, message in df["_error"].dropna().items():
+            result.errors.append({"row": int(row_num), "message": message})
+            result.failed_records.append(chunk[row_num - 2 - offset])
+        if importer.search_collection:
+            await sync_search_entries(importer.search_collection, ids)
+        if importer.collection in expiries.SOURCES:
+            await expiries.sync_expiries(importer.collection, ids)
+        if progress:
+            await progress(offset + len(chunk), len(records))
+    return result
+
+
+def error_report_csv(result: ImportResult) -> bytes:
+    """The failed rows as they were uploaded, with their row number and error"""
+    columns = []
+    for record in result.failed_records:
+        columns.extend(key for key in record if key not in columns and key not in ("row", "error"))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["row", "error", *columns], extrasaction="ignore")
+    writer.writeheader()
+    for error, record in zip(result.errors, result.failed_records):
+        writer.writerow({**record, "row": error["row"], "error": error["message"]})
+    return buffer.getvalue().encode("utf-8-sig")  # BOM so Excel opens it as UTF-8
+
+
+async def _chunks(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def start_import_job(kind: str, org_id: str, records: List[Dict[str, Any]], created_by: str) -> Dict[str, Any]:
+    """Run an import in the background; the job result summarizes it and failed rows go to the report"""
+    job = await create_job(org_id, f"import:{kind}", created_by, params={"kind": kind}, total=len(records))
+
+    async def work(job):
+        async def progress(done, total):
+            await set_progress(job["id"], done, total)
+
+        result = await run_import(kind, org_id, records, progress)
+        if result.errors:
+            filename = f"import_errors_{kind}_{get_ist_now().strftime('%Y%m%d_%H%M')}.csv"
+            await write_artifact(job, filename, "text/csv", _chunks(error_report_csv(result)))
+        return {
+            "total": result.total,
+            "success": result.success,
+            "failed": len(result.errors),
+            "errors": result.errors[:ERROR_PREVIEW],
+        }
+
+    start_job(job, work)
+    return job
@@ -1,23 +1,23 @@
 """
 Email Service for Ticketing System
-- SMTP: Send notifications to ticket participants
+- SMTP: Queue notifications to ticket participants (services/mail_queue.py)
 - IMAP: Receive emails and create/sync tickets
 """
 import os
 import re
 import uuid
-import smtplib
 import imaplib
 import email
 import asyncio
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from email.header import decode_header
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from services.mail_queue import enqueue_email
+from services.inbox_worker import INBOX_BATCH_SIZE, select_folder, search_unseen, fetch_raw, mark_seen
+from services.tenant_counters import count_inserted
 from utils.helpers import get_ist_isoformat
 
 logger = logging.getLogger(__name__)
@@ -39,7 +39,6 @@ class EmailService:
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self._smtp_connected = False
         self._imap_connected = False
     
     def is_configured(self) -> bool:
@@ -48,17 +47,6 @@ class EmailService:
     
     # ==================== SMTP - SENDING EMAILS ====================
     
-    def _create_smtp_connection(self):
-        """Create SMTP connection with TLS"""
-        try:
-            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            return server
-        except Exception as e:
-            logger.error(f"SMTP connection failed: {e}")
-            return None
-    
     def _build_html_email(self, subject: str, body_html: str) -> str:
         """Build HTML email template"""
         return f"""
@@ -96,35 +84,27 @@ class EmailService:
         """
     
     async def send_email(self, to_email: str, subject: str, body_html: str, reply_to: Optional[str] = None) -> bool:
-        """Send an email via SMTP"""
+        """Queue an email for the outbound mail worker (services/mail_queue.py)"""
         if not self.is_configured():
             logger.warning("Email not configured, skipping send")
             return False
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = f"{EMAIL_FROM_NAME} <{EMAIL_USER}>"
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            msg['Reply-To'] = reply_to or EMAIL_REPLY_TO or EMAIL_USER
-            
             # Plain text version
             plain_text = re.sub(r'<[^>]+>', '', body_html)
-            msg.attach(MIMEText(plain_text, 'plain'))
-            
             # HTML version
             html_content = self._build_html_email(subject, body_html)
-            msg.attach(MIMEText(html_content, 'html'))
             
-            server = self._create_smtp_connection()
-            if server:
-                server.send_message(msg)
-                server.quit()
-                logger.info(f"Email sent to {to_email}: {subject}")
-                return True
-            return False
+            await enqueue_email(
+                to_email, subject, html_content,
+                profile="system",
+                text=plain_text,
+                reply_to=reply_to or EMAIL_REPLY_TO or EMAIL_USER
+            )
+            logger.info(f"Email queued for {to_email}: {subject}")
+            return True
         except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {e}")
+            logger.error(f"Failed to queue email to {to_email}: {e}")
             return False
     
     async def send_ticket_notification(self, ticket: dict, event_type: str, reply_content: Optional[str] = None):
@@ -319,23 +299,29 @@ class EmailService:
         return cleaned
     
     async def fetch_new_emails(self, folder: str = "INBOX", mark_read: bool = True) -> List[dict]:
-        """Fetch unread emails from IMAP inbox"""
+        """Fetch unread emails from IMAP inbox (blocking I/O runs in a worker thread)"""
         if not self.is_configured():
             return []
-        
+        return await asyncio.to_thread(self._fetch_new_emails_blocking, folder, mark_read)
+    
+    def _fetch_new_emails_blocking(self, folder: str, mark_read: bool) -> List[dict]:
         emails = []
         mail = self._create_imap_connection()
         if not mail:
             return []
         
         try:
-            mail.select(folder)
-            _, message_numbers = mail.search(None, 'UNSEEN')
+            select_folder(mail, folder)
+            # One UID SEARCH for every unseen message, then one UID FETCH per batch
+            uids = search_unseen(mail, limit=None)
+            fetched = [
+                item for start in range(0, len(uids), INBOX_BATCH_SIZE)
+                for item in fetch_raw(mail, uids[start:start + INBOX_BATCH_SIZE])
+            ]
+            seen = []
             
-            for num in message_numbers[0].split():
+            for uid, raw_email in fetched:
                 try:
-                    _, msg_data = mail.fetch(num, '(RFC822)')
-                    raw_email = msg_data[0][1]
                     msg = email.message_from_bytes(raw_email)
                     
                     # Extract email details
@@ -371,15 +357,15 @@ class EmailService:
                         "references": references,
                         "date": date_header,
                         "ticket_number": ticket_number,
-                        "imap_num": num
+                        "imap_uid": uid
                     })
-                    
-                    if mark_read:
-                        mail.store(num, '+FLAGS', '\\Seen')
+                    seen.append(uid)
                     
                 except Exception as e:
-                    logger.error(f"Error processing email {num}: {e}")
+                    logger.error(f"Error processing email {uid}: {e}")
             
+            if mark_read:
+                mark_seen(mail, seen)
             mail.logout()
         except Exception as e:
             logger.error(f"Error fetching emails: {e}")
@@ -526,6 +512,7 @@ class EmailService:
             }
             
             await self.db.tickets.insert_one(ticket)
+            await count_inserted("tickets", [ticket])
             
             # Create initial thread entry
             entry = {
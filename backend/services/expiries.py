@@ -0,0 +1,256 @@
+"""
+Expiry Index
+============
+One row per dated renewal item - device warranties, part warranties, AMCs,
+AMC contracts, licenses and email subscriptions - so the expiry alerts
+(`/admin/dashboard/alerts`, `/admin/renewal-alerts`) are an indexed range
+scan on (organization_id, expiry_date, kind) instead of loading every device,
+contract, license and subscription and bucketing days in Python.
+
+Collection `expiries`:
+- key              "<collection>:<entity id>" (unique)
+- kind             warranty | part_warranty | amc | amc_contract | license | subscription
+- organization_id, company_id
+- expiry_date      YYYY-MM-DD
+- doc              the fields alert lists display without reading the source
+
+Only live (not deleted) entities with a parseable expiry date have a row.
+`expiry_window` counts rows per (kind, day-range bucket) and returns the
+first rows of each bucket in one $facet aggregation, so the totals are exact
+however many items expire and the lists stay bounded.
+
+Call `await sync_expiries(collection, ids)` (or `sync_expiries_matching` for
+multi-document writes) after writing one of SOURCES. Failures are logged and
+never fail the write; `rebuild_expiries` fills the collection once at
+startup (services/backfills.py) and scripts/rebuild_expiries.py reconciles
+any drift.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne, DeleteOne
+
+from database import db
+from utils.helpers import get_ist_now, get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 1000
+ITEM_LIMIT = 200   # rows returned per (kind, bucket); counts are never limited
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+@dataclass(frozen=True)
+class Source:
+    kind: str
+    date_field: str
+    display: Tuple[str, ...]
+
+
+SOURCES: Dict[str, Source] = {
+    "devices": Source("warranty", "warranty_end_date", ("brand", "model", "serial_number", "asset_tag", "device_type")),
+    "parts": Source("part_warranty", "warranty_expiry_date", ("part_name", "device_id")),
+    "amc": Source("amc", "end_date", ("device_id", "amc_type")),
+    "amc_contracts": Source("amc_contract", "end_date", ("name", "amc_type", "start_date")),
+    "licenses": Source("license", "end_date", ("software_name", "vendor", "license_type")),
+    "email_subscriptions": Source("subscription", "renewal_date", ("provider_name", "domain", "plan_name")),
+}
+COLLECTION_OF_KIND = {source.kind: collection for collection, source in SOURCES.items()}
+
+
+def expiry_date(value: Any) -> Optional[str]:
+    """YYYY-MM-DD of a date / datetime string, or None if it isn't one"""
+    if not isinstance(value, str):
+        return None
+    day = value[:10]
+    if not _DATE_RE.match(day):
+        return None
+    try:
+        date.fromisoformat(day)  # rejects impossible dates such as 2025-02-30
+    except ValueError:
+        return None
+    return day
+
+
+def build_row(collection: str, doc: dict) -> Optional[Dict[str, Any]]:
+    """The expiry row of one entity, or None if it has none"""
+    source = SOURCES[collection]
+    day = expiry_date(doc.get(source.date_field))
+    if doc.get("is_deleted") or not doc.get("id") or not day:
+        return None
+    return {
+        "key": f"{collection}:{doc['id']}",
+        "kind": source.kind,
+        "source_id": doc["id"],
+        "organization_id": doc.get("organization_id"),
+        "company_id": doc.get("company_id"),
+        "expiry_date": day,
+        "doc": {f: doc.get(f) for f in source.display},
+        "updated_at": get_ist_isoformat(),
+    }
+
+
+def _projection(collection: str) -> Dict[str, int]:
+    source = SOURCES[collection]
+    fields = ("id", "organization_id", "company_id", "is_deleted", source.date_field, *source.display)
+    return {"_id": 0, **{f: 1 for f in fields}}
+
+
+def _row_ops(collection: str, docs: Iterable[dict], ids: Iterable[str] = ()) -> list:
+    """Upserts for entities with an expiry, deletes for the rest and for `ids` not in docs"""
+    ops = []
+    seen = set()
+    for doc in docs:
+        seen.add(doc.get("id"))
+        row = build_row(collection, doc)
+        if row:
+            ops.append(UpdateOne({"key": row["key"]}, {"$set": row}, upsert=True))
+        elif doc.get("id"):
+            ops.append(DeleteOne({"key": f"{collection}:{doc['id']}"}))
+    for entity_id in ids:
+        if entity_id not in seen:
+            ops.append(DeleteOne({"key": f"{collection}:{entity_id}"}))
+    return ops
+
+
+# ── write path ──────────────────────────────────────────────────────────────
+
+async def sync_expiries(collection: str, ids: Iterable[str]) -> None:
+    """Re-derive the expiry rows of the given entities (removed if deleted, gone or undated)"""
+    ids = [i for i in ids if i]
+    if not ids or collection not in SOURCES:
+        return
+    try:
+        docs = await db[collection].find({"id": {"$in": ids}}, _projection(collection)).to_list(len(ids))
+        ops = _row_ops(collection, docs, ids)
+        if ops:
+            await db.expiries.bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.error(f"Expiry index sync failed for {collection} {ids[:5]}: {e}")
+
+
+async def sync_expiries_matching(collection: str, query: Dict[str, Any]) -> None:
+    """Re-derive the expiry rows of every entity matching `query` (for update_many writes)"""
+    try:
+        ids = await db[collection].distinct("id", query)
+    except Exception as e:
+        logger.error(f"Expiry index sync failed for {collection} {query}: {e}")
+        return
+    for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+        await sync_expiries(collection, ids[start:start + REBUILD_BATCH_SIZE])
+
+
+async def rebuild_expiries(org_id: Optional[str] = None) -> Dict[str, int]:
+    """Re-derive every expiry row (of one organization) and drop rows whose entity is gone"""
+    stats = {}
+    scope = {"organization_id": org_id} if org_id else {}
+    started = get_ist_isoformat()
+    for collection in SOURCES:
+        scanned = 0
+        batch = []
+        async for doc in db[collection].find(scope, _projection(collection)):
+            batch.append(doc)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                await db.expiries.bulk_write(_row_ops(collection, batch), ordered=False)
+                scanned += len(batch)
+                batch = []
+        if batch:
+            await db.expiries.bulk_write(_row_ops(collection, batch), ordered=False)
+            scanned += len(batch)
+        stats[collection] = scanned
+    removed = await db.expiries.delete_many({**scope, "updated_at": {"$lt": started}})
+    stats["removed"] = removed.deleted_count
+    return stats
+
+
+# ── read path ───────────────────────────────────────────────────────────────
+
+# (label, first day offset, last day offset) relative to today, inclusive
+Bucket = Tuple[str, int, int]
+
+
+def day_offset(days: int) -> str:
+    return (get_ist_now() + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def window_pipeline(org_id: str, kinds: Sequence[str], buckets: Sequence[Bucket],
+                    company_id: Optional[str] = None, limit: int = ITEM_LIMIT) -> List[dict]:
+    """
+    One range scan over [first bucket start, last bucket end]; a facet per
+    (kind, bucket) with its first `limit` rows, plus exact per-facet counts.
+    """
+    ranges = [(label, day_offset(first), day_offset(last)) for label, first, last in buckets]
+    match: Dict[str, Any] = {
+        "organization_id": org_id,
+        "expiry_date": {"$gte": min(r[1] for r in ranges), "$lte": max(r[2] for r in ranges)},
+        "kind": {"$in": list(kinds)},
+    }
+    if company_id:
+        match["company_id"] = company_id
+
+    bucket_of = {"$switch": {
+        "branches": [
+            {"case": {"$and": [{"$gte": ["$expiry_date", start]}, {"$lte": ["$expiry_date", end]}]}, "then": label}
+            for label, start, end in ranges
+        ],
+        "default": None,
+    }}
+    facets: Dict[str, List[dict]] = {
+        "counts": [{"$group": {"_id": {"kind": "$kind", "bucket": bucket_of}, "n": {"$sum": 1}}}],
+    }
+    for kind in kinds:
+        for label, start, end in ranges:
+            facets[f"{kind}:{label}"] = [
+                {"$match": {"kind": kind, "expiry_date": {"$gte": start, "$lte": end}}},
+                {"$sort": {"expiry_date": 1}},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "kind": 1, "source_id": 1, "company_id": 1, "expiry_date": 1, "doc": 1}},
+            ]
+    return [{"$match": match}, {"$facet": facets}]
+
+
+async def expiry_window(org_id: str, kinds: Sequence[str], buckets: Sequence[Bucket],
+                        company_id: Optional[str] = None, limit: int = ITEM_LIMIT) -> Dict[str, Any]:
+    """
+    {"counts": {kind: {bucket: n}}, "items": {kind: {bucket: [rows, soonest first]}}}
+    Rows carry `days_remaining`.
+    """
+    result = await db.expiries.aggregate(window_pipeline(org_id, kinds, buckets, company_id, limit)).to_list(1)
+    facets = result[0] if result else {}
+
+    counts = {kind: {label: 0 for label, _, _ in buckets} for kind in kinds}
+    for row in facets.get("counts", []):
+        kind, label = row["_id"].get("kind"), row["_id"].get("bucket")
+        if kind in counts and label in counts[kind]:
+            counts[kind][label] = row["n"]
+
+    today = get_ist_now().date()
+    items: Dict[str, Dict[str, List[dict]]] = {kind: {} for kind in kinds}
+    for kind in kinds:
+        for label, _, _ in buckets:
+            rows = facets.get(f"{kind}:{label}", [])
+            for row in rows:
+                # Rows indexed before expiry_date validated the date may still hold an impossible one
+                day = expiry_date(row["expiry_date"])
+                row["days_remaining"] = (date.fromisoformat(day) - today).days if day else None
+            items[kind][label] = rows
+    return {"counts": counts, "items": items}
+
+
+async def hydrate(rows: List[dict], projection: Optional[Dict[str, Any]] = None) -> Dict[str, dict]:
+    """The source documents of expiry rows, keyed by "<kind>:<id>" (one $in per kind)"""
+    ids_by_kind: Dict[str, List[str]] = {}
+    for row in rows:
+        ids_by_kind.setdefault(row["kind"], []).append(row["source_id"])
+    docs = {}
+    for kind, ids in ids_by_kind.items():
+        found = await db[COLLECTION_OF_KIND[kind]].find(
+            {"id": {"$in": ids}}, projection or {"_id": 0}
+        ).to_list(len(ids))
+        for doc in found:
+            docs[f"{kind}:{doc['id']}"] = doc
+    return docs
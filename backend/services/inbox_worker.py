@@ -0,0 +1,477 @@
+"""
+Email Inbox Ingestion Worker
+============================
+Polls each org's IMAP mailbox (ticket_email_config) without blocking the
+event loop, and feeds the messages to the async email-to-ticket pipeline.
+
+- Blocking imaplib work (login, UID SEARCH, UID FETCH, MIME parsing) runs on
+  a dedicated thread pool; at most `threads` mailboxes are polled at a time
+- Only UIDs above the mailbox's last processed UID are searched, and the
+  whole batch is retrieved with a single UID FETCH (BODY.PEEK, so nothing is
+  flagged \\Seen before it has been turned into a ticket)
+- Parsed messages go to the pipeline through an asyncio.Queue; the ones it
+  processed are flagged \\Seen with one UID STORE and the cursor advances
+- A message that fails MAX_MESSAGE_ATTEMPTS passes in a row is recorded as a
+  poison UID (imap_poison_uids) and the cursor moves past it, left unseen,
+  so one unparseable email cannot stall the mailbox
+- Each pass carries one TicketNumberBlock (message["ticket_numbers"]), so the
+  tickets it creates take their numbers from a single sequence reservation
+- A lease on the config document keeps two app processes (or the poller and
+  a manual sync) from ingesting the same mailbox at once
+
+Configuration (env):
+    EMAIL_INBOX_WORKER       "0" disables background polling (default on)
+    INBOX_WORKER_THREADS     mailboxes polled in parallel (default 4)
+    INBOX_POLL_SECONDS       how often due mailboxes are looked for (default 60)
+    INBOX_BATCH_SIZE         max messages per mailbox per pass (default 50)
+"""
+import asyncio
+import email
+import imaplib
+import logging
+import os
+import re
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.header import decode_header
+from email.utils import parseaddr
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from services.ticket_sequence import TicketNumberBlock
+from utils.helpers import get_ist_now, get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+INBOX_WORKER_ENABLED = os.environ.get("EMAIL_INBOX_WORKER", "1") != "0"
+INBOX_WORKER_THREADS = int(os.environ.get("INBOX_WORKER_THREADS", "4"))
+INBOX_POLL_SECONDS = int(os.environ.get("INBOX_POLL_SECONDS", "60"))
+INBOX_BATCH_SIZE = int(os.environ.get("INBOX_BATCH_SIZE", "50"))
+LEASE_SECONDS = 600
+MAX_MESSAGE_ATTEMPTS = 3
+POISON_UIDS_KEPT = 100
+
+# handler(config, message) -> "created" | "updated" | None
+MessageHandler = Callable[[dict, dict], Awaitable[Optional[str]]]
+
+_UID_RE = re.compile(rb"UID (\d+)")
+
+
+# ==================== MESSAGE PARSING ====================
+
+def decode_email_header(header_val):
+    """Decode email header value"""
+    if not header_val:
+        return ""
+    decoded_parts = decode_header(header_val)
+    result = []
+    for part, charset in decoded_parts:
+        if isinstance(part, bytes):
+            result.append(part.decode(charset or 'utf-8', errors='replace'))
+        else:
+            result.append(str(part))
+    return " ".join(result)
+
+
+def extract_email_body(msg):
+    """Extract plain text body from email"""
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            ct = part.get_content_type()
+            cd = str(part.get("Content-Disposition", ""))
+            if ct == "text/plain" and "attachment" not in cd:
+                payload = part.get_payload(decode=True)
+                if payload:
+                    charset = part.get_content_charset() or 'utf-8'
+                    body = payload.decode(charset, errors='replace')
+                    break
+        if not body:
+            for part in msg.walk():
+                if part.get_content_type() == "text/html" and "attachment" not in str(part.get("Content-Disposition", "")):
+                    payload = part.get_payload(decode=True)
+                    if payload:
+                        charset = part.get_content_charset() or 'utf-8'
+                        body = payload.decode(charset, errors='replace')
+                        body = re.sub(r'<[^>]+>', '', body)
+                        break
+    else:
+        payload = msg.get_payload(decode=True)
+        if payload:
+            charset = msg.get_content_charset() or 'utf-8'
+            body = payload.decode(charset, errors='replace')
+    return body.strip()
+
+
+def parse_message(uid: int, raw: bytes) -> dict:
+    """RFC822 bytes → the fields the ticket pipeline uses"""
+    msg = email.message_from_bytes(raw)
+    from_name, from_email = parseaddr(msg.get("From", ""))
+    return {
+        "uid": uid,
+        "subject": decode_email_header(msg.get("Subject", "")),
+        "from_name": decode_email_header(from_name) or from_email,
+        "from_email": from_email,
+        "message_id": msg.get("Message-ID", ""),
+        "in_reply_to": msg.get("In-Reply-To", ""),
+        "date": msg.get("Date", ""),
+        "body": extract_email_body(msg),
+    }
+
+
+# ==================== BLOCKING IMAP PRIMITIVES ====================
+# Everything below talks to the server synchronously; call it from a worker thread.
+
+def open_mailbox(config: dict, timeout: int = 30):
+    if config.get("imap_use_ssl", True):
+        conn = imaplib.IMAP4_SSL(config["imap_host"], config.get("imap_port", 993), timeout=timeout)
+    else:
+        conn = imaplib.IMAP4(config["imap_host"], config.get("imap_port", 993), timeout=timeout)
+    conn.login(config.get("imap_username") or config["email_address"], config["imap_password"])
+    return conn
+
+
+def select_folder(conn, folder: str = "INBOX") -> Optional[int]:
+    """Select a folder and return its UIDVALIDITY (None if the server omits it)"""
+    status, data = conn.select(folder)
+    if status != "OK":
+        raise RuntimeError(f"Cannot select folder {folder}: {data}")
+    _, validity = conn.response("UIDVALIDITY")
+    try:
+        return int(validity[0]) if validity and validity[0] else None
+    except (TypeError, ValueError):
+        return None
+
+
+def search_unseen(conn, after_uid: int = 0, limit: Optional[int] = INBOX_BATCH_SIZE) -> List[int]:
+    """UIDs of unseen messages above `after_uid`, oldest first; all of them when `limit` is None"""
+    criteria = ("UID", f"{after_uid + 1}:*", "UNSEEN") if after_uid else ("UNSEEN",)
+    status, data = conn.uid("SEARCH", None, *criteria)
+    if status != "OK":
+        raise RuntimeError(f"UID SEARCH failed: {data}")
+    # "n:*" always matches the newest message, even when its UID is below n
+    uids = sorted(int(u) for u in (data[0] or b"").split() if int(u) > after_uid)
+    return uids[:limit]
+
+
+def fetch_raw(conn, uids: List[int]) -> List[Tuple[int, bytes]]:
+    """Retrieve a batch of messages with one UID FETCH, without setting \\Seen"""
+    if not uids:
+        return []
+    status, data = conn.uid("FETCH", ",".join(str(u) for u in uids), "(UID BODY.PEEK[])")
+    if status != "OK":
+        raise RuntimeError(f"UID FETCH failed: {data}")
+    messages = []
+    for item in data:
+        if not isinstance(item, tuple):
+            continue  # closing ")" of each FETCH response
+        match = _UID_RE.search(item[0])
+        if match:
+            messages.append((int(match.group(1)), item[1]))
+    return sorted(messages)
+
+
+def mark_seen(conn, uids: List[int]) -> None:
+    if uids:
+        conn.uid("STORE", ",".join(str(u) for u in uids), "+FLAGS", "(\\Seen)")
+
+
+def close_mailbox(conn) -> None:
+    try:
+        conn.logout()
+    except Exception:
+        pass
+
+
+def fetch_batch(
+    conn,
+    folder: str,
+    last_uid: int = 0,
+    uid_validity: Optional[int] = None,
+    limit: int = INBOX_BATCH_SIZE
+) -> Tuple[List[dict], int, Optional[int]]:
+    """
+    Select `folder` and fetch + parse unseen messages past the cursor.
+    Returns (messages, effective last_uid, current UIDVALIDITY).
+    """
+    validity = select_folder(conn, folder)
+    if uid_validity and validity and validity != uid_validity:
+        # The server renumbered the folder; old UIDs mean nothing any more
+        last_uid = 0
+    uids = search_unseen(conn, last_uid, limit)
+    messages = []
+    for uid, raw in fetch_raw(conn, uids):
+        try:
+            messages.append(parse_message(uid, raw))
+        except Exception as e:
+            logger.error(f"Unparseable email UID {uid}: {e}")
+            messages.append({"uid": uid, "parse_error": str(e)})
+    return messages, last_uid, validity
+
+
+# ==================== WORKER ====================
+
+class InboxWorker:
+    """Runs IMAP I/O on a thread pool and message handling on the event loop"""
+
+    def __init__(
+        self,
+        db,
+        handler: MessageHandler,
+        threads: int = INBOX_WORKER_THREADS,
+        poll_seconds: int = INBOX_POLL_SECONDS,
+        batch_size: int = INBOX_BATCH_SIZE,
+        connect: Callable[[dict], Any] = open_mailbox
+    ):
+        self.db = db
+        self.handler = handler
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.connect = connect
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="imap")
+        self._slots = asyncio.Semaphore(threads)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=batch_size * threads)
+        self._consumer: Optional[asyncio.Task] = None
+        self._poller: Optional[asyncio.Task] = None
+
+    async def _io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ── pipeline side ──
+
+    def _ensure_consumer(self) -> None:
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._consume())
+
+    async def _consume(self) -> None:
+        """Single consumer, so messages of one mailbox are handled in UID order"""
+        while True:
+            config, message, done = await self._queue.get()
+            try:
+                if message.get("parse_error"):
+                    raise ValueError(message["parse_error"])
+                result = await self.handler(config, message)
+                if not done.done():
+                    done.set_result(result)
+            except Exception as e:
+                if not done.done():
+                    done.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    # ── one mailbox ──
+
+    async def ingest(
+        self,
+        config: dict,
+        last_uid: int = 0,
+        uid_validity: Optional[int] = None,
+        failures: Optional[Dict[str, int]] = None
+    ) -> Tuple[dict, dict]:
+        """
+        One pass over a mailbox. Returns (results, cursor) where cursor is
+        {"last_uid", "uid_validity", "failures"} to persist for the next pass
+        plus the "poisoned" UIDs given up on in this pass. `failures` counts
+        the failed passes per UID (as a string) above the cursor.
+        """
+        self._ensure_consumer()
+        results = {"fetched": 0, "new_tickets": 0, "updated_tickets": 0, "errors": []}
+        failures = dict(failures or {})
+        conn = await self._io(self.connect, config)
+        try:
+            messages, last_uid, validity = await self._io(
+                fetch_batch, conn, config.get("imap_folder", "INBOX"), last_uid, uid_validity, self.batch_size
+            )
+            if uid_validity and validity and validity != uid_validity:
+                failures = {}  # counted against the old UIDs
+            loop = asyncio.get_running_loop()
+            numbers = TicketNumberBlock(config["organization_id"], len(messages))
+            pending = []
+            for message in messages:
+                message["ticket_numbers"] = numbers
+                done = loop.create_future()
+                await self._queue.put((config, message, done))
+                pending.append(done)
+            outcomes = await asyncio.gather(*pending, return_exceptions=True)
+            await numbers.release()
+
+            processed, failed, poisoned = [], [], []
+            for message, outcome in zip(messages, outcomes):
+                key = str(message["uid"])
+                if isinstance(outcome, BaseException):
+                    results["errors"].append(f"Email processing error: {str(outcome)[:100]}")
+                    logger.error(f"Email processing error (UID {message['uid']}): {outcome}")
+                    failures[key] = failures.get(key, 0) + 1
+                    if failures[key] >= MAX_MESSAGE_ATTEMPTS:
+                        poisoned.append(message["uid"])
+                        logger.error(f"Skipping email UID {message['uid']} after {failures[key]} failed attempts")
+                    else:
+                        failed.append(message["uid"])
+                    continue
+                failures.pop(key, None)
+                processed.append(message["uid"])
+                results["fetched"] += 1
+                if outcome == "created":
+                    results["new_tickets"] += 1
+                elif outcome == "updated":
+                    results["updated_tickets"] += 1
+            await self._io(mark_seen, conn, processed)
+        finally:
+            await self._io(close_mailbox, conn)
+
+        # Failed messages stay unseen and above the cursor, so the next pass
+        # retries them; poisoned ones stay unseen but the cursor moves past them
+        if failed:
+            last_uid = min(failed) - 1
+        elif messages:
+            last_uid = max(m["uid"] for m in messages)
+        failures = {key: n for key, n in failures.items() if int(key) > last_uid}
+        return results, {"last_uid": last_uid, "uid_validity": validity, "failures": failures, "poisoned": poisoned}
+
+    async def _claim(self, org_id: str) -> Optional[dict]:
+        now = get_ist_now()
+        return await self.db.ticket_email_config.find_one_and_update(
+            {"organization_id": org_id, "$or": [
+                {"ingest_lease_until": None},
+                {"ingest_lease_until": {"$lt": now.isoformat()}},
+            ]},
+            {"$set": {
+                "ingest_lease_until": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+                "ingest_lease_owner": self.owner,
+            }},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def sync_mailbox(self, config: dict) -> dict:
+        """Lease, ingest and record one org's mailbox; same result shape as a manual sync"""
+        org_id = config["organization_id"]
+        claimed = await self._claim(org_id)
+        if not claimed:
+            return {"fetched": 0, "new_tickets": 0, "updated_tickets": 0,
+                    "errors": ["A sync for this mailbox is already running"]}
+        try:
+            results, cursor = await self.ingest(
+                claimed, claimed.get("imap_last_uid") or 0, claimed.get("imap_uid_validity"),
+                claimed.get("imap_failed_uids")
+            )
+            update = {"$set": {
+                "last_sync_at": get_ist_isoformat(),
+                "last_sync_status": "success",
+                "last_sync_results": results,
+                "imap_last_uid": cursor["last_uid"],
+                "imap_uid_validity": cursor["uid_validity"],
+                "imap_failed_uids": cursor["failures"],
+            }, "$inc": {
+                "total_emails_fetched": results["fetched"],
+                "total_tickets_created": results["new_tickets"],
+            }}
+            if cursor["poisoned"]:
+                update["$push"] = {"imap_poison_uids": {"$each": [
+                    {"uid": uid, "uid_validity": cursor["uid_validity"], "skipped_at": get_ist_isoformat()}
+                    for uid in cursor["poisoned"]
+                ], "$slice": -POISON_UIDS_KEPT}}
+            await self.db.ticket_email_config.update_one({"organization_id": org_id}, update)
+            await self.db.ticket_email_sync_log.insert_one({
+                "id": str(uuid.uuid4()),
+                "organization_id": org_id,
+                "synced_at": get_ist_isoformat(),
+                "status": "success",
+                "fetched": results["fetched"],
+                "new_tickets": results["new_tickets"],
+                "updated_tickets": results["updated_tickets"],
+                "errors": results["errors"],
+            })
+            return results
+        except Exception as e:
+            logger.error(f"Email sync error for org {org_id}: {e}")
+            await self.db.ticket_email_config.update_one(
+                {"organization_id": org_id},
+                {"$set": {
+                    "last_sync_at": get_ist_isoformat(),
+                    "last_sync_status": "error",
+                    "last_sync_error": str(e)[:500],
+                }}
+            )
+            await self.db.ticket_email_sync_log.insert_one({
+                "id": str(uuid.uuid4()),
+                "organization_id": org_id,
+                "synced_at": get_ist_isoformat(),
+                "status": "error",
+                "error": str(e)[:500],
+            })
+            return {"fetched": 0, "new_tickets": 0, "updated_tickets": 0, "errors": [str(e)]}
+        finally:
+            await self.db.ticket_email_config.update_one(
+                {"organization_id": org_id, "ingest_lease_owner": self.owner},
+                {"$set": {"ingest_lease_until": None, "ingest_lease_owner": None}}
+            )
+
+    # ── polling ──
+
+    @staticmethod
+    def _is_due(config: dict, now: datetime) -> bool:
+        last = config.get("last_sync_at")
+        if not last:
+            return True
+        try:
+            last_at = datetime.fromisoformat(last)
+        except ValueError:
+            return True
+        return now - last_at >= timedelta(minutes=config.get("poll_interval_minutes") or 5)
+
+    async def _sync_bounded(self, config: dict) -> dict:
+        async with self._slots:
+            return await self.sync_mailbox(config)
+
+    async def poll_due(self) -> int:
+        """Sync every active mailbox whose poll interval has elapsed; returns how many"""
+        configs = await self.db.ticket_email_config.find(
+            {"is_active": True, "imap_host": {"$nin": [None, ""]}},
+            {"_id": 0}
+        ).to_list(None)
+        now = get_ist_now()
+        due = [c for c in configs if self._is_due(c, now)]
+        await asyncio.gather(*(self._sync_bounded(c) for c in due))
+        return len(due)
+
+    async def _poll_forever(self) -> None:
+        while True:
+            try:
+                await self.poll_due()
+            except Exception as e:
+                logger.error(f"Inbox poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self) -> None:
+        self._ensure_consumer()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_forever())
+            logger.info(f"Inbox worker started ({self.owner})")
+
+    async def stop(self) -> None:
+        for task in (self._poller, self._consumer):
+            if task is not None:
+                task.cancel()
+        self._poller = self._consumer = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instance
+_inbox_worker: Optional[InboxWorker] = None
+
+
+def init_inbox_worker(db, handler: MessageHandler) -> InboxWorker:
+    """Initialize the inbox worker"""
+    global _inbox_worker
+    _inbox_worker = InboxWorker(db, handler)
+    return _inbox_worker
+
+
+def get_inbox_worker() -> Optional[InboxWorker]:
+    """Get the inbox worker instance"""
+    return _inbox_worker
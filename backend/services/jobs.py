@@ -0,0 +1,170 @@
+"""
+Background Jobs
+===============
+Long-running admin operations (bulk QR label sheets, imports) run as an
+asyncio task in the app process and report through a `jobs` document:
+
+- id, organization_id, kind, created_by
+- status           queued | running | completed | failed
+- progress         {"done": n, "total": n}
+- result           kind-specific summary once completed
+- error            message once failed
+- artifact         {"file_id", "filename", "media_type", "size"} for jobs
+                   that produce a file
+
+Files are written to GridFS (bucket `job_files`) chunk by chunk while the
+job runs, so they are never held in memory and any app process can stream
+the download. Jobs and their files are purged JOB_RETENTION_DAYS after they
+finish. A running job whose process died stops updating and is reported as
+failed once JOB_STALE_SECONDS pass without progress.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from database import db
+from utils.helpers import get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+JOB_RETENTION_DAYS = 2
+JOB_STALE_SECONDS = 600
+FILE_BUCKET = "job_files"
+
+# work(job) -> result summary
+JobWork = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+_tasks = set()
+
+
+def _bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=FILE_BUCKET)
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job as returned by the API (internal fields removed)"""
+    job = {k: v for k, v in job.items() if k not in ("_id", "purge_at", "heartbeat_at")}
+    if job.get("artifact"):
+        job["artifact"] = {k: v for k, v in job["artifact"].items() if k != "file_id"}
+    return job
+
+
+async def create_job(org_id: str, kind: str, created_by: str,
+                     params: Optional[Dict[str, Any]] = None, total: int = 0) -> Dict[str, Any]:
+    await purge_expired_jobs()
+    now = get_ist_isoformat()
+    job = {
+        "id": str(uuid.uuid4()),
+        "organization_id": org_id,
+        "kind": kind,
+        "created_by": created_by,
+        "params": params or {},
+        "status": "queued",
+        "progress": {"done": 0, "total": total},
+        "result": None,
+        "error": None,
+        "artifact": None,
+        "created_at": now,
+        "updated_at": now,
+        "heartbeat_at": datetime.now(timezone.utc),
+    }
+    await db.jobs.insert_one(dict(job))
+    return job
+
+
+async def get_job(job_id: str, org_id: str) -> Optional[Dict[str, Any]]:
+    job = await db.jobs.find_one({"id": job_id, "organization_id": org_id}, {"_id": 0})
+    if not job or job["status"] not in ("queued", "running"):
+        return job
+    heartbeat = job.get("heartbeat_at")
+    if heartbeat and heartbeat.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS):
+        await _finish(job_id, "failed", error="Job was interrupted")
+        job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    return job
+
+
+async def set_progress(job_id: str, done: int, total: Optional[int] = None) -> None:
+    fields = {"progress.done": done, "updated_at": get_ist_isoformat(), "heartbeat_at": datetime.now(timezone.utc)}
+    if total is not None:
+        fields["progress.total"] = total
+    await db.jobs.update_one({"id": job_id}, {"$set": fields})
+
+
+async def _finish(job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+    await db.jobs.update_one({"id": job_id}, {"$set": {
+        "status": status,
+        "result": result,
+        "error": error,
+        "updated_at": get_ist_isoformat(),
+        "finished_at": get_ist_isoformat(),
+        "purge_at": datetime.now(timezone.utc) + timedelta(days=JOB_RETENTION_DAYS),
+    }})
+
+
+async def _run(job: Dict[str, Any], work: JobWork) -> None:
+    await db.jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": "running", "started_at": get_ist_isoformat(), "heartbeat_at": datetime.now(timezone.utc)
+    }})
+    try:
+        result = await work(job)
+    except Exception as e:
+        logger.exception(f"Job {job['id']} ({job['kind']}) failed")
+        await _finish(job["id"], "failed", error=str(e) or e.__class__.__name__)
+        return
+    await _finish(job["id"], "completed", result=result)
+
+
+def start_job(job: Dict[str, Any], work: JobWork) -> None:
+    """Run `work(job)` in the background; its return value becomes the job result"""
+    task = asyncio.create_task(_run(job, work))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def write_artifact(job: Dict[str, Any], filename: str, media_type: str,
+                         chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """Store the file produced by a job as it is generated and attach it to the job"""
+    stream = _bucket().open_upload_stream(filename, metadata={
+        "job_id": job["id"], "organization_id": job["organization_id"], "contentType": media_type
+    })
+    size = 0
+    try:
+        async for chunk in chunks:
+            await stream.write(chunk)
+            size += len(chunk)
+    except BaseException:
+        await stream.abort()
+        raise
+    await stream.close()
+    artifact = {"file_id": stream._id, "filename": filename, "media_type": media_type, "size": size}
+    await db.jobs.update_one({"id": job["id"]}, {"$set": {"artifact": artifact}})
+    return artifact
+
+
+async def read_artifact(job: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """The job's file, one GridFS chunk at a time"""
+    stream = await _bucket().open_download_stream(job["artifact"]["file_id"])
+    while True:
+        chunk = await stream.readchunk()
+        if not chunk:
+            break
+        yield chunk
+
+
+async def purge_expired_jobs() -> int:
+    """Delete finished jobs past their retention, with their files"""
+    now = datetime.now(timezone.utc)
+    expired = await db.jobs.find({"purge_at": {"$lt": now}}, {"_id": 0, "id": 1, "artifact": 1}).to_list(100)
+    bucket = _bucket()
+    for job in expired:
+        if job.get("artifact"):
+            try:
+                await bucket.delete(job["artifact"]["file_id"])
+            except Exception as e:
+                logger.warning(f"Could not delete file of job {job['id']}: {e}")
+        await db.jobs.delete_one({"id": job["id"]})
+    return len(expired)
@@ -0,0 +1,542 @@
+"""
+Outbound Mail Queue
+===================
+Request handlers never talk SMTP. They call `enqueue_email(...)`, which
+writes one `email_outbox` document per recipient and returns immediately;
+`MailWorker` delivers them in the background.
+
+- Durable: the queue lives in MongoDB, so restarts lose nothing; a lease on
+  claimed messages lets several app processes share the queue safely
+- Per-recipient dedup, opt-in: a caller-supplied `dedup_key` (or, with
+  `dedup_content`, the message content within DEDUP_WINDOW_SECONDS) turns
+  repeated enqueues into no-ops; without either every enqueue is delivered
+- Batching + pooling: claimed messages are grouped by SMTP account and sent
+  over pooled, reused connections (`SmtpPool`) on a thread pool, so there is
+  one TCP+TLS handshake per account instead of one per message
+- Retry: transient failures back off exponentially (with jitter) up to
+  MAX_ATTEMPTS; permanent 5xx rejections fail immediately
+
+SMTP accounts ("profiles") are resolved at send time, so no credentials are
+stored in the queue:
+    "system"    SMTP_HOST / SMTP_PORT / EMAIL_USER / EMAIL_PASSWORD (env)
+    "settings"  the org's settings.smtp_host / smtp_user / smtp_pass / smtp_from
+    "inbox"     the org's ticket_email_config SMTP settings
+
+Configuration (env):
+    MAIL_WORKER                "0" disables delivery in this process (default on)
+    MAIL_WORKER_THREADS        SMTP accounts sent to in parallel (default 4)
+    MAIL_POOL_SIZE             idle connections kept per SMTP account (default 2)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.helpers import get_ist_now, get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+MAIL_WORKER_ENABLED = os.environ.get("MAIL_WORKER", "1") != "0"
+MAIL_WORKER_THREADS = int(os.environ.get("MAIL_WORKER_THREADS", "4"))
+MAIL_POOL_SIZE = int(os.environ.get("MAIL_POOL_SIZE", "2"))
+
+BATCH_SIZE = 100
+POLL_SECONDS = 10
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+DEDUP_WINDOW_SECONDS = 600
+RETENTION_DAYS = 30
+SMTP_TIMEOUT = 15
+SMTP_IDLE_SECONDS = 60
+
+PROFILES = ("system", "settings", "inbox")
+
+
+# ==================== ENQUEUE ====================
+
+def _recipients(to: Union[str, Iterable[str], None]) -> List[str]:
+    if not to:
+        return []
+    items = [to] if isinstance(to, str) else list(to)
+    seen, result = set(), []
+    for item in items:
+        for address in str(item).split(","):
+            address = address.strip()
+            if address and address.lower() not in seen:
+                seen.add(address.lower())
+                result.append(address)
+    return result
+
+
+def dedup_key_for(
+    recipient: str,
+    subject: str,
+    html: str,
+    org_id: Optional[str] = None,
+    profile: str = "system",
+    key: Optional[str] = None,
+    content: bool = False,
+    now: Optional[float] = None
+) -> str:
+    """
+    Per-recipient dedup key. With an explicit `key` the same logical message is
+    sent once per recipient; with `content` identical content to the same
+    recipient is collapsed within DEDUP_WINDOW_SECONDS. Otherwise the key is
+    unique, so the message is never taken for a duplicate.
+    """
+    if key is None and not content:
+        key = f"message:{uuid.uuid4()}"
+    elif key is None:
+        window = int((now if now is not None else time.time()) // DEDUP_WINDOW_SECONDS)
+        digest = hashlib.sha256(f"{subject}\x00{html}".encode()).hexdigest()
+        key = f"content:{digest}:{window}"
+    return hashlib.sha256(f"{org_id}|{profile}|{recipient.lower()}|{key}".encode()).hexdigest()
+
+
+async def enqueue_email(
+    to: Union[str, Iterable[str]],
+    subject: str,
+    html: str,
+    org_id: Optional[str] = None,
+    profile: str = "settings",
+    text: Optional[str] = None,
+    from_addr: Optional[str] = None,
+    reply_to: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    dedup_key: Optional[str] = None,
+    dedup_content: bool = False,
+    context: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """
+    Queue a message for every recipient. Returns the ids of the queued
+    messages (recipients already queued under the same dedup key are skipped;
+    `dedup_content` also skips identical content sent within the dedup window).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown SMTP profile: {profile}")
+    now = get_ist_isoformat()
+    queued = []
+    for recipient in _recipients(to):
+        doc = {
+            "id": str(uuid.uuid4()),
+            "organization_id": org_id,
+            "profile": profile,
+            "to": recipient,
+            "subject": subject,
+            "html": html,
+            "text": text,
+            "from_addr": from_addr,
+            "reply_to": reply_to,
+            "headers": headers or {},
+            "context": context or {},
+            "dedup_key": dedup_key_for(recipient, subject, html, org_id, profile, dedup_key, dedup_content),
+            "status": "queued",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        try:
+            await db.email_outbox.insert_one(doc)
+            queued.append(doc["id"])
+        except DuplicateKeyError:
+            logger.info(f"Skipping duplicate email to {recipient}: {subject}")
+    if queued and _mail_worker is not None:
+        _mail_worker.wake()
+    return queued
+
+
+# ==================== SMTP ACCOUNTS ====================
+
+async def resolve_smtp(org_id: Optional[str], profile: str) -> Optional[dict]:
+    """
+    Connection settings for an SMTP profile:
+    {host, port, username, password, use_ssl, use_tls, from_addr}, or None
+    when the account is not configured.
+    """
+    if profile == "system":
+        host, user = os.environ.get("SMTP_HOST", "smtp.gmail.com"), os.environ.get("EMAIL_USER", "")
+        password = os.environ.get("EMAIL_PASSWORD", "")
+        if not (user and password):
+            return None
+        port = int(os.environ.get("SMTP_PORT", "587"))
+        return {
+            "host": host, "port": port, "username": user, "password": password,
+            "use_ssl": port == 465, "use_tls": True,
+            "from_addr": f"{os.environ.get('EMAIL_FROM_NAME', 'Support Team')} <{user}>",
+            "reply_to": os.environ.get("EMAIL_REPLY_TO", "") or user,
+        }
+
+    if profile == "settings":
+        settings = await db.settings.find_one(
+            {"organization_id": org_id},
+            {"_id": 0, "smtp_host": 1, "smtp_port": 1, "smtp_user": 1, "smtp_pass": 1, "smtp_from": 1}
+        )
+        if not settings or not settings.get("smtp_host"):
+            return None
+        port = int(settings.get("smtp_port", 587))
+        return {
+            "host": settings["smtp_host"], "port": port,
+            "username": settings.get("smtp_user"), "password": settings.get("smtp_pass"),
+            "use_ssl": port == 465, "use_tls": True,
+            "from_addr": settings.get("smtp_from", settings.get("smtp_user", "")),
+        }
+
+    if profile == "inbox":
+        config = await db.ticket_email_config.find_one({"organization_id": org_id}, {"_id": 0})
+        if not config or not config.get("smtp_host"):
+            return None
+        port = int(config.get("smtp_port", 587))
+        return {
+            "host": config["smtp_host"], "port": port,
+            "username": config.get("smtp_username") or config.get("email_address"),
+            "password": config.get("smtp_password"),
+            "use_ssl": port == 465, "use_tls": config.get("smtp_use_tls", True),
+            "from_addr": f"{config.get('display_name', '')} <{config.get('email_address', '')}>",
+        }
+    return None
+
+
+async def smtp_configured(org_id: Optional[str], profile: str = "settings") -> bool:
+    return await resolve_smtp(org_id, profile) is not None
+
+
+# ==================== CONNECTION POOL ====================
+
+class SmtpPool:
+    """
+    Reusable SMTP connections keyed by (host, port, username).
+    Thread-safe; a connection is used by one thread at a time.
+    """
+
+    def __init__(self, max_idle: int = MAIL_POOL_SIZE, idle_seconds: float = SMTP_IDLE_SECONDS, timeout: float = SMTP_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self._idle: Dict[Tuple, List[Tuple[smtplib.SMTP, float]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.reuses = 0
+
+    @staticmethod
+    def _key(account: dict) -> Tuple:
+        return account["host"], int(account["port"]), account.get("username") or ""
+
+    def _connect(self, account: dict) -> smtplib.SMTP:
+        if account.get("use_ssl"):
+            conn = smtplib.SMTP_SSL(account["host"], int(account["port"]), timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(account["host"], int(account["port"]), timeout=self.timeout)
+            if account.get("use_tls", True):
+                conn.starttls()
+        if account.get("username") and account.get("password"):
+            conn.login(account["username"], account["password"])
+        self.connects += 1
+        return conn
+
+    def acquire(self, account: dict) -> smtplib.SMTP:
+        key = self._key(account)
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle[key]
+                if not idle:
+                    break
+                conn, last_used = idle.pop()
+            if now - last_used > self.idle_seconds:
+                self.discard(conn)
+                continue
+            try:
+                if conn.noop()[0] == 250:
+                    self.reuses += 1
+                    return conn
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self.discard(conn)
+        return self._connect(account)
+
+    def release(self, account: dict, conn: smtplib.SMTP) -> None:
+        with self._lock:
+            idle = self._idle[self._key(account)]
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+
+    @staticmethod
+    def discard(conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn, _ in conns]
+            self._idle.clear()
+        for conn in idle:
+            self.discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = sum(len(v) for v in self._idle.values())
+        return {"connects": self.connects, "reuses": self.reuses, "idle": idle}
+
+
+# ==================== DELIVERY (blocking, worker threads) ====================
+
+def build_message(message: dict, account: dict) -> MIMEMultipart:
+    msg = MIMEMultipart("alternative")
+    msg["From"] = message.get("from_addr") or account.get("from_addr") or account.get("username") or ""
+    msg["To"] = message["to"]
+    msg["Subject"] = message.get("subject", "")
+    reply_to = message.get("reply_to") or account.get("reply_to")
+    if reply_to:
+        msg["Reply-To"] = reply_to
+    for name, value in (message.get("headers") or {}).items():
+        msg[name] = value
+    html = message.get("html") or ""
+    text = message.get("text")
+    if text is None and html:
+        text = re.sub(r"<[^>]+>", "", html)
+    if text:
+        msg.attach(MIMEText(text, "plain"))
+    if html:
+        msg.attach(MIMEText(html, "html"))
+    return msg
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPServerDisconnected)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _reset(pool: SmtpPool, conn: Optional[smtplib.SMTP]) -> Optional[smtplib.SMTP]:
+    """Abort the current transaction but keep the connection if it is still healthy"""
+    if conn is None:
+        return None
+    try:
+        conn.rset()
+        return conn
+    except Exception:
+        pool.discard(conn)
+        return None
+
+
+def send_batch(pool: SmtpPool, account: dict, messages: List[dict]) -> List[Tuple[str, Optional[str], bool]]:
+    """
+    Deliver messages that share one SMTP account over a pooled connection.
+    Returns (message id, error or None, permanent) per message.
+    """
+    outcomes = []
+    conn = None
+    for message in messages:
+        error: Optional[Exception] = None
+        for _ in range(2):
+            try:
+                if conn is None:
+                    conn = pool.acquire(account)
+                conn.send_message(build_message(message, account), to_addrs=[message["to"]])
+                error = None
+                break
+            except smtplib.SMTPRecipientsRefused as e:
+                # Rejected recipient; the connection is still usable
+                error = e
+                break
+            except smtplib.SMTPResponseException as e:
+                # The server answered with an error (login, MAIL, DATA): no resend now
+                error = e
+                conn = _reset(pool, conn)
+                break
+            except (smtplib.SMTPException, OSError) as e:
+                # Dropped or stale connection: reconnect once for this message
+                error = e
+                if conn is not None:
+                    pool.discard(conn)
+                conn = None
+        if error is None:
+            outcomes.append((message["id"], None, False))
+        else:
+            outcomes.append((message["id"], str(error)[:500], _is_permanent(error)))
+    if conn is not None:
+        pool.release(account, conn)
+    return outcomes
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt after `attempts` failures (exponential, ±20% jitter)"""
+    delay = min(RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ==================== WORKER ====================
+
+class MailWorker:
+    def __init__(
+        self,
+        database=None,
+        pool: Optional[SmtpPool] = None,
+        threads: int = MAIL_WORKER_THREADS,
+        batch_size: int = BATCH_SIZE,
+        poll_seconds: float = POLL_SECONDS
+    ):
+        self.db = database if database is not None else db
+        self.pool = pool or SmtpPool()
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="smtp")
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def _claim(self) -> List[dict]:
+        now = get_ist_now()
+        claim = uuid.uuid4().hex
+        due = {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now.isoformat()}},
+            {"status": "sending", "lease_until": {"$lt": now.isoformat()}},
+        ]}
+        candidates = await self.db.email_outbox.find(due, {"_id": 0, "id": 1}).sort(
+            "next_attempt_at", 1
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+        await self.db.email_outbox.update_many(
+            {"id": {"$in": [c["id"] for c in candidates]}, **due},
+            {"$set": {
+                "status": "sending",
+                "claim": claim,
+                "lease_owner": self.owner,
+                "lease_until": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+            }}
+        )
+        return await self.db.email_outbox.find({"claim": claim}, {"_id": 0}).to_list(self.batch_size)
+
+    async def _send_group(self, org_id, profile, messages) -> List[Tuple[str, Optional[str], bool]]:
+        account = await resolve_smtp(org_id, profile)
+        if account is None:
+            return [(m["id"], f"SMTP profile '{profile}' not configured", False) for m in messages]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, send_batch, self.pool, account, messages)
+
+    async def run_once(self) -> int:
+        """Claim and deliver one batch; returns the number of messages claimed"""
+        messages = await self._claim()
+        if not messages:
+            return 0
+        groups: Dict[Tuple, List[dict]] = defaultdict(list)
+        for message in messages:
+            groups[(message.get("organization_id"), message.get("profile", "system"))].append(message)
+        results = await asyncio.gather(
+            *(self._send_group(org_id, profile, group) for (org_id, profile), group in groups.items()),
+            return_exceptions=True
+        )
+
+        attempts = {m["id"]: m.get("attempts", 0) + 1 for m in messages}
+        now = get_ist_now()
+        purge_at = datetime.now(timezone.utc) + timedelta(days=RETENTION_DAYS)
+        ops = []
+        for group, outcome in zip(groups.values(), results):
+            if isinstance(outcome, BaseException):
+                outcome = [(m["id"], str(outcome)[:500], False) for m in group]
+            for message_id, error, permanent in outcome:
+                tries = attempts[message_id]
+                release = {"claim": None, "lease_owner": None, "lease_until": None}
+                if error is None:
+                    self.sent += 1
+                    update = {**release, "status": "sent", "attempts": tries,
+                              "sent_at": now.isoformat(), "last_error": None, "purge_at": purge_at}
+                elif permanent or tries >= MAX_ATTEMPTS:
+                    self.failed += 1
+                    update = {**release, "status": "failed", "attempts": tries,
+                              "last_error": error, "failed_at": now.isoformat(), "purge_at": purge_at}
+                    logger.warning(f"Email {message_id} failed permanently after {tries} attempt(s): {error}")
+                else:
+                    self.retried += 1
+                    next_at = now + timedelta(seconds=retry_delay(tries))
+                    update = {**release, "status": "queued", "attempts": tries,
+                              "last_error": error, "next_attempt_at": next_at.isoformat()}
+                ops.append(UpdateOne({"id": message_id, "lease_owner": self.owner}, {"$set": update}))
+        if ops:
+            await self.db.email_outbox.bulk_write(ops, ordered=False)
+        return len(messages)
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Mail worker pass failed: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more due mail is probably waiting
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+            logger.info(f"Mail worker started ({self.owner})")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close_all()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried, **self.pool.stats()}
+
+
+# Global instance
+_mail_worker: Optional[MailWorker] = None
+
+
+def init_mail_worker(database=None) -> MailWorker:
+    """Initialize the outbound mail worker"""
+    global _mail_worker
+    _mail_worker = MailWorker(database)
+    return _mail_worker
+
+
+def get_mail_worker() -> Optional[MailWorker]:
+    """Get the outbound mail worker instance"""
+    return _mail_worker
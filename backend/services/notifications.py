@@ -0,0 +1,41 @@
+"""
+In-app Notifications
+====================
+`create_notification` records a notification for the admin UI and the
+engineer portal (listed by GET /notifications, routes/job_acceptance.py).
+Used by the accept/decline workflow and by the SLA scheduler
+(services/sla_scheduler.py). Each notification is also pushed to the open
+streams of its audience (services/push.py).
+"""
+import uuid
+from typing import Optional
+
+from database import db
+from services.push import publish
+from utils.helpers import get_ist_isoformat
+
+DEFAULT_TARGET_ROLES = ["admin", "back_office"]
+
+
+async def create_notification(org_id: str, notif_type: str, title: str, message: str,
+                              target_roles: Optional[list] = None, target_user_ids: Optional[list] = None,
+                              ticket_id: Optional[str] = None, metadata: Optional[dict] = None) -> dict:
+    """Create an in-app notification."""
+    notif = {
+        "id": str(uuid.uuid4()),
+        "organization_id": org_id,
+        "type": notif_type,
+        "title": title,
+        "message": message,
+        "target_roles": target_roles or DEFAULT_TARGET_ROLES,
+        "target_user_ids": target_user_ids or [],
+        "ticket_id": ticket_id,
+        "metadata": metadata or {},
+        "is_read": False,
+        "created_at": get_ist_isoformat(),
+    }
+    await db.notifications.insert_one(notif)
+    notif.pop("_id", None)
+    await publish("notification", org_id, notif, user_ids=notif["target_user_ids"],
+                  admins=not set(notif["target_roles"]).isdisjoint(DEFAULT_TARGET_ROLES))
+    return notif
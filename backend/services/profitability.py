@@ -0,0 +1,339 @@
+"""
+Device Profitability Engine
+===========================
+Columnar computation behind GET /analytics/profitability.
+
+Devices, tickets, service visits, AMC assignments and parts costs of an org
+are streamed from MongoDB (projected fields only, cursor batches) into pandas
+frames. Labour, travel tiers, parts and AMC revenue are then derived with hash
+joins and grouped, vectorized operations, so the cost is O(rows) rather than a
+Python loop per device plus a linear contract scan per AMC assignment.
+
+Costing rules:
+- On-site visit: the visit's own labour / travel cost when filled in, else
+  engineer hourly rate × max(hours, 1) and the travel tier for distance_km
+- Remote call (ticket without visits): 30 minutes at the assignee's rate
+- Parts: parts_requests.grand_total + ticket_part_issues.total_cost per ticket,
+  split evenly across that ticket's visits in the call details
+- Revenue: custom_price of the device's AMC contract
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from database import db
+
+DEFAULT_TRAVEL_COST = 200
+DEFAULT_HOURLY_RATE = 500
+MIN_VISIT_HOURS = 1.0
+REMOTE_CALL_HOURS = 0.5
+TOP_N = 10
+BATCH_SIZE = 5000
+
+DEVICE_FIELDS = ["id", "device_name", "name", "brand", "model", "serial_number",
+                 "company_id", "company_name", "warranty_type"]
+TICKET_FIELDS = ["id", "device_id", "created_at", "assigned_to_id", "assigned_to_name"]
+VISIT_FIELDS = ["ticket_id", "technician_id", "technician_name", "duration_minutes",
+                "labour_cost", "travel_cost", "distance_km", "scheduled_date", "created_at"]
+ENGINEER_FIELDS = ["id", "hourly_rate"]
+CONTRACT_FIELDS = ["id", "name", "custom_price", "amc_type"]
+ASSIGNMENT_FIELDS = ["device_id", "contract_id"]
+PART_REQUEST_FIELDS = ["ticket_id", "grand_total"]
+PART_ISSUE_FIELDS = ["ticket_id", "total_cost"]
+COMPANY_FIELDS = ["id", "name"]
+
+
+# ── loading ─────────────────────────────────────────────────────────────────
+
+async def _frame(collection, query: Dict[str, Any], fields: List[str], batch_size: int = BATCH_SIZE) -> pd.DataFrame:
+    """Stream a projected query into a DataFrame, one cursor batch at a time"""
+    chunks, batch = [], []
+    cursor = collection.find(query, {"_id": 0, **{f: 1 for f in fields}}).batch_size(batch_size)
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            chunks.append(pd.DataFrame.from_records(batch, columns=fields))
+            batch = []
+    if batch:
+        chunks.append(pd.DataFrame.from_records(batch, columns=fields))
+    if not chunks:
+        return pd.DataFrame(columns=fields)
+    return pd.concat(chunks, ignore_index=True)
+
+
+async def load_frames(org_id: str, batch_size: int = BATCH_SIZE) -> Dict[str, pd.DataFrame]:
+    org = {"organization_id": org_id}
+    live = {"organization_id": org_id, "is_deleted": {"$ne": True}}
+    sources = {
+        "devices": (db.devices, org, DEVICE_FIELDS),
+        "tickets": (db.tickets_v2, live, TICKET_FIELDS),
+        "visits": (db.service_visits_new, org, VISIT_FIELDS),
+        "engineers": (db.engineers, live, ENGINEER_FIELDS),
+        "contracts": (db.amc_contracts, live, CONTRACT_FIELDS),
+        "assignments": (db.amc_device_assignments, org, ASSIGNMENT_FIELDS),
+        "part_requests": (db.parts_requests, org, PART_REQUEST_FIELDS),
+        "part_issues": (db.ticket_part_issues, org, PART_ISSUE_FIELDS),
+        "companies": (db.companies, org, COMPANY_FIELDS),
+    }
+    frames = await asyncio.gather(*[
+        _frame(collection, query, fields, batch_size) for collection, query, fields in sources.values()
+    ])
+    return dict(zip(sources, frames))
+
+
+# ── column helpers ──────────────────────────────────────────────────────────
+
+def _num(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce").fillna(0.0).astype(float)
+
+
+def _text(series: pd.Series) -> pd.Series:
+    return series.where(series.notna(), "").astype(str)
+
+
+def _first_truthy(*columns: pd.Series, default: str = "") -> pd.Series:
+    """Element-wise `a or b or ... or default` over text columns"""
+    result = pd.Series(default, index=columns[0].index, dtype=object)
+    for column in reversed(columns):
+        text = _text(column)
+        result = text.where(text != "", result)
+    return result
+
+
+def _has_value(series: pd.Series) -> pd.Series:
+    return series.notna() & (_text(series) != "")
+
+
+def travel_costs(distance_km, tiers: list) -> np.ndarray:
+    """
+    Vectorized travel tier lookup: first tier (by min_km) containing the
+    distance, else the last tier; no distance recorded → the first tier.
+    """
+    distance = np.nan_to_num(np.asarray(distance_km, dtype=float), nan=0.0)
+    if not tiers:
+        return np.full(distance.shape, float(DEFAULT_TRAVEL_COST))
+    ordered = sorted(tiers, key=lambda t: t["min_km"])
+    cost = np.select(
+        [(distance >= t["min_km"]) & (distance <= t["max_km"]) for t in ordered],
+        [float(t["cost"]) for t in ordered],
+        default=float(tiers[-1]["cost"])
+    )
+    return np.where(distance > 0, cost, float(tiers[0]["cost"]))
+
+
+def _records(df: pd.DataFrame) -> List[dict]:
+    """DataFrame → JSON-safe records (NaN → None, numpy scalars → Python)"""
+    if df.empty:
+        return []
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+# ── computation ─────────────────────────────────────────────────────────────
+
+def compute_profitability(
+    frames: Dict[str, pd.DataFrame],
+    travel_tiers: list,
+    default_hourly: float = DEFAULT_HOURLY_RATE
+) -> Dict[str, Any]:
+    devices = frames["devices"].reset_index(drop=True)
+    device_ids = _text(devices["id"])
+
+    engineers = frames["engineers"].drop_duplicates("id", keep="last")
+    rates = _num(engineers["hourly_rate"])
+    rate_by_engineer = pd.Series(rates.where(rates != 0, default_hourly).values, index=engineers["id"])
+
+    def rate_for(engineer_ids: pd.Series) -> pd.Series:
+        return engineer_ids.map(rate_by_engineer).astype(float).fillna(float(default_hourly))
+
+    # AMC revenue: hash join assignments → contracts; the latest assignment of a device wins
+    contracts = frames["contracts"].drop_duplicates("id", keep="first")
+    assignments = frames["assignments"]
+    assignments = assignments[_has_value(assignments["device_id"]) & _has_value(assignments["contract_id"])]
+    device_amc = assignments.merge(
+        contracts, left_on="contract_id", right_on="id", how="inner"
+    ).drop_duplicates("device_id", keep="last").set_index("device_id")
+    amc_revenue = _num(device_ids.map(device_amc["custom_price"]))
+    amc_type = device_ids.map(device_amc["amc_type"])
+    has_amc = device_ids.isin(device_amc.index)
+
+    # Parts cost per ticket
+    parts = pd.concat([
+        pd.DataFrame({"ticket_id": frames["part_requests"]["ticket_id"],
+                      "cost": _num(frames["part_requests"]["grand_total"])}),
+        pd.DataFrame({"ticket_id": frames["part_issues"]["ticket_id"],
+                      "cost": _num(frames["part_issues"]["total_cost"])}),
+    ], ignore_index=True)
+    parts = parts[_has_value(parts["ticket_id"])]
+    parts_by_ticket = parts.groupby("ticket_id")["cost"].sum()
+
+    # Tickets of known devices, in load order (call details follow it)
+    tickets = frames["tickets"]
+    tickets = tickets[_has_value(tickets["device_id"]) & tickets["device_id"].isin(device_ids)].copy()
+    tickets["position"] = np.arange(len(tickets))
+    tickets["parts"] = tickets["id"].map(parts_by_ticket).fillna(0.0).astype(float)
+
+    # On-site calls: one per visit
+    visits = frames["visits"]
+    visits = visits[_has_value(visits["ticket_id"])].merge(
+        tickets[["id", "device_id", "position", "parts"]],
+        left_on="ticket_id", right_on="id", how="inner"
+    )
+    visit_hours = np.maximum(_num(visits["duration_minutes"]) / 60, MIN_VISIT_HOURS)
+    own_labour, own_travel = _num(visits["labour_cost"]), _num(visits["travel_cost"])
+    visits_per_ticket = visits.groupby("ticket_id")["ticket_id"].transform("size")
+    onsite = pd.DataFrame({
+        "device_id": visits["device_id"],
+        "position": visits["position"],
+        "type": "on-site",
+        "date": _first_truthy(visits["scheduled_date"], _text(visits["created_at"]).str[:10]),
+        "engineer": _first_truthy(visits["technician_name"], default="Unknown"),
+        "hours": visit_hours,
+        "labour": np.where(own_labour > 0, own_labour, rate_for(visits["technician_id"]) * visit_hours),
+        "travel": np.where(own_travel > 0, own_travel, travel_costs(visits["distance_km"], travel_tiers)),
+        "parts": visits["parts"] / visits_per_ticket.clip(lower=1),
+    })
+
+    # Remote calls: tickets without any visit
+    remote_tickets = tickets[~tickets["id"].isin(visits["ticket_id"])]
+    remote = pd.DataFrame({
+        "device_id": remote_tickets["device_id"],
+        "position": remote_tickets["position"],
+        "type": "remote",
+        "date": _text(remote_tickets["created_at"]).str[:10],
+        "engineer": _first_truthy(remote_tickets["assigned_to_name"], default="Unassigned"),
+        "hours": REMOTE_CALL_HOURS,
+        "labour": rate_for(remote_tickets["assigned_to_id"]) * REMOTE_CALL_HOURS,
+        "travel": 0.0,
+        "parts": remote_tickets["parts"],
+    })
+
+    calls = pd.concat([onsite, remote], ignore_index=True).sort_values("position", kind="stable")
+
+    # Per-device totals
+    per_device = pd.DataFrame(index=pd.Index(device_ids.unique()))
+    per_device["total_calls"] = tickets.groupby("device_id").size()
+    per_device["parts_cost"] = tickets.groupby("device_id")["parts"].sum()
+    per_device["remote_calls"] = remote.groupby("device_id").size()
+    per_device["onsite_calls"] = onsite.groupby("device_id").size()
+    per_device["total_visit_hours"] = onsite.groupby("device_id")["hours"].sum()
+    per_device["labour_cost"] = calls.groupby("device_id")["labour"].sum()
+    per_device["travel_cost"] = calls.groupby("device_id")["travel"].sum()
+    per_device = per_device.fillna(0).reindex(device_ids)
+
+    labour = per_device["labour_cost"].to_numpy(dtype=float)
+    travel = per_device["travel_cost"].to_numpy(dtype=float)
+    parts_cost = per_device["parts_cost"].to_numpy(dtype=float)
+    revenue = amc_revenue.to_numpy(dtype=float)
+    total_cost = labour + travel + parts_cost
+
+    company_map = frames["companies"].drop_duplicates("id", keep="last").set_index("id")["name"]
+    company_ids = devices["company_id"]
+    brand_model = _text(devices["brand"]) + " " + _text(devices["model"])
+
+    results = pd.DataFrame({
+        "device_id": device_ids,
+        "device_name": _first_truthy(devices["device_name"], devices["name"], brand_model),
+        "serial_number": _text(devices["serial_number"]),
+        "brand": _text(devices["brand"]),
+        "model": _text(devices["model"]),
+        "company_id": company_ids,
+        "company_name": company_ids.map(company_map).fillna(devices["company_name"]).fillna("Unknown"),
+        "warranty_type": _first_truthy(
+            devices["warranty_type"],
+            pd.Series(np.where(has_amc, _text(amc_type), "none"), index=devices.index)
+        ),
+        "amc_revenue": np.round(revenue, 2),
+        "total_calls": per_device["total_calls"].to_numpy(dtype=int),
+        "remote_calls": per_device["remote_calls"].to_numpy(dtype=int),
+        "onsite_calls": per_device["onsite_calls"].to_numpy(dtype=int),
+        "total_visit_hours": np.round(per_device["total_visit_hours"].to_numpy(dtype=float), 1),
+        "labour_cost": np.round(labour, 2),
+        "travel_cost": np.round(travel, 2),
+        "parts_cost": np.round(parts_cost, 2),
+        "total_cost": np.round(total_cost, 2),
+        "profit_loss": np.round(revenue - total_cost, 2),
+    })
+    # Unassigned devices keep a null company_id (groupby would drop NaN keys)
+    results["company_id"] = results["company_id"].astype(object).where(results["company_id"].notna(), None)
+
+    # Company rollup on unrounded figures
+    by_company = pd.DataFrame({
+        "company_id": results["company_id"].fillna(""),
+        "revenue": revenue, "cost": total_cost,
+        "calls": results["total_calls"],
+    }).groupby("company_id", sort=False).agg(
+        revenue=("revenue", "sum"), cost=("cost", "sum"),
+        devices=("calls", "size"), calls=("calls", "sum")
+    )
+    company_profitability = []
+    for cid, row in by_company.iterrows():
+        company_profitability.append({
+            "company_id": cid or None,
+            "company_name": company_map.get(cid, "Unknown") if cid else "Unknown",
+            "devices": int(row["devices"]),
+            "total_calls": int(row["calls"]),
+            "amc_revenue": round(row["revenue"], 2),
+            "total_cost": round(row["cost"], 2),
+            "profit_loss": round(row["revenue"] - row["cost"], 2),
+            "margin_pct": _margin(row["revenue"], row["cost"]),
+        })
+
+    # Devices with calls, worst first, with their call details
+    with_calls = results[results["total_calls"] > 0].sort_values("profit_loss", kind="stable")
+    details: Dict[str, List[dict]] = defaultdict(list)
+    calls = calls[calls["device_id"].isin(with_calls["device_id"])].copy()
+    calls["hours"] = calls["hours"].round(1)
+    for column in ("labour", "travel", "parts"):
+        calls[column] = calls[column].round(2)
+    for call in _records(calls[["device_id", "type", "date", "engineer", "hours", "labour", "travel", "parts"]]):
+        details[call.pop("device_id")].append(call)
+    device_list = _records(with_calls)
+    for device in device_list:
+        device["call_details"] = details.get(device["device_id"], [])
+
+    total_revenue = float(results["amc_revenue"].sum())
+    total_service_cost = float(results["total_cost"].sum())
+    by_id = {d["device_id"]: d for d in device_list}
+    most_expensive = [
+        by_id[did] for did in results[results["total_calls"] > 0]
+        .sort_values("total_cost", ascending=False, kind="stable")["device_id"].head(TOP_N)
+    ]
+
+    return {
+        "summary": {
+            "total_devices": len(devices),
+            "devices_with_calls": len(device_list),
+            "total_amc_revenue": round(total_revenue, 2),
+            "total_service_cost": round(total_service_cost, 2),
+            "net_profit_loss": round(total_revenue - total_service_cost, 2),
+            "overall_margin_pct": _margin(total_revenue, total_service_cost),
+            "profitable_devices": int((with_calls["profit_loss"] >= 0).sum()),
+            "loss_making_devices": int((with_calls["profit_loss"] < 0).sum()),
+            "total_remote_calls": int(results["remote_calls"].sum()),
+            "total_onsite_calls": int(results["onsite_calls"].sum()),
+        },
+        "devices": device_list,
+        "worst_roi": device_list[:TOP_N],
+        "most_expensive": most_expensive,
+        "company_profitability": sorted(company_profitability, key=lambda c: c["profit_loss"]),
+    }
+
+
+def _margin(revenue: float, cost: float) -> float:
+    if revenue > 0:
+        return round((revenue - cost) / revenue * 100, 1)
+    return 0 if cost == 0 else -100
+
+
+async def build_report(
+    org_id: str,
+    travel_tiers: list,
+    default_hourly: float = DEFAULT_HOURLY_RATE,
+    batch_size: int = BATCH_SIZE
+) -> Dict[str, Any]:
+    frames = await load_frames(org_id, batch_size)
+    # pandas work is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(compute_profitability, frames, travel_tiers, default_hourly)
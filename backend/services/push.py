@@ -0,0 +1,346 @@
+"""
+Push Channel
+============
+Server-sent event streams for the admin UI and the engineer portal, so they
+hear about new notifications and ticket transitions instead of polling
+/notifications and the ticket lists.
+
+Events are published by:
+- create_notification (services/notifications.py)   type "notification"
+- sync_ticket_rollup (services/ticket_rollups.py)    type "ticket", once per
+  claimed transition, with the TRANSITION_FIELDS that changed
+
+Every event names its audience: organization_id, `admins` (all admins of the
+org) and `user_ids` (engineers or users it is addressed to). A stream
+receives the events its subscriber matches (`audience_matches`).
+
+Brokers (PUSH_BROKER):
+- memory  in-process fan-out, the default; enough for a single worker
+- mongo   events go to the capped collection `push_events`, which every
+          worker tails, so a stream on any worker sees events from all of them
+
+Streams (`event_stream`):
+- backpressure  each stream has a bounded queue (PUSH_QUEUE_SIZE); publishers
+                never wait. A stream that falls behind drops its backlog and
+                gets one "resync" event, telling the client to refetch.
+- heartbeat     a comment line after PUSH_HEARTBEAT idle seconds keeps
+                proxies from closing the connection
+- resume        a reconnecting EventSource sends Last-Event-ID; the events
+                after it are replayed from the broker's history, or the
+                client gets "resync" when they are no longer all held
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid
+
+from database import db
+from utils.helpers import get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+PUSH_BROKER = os.environ.get("PUSH_BROKER", "memory")
+QUEUE_SIZE = int(os.environ.get("PUSH_QUEUE_SIZE", "256"))
+HEARTBEAT_SECONDS = int(os.environ.get("PUSH_HEARTBEAT", "15"))
+HISTORY_SIZE = int(os.environ.get("PUSH_HISTORY", "1000"))
+HISTORY_BYTES = 16 * 1024 * 1024
+RETRY_MS = 3000
+
+RESYNC = "resync"
+
+# Ticket fields whose change is pushed as a transition
+TRANSITION_FIELDS = (
+    "is_open", "is_deleted", "current_stage_name", "priority_name", "assigned_to_id",
+    "assigned_to_name", "assigned_team_name", "assignment_status", "sla_breached",
+    "is_overdue", "is_escalated",
+)
+
+
+def audience_matches(event: dict, org_id: Optional[str], user_ids: Iterable[str] = (),
+                     is_admin: bool = False) -> bool:
+    if not org_id or event.get("organization_id") != org_id:
+        return False
+    if is_admin and event.get("admins"):
+        return True
+    return not set(user_ids).isdisjoint(event.get("user_ids") or [])
+
+
+class Subscription:
+    """One stream's bounded queue of matching events"""
+
+    def __init__(self, match: Callable[[dict], bool], size: int = QUEUE_SIZE):
+        self.match = match
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.lagged = False
+
+    def offer(self, event: dict) -> None:
+        if self.lagged or not self.match(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow a reader: drop the backlog rather than hold up publishers
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagged = True
+            self.queue.put_nowait({"type": RESYNC})
+
+    async def next(self, timeout: float) -> Optional[dict]:
+        """The next event, or None after `timeout` seconds without one"""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event.get("type") == RESYNC:
+            self.lagged = False
+        return event
+
+
+class Broker(ABC):
+    """Fan-out to the subscriptions of this process; subclasses add publishing and history"""
+
+    def __init__(self):
+        self.subscribers: Set[Subscription] = set()
+
+    def subscribe(self, subscription: Subscription) -> None:
+        self.subscribers.add(subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def _fan_out(self, event: dict) -> None:
+        for subscription in list(self.subscribers):
+            subscription.offer(event)
+
+    @property
+    @abstractmethod
+    def last_id(self) -> Optional[str]:
+        """Id of the latest event this process has seen, or None before the first"""
+
+    @abstractmethod
+    async def publish(self, event: dict) -> dict:
+        """Assign the event its id, store it for replay and fan it out"""
+
+    @abstractmethod
+    async def replay(self, last_event_id: str) -> Optional[List[dict]]:
+        """Events after `last_event_id`, or None when they are no longer all held"""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBroker(Broker):
+    """In-process broker; event ids are "<epoch>-<seq>", so ids of a restarted process never resume"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        super().__init__()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.history: deque = deque(maxlen=history_size)
+
+    @property
+    def last_id(self) -> Optional[str]:
+        return f"{self.epoch}-{self.seq}" if self.seq else None
+
+    async def publish(self, event: dict) -> dict:
+        self.seq += 1
+        event = {**event, "id": f"{self.epoch}-{self.seq}"}
+        self.history.append(event)
+        self._fan_out(event)
+        return event
+
+    async def replay(self, last_event_id: str) -> Optional[List[dict]]:
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        held = len(self.history)
+        after = int(seq)
+        if after < self.seq - held:
+            return None
+        return list(self.history)[held - (self.seq - after):]
+
+
+class MongoBroker(Broker):
+    """Shared broker: a capped collection every worker tails; ids are a global sequence"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        super().__init__()
+        self.history_size = history_size
+        self.seen = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def last_id(self) -> Optional[str]:
+        return str(self.seen) if self.seen else None
+
+    async def publish(self, event: dict) -> dict:
+        counter = await db.push_state.find_one_and_update(
+            {"key": "seq"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        event = {**event, "id": str(counter["seq"]), "seq": counter["seq"]}
+        await db.push_events.insert_one(dict(event))
+        return event  # fanned out by the tail of every worker, this one included
+
+    async def replay(self, last_event_id: str) -> Optional[List[dict]]:
+        if not last_event_id.isdigit():
+            return None
+        after = int(last_event_id)
+        oldest = await db.push_events.find_one({}, {"_id": 0, "seq": 1}, sort=[("$natural", 1)])
+        if oldest and after < oldest["seq"] - 1:
+            return None
+        return await db.push_events.find(
+            {"seq": {"$gt": after}}, {"_id": 0}
+        ).sort("seq", 1).to_list(self.history_size)
+
+    async def _tail(self) -> None:
+        latest = await db.push_events.find_one({}, {"_id": 0, "seq": 1}, sort=[("$natural", -1)])
+        self.seen = latest["seq"] if latest else 0
+        while True:
+            try:
+                cursor = db.push_events.find(
+                    {"seq": {"$gt": self.seen}}, {"_id": 0}, cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                while cursor.alive:
+                    async for event in cursor:
+                        self.seen = max(self.seen, event["seq"])
+                        self._fan_out(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Push event tail failed: {e}")
+            await asyncio.sleep(1)  # a tailable cursor on an empty collection dies at once
+
+    async def start(self) -> None:
+        try:
+            await db.create_collection("push_events", capped=True, size=HISTORY_BYTES, max=self.history_size)
+        except CollectionInvalid:
+            pass  # already exists
+        await db.push_events.create_index("seq")
+        # One sequence counter: without it two first publishes could upsert two
+        await db.push_state.create_index("key", unique=True)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._tail())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# ── publishing ──────────────────────────────────────────────────────────────
+
+async def publish(event_type: str, org_id: Optional[str], data: Dict[str, Any],
+                  user_ids: Iterable[Optional[str]] = (), admins: bool = True) -> None:
+    """Push an event to matching streams. Failures are logged and never fail the caller's write."""
+    if _broker is None or not org_id:
+        return
+    try:
+        await _broker.publish({
+            "type": event_type,
+            "organization_id": org_id,
+            "admins": admins,
+            "user_ids": sorted({u for u in user_ids if u}),
+            "data": data,
+            "created_at": get_ist_isoformat(),
+        })
+    except Exception as e:
+        logger.warning(f"Push publish of {event_type} failed: {e}")
+
+
+def ticket_transition(ticket_id: str, before: Optional[dict], after: Optional[dict]) -> Optional[Dict[str, Any]]:
+    """Push data of a ticket change (tracked fields before / after), or None if nothing pushable changed"""
+    before, after = before or {}, after or {}
+    changes = {f: after.get(f) for f in TRANSITION_FIELDS if before.get(f) != after.get(f)}
+    if before and after and not changes:
+        return None
+    action = "created" if not before else "removed" if not after else "updated"
+    return {"ticket_id": ticket_id, "action": action, "changes": changes}
+
+
+async def publish_ticket_transition(ticket_id: str, before: Optional[dict], after: Optional[dict]) -> None:
+    data = ticket_transition(ticket_id, before, after)
+    if data is None:
+        return
+    current = after or before or {}
+    # The previous assignee hears about it too, so the ticket leaves their list
+    assignees = {(before or {}).get("assigned_to_id"), current.get("assigned_to_id")}
+    await publish("ticket", current.get("organization_id"), data, user_ids=assignees)
+
+
+# ── streaming ───────────────────────────────────────────────────────────────
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event.get("id"):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    payload = {k: event.get(k) for k in ("id", "type", "data", "created_at") if event.get(k) is not None}
+    lines.append(f"data: {json.dumps(payload, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(request: Request, broker: Broker, match: Callable[[dict], bool],
+                       last_event_id: Optional[str] = None, heartbeat: float = HEARTBEAT_SECONDS,
+                       queue_size: int = QUEUE_SIZE) -> AsyncIterator[str]:
+    """SSE frames for one subscriber until the client disconnects"""
+    subscription = Subscription(match, queue_size)
+    broker.subscribe(subscription)  # before the replay, so nothing falls between the two
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        replayed: Set[str] = set()
+        if last_event_id:
+            events = await broker.replay(last_event_id)
+            if events is None:
+                yield format_sse({"id": broker.last_id, "type": RESYNC})
+            else:
+                for event in events:
+                    if match(event):
+                        replayed.add(event["id"])
+                        yield format_sse(event)
+        while not await request.is_disconnected():
+            event = await subscription.next(heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+            elif event["type"] == RESYNC:
+                yield format_sse({"id": broker.last_id, "type": RESYNC})
+            elif event["id"] not in replayed:
+                yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def sse_response(request: Request, match: Callable[[dict], bool],
+                 last_event_id: Optional[str] = None) -> StreamingResponse:
+    return StreamingResponse(
+        event_stream(request, _broker, match, last_event_id or request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Global instance
+_broker: Optional[Broker] = None
+
+
+def init_push_broker() -> Broker:
+    """Initialize the push broker selected by PUSH_BROKER"""
+    global _broker
+    _broker = MongoBroker() if PUSH_BROKER == "mongo" else MemoryBroker()
+    return _broker
+
+
+def get_push_broker() -> Optional[Broker]:
+    """Get the push broker instance"""
+    return _broker
@@ -0,0 +1,180 @@
+"""
+Bulk QR Labels
+==============
+Printable QR label sheets for any number of devices (a whole site rollout
+in one PDF), shared by `POST /devices/bulk-qr-pdf` (streamed straight to the
+browser) and `POST /devices/bulk-qr-pdf/jobs` (built in the background with
+progress, see services/jobs.py).
+
+- Devices are read in batches of RENDER_BATCH, sorted by serial number
+- QR PNGs come from `qr_label_cache` (keyed by a hash of the device URL);
+  misses are rendered in the shared render pool (services/render_pool.py),
+  split across its workers, and cached. The next batch renders while the
+  current one is written.
+- The PDF is emitted page by page by utils.label_sheet.LabelSheetWriter, so
+  memory stays at one batch of labels regardless of the device count
+
+Configuration (env):
+    QR_CACHE_DAYS         how long rendered PNGs are kept (default 90)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from bson import Binary
+from pymongo import UpdateOne
+
+from database import db
+from services.render_pool import RenderPool, get_render_pool
+from utils.helpers import get_ist_now
+from utils.label_sheet import LabelSheetWriter, LABELS_PER_PAGE, render_qr_pngs
+from utils.tenant_scope import scope_query
+
+logger = logging.getLogger(__name__)
+
+QR_CACHE_DAYS = int(os.environ.get("QR_CACHE_DAYS", "90"))
+RENDER_BATCH = LABELS_PER_PAGE * 10
+
+LABEL_PROJECTION = {"_id": 0, "id": 1, "serial_number": 1, "asset_tag": 1}
+
+# progress(labels written so far)
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+
+def frontend_base_url() -> str:
+    """Public portal URL the QR codes point to"""
+    frontend_url = os.environ.get('FRONTEND_URL', '')
+    if not frontend_url:
+        cors_origins = os.environ.get('CORS_ORIGINS', '')
+        if cors_origins and cors_origins != '*':
+            frontend_url = cors_origins.split(',')[0].strip()
+        else:
+            frontend_url = "https://your-portal-url.com"
+    return frontend_url
+
+
+def device_url(base_url: str, device: Dict[str, Any]) -> str:
+    return f"{base_url}/device/{device.get('serial_number') or ''}"
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def label_query(org_id: str, device_ids: Optional[List[str]] = None,
+                site_id: Optional[str] = None, company_id: Optional[str] = None) -> Dict[str, Any]:
+    """Devices to label: explicit IDs, else a site, else a company, else the whole organization"""
+    query = {"is_deleted": {"$ne": True}}
+    if device_ids:
+        query["id"] = {"$in": device_ids}
+    elif site_id:
+        query["site_id"] = site_id
+    elif company_id:
+        query["company_id"] = company_id
+    return scope_query(query, org_id)
+
+
+async def label_filename(org_id: str, site_id: Optional[str] = None, company_id: Optional[str] = None) -> str:
+    filename_parts = ["QR_Codes"]
+    if company_id:
+        company = await db.companies.find_one(scope_query({"id": company_id}, org_id), {"_id": 0, "name": 1})
+        if company:
+            filename_parts.append(company["name"].replace(" ", "_")[:20])
+    if site_id:
+        site = await db.sites.find_one(scope_query({"id": site_id}, org_id), {"_id": 0, "name": 1})
+        if site:
+            filename_parts.append(site["name"].replace(" ", "_")[:20])
+    filename_parts.append(get_ist_now().strftime('%Y%m%d'))
+    return "_".join(filename_parts) + ".pdf"
+
+
+class LabelRenderer:
+    """QR PNGs by URL: cache first, the render pool for the rest"""
+
+    def __init__(self, pool: Optional[RenderPool] = None):
+        self.pool = pool or get_render_pool()
+
+    async def render(self, urls: List[str]) -> List[bytes]:
+        """Render in the pool, one slice of the URLs per worker process"""
+        size = -(-len(urls) // self.pool.processes)
+        slices = [urls[i:i + size] for i in range(0, len(urls), size)]
+        rendered = await asyncio.gather(*(self.pool.run(render_qr_pngs, part) for part in slices))
+        return [png for part in rendered for png in part]
+
+    async def pngs(self, urls: List[str]) -> Dict[str, bytes]:
+        by_key = {cache_key(url): url for url in urls}
+        found = {}
+        async for doc in db.qr_label_cache.find({"key": {"$in": list(by_key)}}, {"_id": 0, "key": 1, "png": 1}):
+            found[by_key[doc["key"]]] = bytes(doc["png"])
+
+        missing = [url for url in by_key.values() if url not in found]
+        if missing:
+            rendered = await self.render(missing)
+            expires_at = datetime.now(timezone.utc) + timedelta(days=QR_CACHE_DAYS)
+            ops = []
+            for url, png in zip(missing, rendered):
+                found[url] = png
+                ops.append(UpdateOne({"key": cache_key(url)}, {"$setOnInsert": {
+                    "key": cache_key(url), "url": url, "png": Binary(png), "expires_at": expires_at
+                }}, upsert=True))
+            try:
+                await db.qr_label_cache.bulk_write(ops, ordered=False)
+            except Exception as e:
+                logger.warning(f"QR label cache write failed: {e}")
+        return found
+
+
+_label_renderer: Optional[LabelRenderer] = None
+
+
+def get_label_renderer() -> LabelRenderer:
+    """Get the shared QR label renderer"""
+    global _label_renderer
+    if _label_renderer is None:
+        _label_renderer = LabelRenderer()
+    return _label_renderer
+
+
+async def label_pdf(query: Dict[str, Any], base_url: str,
+                    progress: Optional[ProgressCallback] = None) -> AsyncIterator[bytes]:
+    """The label sheet PDF for the devices matching `query`, one page at a time"""
+    renderer = get_label_renderer()
+    writer = LabelSheetWriter()
+    cursor = db.devices.find(query, LABEL_PROJECTION).sort("serial_number", 1)
+
+    def render(devices):
+        if not devices:
+            return None
+        return asyncio.ensure_future(renderer.pngs([device_url(base_url, d) for d in devices]))
+
+    devices = await cursor.to_list(RENDER_BATCH)
+    pending = render(devices)
+    done = 0
+    try:
+        yield writer.header()
+        while devices:
+            pngs = await pending
+            next_devices = await cursor.to_list(RENDER_BATCH)
+            pending = render(next_devices)
+            for start in range(0, len(devices), LABELS_PER_PAGE):
+                page = devices[start:start + LABELS_PER_PAGE]
+                done += len(page)
+                footer = None
+                if not next_devices and start + LABELS_PER_PAGE >= len(devices):
+                    footer = (f"Generated: {get_ist_now().strftime('%Y-%m-%d %H:%M')} | {done} QR codes | "
+                              f"Size: 1.5\" x 1.5\"")
+                labels = [
+                    (pngs[device_url(base_url, d)], d.get("serial_number") or "N/A", d.get("asset_tag"))
+                    for d in page
+                ]
+                yield await asyncio.to_thread(writer.page, labels, footer)
+                if progress:
+                    await progress(done)
+            devices = next_devices
+        yield writer.finish()
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
@@ -0,0 +1,72 @@
+"""
+Render Pool
+===========
+Worker processes for CPU-bound document rendering (reportlab PDFs, QR
+images), so a render never blocks the event loop and renders run in
+parallel instead of contending for the GIL.
+
+- `await get_render_pool().run(fn, *args)` runs `fn(*args)` in a worker;
+  `fn` and its arguments must be picklable (module-level functions, plain
+  data) and should not touch the database
+- At most RENDER_CONCURRENCY renders are submitted at once; further callers
+  wait their turn instead of piling work onto the pool's queue
+- Workers are started with `spawn` on first use: forking a process that
+  runs the event loop and driver threads is unsafe
+
+Configuration (env):
+    RENDER_PROCESSES      worker processes (default: CPUs, max 4)
+    RENDER_CONCURRENCY    renders in flight at once (default 2 x processes)
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+RENDER_PROCESSES = int(os.environ.get("RENDER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+RENDER_CONCURRENCY = int(os.environ.get("RENDER_CONCURRENCY", str(2 * RENDER_PROCESSES)))
+
+
+class RenderPool:
+    """Process pool with a cap on in-flight renders"""
+
+    def __init__(self, processes: int = RENDER_PROCESSES, concurrency: Optional[int] = None):
+        self.processes = max(1, processes)
+        self.concurrency = max(1, concurrency or 2 * self.processes)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._slots = None
+
+
+_render_pool: Optional[RenderPool] = None
+
+
+def get_render_pool() -> RenderPool:
+    """Get the shared render pool (its processes start on first use)"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = RenderPool(RENDER_PROCESSES, RENDER_CONCURRENCY)
+    return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    if _render_pool is not None:
+        _render_pool.shutdown()
@@ -0,0 +1,299 @@
+"""
+Universal Search Index
+======================
+Per-tenant inverted index behind `GET /search`, so the admin omnibox reads
+one indexed collection instead of regex-scanning seven.
+
+Collection `search_index`, one entry per searchable entity:
+- key              "<collection>:<entity id>" (unique)
+- organization_id  tenant of the entity
+- collection       source collection (companies, sites, users, devices, ...)
+- terms            every key a query word can hit: each word and its
+                   prefixes (edge n-grams), every infix n-gram of identifier
+                   fields (serials, asset tags, phones, GST numbers) and the
+                   words of any synonym group / brand alias the entity
+                   mentions (utils/synonyms.py), expanded at index time
+- title_words      whole words of the title fields (ranking)
+- words            whole words of all fields (ranking)
+- doc              the fields the result cards display
+
+A query is tokenized the same way and matches the entries holding all of its
+words as terms (`{"organization_id": org, "terms": {"$all": words}}`, a
+multikey index lookup). Hits are ranked by whole-word matches, title first,
+and grouped per collection in the same aggregation.
+
+Call `await sync_search_entries(collection, ids)` (or `sync_search_matching`
+for multi-document writes) after writing a searchable entity. It re-reads the
+entities and upserts or removes their entries. Failures are logged and never
+fail the write; `rebuild_search_index` builds the index once at startup
+(services/backfills.py) and scripts/rebuild_search_index.py reconciles any
+drift.
+"""
+import logging
+import re
+from typing import Optional, List, Dict, Any, Iterable
+
+from pymongo import UpdateOne, DeleteOne
+
+from database import db
+from utils.helpers import get_ist_isoformat
+from utils.synonyms import synonym_index_words
+
+logger = logging.getLogger(__name__)
+
+MAX_GRAM = 20            # longest prefix / infix indexed; longer query words are truncated to it
+MIN_INFIX = 3            # identifier infix n-grams shorter than this are not indexed
+MAX_WORDS_PER_FIELD = 50
+MAX_QUERY_WORDS = 8
+CANDIDATE_LIMIT = 1000   # entries ranked per query
+REBUILD_BATCH_SIZE = 1000
+
+# collection -> fields indexed. "title" fields rank first, "ident" fields get
+# infix n-grams, "synonyms"/"brand" fields are expanded via utils/synonyms.py,
+# "display" is what the result card needs.
+ENTITIES: Dict[str, Dict[str, List[str]]] = {
+    "companies": {
+        "title": ["name"],
+        "text": ["contact_email", "address"],
+        "ident": ["gst_number"],
+        "display": ["id", "name", "contact_email", "address"],
+    },
+    "sites": {
+        "title": ["name"],
+        "text": ["address", "city", "primary_contact_name"],
+        "ident": ["contact_number"],
+        "display": ["id", "name", "city", "company_id"],
+    },
+    "users": {
+        "title": ["name"],
+        "text": ["email", "designation"],
+        "ident": ["phone"],
+        "display": ["id", "name", "email", "phone"],
+    },
+    "devices": {
+        "title": ["brand", "model"],
+        "text": ["location", "device_type", "notes"],
+        "ident": ["serial_number", "asset_tag"],
+        "synonyms": ["device_type", "notes"],
+        "brand": ["brand"],
+        "display": ["id", "brand", "model", "serial_number", "asset_tag", "company_id"],
+    },
+    "deployments": {
+        "title": ["name"],
+        "text": ["installed_by", "notes", "items.category", "items.brand", "items.model"],
+        "ident": ["items.serial_numbers"],
+        "synonyms": ["items.category"],
+        "display": ["id", "name", "site_id"],
+    },
+    "amc_contracts": {
+        "title": ["name"],
+        "text": ["amc_type", "internal_notes"],
+        "ident": [],
+        "display": ["id", "name", "company_id", "start_date", "end_date"],
+    },
+    "service_history": {
+        "title": ["action_taken"],
+        "text": ["problem_reported", "technician_name", "notes"],
+        "ident": ["ticket_id"],
+        "display": ["id", "action_taken", "device_id", "service_type", "ticket_id"],
+    },
+}
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercase alphanumeric words of a value (lists are flattened)"""
+    if text is None:
+        return []
+    if isinstance(text, (list, tuple)):
+        return [w for item in text for w in tokenize(item)]
+    return re.findall(r"[a-z0-9]+", str(text).lower())
+
+
+def prefixes(word: str) -> List[str]:
+    word = word[:MAX_GRAM]
+    return [word[:n] for n in range(1, len(word) + 1)]
+
+
+def infixes(value: str) -> List[str]:
+    """All substrings of an identifier (punctuation removed) between MIN_INFIX and MAX_GRAM long"""
+    compact = "".join(tokenize(value))
+    return [
+        compact[i:j]
+        for i in range(len(compact))
+        for j in range(i + MIN_INFIX, min(len(compact), i + MAX_GRAM) + 1)
+    ]
+
+
+def field_values(doc: dict, path: str) -> List[Any]:
+    """Values at a dotted path; lists along the way are traversed"""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                next_values.extend(v.get(part) for v in value if isinstance(v, dict))
+            elif isinstance(value, dict):
+                next_values.append(value.get(part))
+        values = next_values
+    flat = []
+    for value in values:
+        if isinstance(value, list):
+            flat.extend(value)
+        elif value is not None:
+            flat.append(value)
+    return flat
+
+
+def build_entry(collection: str, doc: dict) -> Optional[Dict[str, Any]]:
+    """Index entry for an entity, or None if it should not be searchable"""
+    spec = ENTITIES[collection]
+    if not doc or doc.get("is_deleted") or not doc.get("id"):
+        return None
+
+    title_words, words, terms = set(), set(), set()
+    for kind in ("title", "text", "ident"):
+        for path in spec[kind]:
+            for value in field_values(doc, path):
+                field_words = tokenize(value)[:MAX_WORDS_PER_FIELD]
+                words.update(field_words)
+                if kind == "title":
+                    title_words.update(field_words)
+                for word in field_words:
+                    terms.update(prefixes(word))
+                if kind == "ident":
+                    terms.update(infixes(value))
+
+    for kind, brand in (("synonyms", False), ("brand", True)):
+        for path in spec.get(kind, []):
+            for value in field_values(doc, path):
+                expanded = synonym_index_words(str(value), brand=brand)
+                words.update(expanded)
+                terms.update(expanded)
+
+    display = {field: doc.get(field) for field in spec["display"]}
+    if collection == "deployments":
+        display["item_count"] = len(doc.get("items") or [])
+
+    return {
+        "key": f"{collection}:{doc['id']}",
+        "organization_id": doc.get("organization_id"),
+        "collection": collection,
+        "entity_id": doc["id"],
+        "terms": sorted(terms),
+        "title_words": sorted(title_words),
+        "words": sorted(words),
+        "doc": display,
+        "updated_at": get_ist_isoformat(),
+    }
+
+
+def _projection(collection: str) -> Dict[str, int]:
+    spec = ENTITIES[collection]
+    fields = {"_id": 0, "id": 1, "organization_id": 1, "is_deleted": 1}
+    for kind in ("title", "text", "ident", "synonyms", "brand", "display"):
+        for path in spec.get(kind, []):
+            fields[path.split(".")[0]] = 1
+    return fields
+
+
+def _entry_ops(collection: str, docs: Iterable[dict], ids: Iterable[str] = ()) -> list:
+    """Upserts for live entities, deletes for deleted ones and for `ids` not in docs"""
+    ops = []
+    seen = set()
+    for doc in docs:
+        seen.add(doc.get("id"))
+        entry = build_entry(collection, doc)
+        if entry:
+            ops.append(UpdateOne({"key": entry["key"]}, {"$set": entry}, upsert=True))
+        elif doc.get("id"):
+            ops.append(DeleteOne({"key": f"{collection}:{doc['id']}"}))
+    for entity_id in ids:
+        if entity_id not in seen:
+            ops.append(DeleteOne({"key": f"{collection}:{entity_id}"}))
+    return ops
+
+
+async def sync_search_entries(collection: str, ids: Iterable[str]) -> None:
+    """Re-index the given entities of a collection (removed if deleted or gone)"""
+    ids = [i for i in ids if i]
+    if not ids or collection not in ENTITIES:
+        return
+    try:
+        docs = await db[collection].find({"id": {"$in": ids}}, _projection(collection)).to_list(len(ids))
+        ops = _entry_ops(collection, docs, ids)
+        if ops:
+            await db.search_index.bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.error(f"Search index sync failed for {collection} {ids[:5]}: {e}")
+
+
+async def sync_search_matching(collection: str, query: Dict[str, Any]) -> None:
+    """Re-index every entity of a collection matching `query` (for update_many writes)"""
+    try:
+        ids = await db[collection].distinct("id", query)
+    except Exception as e:
+        logger.error(f"Search index sync failed for {collection} {query}: {e}")
+        return
+    for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+        await sync_search_entries(collection, ids[start:start + REBUILD_BATCH_SIZE])
+
+
+async def rebuild_search_index(org_id: Optional[str] = None) -> Dict[str, int]:
+    """Re-index every entity (of one organization) and drop entries whose entity is gone"""
+    stats = {}
+    scope = {"organization_id": org_id} if org_id else {}
+    started = get_ist_isoformat()
+    for collection in ENTITIES:
+        indexed = 0
+        batch = []
+        async for doc in db[collection].find(scope, _projection(collection)):
+            batch.append(doc)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                await db.search_index.bulk_write(_entry_ops(collection, batch), ordered=False)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            await db.search_index.bulk_write(_entry_ops(collection, batch), ordered=False)
+            indexed += len(batch)
+        stats[collection] = indexed
+    # Anything not touched by this pass belongs to an entity that no longer exists
+    removed = await db.search_index.delete_many({**scope, "updated_at": {"$lt": started}})
+    stats["removed"] = removed.deleted_count
+    return stats
+
+
+def query_words(q: str) -> List[str]:
+    words = []
+    for word in tokenize(q):
+        word = word[:MAX_GRAM]
+        if word not in words:
+            words.append(word)
+    return words[:MAX_QUERY_WORDS]
+
+
+def search_pipeline(org_id: Optional[str], words: List[str], limit: int) -> list:
+    return [
+        {"$match": {"organization_id": org_id, "terms": {"$all": words}}},
+        {"$limit": CANDIDATE_LIMIT},
+        {"$project": {
+            "_id": 0,
+            "collection": 1,
+            "doc": 1,
+            "score": {"$add": [
+                {"$multiply": [3, {"$size": {"$setIntersection": ["$title_words", words]}}]},
+                {"$size": {"$setIntersection": ["$words", words]}},
+            ]},
+        }},
+        {"$sort": {"score": -1}},
+        {"$group": {"_id": "$collection", "hits": {"$push": "$doc"}}},
+        {"$project": {"hits": {"$slice": ["$hits", limit]}}},
+    ]
+
+
+async def search(org_id: Optional[str], q: str, limit: int) -> Dict[str, List[dict]]:
+    """Ranked hits per source collection (display fields only), at most `limit` each"""
+    words = query_words(q)
+    if not words:
+        return {}
+    groups = await db.search_index.aggregate(search_pipeline(org_id, words, limit)).to_list(None)
+    return {group["_id"]: group["hits"] for group in groups}
@@ -0,0 +1,326 @@
+"""
+SLA Scheduler
+=============
+Fires SLA breaches and assignment escalations as they come due, instead of
+waiting for someone to call /ticketing/assignment/check-escalations or open
+an analytics page.
+
+Deadlines are the `sla_timers` documents of services/sla_timers.py, which
+sync_ticket_rollup keeps in line with every ticket write. One app process at
+a time runs the scheduler: the holder of the "sla" lease in
+`scheduler_leases` (renewed every tick, taken over by another worker once it
+lapses). Each tick:
+
+1. loads the unfired timers due before the next poll into an in-memory
+   heap (DueQueue) ordered by due_at - one indexed query on sla_timers
+2. pops what is due and claims each timer (fired_at is set conditionally, so
+   a timer fires once even across a lease handover)
+3. applies its breach: flags and a history event on the ticket - only if the
+   ticket still matches the deadline - then a notification
+4. sleeps until the next due timer or the poll interval, whichever comes
+   first; timers written in this process (on_timer_scheduled) wake it early
+
+Fired timers keep fired_at, so a restart resumes from the unfired ones
+without rescanning tickets. A timer whose breach fails is released for a
+retry, up to MAX_ATTEMPTS times.
+
+Time comes from a Clock; tests substitute one they move by hand.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import IST
+from database import db
+from services.notifications import create_notification
+from services.sla_timers import ACCEPTANCE, RESOLUTION, RESPONSE, on_timer_scheduled
+from services.ticket_events import append_ticket_events
+from services.ticket_rollups import sync_ticket_rollup
+from services.workload import AUTO_ESCALATION_HOURS
+from utils.helpers import get_ist_now
+
+logger = logging.getLogger(__name__)
+
+SLA_SCHEDULER_ENABLED = os.environ.get("SLA_SCHEDULER", "1") != "0"
+POLL_SECONDS = int(os.environ.get("SLA_SCHEDULER_POLL", "30"))
+LEASE_SECONDS = int(os.environ.get("SLA_SCHEDULER_LEASE", "90"))
+LEASE_NAME = "sla"
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+
+
+def iso(moment: datetime) -> str:
+    """A moment in the form of sla_timers.due_at"""
+    return moment.astimezone(IST).isoformat(timespec="seconds")
+
+
+class Clock:
+    """Wall clock of the scheduler"""
+
+    def now(self) -> datetime:
+        return get_ist_now()
+
+    async def sleep(self, seconds: float, wake: asyncio.Event) -> None:
+        """Sleep for `seconds`, or until `wake` is set"""
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+
+
+class DueQueue:
+    """Timer keys ordered by due_at; pushing a key again moves it"""
+
+    def __init__(self):
+        self._heap: List[Tuple[str, str]] = []
+        self._due: Dict[str, str] = {}  # key -> due_at of its live heap entry
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def push(self, key: str, due_at: str) -> None:
+        if self._due.get(key) == due_at:
+            return
+        self._due[key] = due_at
+        heapq.heappush(self._heap, (due_at, key))
+
+    def discard(self, key: str) -> None:
+        self._due.pop(key, None)
+
+    def _prune(self) -> None:
+        # Entries of moved or discarded keys are dropped as they surface
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[str]:
+        """due_at of the earliest entry"""
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: str) -> List[Tuple[str, str]]:
+        """(due_at, key) of every entry due at or before `now`, earliest first"""
+        due = []
+        while self.peek() is not None and self._heap[0][0] <= now:
+            due_at, key = heapq.heappop(self._heap)
+            del self._due[key]
+            due.append((due_at, key))
+        return due
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._due.clear()
+
+
+def breach_action(timer: dict) -> Optional[Dict[str, Any]]:
+    """
+    What firing a timer does: {"filter", "set", "event", "notification"}.
+    The filter only matches while the ticket still has the deadline, so a
+    deadline met after it was scheduled changes nothing. None for unknown kinds.
+    """
+    ticket_filter = {"id": timer["ticket_id"], "is_open": True, "is_deleted": {"$ne": True}}
+    kind = timer.get("kind")
+    if kind == ACCEPTANCE:
+        ticket_filter.update(assignment_status="pending", assigned_at=timer.get("ref"))
+        updates = {"is_escalated": True}
+        event, title = "assignment_escalated", "Assignment escalated"
+        description = f"Assignment not accepted within {AUTO_ESCALATION_HOURS} hours"
+    elif kind == RESPONSE:
+        ticket_filter.update(first_response_at=None, response_due_at=timer.get("ref"))
+        updates = {"sla_breached": True}
+        event, title = "sla_response_breached", "Response SLA breached"
+        description = "First response was due at " + timer["due_at"]
+    elif kind == RESOLUTION:
+        ticket_filter.update(resolution_due_at=timer.get("ref"))
+        updates = {"sla_breached": True, "is_overdue": True, "is_escalated": True}
+        event, title = "sla_resolution_breached", "Resolution SLA breached"
+        description = "Resolution was due at " + timer["due_at"]
+    else:
+        return None
+    return {
+        "filter": ticket_filter,
+        "set": updates,
+        "event": {"type": event, "description": description, "user_name": "SLA scheduler",
+                  "details": {"due_at": timer["due_at"]}},
+        "notification": {"notif_type": event, "title": title},
+    }
+
+
+async def fire_timer(timer: dict) -> bool:
+    """Apply a timer's breach; False if the ticket no longer has the deadline"""
+    action = breach_action(timer)
+    if not action:
+        return False
+    ticket = await append_ticket_events(action["filter"], dict(action["event"]), {"$set": action["set"]})
+    if not ticket:
+        return False
+    await sync_ticket_rollup(timer["ticket_id"])
+    details = await db.tickets_v2.find_one(
+        {"id": timer["ticket_id"]}, {"_id": 0, "ticket_number": 1, "subject": 1, "assigned_to_id": 1}
+    ) or {}
+    await create_notification(
+        org_id=ticket["organization_id"],
+        title=action["notification"]["title"],
+        message=f"#{details.get('ticket_number', '')} {details.get('subject', '')}: {action['event']['description']}",
+        notif_type=action["notification"]["notif_type"],
+        target_user_ids=[details["assigned_to_id"]] if details.get("assigned_to_id") else None,
+        ticket_id=timer["ticket_id"],
+        metadata={"kind": timer["kind"], "due_at": timer["due_at"]},
+    )
+    return True
+
+
+class SlaScheduler:
+    """Leader-elected due-queue of sla_timers"""
+
+    def __init__(self, clock: Optional[Clock] = None, poll_seconds: float = POLL_SECONDS,
+                 lease_seconds: float = LEASE_SECONDS, batch_size: int = BATCH_SIZE):
+        self.clock = clock or Clock()
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.owner = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.queue = DueQueue()
+        self.loaded_until: Optional[str] = None  # the heap holds every unfired timer due up to here
+        self.is_leader = False
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._listening = False
+
+    # ── leadership ──
+
+    async def _acquire(self, now: datetime) -> bool:
+        try:
+            lease = await db.scheduler_leases.find_one_and_update(
+                {"name": LEASE_NAME, "$or": [{"lease_until": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds),
+                          "last_tick_at": iso(now)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            lease = None  # another process holds the lease
+        leader = bool(lease) and lease.get("owner") == self.owner
+        if leader and not self.is_leader:
+            logger.info(f"SLA scheduler leadership taken ({self.owner})")
+        if not leader:
+            self.queue.clear()
+            self.loaded_until = None
+        self.is_leader = leader
+        return leader
+
+    # ── due-queue ──
+
+    def notify(self, timer: dict) -> None:
+        """A timer was (re)written in this process: queue it if it falls inside the loaded window"""
+        if not self.is_leader or self.loaded_until is None:
+            return
+        if timer.get("fired_at") is None and timer["due_at"] <= self.loaded_until:
+            self.queue.push(timer["key"], timer["due_at"])
+            self._wake.set()
+
+    async def _refill(self, now: datetime) -> None:
+        """Load unfired timers due before the end of the next poll interval"""
+        until = iso(now + timedelta(seconds=self.poll_seconds))
+        docs = await db.sla_timers.find(
+            {"fired_at": None, "due_at": {"$lte": until}}, {"_id": 0, "key": 1, "due_at": 1}
+        ).sort("due_at", 1).limit(self.batch_size).to_list(None)
+        for doc in docs:
+            self.queue.push(doc["key"], doc["due_at"])
+        # A full batch may have left later timers behind; load only up to the last one
+        self.loaded_until = docs[-1]["due_at"] if len(docs) == self.batch_size else until
+
+    async def _claim(self, key: str, due_at: str, now: datetime) -> Optional[dict]:
+        """Mark a timer fired, unless it moved or was fired meanwhile"""
+        return await db.sla_timers.find_one_and_update(
+            {"key": key, "due_at": due_at, "fired_at": None},
+            {"$set": {"fired_at": iso(now), "fired_by": self.owner}},
+            projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+
+    async def _release(self, timer: dict, error: Exception) -> None:
+        attempts = timer.get("attempts", 0) + 1
+        logger.error(f"SLA timer {timer['key']} failed (attempt {attempts}): {error}")
+        await db.sla_timers.update_one(
+            {"key": timer["key"], "due_at": timer["due_at"]},
+            {"$set": {"fired_at": None if attempts < MAX_ATTEMPTS else timer["fired_at"],
+                      "last_error": str(error)}, "$inc": {"attempts": 1}}
+        )
+
+    def wait_seconds(self, now: datetime) -> float:
+        """Seconds until the next due timer, capped at the poll interval"""
+        next_due = self.queue.peek()
+        if next_due is None:
+            return self.poll_seconds
+        delay = (datetime.fromisoformat(next_due) - now).total_seconds()
+        return min(max(delay, 0), self.poll_seconds)
+
+    async def run_once(self) -> Optional[int]:
+        """One tick; returns the number of breaches applied, None when not the leader"""
+        now = self.clock.now()
+        if not await self._acquire(now):
+            return None
+        await self._refill(now)
+        fired = 0
+        for due_at, key in self.queue.pop_due(iso(now)):
+            timer = await self._claim(key, due_at, now)
+            if not timer:
+                continue
+            try:
+                fired += await fire_timer(timer)
+            except Exception as e:
+                await self._release(timer, e)
+        if fired:
+            await db.scheduler_leases.update_one({"name": LEASE_NAME}, {"$inc": {"fired_total": fired}})
+        return fired
+
+    async def _run_forever(self) -> None:
+        while True:
+            wait = self.poll_seconds
+            try:
+                await self.run_once()
+                wait = self.wait_seconds(self.clock.now())
+            except Exception as e:
+                logger.error(f"SLA scheduler tick failed: {e}")
+            self._wake.clear()
+            await self.clock.sleep(wait, self._wake)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            if not self._listening:
+                on_timer_scheduled(self.notify)
+                self._listening = True
+            self._task = asyncio.create_task(self._run_forever())
+            logger.info(f"SLA scheduler started ({self.owner})")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            # Hand the lease over at once instead of letting it lapse
+            await db.scheduler_leases.update_one(
+                {"name": LEASE_NAME, "owner": self.owner}, {"$set": {"lease_until": self.clock.now()}}
+            )
+            self.is_leader = False
+
+
+# Global instance
+_scheduler: Optional[SlaScheduler] = None
+
+
+def init_sla_scheduler() -> SlaScheduler:
+    """Initialize the SLA scheduler"""
+    global _scheduler
+    _scheduler = SlaScheduler()
+    return _scheduler
+
+
+def get_sla_scheduler() -> Optional[SlaScheduler]:
+    """Get the SLA scheduler instance"""
+    return _scheduler
@@ -0,0 +1,178 @@
+"""
+SLA Timers
+==========
+The persisted due-queue of services/sla_scheduler.py: one document per
+pending deadline of a ticket, in collection `sla_timers`:
+- key               "<ticket_id>:<kind>" (unique)
+- organization_id, ticket_id
+- kind              acceptance | response | resolution
+- due_at            ISO timestamp in IST to the second, so string order is time order
+- ref               the ticket value the deadline was derived from
+- fired_at          set once the scheduler has fired it
+- attempts          failed firings so far
+
+Which deadlines a ticket has is a pure function of its fields
+(`ticket_timers`):
+- acceptance   a pending assignment: assigned_at + AUTO_ESCALATION_HOURS
+- response     response_due_at, until the first staff reply stamps
+               first_response_at (ticket_rollups.record_first_response)
+- resolution   resolution_due_at
+Closed and deleted tickets have none. `sync_ticket_timers` brings the
+collection in line with a ticket (sync_ticket_rollup calls it after every
+ticket write), so the scheduler never has to scan tickets_v2. A timer that
+goes stale between two syncs is harmless: the scheduler re-checks the ticket
+before acting on it.
+
+`sla_deadlines` sets response_due_at / resolution_due_at on a new ticket
+from its SLA policy (wall-clock hours times the policy's priority multiplier).
+`rebuild_sla_timers` (scripts/rebuild_sla_timers.py) backfills open tickets.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import IST
+from database import db
+from services.workload import AUTO_ESCALATION_HOURS
+from utils.helpers import get_ist_now
+
+logger = logging.getLogger(__name__)
+
+ACCEPTANCE = "acceptance"
+RESPONSE = "response"
+RESOLUTION = "resolution"
+
+# Ticket fields ticket_timers reads
+TIMER_FIELDS = (
+    "organization_id", "is_open", "is_deleted", "assignment_status", "assigned_at",
+    "response_due_at", "resolution_due_at", "first_response_at",
+)
+
+# Called with each timer written, so an in-process scheduler can pick it up at once
+_listeners: List[Callable[[dict], None]] = []
+
+
+def on_timer_scheduled(listener: Callable[[dict], None]) -> None:
+    _listeners.append(listener)
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Aware datetime of an ISO timestamp (naive ones are IST); None if unparseable"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=IST)
+
+
+def timer_key(ticket_id: str, kind: str) -> str:
+    return f"{ticket_id}:{kind}"
+
+
+def ticket_timers(ticket: Optional[dict]) -> List[Dict[str, Any]]:
+    """The deadlines a ticket currently has: [{"key", "kind", "due_at", "ref"}]"""
+    if not ticket or ticket.get("is_deleted") or not ticket.get("is_open", True):
+        return []
+    timers = []
+
+    def add(kind: str, due: Optional[datetime], ref: Optional[str]) -> None:
+        if due is not None:
+            timers.append({"key": timer_key(ticket["id"], kind), "kind": kind,
+                           "due_at": due.astimezone(IST).isoformat(timespec="seconds"), "ref": ref})
+
+    assigned_at = ticket.get("assigned_at")
+    if ticket.get("assignment_status") == "pending" and assigned_at:
+        assigned = parse_timestamp(assigned_at)
+        add(ACCEPTANCE, assigned + timedelta(hours=AUTO_ESCALATION_HOURS) if assigned else None, assigned_at)
+    if not ticket.get("first_response_at"):
+        add(RESPONSE, parse_timestamp(ticket.get("response_due_at")), ticket.get("response_due_at"))
+    add(RESOLUTION, parse_timestamp(ticket.get("resolution_due_at")), ticket.get("resolution_due_at"))
+    return timers
+
+
+async def sync_ticket_timers(ticket_id: str, ticket: Optional[dict]) -> None:
+    """
+    Make sla_timers hold exactly the ticket's deadlines (`ticket` carries
+    TIMER_FIELDS, or is None when the ticket is gone). A deadline that has
+    not moved keeps its fired state, so it never fires twice.
+    """
+    wanted = ticket_timers(ticket)
+    existing = {
+        t["key"]: t.get("due_at")
+        for t in await db.sla_timers.find({"ticket_id": ticket_id}, {"_id": 0, "key": 1, "due_at": 1}).to_list(None)
+    }
+    stale = [key for key in existing if key not in {t["key"] for t in wanted}]
+    if stale:
+        await db.sla_timers.delete_many({"key": {"$in": stale}})
+    for timer in wanted:
+        if existing.get(timer["key"]) == timer["due_at"]:
+            continue
+        doc = {**timer, "organization_id": ticket.get("organization_id"), "ticket_id": ticket_id,
+               "fired_at": None, "attempts": 0}
+        try:
+            await db.sla_timers.update_one({"key": timer["key"]}, {"$set": doc}, upsert=True)
+        except DuplicateKeyError:
+            continue  # a concurrent sync wrote it
+        for listener in _listeners:
+            listener(doc)
+
+
+async def find_sla_policy(org_id: str, policy_id: Optional[str] = None) -> Optional[dict]:
+    """The given active SLA policy, else the org's default one"""
+    query: Dict[str, Any] = {"organization_id": org_id, "is_active": {"$ne": False}}
+    policy = None
+    if policy_id:
+        policy = await db.ticket_sla_policies.find_one({**query, "id": policy_id}, {"_id": 0})
+    if not policy:
+        policy = await db.ticket_sla_policies.find_one({**query, "is_default": True}, {"_id": 0})
+    return policy
+
+
+def sla_deadlines(policy: Optional[dict], priority_name: Optional[str],
+                  created_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """sla_policy_id / response_due_at / resolution_due_at for a ticket created at `created_at` (now)"""
+    if not policy:
+        return {}
+    created_at = created_at or get_ist_now()
+    multiplier = (policy.get("priority_multipliers") or {}).get((priority_name or "medium").lower(), 1.0)
+    deadlines: Dict[str, Any] = {"sla_policy_id": policy.get("id")}
+    for field, hours_key in (("response_due_at", "response_time_hours"), ("resolution_due_at", "resolution_time_hours")):
+        hours = policy.get(hours_key)
+        if hours:
+            deadlines[field] = (created_at + timedelta(hours=hours * multiplier)).isoformat()
+    return deadlines
+
+
+async def rebuild_sla_timers(org_id: Optional[str] = None, fire_overdue: bool = False,
+                             batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Backfill timers for open tickets (those written before sla_timers existed).
+    Existing timers are left alone. Deadlines already past are stored as fired
+    unless `fire_overdue`, so a backfill does not escalate old tickets all at once.
+    """
+    query: Dict[str, Any] = {"is_open": True, "is_deleted": {"$ne": True}}
+    if org_id:
+        query["organization_id"] = org_id
+    now = get_ist_now().astimezone(IST).isoformat(timespec="seconds")
+    ops: List[UpdateOne] = []
+    stats = {"tickets": 0, "timers": 0, "overdue": 0}
+
+    async for ticket in db.tickets_v2.find(query, {"_id": 0, "id": 1, **{f: 1 for f in TIMER_FIELDS}}).batch_size(batch_size):
+        stats["tickets"] += 1
+        for timer in ticket_timers(ticket):
+            overdue = timer["due_at"] <= now and not fire_overdue
+            stats["timers"] += 1
+            stats["overdue"] += overdue
+            ops.append(UpdateOne({"key": timer["key"]}, {"$setOnInsert": {
+                **timer, "organization_id": ticket.get("organization_id"), "ticket_id": ticket["id"],
+                "fired_at": now if overdue else None, "fired_by": "backfill" if overdue else None, "attempts": 0,
+            }}, upsert=True))
+        if len(ops) >= batch_size:
+            await db.sla_timers.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await db.sla_timers.bulk_write(ops, ordered=False)
+    return stats
@@ -13,6 +13,7 @@ from contextvars import ContextVar
 
 from config import SECRET_KEY, ALGORITHM
 from database import db
+from utils.tenant_scope import get_admin_org_id
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +29,7 @@ async def get_org_id_from_admin(admin_email: str) -> Optional[str]:
     Get organization_id for an admin user.
     Used to scope admin queries to their organization.
     """
-    # Check if admin has an organization member entry
-    org_member = await db.organization_members.find_one(
-        {"email": admin_email, "is_active": True, "is_deleted": {"$ne": True}},
-        {"_id": 0}
-    )
-    
-    if org_member:
-        return org_member.get("organization_id")
-    
-    return None
+    return await get_admin_org_id(admin_email)
 
 
 def add_tenant_filter(query: dict, org_id: Optional[str]) -> dict:
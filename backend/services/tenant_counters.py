@@ -0,0 +1,382 @@
+"""
+Tenant Counters
+===============
+Materialized entity counts for the dashboards (`/admin/dashboard`,
+`/company/dashboard`, organization `/current` and `/usage`, the platform
+organization list / detail), so each is a single-document read instead of
+one count_documents per figure.
+
+Collection `tenant_counters`, one document per scope:
+- "org:<organization_id>"   companies, users, company_users, devices, parts,
+                            services, amc, amc_contracts, tickets, open_tickets
+- "company:<company_id>"    company_users, devices, amc_contracts, open_tickets
+
+Counts that depend on today's date (active warranties, expiring in N days,
+tickets this month) are kept as histograms keyed by the date (or month) of
+the relevant field - `warranty_end.2025-06-30: 12` - and summed over the
+wanted range at read time, so they stay correct without any rewrite when
+the day changes.
+
+What a document contributes is a pure function of its fields
+(`contributions`), so writers report "before" and "after" and the difference
+is applied with one $inc per scope (`count_change`). Rows with
+is_deleted=True count nothing, so a soft delete is just an update.
+`reconcile_counters` recomputes everything with one aggregation per
+collection and replaces the documents; CounterReconciler runs it
+periodically (one process at a time, via a lease) to repair any drift from
+failed or racing increments.
+
+Configuration (env):
+    TENANT_COUNTERS_RECONCILE    "0" disables periodic reconciliation (default on)
+    COUNTER_RECONCILE_SECONDS    interval between reconciliations (default 3600)
+"""
+import asyncio
+import logging
+import os
+import re
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.helpers import get_ist_now, get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_ENABLED = os.environ.get("TENANT_COUNTERS_RECONCILE", "1") != "0"
+RECONCILE_SECONDS = int(os.environ.get("COUNTER_RECONCILE_SECONDS", "3600"))
+LEASE_KEY = "_reconcile_lease"
+
+DAY, MONTH = 10, 7  # histogram bucket = prefix length of an ISO date
+_BUCKET_RE = {DAY: re.compile(r"^\d{4}-\d{2}-\d{2}$"), MONTH: re.compile(r"^\d{4}-\d{2}$")}
+
+
+@dataclass(frozen=True)
+class Counted:
+    """How documents of one collection are counted"""
+    collection: str
+    counter: str
+    per_company: bool = False                  # also counted on the company's document
+    histogram: Optional[str] = None            # histogram field, bucketed by `date_field`
+    date_field: Optional[str] = None
+    bucket: int = DAY
+    match: Dict[str, Any] = field(default_factory=dict)  # extra equality conditions
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        names = ["organization_id", "company_id", "is_deleted", *self.match]
+        if self.date_field:
+            names.append(self.date_field)
+        return tuple(names)
+
+    @property
+    def projection(self) -> Dict[str, int]:
+        return {"_id": 0, **{f: 1 for f in self.fields}}
+
+
+COUNTED: Dict[str, Counted] = {c.collection: c for c in (
+    Counted("companies", "companies"),
+    Counted("users", "users"),
+    Counted("company_users", "company_users", per_company=True),
+    Counted("devices", "devices", per_company=True, histogram="warranty_end", date_field="warranty_end_date"),
+    Counted("parts", "parts"),
+    Counted("service_history", "services"),
+    Counted("amc", "amc", histogram="amc_end", date_field="end_date"),
+    Counted("amc_contracts", "amc_contracts", per_company=True, histogram="amc_contract_end", date_field="end_date"),
+    Counted("tickets", "tickets", histogram="tickets_created", date_field="created_at", bucket=MONTH),
+    Counted("tickets_v2", "open_tickets", per_company=True, match={"is_open": True}),
+)}
+
+
+def org_key(org_id: str) -> str:
+    return f"org:{org_id}"
+
+
+def company_key(company_id: str) -> str:
+    return f"company:{company_id}"
+
+
+def bucket_of(value: Any, width: int) -> Optional[str]:
+    """The histogram bucket of a date/datetime string, or None if it isn't one"""
+    if not isinstance(value, str):
+        return None
+    key = value[:width]
+    return key if _BUCKET_RE[width].match(key) else None
+
+
+# ── contributions ───────────────────────────────────────────────────────────
+
+def contributions(collection: str, doc: Optional[dict]) -> Dict[str, Dict[str, int]]:
+    """What one document adds to the counters, as {scope key: {"dotted.path": amount}}"""
+    spec = COUNTED[collection]
+    if not doc or doc.get("is_deleted"):
+        return {}
+    if any(doc.get(name) != value for name, value in spec.match.items()):
+        return {}
+
+    paths = {spec.counter: 1}
+    if spec.histogram:
+        bucket = bucket_of(doc.get(spec.date_field), spec.bucket)
+        if bucket:
+            paths[f"{spec.histogram}.{bucket}"] = 1
+
+    out = {}
+    if doc.get("organization_id"):
+        out[org_key(doc["organization_id"])] = dict(paths)
+    if spec.per_company and doc.get("company_id"):
+        out[company_key(doc["company_id"])] = dict(paths)
+    return out
+
+
+def _owners(doc: Optional[dict]) -> Dict[str, Dict[str, Any]]:
+    """The identifying fields stored on each scope document a row counts on"""
+    if not doc:
+        return {}
+    org_id, company_id = doc.get("organization_id"), doc.get("company_id")
+    owners = {}
+    if org_id:
+        owners[org_key(org_id)] = {"scope": "org", "organization_id": org_id}
+    if company_id:
+        owners[company_key(company_id)] = {"scope": "company", "company_id": company_id, "organization_id": org_id}
+    return owners
+
+
+def delta(collection: str, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> Dict[str, Dict[str, int]]:
+    """Net counter change of a set of (before, after) document pairs"""
+    out: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for before, after in changes:
+        for sign, doc in ((-1, before), (1, after)):
+            for key, paths in contributions(collection, doc).items():
+                for path, amount in paths.items():
+                    out[key][path] += sign * amount
+    return {key: {p: n for p, n in paths.items() if n} for key, paths in out.items() if any(paths.values())}
+
+
+# ── write path ──────────────────────────────────────────────────────────────
+
+async def count_changes(collection: str, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    """
+    Apply the counter change of (before, after) pairs - (None, doc) for an
+    insert, (doc, None) or (doc, {**doc, "is_deleted": True}) for a delete.
+    Failures are logged and never fail the write; reconciliation repairs them.
+    """
+    try:
+        changes = list(changes)
+        incs = delta(collection, changes)
+        if not incs:
+            return
+        owners = {}
+        for before, after in changes:
+            owners.update(_owners(before))
+            owners.update(_owners(after))
+        now = get_ist_isoformat()
+        await db.tenant_counters.bulk_write([
+            UpdateOne({"key": key}, {"$inc": paths, "$set": {**owners.get(key, {}), "updated_at": now}}, upsert=True)
+            for key, paths in incs.items()
+        ], ordered=False)
+    except Exception as e:
+        logger.warning(f"Tenant counter update failed for {collection}: {e}")
+
+
+async def count_change(collection: str, before: Optional[dict], after: Optional[dict]) -> None:
+    await count_changes(collection, [(before, after)])
+
+
+async def count_inserted(collection: str, docs: Iterable[dict]) -> None:
+    await count_changes(collection, [(None, doc) for doc in docs])
+
+
+async def update_counted(collection: str, query: dict, fields: dict) -> Optional[dict]:
+    """
+    $set `fields` on one document and apply the counter change. Returns the
+    document as it was (counted fields only), or None if nothing matched.
+    """
+    before = await db[collection].find_one_and_update(
+        query, {"$set": fields}, projection=COUNTED[collection].projection
+    )
+    if before:
+        await count_change(collection, before, {**before, **fields})
+    return before
+
+
+async def soft_delete_counted(collection: str, query: dict, extra: Optional[dict] = None) -> Optional[dict]:
+    """
+    Set is_deleted (plus any `extra` fields) on one document and uncount it.
+    Returns the document as it was (counted fields only), or None if nothing
+    matched.
+    """
+    spec = COUNTED[collection]
+    before = await db[collection].find_one_and_update(
+        query, {"$set": {"is_deleted": True, **(extra or {})}}, projection=spec.projection
+    )
+    if before:
+        await count_change(collection, before, {**before, "is_deleted": True})
+    return before
+
+
+async def soft_delete_many_counted(collection: str, query: dict, extra: Optional[dict] = None) -> int:
+    """update_many(is_deleted=True) that uncounts the rows it deletes"""
+    spec = COUNTED[collection]
+    live = {**query, "is_deleted": {"$ne": True}}
+    before = await db[collection].find(live, spec.projection).to_list(None)
+    result = await db[collection].update_many(live, {"$set": {"is_deleted": True, **(extra or {})}})
+    await count_changes(collection, [(doc, None) for doc in before])
+    return result.modified_count
+
+
+# ── reconciliation ──────────────────────────────────────────────────────────
+
+def _pipeline(spec: Counted, org_id: Optional[str]) -> List[dict]:
+    match: Dict[str, Any] = {"is_deleted": {"$ne": True}, **spec.match}
+    match["organization_id"] = org_id if org_id else {"$ne": None}
+    group: Dict[str, Any] = {"organization_id": "$organization_id"}
+    if spec.per_company:
+        group["company_id"] = "$company_id"
+    if spec.histogram:
+        date = f"${spec.date_field}"
+        group["bucket"] = {"$cond": [
+            {"$eq": [{"$type": date}, "string"]}, {"$substrCP": [date, 0, spec.bucket]}, None
+        ]}
+    return [{"$match": match}, {"$group": {"_id": group, "n": {"$sum": 1}}}]
+
+
+def _nest(flat: Dict[str, int]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for path, amount in flat.items():
+        if "." in path:
+            name, bucket = path.split(".", 1)
+            nested.setdefault(name, {})[bucket] = amount
+        else:
+            nested[path] = amount
+    return nested
+
+
+async def reconcile_counters(org_id: Optional[str] = None) -> Dict[str, int]:
+    """
+    Recompute the counter documents of one organization (or all of them) from
+    the source collections and replace the stored ones.
+    """
+    acc: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    owners: Dict[str, Dict[str, Any]] = {}
+    for collection, spec in COUNTED.items():
+        async for row in db[collection].aggregate(_pipeline(spec, org_id), allowDiskUse=True):
+            ident = row["_id"]
+            doc = {"organization_id": ident.get("organization_id"), "company_id": ident.get("company_id")}
+            if spec.histogram:
+                doc[spec.date_field] = ident.get("bucket")
+            doc.update(spec.match)
+            for key, paths in contributions(collection, doc).items():
+                for path, amount in paths.items():
+                    acc[key][path] += amount * row["n"]
+            owners.update(_owners(doc))
+
+    now = get_ist_isoformat()
+    ops = [
+        ReplaceOne({"key": key}, {"key": key, **owners[key], **_nest(paths), "updated_at": now}, upsert=True)
+        for key, paths in acc.items()
+    ]
+    for i in range(0, len(ops), 1000):
+        await db.tenant_counters.bulk_write(ops[i:i + 1000], ordered=False)
+
+    # Scopes with nothing left to count
+    stale: Dict[str, Any] = {"scope": {"$in": ["org", "company"]}, "key": {"$nin": list(acc)}}
+    if org_id:
+        stale["organization_id"] = org_id
+    removed = await db.tenant_counters.delete_many(stale)
+
+    logger.info(f"Reconciled tenant counters: {len(acc)} documents, {removed.deleted_count} removed")
+    return {"documents": len(acc), "removed": removed.deleted_count}
+
+
+class CounterReconciler:
+    """Periodic reconcile_counters; a lease keeps it to one app process per run"""
+
+    def __init__(self, interval: int = RECONCILE_SECONDS):
+        self.interval = interval
+        self.owner = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._task: Optional[asyncio.Task] = None
+
+    async def _acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await db.tenant_counters.find_one_and_update(
+                {"key": LEASE_KEY, "$or": [{"lease_until": {"$lt": now}}, {"lease_owner": self.owner}]},
+                {"$set": {"lease_owner": self.owner, "lease_until": now + timedelta(seconds=self.interval)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False  # another process holds the lease
+        return bool(lease) and lease.get("lease_owner") == self.owner
+
+    async def run_once(self) -> Optional[Dict[str, int]]:
+        if not await self._acquire():
+            return None
+        return await reconcile_counters()
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Tenant counter reconciliation failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+            logger.info(f"Tenant counter reconciler started ({self.owner})")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# ── read path ───────────────────────────────────────────────────────────────
+
+async def load_org_counters(org_id: str) -> dict:
+    return await db.tenant_counters.find_one({"key": org_key(org_id)}, {"_id": 0}) or {}
+
+
+async def load_company_counters(company_id: str) -> dict:
+    return await db.tenant_counters.find_one({"key": company_key(company_id)}, {"_id": 0}) or {}
+
+
+async def load_org_counters_many(org_ids: Iterable[str]) -> Dict[str, dict]:
+    """Counter documents for a page of organizations, in one query"""
+    keys = [org_key(oid) for oid in org_ids]
+    docs = await db.tenant_counters.find({"key": {"$in": keys}}, {"_id": 0}).to_list(None)
+    return {doc["organization_id"]: doc for doc in docs}
+
+
+def count_between(hist: Optional[Dict[str, int]], start: Optional[str] = None, end: Optional[str] = None) -> int:
+    """Sum of histogram buckets with start <= bucket <= end (ISO order is date order)"""
+    return sum(
+        n for bucket, n in (hist or {}).items()
+        if (start is None or bucket >= start) and (end is None or bucket <= end)
+    )
+
+
+def days_from_today(days: int) -> str:
+    return (get_ist_now() + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+# Global instance
+_reconciler: Optional[CounterReconciler] = None
+
+
+def init_counter_reconciler() -> CounterReconciler:
+    """Initialize the periodic counter reconciler"""
+    global _reconciler
+    _reconciler = CounterReconciler()
+    return _reconciler
+
+
+def get_counter_reconciler() -> Optional[CounterReconciler]:
+    """Get the counter reconciler instance"""
+    return _reconciler
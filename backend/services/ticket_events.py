@@ -0,0 +1,190 @@
+"""
+Ticket Events
+=============
+Append-only history of tickets_v2 (comments, email replies, assignments,
+stage changes, visits...), one document per event, so a ticket's history can
+grow without growing the ticket document.
+
+Collection `ticket_events`:
+- id                event id (unique; the timeline entry's id)
+- organization_id, ticket_id
+- created_at        ISO timestamp; pages are ordered by (created_at, id)
+- type, description, user_id, user_name, is_internal, details, ...
+                    the timeline entry as it was written
+
+The ticket keeps `timeline` as a denormalized summary of its last
+TIMELINE_SUMMARY_SIZE events (what ticket detail pages render first) and
+`event_count`. Older events are read through `list_ticket_events`
+(GET /ticketing/tickets/{id}/events), which pages on an opaque
+(created_at, id) cursor (utils/pagination.py) instead of skip/limit.
+
+Write events with `await append_ticket_events(ticket_filter, entry, update)`
+instead of `$push`-ing onto `timeline`. Tickets written before this
+collection existed still hold their whole history in `timeline`; the first
+event appended to one moves that history over (`events_migrated`) before
+the summary is trimmed, and `migrate_tickets` moves the rest in bulk (once
+at startup via services/backfills.py, or scripts/migrate_ticket_events.py).
+"""
+import logging
+import os
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import db
+from utils.helpers import get_ist_isoformat
+from utils.pagination import after_cursor, keyset_sort, page_of
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_SUMMARY_SIZE = int(os.environ.get("TICKET_TIMELINE_SUMMARY", "20"))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Entries = Union[dict, Iterable[dict]]
+
+
+def _entries(entries: Entries) -> List[dict]:
+    """Entries as a list, each with an id and created_at (set on the dicts themselves)"""
+    entries = [entries] if isinstance(entries, dict) else list(entries)
+    for entry in entries:
+        entry.setdefault("id", str(uuid.uuid4()))
+        entry.setdefault("created_at", get_ist_isoformat())
+    return entries
+
+
+def summary_push(entries: List[dict]) -> Dict[str, Any]:
+    """$push modifier that appends to the timeline summary and keeps its last N entries"""
+    return {"$each": entries, "$slice": -TIMELINE_SUMMARY_SIZE}
+
+
+def event_docs(org_id: Optional[str], ticket_id: str, entries: Iterable[dict]) -> List[dict]:
+    return [{**entry, "organization_id": org_id, "ticket_id": ticket_id} for entry in entries]
+
+
+def _upserts(org_id: Optional[str], ticket_id: str, entries: Iterable[dict]) -> List[UpdateOne]:
+    """Idempotent writes of timeline entries (legacy entries without an id get a stable one)"""
+    ops = []
+    for index, entry in enumerate(entries):
+        entry = {**entry, "id": entry.get("id") or f"{ticket_id}:{index}"}
+        entry.setdefault("created_at", "")
+        ops.append(UpdateOne(
+            {"id": entry["id"]},
+            {"$setOnInsert": event_docs(org_id, ticket_id, [entry])[0]},
+            upsert=True,
+        ))
+    return ops
+
+
+async def record_events(org_id: Optional[str], ticket_id: str, entries: Entries) -> None:
+    """Insert events for a ticket whose summary already holds them (e.g. a new ticket)"""
+    entries = _entries(entries)
+    if not entries:
+        return
+    try:
+        await db.ticket_events.insert_many(event_docs(org_id, ticket_id, entries), ordered=False)
+    except BulkWriteError as e:
+        # Re-recorded events (duplicate ids) are expected to be skipped
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            logger.error(f"Ticket event write failed for {ticket_id}: {e.details}")
+    except Exception as e:
+        logger.error(f"Ticket event write failed for {ticket_id}: {e}")
+
+
+async def migrate_ticket(ticket: dict) -> int:
+    """
+    Move a legacy ticket's embedded timeline to ticket_events, then trim the
+    summary and mark it migrated. Returns the number of legacy entries.
+    """
+    timeline = ticket.get("timeline") or []
+    if timeline:
+        await db.ticket_events.bulk_write(
+            _upserts(ticket.get("organization_id"), ticket["id"], timeline), ordered=False
+        )
+    await db.tickets_v2.update_one(
+        {"id": ticket["id"], "events_migrated": {"$ne": True}},
+        {
+            "$set": {"events_migrated": True, "event_count": len(timeline)},
+            "$push": {"timeline": {"$each": [], "$slice": -TIMELINE_SUMMARY_SIZE}},
+        }
+    )
+    return len(timeline)
+
+
+async def migrate_tickets(org_id: Optional[str] = None) -> Dict[str, int]:
+    """Migrate every ticket (of one organization) not migrated yet"""
+    query: Dict[str, Any] = {"events_migrated": {"$ne": True}}
+    if org_id:
+        query["organization_id"] = org_id
+    tickets = events = 0
+    async for ticket in db.tickets_v2.find(query, {"_id": 0, "id": 1, "organization_id": 1, "timeline": 1}):
+        events += await migrate_ticket(ticket)
+        tickets += 1
+    return {"tickets": tickets, "events": events}
+
+
+async def append_ticket_events(
+    ticket_filter: Dict[str, Any], entries: Entries, update: Optional[Dict[str, Any]] = None
+) -> Optional[dict]:
+    """
+    Append events to the first ticket matching `ticket_filter`, applying
+    `update` (e.g. {"$set": {...}}) in the same write. Returns the ticket's
+    {"id", "organization_id"}, or None if no ticket matched.
+    """
+    entries = _entries(entries)
+    current = await db.tickets_v2.find_one(ticket_filter, {"_id": 0, "id": 1, "events_migrated": 1})
+    if not current:
+        return None
+    migrated = bool(current.get("events_migrated"))
+    if not migrated:
+        # Legacy ticket: copy its full history out of `timeline` before any
+        # write trims it. If that fails, append untrimmed so nothing is lost.
+        legacy = await db.tickets_v2.find_one(
+            {"id": current["id"]}, {"_id": 0, "id": 1, "organization_id": 1, "timeline": 1}
+        )
+        try:
+            await migrate_ticket(legacy)
+            migrated = True
+        except Exception as e:
+            logger.error(f"Ticket event migration failed for {current['id']}: {e}")
+
+    ops = {key: dict(value) for key, value in (update or {}).items()}
+    ops.setdefault("$push", {})["timeline"] = summary_push(entries) if migrated else {"$each": entries}
+    ops.setdefault("$inc", {})["event_count"] = len(entries)
+
+    before = await db.tickets_v2.find_one_and_update(
+        ticket_filter, ops, projection={"_id": 0, "id": 1, "organization_id": 1}
+    )
+    if not before:
+        return None
+
+    org_id, ticket_id = before.get("organization_id"), before["id"]
+    await record_events(org_id, ticket_id, entries)
+    return {"id": ticket_id, "organization_id": org_id}
+
+
+# ── reading ─────────────────────────────────────────────────────────────────
+
+def page_query(org_id: str, ticket_id: str, cursor: Optional[str] = None,
+               newest_first: bool = True, include_internal: bool = True) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"organization_id": org_id, "ticket_id": ticket_id}
+    if not include_internal:
+        query["is_internal"] = {"$ne": True}
+    if cursor:
+        query.update(after_cursor(cursor, newest_first))
+    return query
+
+
+async def list_ticket_events(org_id: str, ticket_id: str, limit: int = DEFAULT_PAGE_SIZE,
+                             cursor: Optional[str] = None, newest_first: bool = True,
+                             include_internal: bool = True) -> Dict[str, Any]:
+    """One page of a ticket's events: {"events": [...], "next_cursor": str | None}"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    events = await db.ticket_events.find(
+        page_query(org_id, ticket_id, cursor, newest_first, include_internal),
+        {"_id": 0, "organization_id": 0}
+    ).sort(keyset_sort(newest_first)).limit(limit + 1).to_list(limit + 1)
+    events, next_cursor = page_of(events, limit)
+    return {"events": events, "next_cursor": next_cursor}
@@ -0,0 +1,613 @@
+"""
+Ticket Analytics Rollups
+========================
+Incrementally maintained aggregates for routes/analytics.py, so dashboards
+read O(days) rollup rows instead of loading every ticket of the org.
+
+Collections:
+- ticket_rollups_daily   one row per (organization_id, date). Tickets created
+                         that day by priority / help topic / source / team /
+                         company / hour-of-week, SLA flags, first-response
+                         histogram; resolution histogram on the close date.
+- ticket_rollup_totals   one row per organization. Live open/closed counts,
+                         tickets per stage, open tickets per stage /
+                         priority / help topic, unassigned tickets,
+                         per-engineer workload and all-time resolution /
+                         first-response histograms. It backs the ticketing
+                         header stats (`ticketing_stats`) in O(1).
+- ticket_rollup_state    the tracked fields each ticket last contributed,
+                         so that a change is applied as a delta.
+
+A ticket's contribution is a pure function of its fields (`contributions`),
+so every write is "subtract what it counted before, add what it counts now"
+(`sync_ticket_rollup`), and a rebuild is the plain sum over all tickets
+(`rebuild_rollups`, also exposed as scripts/rebuild_ticket_rollups.py).
+
+Staff replies call `record_first_response`, the only writer of
+first_response_at, which ends the response SLA.
+
+Call `await sync_ticket_rollup(ticket_id)` after any write that changes one of
+TRACKED_FIELDS. It also marks the org's ticket-derived analytics cache
+entries stale and moves the open-ticket tenant counters
+(services/tenant_counters.py), keeps the ticket's derived `is_assigned`
+flag in line with assigned_to_id / assigned_to_name, and reschedules its SLA
+and acceptance deadlines (services/sla_timers.py). Each claimed transition
+is pushed to open streams (services/push.py). Rollup failures are
+logged and never fail the ticket write; a rebuild reconciles any drift.
+
+Totals documents carry `schema`; a rebuild stamps ROLLUP_SCHEMA (the app
+rebuilds once per schema at startup, services/backfills.py). Until an org's
+totals have been rebuilt with the current contributions (`rollups_current`),
+its rollups hold only the tickets written since, so readers fall back to an
+aggregation over tickets_v2: `ticketing_stats` and the analytics modules.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterable
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from services.analytics_cache import invalidate_analytics
+from services.tenant_counters import count_change
+from services.sla_timers import TIMER_FIELDS, sync_ticket_timers
+from services.push import publish_ticket_transition
+from utils.helpers import get_ist_now, get_ist_isoformat
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = (
+    "organization_id", "is_deleted", "is_open", "created_at", "closed_at",
+    "first_response_at", "assigned_at", "current_stage_name", "priority_name",
+    "help_topic_name", "source", "assigned_to_id", "assigned_to_name", "assigned_team_name",
+    "company_id", "sla_breached", "is_overdue", "is_escalated",
+    "assignment_status",  # no rollup of its own; a change is a pushed transition
+)
+TRACKED_PROJECTION = {
+    "_id": 0, "id": 1, "is_assigned": 1, **{f: 1 for f in TRACKED_FIELDS}, **{f: 1 for f in TIMER_FIELDS},
+}
+
+# Bump when contributions() gains totals, so stale totals are not read as complete
+ROLLUP_SCHEMA = 2
+
+# Upper bounds (hours) of the resolution / first-response histogram buckets
+HOUR_BUCKETS = (1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720)
+OVERFLOW_BUCKET = "inf"
+
+TOTALS = "totals"
+SYNC_RETRIES = 3
+
+
+# ── key helpers ─────────────────────────────────────────────────────────────
+
+def _k(name: Any) -> str:
+    """Make a free-text value (stage, topic, ...) safe as a Mongo field name"""
+    text = str(name) if name not in (None, "") else "Unknown"
+    return text.replace("$", "＄").replace(".", "．")
+
+
+def _unk(key: str) -> str:
+    return key.replace("＄", "$").replace("．", ".")
+
+
+def _parse(iso: Optional[str]) -> Optional[datetime]:
+    if not iso:
+        return None
+    try:
+        return datetime.fromisoformat(str(iso).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _hours_between(start: Optional[str], end: Optional[str]) -> Optional[float]:
+    a, b = _parse(start), _parse(end)
+    if a is None or b is None:
+        return None
+    try:
+        return (b - a).total_seconds() / 3600
+    except TypeError:
+        # naive vs aware timestamps
+        return None
+
+
+def hours_bucket(hours: float) -> str:
+    for bound in HOUR_BUCKETS:
+        if hours <= bound:
+            return str(bound)
+    return OVERFLOW_BUCKET
+
+
+# ── contributions ───────────────────────────────────────────────────────────
+
+def is_assigned(ticket: Optional[dict]) -> bool:
+    """Assigned to a named person (the old four-way $or on id / name, inverted)"""
+    return bool(ticket and ticket.get("assigned_to_id") and ticket.get("assigned_to_name"))
+
+
+def tracked(ticket: Optional[dict]) -> Optional[dict]:
+    """The subset of a ticket the rollups depend on"""
+    if not ticket:
+        return None
+    return {f: ticket.get(f) for f in TRACKED_FIELDS if ticket.get(f) is not None}
+
+
+def contributions(ticket: Optional[dict]) -> Dict[str, Dict[str, float]]:
+    """
+    What one ticket adds to the rollups, as
+    {TOTALS or "YYYY-MM-DD": {"dotted.path": amount}}.
+    """
+    out: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+    if not ticket or ticket.get("is_deleted") or not ticket.get("organization_id"):
+        return {}
+
+    created_at = ticket.get("created_at") or ""
+    closed_at = ticket.get("closed_at")
+    is_open = bool(ticket.get("is_open"))
+    engineer_id = ticket.get("assigned_to_id")
+    breached = 1 if ticket.get("sla_breached") else 0
+
+    totals = out[TOTALS]
+    totals["total"] += 1
+    totals["open" if is_open else "closed"] += 1
+    totals[f"by_stage.{_k(ticket.get('current_stage_name'))}"] += 1
+    if not is_assigned(ticket):
+        totals["unassigned"] += 1
+    if is_open:
+        totals[f"open_by_stage.{_k(ticket.get('current_stage_name'))}"] += 1
+        totals[f"open_by_priority.{_k(ticket.get('priority_name'))}"] += 1
+        totals[f"open_by_topic.{_k(ticket.get('help_topic_name'))}"] += 1
+        totals["open_assigned" if engineer_id else "open_unassigned"] += 1
+    if closed_at and is_open:
+        totals["reopened"] += 1
+
+    if engineer_id:
+        prefix = f"engineers.{_k(engineer_id)}"
+        totals[f"{prefix}.assigned"] += 1
+        if not is_open:
+            totals[f"{prefix}.closed"] += 1
+            hours = _hours_between(ticket.get("assigned_at"), closed_at)
+            if hours is not None:
+                totals[f"{prefix}.resolution_hours"] += hours
+                totals[f"{prefix}.resolution_count"] += 1
+
+    day = created_at[:10]
+    if day:
+        daily = out[day]
+        priority = _k(ticket.get("priority_name") or "medium")
+        team = _k(ticket.get("assigned_team_name") or "Unassigned")
+        daily["created"] += 1
+        if is_open:
+            daily["created_open"] += 1
+        daily[f"priority.{priority}"] += 1
+        daily[f"topic.{_k(ticket.get('help_topic_name'))}"] += 1
+        daily[f"source.{_k(ticket.get('source') or 'web')}"] += 1
+        daily[f"team.{team}.total"] += 1
+        if breached:
+            daily["sla_breached"] += 1
+            daily[f"priority_breached.{priority}"] += 1
+            daily[f"team.{team}.breached"] += 1
+        if ticket.get("is_overdue"):
+            daily["is_overdue"] += 1
+        if ticket.get("is_escalated"):
+            daily["is_escalated"] += 1
+        if engineer_id:
+            daily[f"engineer_created.{_k(engineer_id)}"] += 1
+        if ticket.get("company_id"):
+            daily[f"company.{_k(ticket['company_id'])}"] += 1
+
+        created = _parse(created_at)
+        if created is not None:
+            daily[f"heatmap.{created.strftime('%a')}.{created.hour}"] += 1
+
+        response = _hours_between(created_at, ticket.get("first_response_at"))
+        if response is not None:
+            for row in (daily, totals):
+                row[f"first_response_hist.{hours_bucket(response)}"] += 1
+                row["first_response_hours"] += response
+                row["first_response_count"] += 1
+
+    resolution = _hours_between(created_at, closed_at)
+    if resolution is not None:
+        closed_row = out[closed_at[:10]]
+        closed_row["resolved"] += 1
+        for row in (closed_row, totals):
+            row[f"resolution_hist.{hours_bucket(resolution)}"] += 1
+            row["resolution_hours"] += resolution
+            row["resolution_count"] += 1
+
+    return {key: dict(paths) for key, paths in out.items()}
+
+
+def _delta(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    delta = {}
+    for key in set(before) | set(after):
+        old, new = before.get(key, {}), after.get(key, {})
+        changes = {}
+        for path in set(old) | set(new):
+            amount = new.get(path, 0) - old.get(path, 0)
+            if amount:
+                changes[path] = amount
+        if changes:
+            delta[key] = changes
+    return delta
+
+
+async def _apply(org_id: str, delta: Dict[str, Dict[str, float]]) -> None:
+    now = get_ist_isoformat()
+    daily_ops = []
+    for key, incs in delta.items():
+        if key == TOTALS:
+            # No `schema` here: a row created by a delta holds only the tickets
+            # written since, and stays behind the $facet fallback until a rebuild
+            await db.ticket_rollup_totals.update_one(
+                {"organization_id": org_id},
+                {"$inc": incs, "$set": {"updated_at": now}},
+                upsert=True
+            )
+        else:
+            daily_ops.append(UpdateOne(
+                {"organization_id": org_id, "date": key},
+                {"$inc": incs, "$set": {"updated_at": now}},
+                upsert=True
+            ))
+    if daily_ops:
+        await db.ticket_rollups_daily.bulk_write(daily_ops, ordered=False)
+
+
+# ── write path ──────────────────────────────────────────────────────────────
+
+async def sync_ticket_rollup(ticket_id: str) -> None:
+    """
+    Bring the rollups in line with the current state of one ticket.
+    Safe to call after any ticket write; a no-op when no tracked field changed.
+    """
+    try:
+        for _ in range(SYNC_RETRIES):
+            ticket = await db.tickets_v2.find_one({"id": ticket_id}, TRACKED_PROJECTION)
+            if ticket and ticket.get("is_assigned") != is_assigned(ticket):
+                await db.tickets_v2.update_one(
+                    {"id": ticket_id}, {"$set": {"is_assigned": is_assigned(ticket)}}
+                )
+            try:
+                await sync_ticket_timers(ticket_id, ticket)
+            except Exception as e:
+                logger.warning(f"SLA timer sync failed for {ticket_id}: {e}")
+            state = await db.ticket_rollup_state.find_one({"ticket_id": ticket_id}, {"_id": 0})
+            before = state.get("fields") if state else None
+            after = tracked(ticket)
+            if before == after:
+                return
+
+            # Claim the before → after transition so concurrent syncs of the
+            # same ticket never apply the same delta twice.
+            if state:
+                claimed = await db.ticket_rollup_state.update_one(
+                    {"ticket_id": ticket_id, "rev": state.get("rev", 0)},
+                    {"$set": {"fields": after, "rev": state.get("rev", 0) + 1}}
+                )
+                if claimed.modified_count == 0:
+                    continue
+            else:
+                try:
+                    await db.ticket_rollup_state.insert_one(
+                        {"ticket_id": ticket_id, "rev": 1, "fields": after}
+                    )
+                except DuplicateKeyError:
+                    continue
+
+            old, new = contributions(before), contributions(after)
+            old_org = (before or {}).get("organization_id")
+            new_org = (after or {}).get("organization_id")
+            if old_org == new_org:
+                if new_org:
+                    await _apply(new_org, _delta(old, new))
+            else:
+                if old_org:
+                    await _apply(old_org, _delta(old, {}))
+                if new_org:
+                    await _apply(new_org, _delta({}, new))
+            await count_change("tickets_v2", before, after)
+            for org_id in {old_org, new_org}:
+                await invalidate_analytics(org_id, "tickets")
+            await publish_ticket_transition(ticket_id, before, after)
+            return
+        logger.warning(f"Ticket rollup sync for {ticket_id} gave up after {SYNC_RETRIES} conflicting attempts")
+    except Exception as e:
+        logger.warning(f"Ticket rollup sync failed for {ticket_id}: {e}")
+
+
+async def record_first_response(ticket_id: str, responded_at: Optional[str] = None) -> bool:
+    """
+    Stamp first_response_at on a ticket's first staff reply (later replies keep
+    the first one) and sync, which drops its response SLA timer.
+    """
+    result = await db.tickets_v2.update_one(
+        {"id": ticket_id, "first_response_at": None},
+        {"$set": {"first_response_at": responded_at or get_ist_isoformat()}}
+    )
+    if not result.modified_count:
+        return False
+    await sync_ticket_rollup(ticket_id)
+    return True
+
+
+# Staff replies in the history: a signed-in user's public comment, or an email sent from the ticket
+STAFF_REPLY = {
+    "type": "comment", "is_internal": {"$ne": True},
+    "$or": [{"user_id": {"$nin": [None, ""]}}, {"source": "email_sent"}],
+}
+
+
+async def backfill_first_responses(org_id: Optional[str] = None) -> int:
+    """first_response_at of open tickets with a response deadline, from staff replies made before it was stamped"""
+    query: Dict[str, Any] = {"is_open": True, "response_due_at": {"$ne": None}, "first_response_at": None}
+    if org_id:
+        query["organization_id"] = org_id
+    stamped = 0
+    async for ticket in db.tickets_v2.find(query, {"_id": 0, "id": 1, "organization_id": 1}):
+        reply = await db.ticket_events.find_one(
+            {"organization_id": ticket.get("organization_id"), "ticket_id": ticket["id"], **STAFF_REPLY},
+            {"_id": 0, "created_at": 1}, sort=[("created_at", 1)]
+        )
+        if reply and reply.get("created_at"):
+            stamped += await record_first_response(ticket["id"], reply["created_at"])
+    return stamped
+
+
+# ── rebuild / backfill ──────────────────────────────────────────────────────
+
+def _nest(flat: Dict[str, float]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for path, amount in flat.items():
+        node = nested
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = amount
+    return nested
+
+
+async def rebuild_rollups(org_id: Optional[str] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Recompute rollups from tickets_v2 for one organization (or all of them).
+    Streams tickets with a cursor; memory is O(orgs × days), not O(tickets).
+    """
+    query: Dict[str, Any] = {"organization_id": org_id} if org_id else {"organization_id": {"$ne": None}}
+    acc: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(
+        lambda: defaultdict(lambda: defaultdict(int))
+    )
+    states: List[UpdateOne] = []
+    flags: List[UpdateOne] = []
+    tickets = 0
+
+    async for ticket in db.tickets_v2.find(query, TRACKED_PROJECTION).batch_size(batch_size):
+        tickets += 1
+        fields = tracked(ticket)
+        if ticket.get("is_assigned") != is_assigned(ticket):
+            flags.append(UpdateOne({"id": ticket["id"]}, {"$set": {"is_assigned": is_assigned(ticket)}}))
+        for key, paths in contributions(fields).items():
+            target = acc[ticket["organization_id"]][key]
+            for path, amount in paths.items():
+                target[path] += amount
+        states.append(UpdateOne(
+            {"ticket_id": ticket["id"]},
+            {"$set": {"fields": fields}, "$inc": {"rev": 1}},
+            upsert=True
+        ))
+        if len(states) >= batch_size:
+            await db.ticket_rollup_state.bulk_write(states, ordered=False)
+            states = []
+        if len(flags) >= batch_size:
+            await db.tickets_v2.bulk_write(flags, ordered=False)
+            flags = []
+    if states:
+        await db.ticket_rollup_state.bulk_write(states, ordered=False)
+    if flags:
+        await db.tickets_v2.bulk_write(flags, ordered=False)
+
+    org_ids = [org_id] if org_id else list(acc)
+    now = get_ist_isoformat()
+    days = 0
+    for oid in org_ids:
+        rows = acc.get(oid, {})
+        # Keyed upserts rather than delete-then-insert: a sync_ticket_rollup
+        # upsert landing in between can neither collide with the insert nor
+        # leave a partial row behind
+        dates = [key for key in rows if key != TOTALS]
+        daily_ops = [
+            ReplaceOne(
+                {"organization_id": oid, "date": key},
+                {"organization_id": oid, "date": key, **_nest(rows[key]), "updated_at": now},
+                upsert=True
+            )
+            for key in dates
+        ]
+        for start in range(0, len(daily_ops), batch_size):
+            await db.ticket_rollups_daily.bulk_write(daily_ops[start:start + batch_size], ordered=False)
+        await db.ticket_rollups_daily.delete_many({"organization_id": oid, "date": {"$nin": dates}})
+        days += len(dates)
+        await db.ticket_rollup_totals.replace_one(
+            {"organization_id": oid},
+            {"organization_id": oid, **_nest(rows.get(TOTALS, {})), "schema": ROLLUP_SCHEMA, "updated_at": now},
+            upsert=True
+        )
+
+    logger.info(f"Rebuilt ticket rollups: {len(org_ids)} orgs, {tickets} tickets, {days} daily rows")
+    return {"organizations": len(org_ids), "tickets": tickets, "daily_rows": days}
+
+
+# ── read path ───────────────────────────────────────────────────────────────
+
+def period_start(days: int) -> str:
+    """First IST calendar date (YYYY-MM-DD) covered by a `days`-long window"""
+    return (get_ist_now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+async def load_daily(
+    org_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None
+) -> List[dict]:
+    """Daily rows for [start_date, end_date), oldest first"""
+    query: Dict[str, Any] = {"organization_id": org_id}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lt"] = end_date
+    projection = {"_id": 0, "date": 1, **{f: 1 for f in fields}} if fields else {"_id": 0}
+    return await db.ticket_rollups_daily.find(query, projection).sort("date", 1).to_list(None)
+
+
+async def load_totals(org_id: str) -> dict:
+    return await db.ticket_rollup_totals.find_one({"organization_id": org_id}, {"_id": 0}) or {}
+
+
+def rollups_current(totals: Optional[dict]) -> bool:
+    """Whether an org's rollups were rebuilt with the current contributions (else they may be partial)"""
+    return bool(totals) and totals.get("schema") == ROLLUP_SCHEMA
+
+
+def daily_rows_from_groups(groups: Iterable[dict]) -> List[dict]:
+    """
+    ticket_rollups_daily-shaped SLA rows (created, flags, priority, priority_breached,
+    team) from per (date, priority, team) ticket counts, for orgs not yet rebuilt
+    """
+    rows: Dict[str, dict] = {}
+    for group in groups:
+        day = (group["_id"].get("date") or "")[:10]
+        if not day:
+            continue
+        row = rows.setdefault(day, {
+            "date": day, "created": 0, "sla_breached": 0, "is_overdue": 0, "is_escalated": 0,
+            "priority": defaultdict(int), "priority_breached": defaultdict(int),
+            "team": defaultdict(lambda: defaultdict(int)),
+        })
+        priority = _k(group["_id"].get("priority") or "medium")
+        team = _k(group["_id"].get("team") or "Unassigned")
+        for field in ("created", "sla_breached", "is_overdue", "is_escalated"):
+            row[field] += group.get(field, 0)
+        row["priority"][priority] += group.get("created", 0)
+        row["priority_breached"][priority] += group.get("sla_breached", 0)
+        row["team"][team]["total"] += group.get("created", 0)
+        row["team"][team]["breached"] += group.get("sla_breached", 0)
+    return [rows[day] for day in sorted(rows)]
+
+
+def total(rows: Iterable[dict], field: str) -> float:
+    return sum(row.get(field, 0) for row in rows)
+
+
+def merge_counts(rows: Iterable[dict], field: str) -> Dict[str, float]:
+    """
+    Sum a {name: count} map across rows, restoring the original names.
+    Counters that were decremented back to zero are dropped.
+    """
+    merged: Dict[str, float] = defaultdict(int)
+    for row in rows:
+        for key, amount in (row.get(field) or {}).items():
+            merged[_unk(key)] += amount
+    return {k: v for k, v in merged.items() if v}
+
+
+def merge_nested(rows: Iterable[dict], field: str) -> Dict[str, Dict[str, float]]:
+    """Sum a {name: {metric: count}} map across rows"""
+    merged: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        for key, metrics in (row.get(field) or {}).items():
+            for metric, amount in metrics.items():
+                merged[_unk(key)][metric] += amount
+    return {k: dict(v) for k, v in merged.items()}
+
+
+def unescape_keys(counts: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Restore the original names of a single {name: count} map, dropping zeros"""
+    return {_unk(k): v for k, v in (counts or {}).items() if v}
+
+
+def stats_pipeline(org_id: str) -> List[dict]:
+    """Ticketing header stats in one pass over tickets_v2 (fallback for un-rebuilt totals)"""
+    def by(field: str, open_only: bool = False) -> List[dict]:
+        stages = [{"$match": {"is_open": True}}] if open_only else []
+        return stages + [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+
+    return [
+        {"$match": {"organization_id": org_id, "is_deleted": {"$ne": True}}},
+        {"$facet": {
+            "counts": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "open": {"$sum": {"$cond": [{"$eq": ["$is_open", True]}, 1, 0]}},
+                "closed": {"$sum": {"$cond": [{"$eq": ["$is_open", True]}, 0, 1]}},
+                "unassigned": {"$sum": {"$cond": [
+                    {"$and": [{"$ifNull": ["$assigned_to_id", False]}, {"$ifNull": ["$assigned_to_name", False]}]}, 0, 1
+                ]}},
+            }}],
+            "by_priority": by("priority_name", open_only=True),
+            "by_topic": by("help_topic_name", open_only=True),
+            "by_stage": by("current_stage_name"),
+        }},
+    ]
+
+
+def stats_from_facet(facets: dict) -> Dict[str, Any]:
+    counts = (facets.get("counts") or [{}])[0]
+
+    def named(rows: List[dict]) -> Dict[str, int]:
+        return {_unk(_k(row["_id"])): row["count"] for row in rows or []}
+
+    return {
+        "total": counts.get("total", 0),
+        "open": counts.get("open", 0),
+        "closed": counts.get("closed", 0),
+        "unassigned": counts.get("unassigned", 0),
+        "by_priority": named(facets.get("by_priority")),
+        "by_topic": named(facets.get("by_topic")),
+        "by_stage": named(facets.get("by_stage")),
+    }
+
+
+def stats_from_totals(totals: dict) -> Dict[str, Any]:
+    return {
+        "total": totals.get("total", 0),
+        "open": totals.get("open", 0),
+        "closed": totals.get("closed", 0),
+        "unassigned": totals.get("unassigned", 0),
+        "by_priority": unescape_keys(totals.get("open_by_priority")),
+        "by_topic": unescape_keys(totals.get("open_by_topic")),
+        "by_stage": unescape_keys(totals.get("by_stage")),
+    }
+
+
+async def ticketing_stats(org_id: str) -> Dict[str, Any]:
+    """Header stats from the live totals row; one $facet aggregation if it predates ROLLUP_SCHEMA"""
+    totals = await load_totals(org_id)
+    if rollups_current(totals):
+        return stats_from_totals(totals)
+    result = await db.tickets_v2.aggregate(stats_pipeline(org_id)).to_list(1)
+    return stats_from_facet(result[0] if result else {})
+
+
+def histogram_percentile(hist: Optional[Dict[str, float]], q: float) -> float:
+    """
+    Approximate the q-quantile (0..1) of a bucketed histogram, interpolating
+    linearly inside the bucket. The overflow bucket reports its lower bound.
+    """
+    hist = hist or {}
+    count = sum(hist.values())
+    if not count:
+        return 0.0
+    target = q * count
+    seen = 0.0
+    lower = 0.0
+    for bound in HOUR_BUCKETS:
+        n = hist.get(str(bound), 0)
+        if n and seen + n >= target:
+            return lower + (bound - lower) * (target - seen) / n
+        seen += n
+        lower = float(bound)
+    return lower
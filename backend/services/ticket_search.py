@@ -0,0 +1,68 @@
+"""
+Ticket Search Terms
+===================
+`GET /ticketing/tickets?search=` matches a multikey index instead of an
+unanchored, case-insensitive $regex over ticket_number and subject (which
+scans every ticket of the org).
+
+Each tickets_v2 document carries `search_terms`:
+- every prefix of every subject word (edge n-grams, as in the universal
+  search index - services/search_index.py)
+- every prefix, suffix and infix (MIN_INFIX+) of the ticket number, so
+  "0042", "42" and "T2610" all find "T2610-0042"
+
+A search is tokenized the same way and matches tickets holding all of its
+words: {"organization_id": org, "search_terms": {"$all": words}}, served by
+the (organization_id, search_terms) index.
+
+`search_terms` is set when a ticket is inserted (insert_numbered_ticket) and
+whenever its subject changes. Tickets created before it existed get it from
+`backfill_search_terms`, run once at startup (services/backfills.py) or by
+hand with scripts/backfill_ticket_search_terms.py.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database import db
+from services.search_index import tokenize, prefixes, infixes, MAX_GRAM, MAX_QUERY_WORDS
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBJECT_WORDS = 30
+BACKFILL_BATCH_SIZE = 1000
+
+
+def ticket_search_terms(ticket: Dict[str, Any]) -> List[str]:
+    terms = set()
+    for word in tokenize(ticket.get("subject"))[:MAX_SUBJECT_WORDS]:
+        terms.update(prefixes(word))
+    number = "".join(tokenize(ticket.get("ticket_number")))[:MAX_GRAM]
+    if number:
+        terms.update(prefixes(number))
+        terms.update(number[i:] for i in range(len(number)))
+        terms.update(infixes(number))
+    return sorted(terms)
+
+
+def search_words(q: Optional[str]) -> List[str]:
+    """Query words truncated to what is indexed; a ticket must hold all of them"""
+    return [w[:MAX_GRAM] for w in tokenize(q)][:MAX_QUERY_WORDS]
+
+
+async def backfill_search_terms(org_id: Optional[str] = None) -> int:
+    """Set search_terms on tickets that lack them; returns the number updated"""
+    query: Dict[str, Any] = {"search_terms": {"$exists": False}}
+    if org_id:
+        query["organization_id"] = org_id
+    updated = 0
+    batch = []
+    async for ticket in db.tickets_v2.find(query, {"_id": 0, "id": 1, "subject": 1, "ticket_number": 1}):
+        batch.append(UpdateOne({"id": ticket["id"]}, {"$set": {"search_terms": ticket_search_terms(ticket)}}))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            updated += (await db.tickets_v2.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.tickets_v2.bulk_write(batch, ordered=False)).modified_count
+    return updated
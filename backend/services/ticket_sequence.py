@@ -0,0 +1,186 @@
+"""
+Ticket Number Sequences
+=======================
+Per-organization counters for tickets_v2 ticket numbers. A number is one
+`find_one_and_update` with `$inc` on the org's sequence document, so
+concurrent creators can never draw the same value and there is no
+generate-and-check loop.
+
+Collection `ticket_sequences`:
+- key              "<organization_id>:tickets_v2" (unique)
+- organization_id
+- value            last number handed out
+- format           optional per-org format (see `format_ticket_number`)
+
+Bulk creators (the email inbox worker) reserve a block of numbers with a
+single `$inc` through `TicketNumberBlock`; numbers a block did not use are
+handed back when nobody has allocated after it, so normal traffic leaves no
+gaps.
+
+The unique index on tickets_v2 (organization_id, ticket_number) is the final
+guarantee: `insert_numbered_ticket` draws the next number if a sequence
+value collides with a ticket numbered by the old random generator.
+
+Configuration (env):
+    TICKET_NUMBER_FORMAT   default format, e.g. "{seq:06d}" (default) or
+                           "T{yy}{month}-{seq:04d}"
+"""
+import logging
+import os
+import re
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from services.ticket_search import ticket_search_terms
+from utils.helpers import get_ist_now
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_NAME = "tickets_v2"
+DEFAULT_FORMAT = os.environ.get("TICKET_NUMBER_FORMAT", "{seq:06d}")
+INSERT_ATTEMPTS = 5
+
+# Email threading matches "[Ticket #<number>]", so numbers stay within A-Z, 0-9 and "-"
+_NUMBER_RE = re.compile(r"^[A-Z0-9][A-Z0-9-]{2,31}$")
+
+
+def _key(org_id: str) -> str:
+    return f"{org_id}:{SEQUENCE_NAME}"
+
+
+def format_ticket_number(seq: int, fmt: Optional[str] = None, now=None) -> str:
+    """
+    Render a sequence value. Placeholders: {seq} (accepts format specs such as
+    {seq:06d}), {year}, {yy} and {month}.
+    """
+    now = now or get_ist_now()
+    return (fmt or DEFAULT_FORMAT).format(
+        seq=seq, year=now.year, yy=f"{now.year % 100:02d}", month=f"{now.month:02d}"
+    ).upper()
+
+
+def validate_format(fmt: str) -> str:
+    """Return `fmt` if it renders usable ticket numbers, else raise ValueError"""
+    if "{seq" not in fmt:
+        raise ValueError("Format must contain {seq}")
+    try:
+        sample = format_ticket_number(1, fmt)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Invalid format: {e}")
+    if not _NUMBER_RE.match(sample):
+        raise ValueError("Ticket numbers may only contain letters, digits and '-' (3-32 characters)")
+    return fmt
+
+
+async def _reserve(org_id: str, count: int) -> Tuple[int, Optional[str]]:
+    """Advance the org's sequence by `count`; returns (last value reserved, org format)"""
+    if not org_id:
+        raise ValueError("organization_id is required for ticket numbers")
+    for _ in range(2):
+        try:
+            doc = await db.ticket_sequences.find_one_and_update(
+                {"key": _key(org_id)},
+                {"$inc": {"value": count}, "$setOnInsert": {"organization_id": org_id}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return doc["value"], doc.get("format")
+        except DuplicateKeyError:
+            # Two first-ever allocations upserted at once; the loser retries as an update
+            continue
+    raise RuntimeError(f"Could not allocate a ticket number for org {org_id}")
+
+
+async def reserve_ticket_numbers(org_id: str, count: int = 1) -> List[str]:
+    """`count` consecutive ticket numbers for one org, with one round trip"""
+    last, fmt = await _reserve(org_id, count)
+    return [format_ticket_number(seq, fmt) for seq in range(last - count + 1, last + 1)]
+
+
+async def allocate_ticket_number(org_id: str) -> str:
+    return (await reserve_ticket_numbers(org_id, 1))[0]
+
+
+async def get_number_format(org_id: str) -> str:
+    doc = await db.ticket_sequences.find_one({"key": _key(org_id)}, {"_id": 0, "format": 1})
+    return (doc or {}).get("format") or DEFAULT_FORMAT
+
+
+async def set_number_format(org_id: str, fmt: Optional[str]) -> str:
+    """Set (or with None, reset to the default) the org's ticket number format"""
+    update = {"$set": {"format": validate_format(fmt)}} if fmt else {"$unset": {"format": ""}}
+    await db.ticket_sequences.update_one(
+        {"key": _key(org_id)},
+        {**update, "$setOnInsert": {"organization_id": org_id, "value": 0}},
+        upsert=True,
+    )
+    return fmt or DEFAULT_FORMAT
+
+
+class TicketNumberBlock:
+    """
+    Hands out ticket numbers for one org, reserving up to `size` at a time.
+    Call `release()` when done so unused numbers go back to the sequence.
+    """
+
+    def __init__(self, org_id: str, size: int):
+        self.org_id = org_id
+        self.size = max(1, size)
+        self._next = 0
+        self._last = 0
+        self._format: Optional[str] = None
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self._last - self._next + 1) if self._next else 0
+
+    async def next(self) -> str:
+        if not self.remaining:
+            self._last, self._format = await _reserve(self.org_id, self.size)
+            self._next = self._last - self.size + 1
+        seq = self._next
+        self._next += 1
+        return format_ticket_number(seq, self._format)
+
+    async def release(self) -> None:
+        """Give the unused tail back, unless another allocation has happened since"""
+        unused = self.remaining
+        if not unused:
+            return
+        try:
+            await db.ticket_sequences.update_one(
+                {"key": _key(self.org_id), "value": self._last},
+                {"$inc": {"value": -unused}},
+            )
+        except Exception as e:
+            logger.warning(f"Could not release {unused} ticket numbers for org {self.org_id}: {e}")
+        self._next = self._last = 0
+
+
+async def insert_numbered_ticket(
+    ticket: dict, next_number: Optional[Callable[[], Awaitable[str]]] = None
+) -> dict:
+    """
+    Insert a tickets_v2 document (with its search_terms). If its ticket_number
+    is already taken (a ticket from the old random generator), draw the next
+    one and retry.
+    """
+    next_number = next_number or (lambda: allocate_ticket_number(ticket["organization_id"]))
+    if not ticket.get("ticket_number"):
+        ticket["ticket_number"] = await next_number()
+    for _ in range(INSERT_ATTEMPTS - 1):
+        ticket["search_terms"] = ticket_search_terms(ticket)
+        try:
+            await db.tickets_v2.insert_one(ticket)
+            return ticket
+        except DuplicateKeyError as e:
+            if "ticket_number" not in str(e):
+                raise
+            ticket.pop("_id", None)
+            ticket["ticket_number"] = await next_number()
+    ticket["search_terms"] = ticket_search_terms(ticket)
+    await db.tickets_v2.insert_one(ticket)
+    return ticket
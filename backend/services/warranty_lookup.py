@@ -0,0 +1,269 @@
+"""
+Warranty Lookup
+===============
+Public warranty search (QR scans, public site) by serial number or asset tag.
+
+Devices and parts carry normalized `serial_key` / `asset_tag_key` fields
+(utils.helpers.with_lookup_keys, maintained on every write) so a lookup is an
+indexed equality match instead of an anchored case-insensitive regex scan.
+The company, assigned user, AMC, parts and service-count follow-ups are
+joined in the same aggregation, so a search is one round trip per collection
+probed (parts first, then devices).
+
+Existing records are backfilled by `backfill_lookup_keys`, which runs once
+at startup (services/backfills.py) and is also exposed as
+scripts/backfill_lookup_keys.py (it also fills the canonical
+`device_category` used by the device list searches).
+"""
+import logging
+from typing import Optional, Dict, Any
+
+from pymongo import UpdateOne
+
+from database import db
+from utils.helpers import (
+    is_warranty_active, normalize_lookup_key, lookup_key_fields, device_key_query, LOOKUP_KEY_FIELDS
+)
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _join(collection: str, local: str, foreign: str, as_field: str, match: Dict = None,
+          project: Dict = None, limit: Optional[int] = None, pipeline: list = None) -> Dict:
+    """$lookup stage joining `collection.foreign == local` with extra filters"""
+    stages = [{"$match": {"$expr": {"$eq": [f"${foreign}", "$$key"]}, **(match or {})}}]
+    if limit:
+        stages.append({"$limit": limit})
+    stages.extend(pipeline or [])
+    stages.append({"$project": {"_id": 0, **(project or {})}})
+    return {"$lookup": {"from": collection, "let": {"key": f"${local}"}, "pipeline": stages, "as": as_field}}
+
+
+NOT_DELETED = {"is_deleted": {"$ne": True}}
+
+
+def part_pipeline(key: str) -> list:
+    """Part by serial number, with its parent device and that device's company name"""
+    return [
+        {"$match": {"serial_key": key, **NOT_DELETED}},
+        {"$limit": 1},
+        _join("devices", "device_id", "id", "device", NOT_DELETED, limit=1, pipeline=[
+            _join("companies", "company_id", "id", "company", NOT_DELETED, {"name": 1}, limit=1)
+        ]),
+        {"$project": {"_id": 0}},
+    ]
+
+
+def device_pipeline(key: str) -> list:
+    """Device by serial number / asset tag, with everything the public page shows"""
+    return [
+        {"$match": device_key_query(key)},
+        {"$limit": 1},
+        _join("companies", "company_id", "id", "company", NOT_DELETED, {"name": 1}, limit=1),
+        _join("users", "assigned_user_id", "id", "assigned_user", NOT_DELETED, {"name": 1}, limit=1),
+        _join("amc_device_assignments", "id", "device_id", "amc_assignment", {"status": "active"}, limit=1,
+              pipeline=[_join("amc_contracts", "amc_contract_id", "id", "contract", NOT_DELETED, limit=1)]),
+        _join("amc", "id", "device_id", "legacy_amc", NOT_DELETED, limit=1),
+        _join("parts", "id", "device_id", "parts", NOT_DELETED, {
+            "part_name": 1, "replaced_date": 1, "warranty_months": 1, "warranty_expiry_date": 1
+        }),
+        {"$lookup": {"from": "service_history", "let": {"key": "$id"}, "as": "service_count", "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$device_id", "$$key"]}}},
+            {"$count": "n"},
+        ]}},
+        {"$project": {"_id": 0}},
+    ]
+
+
+def _first(doc: Dict, field: str) -> Optional[Dict]:
+    rows = doc.pop(field, None) or []
+    return rows[0] if rows else None
+
+
+async def find_part(q: str) -> Optional[Dict[str, Any]]:
+    key = normalize_lookup_key(q)
+    if key is None:
+        return None  # a blank key would match every part without a serial
+    docs = await db.parts.aggregate(part_pipeline(key)).to_list(1)
+    return docs[0] if docs else None
+
+
+async def find_device(q: str) -> Optional[Dict[str, Any]]:
+    key = normalize_lookup_key(q)
+    if key is None:
+        return None
+    docs = await db.devices.aggregate(device_pipeline(key)).to_list(1)
+    return docs[0] if docs else None
+
+
+def part_result(part: Dict[str, Any]) -> Dict[str, Any]:
+    device = _first(part, "device")
+    company = _first(device, "company") if device else None
+    return {
+        "search_type": "part",
+        "part": {
+            "id": part.get("id"),
+            "part_type": part.get("part_type"),
+            "part_name": part.get("part_name"),
+            "brand": part.get("brand"),
+            "model_number": part.get("model_number"),
+            "serial_number": part.get("serial_number"),
+            "capacity": part.get("capacity"),
+            "purchase_date": part.get("purchase_date"),
+            "replaced_date": part.get("replaced_date"),
+            "warranty_months": part.get("warranty_months"),
+            "warranty_expiry_date": part.get("warranty_expiry_date"),
+            "warranty_active": is_warranty_active(part.get("warranty_expiry_date", "")),
+            "vendor": part.get("vendor")
+        },
+        "parent_device": {
+            "id": device.get("id"),
+            "device_type": device.get("device_type"),
+            "brand": device.get("brand"),
+            "model": device.get("model"),
+            "serial_number": device.get("serial_number")
+        } if device else None,
+        "company_name": company.get("name") if company else "Unknown",
+        "coverage_source": "part_warranty",
+        "effective_coverage_end": part.get("warranty_expiry_date")
+    }
+
+
+def device_result(device: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    AMC OVERRIDE RULE:
+    IF device has ACTIVE AMC → show AMC coverage (ignore device warranty expiry)
+    ELSE → show device warranty
+    """
+    company = _first(device, "company")
+    user = _first(device, "assigned_user")
+    assignment = _first(device, "amc_assignment")
+    legacy_amc = _first(device, "legacy_amc")
+    counted = _first(device, "service_count")
+    parts = device.pop("parts", [])
+
+    if device.get("status") in ["retired", "scrapped"]:
+        return {
+            "device": {
+                "id": device.get("id"),
+                "device_type": device.get("device_type"),
+                "brand": device.get("brand"),
+                "model": device.get("model"),
+                "serial_number": device.get("serial_number"),
+                "asset_tag": device.get("asset_tag"),
+                "status": device.get("status"),
+                "message": "This asset is no longer active"
+            },
+            "company_name": None,
+            "assigned_user": None,
+            "parts": [],
+            "amc": None,
+            "amc_contract": None,
+            "coverage_source": None,
+            "service_count": 0
+        }
+
+    device_warranty_expiry = device.get("warranty_end_date")
+    device_warranty_active = is_warranty_active(device_warranty_expiry) if device_warranty_expiry else False
+
+    amc_contract_info = None
+    amc_coverage_active = False
+    coverage_source = "device_warranty"
+    effective_coverage_end = device_warranty_expiry
+
+    if assignment:
+        amc_coverage_active = is_warranty_active(assignment.get("coverage_end", ""))
+        amc_contract = _first(assignment, "contract")
+        if amc_coverage_active and amc_contract:
+            coverage_source = "amc_contract"
+            effective_coverage_end = assignment.get("coverage_end")
+            amc_contract_info = {
+                "contract_id": amc_contract["id"],
+                "name": amc_contract.get("name"),
+                "amc_type": amc_contract.get("amc_type"),
+                "coverage_start": assignment.get("coverage_start"),
+                "coverage_end": assignment.get("coverage_end"),
+                "active": True,
+                "coverage_includes": amc_contract.get("coverage_includes"),
+                "entitlements": amc_contract.get("entitlements")
+            }
+
+    # Legacy AMC collection, kept for backward compatibility
+    legacy_amc_info = None
+    if legacy_amc:
+        legacy_amc_active = is_warranty_active(legacy_amc.get("end_date", ""))
+        legacy_amc_info = {
+            "start_date": legacy_amc.get("start_date"),
+            "end_date": legacy_amc.get("end_date"),
+            "active": legacy_amc_active
+        }
+        if not amc_coverage_active and legacy_amc_active:
+            coverage_source = "legacy_amc"
+            effective_coverage_end = legacy_amc.get("end_date")
+
+    for part in parts:
+        part["warranty_active"] = is_warranty_active(part.get("warranty_expiry_date", ""))
+
+    return {
+        "search_type": "device",
+        "device": {
+            "id": device.get("id"),
+            "device_type": device.get("device_type"),
+            "brand": device.get("brand"),
+            "model": device.get("model"),
+            "serial_number": device.get("serial_number"),
+            "asset_tag": device.get("asset_tag"),
+            "purchase_date": device.get("purchase_date"),
+            "warranty_end_date": device_warranty_expiry,
+            # AMC overrides even if the device warranty expired
+            "warranty_active": amc_coverage_active or device_warranty_active,
+            "device_warranty_active": device_warranty_active,
+            "condition": device.get("condition"),
+            "status": device.get("status")
+        },
+        "company_name": company.get("name") if company else "Unknown",
+        "assigned_user": user.get("name") if user else None,
+        "parts": parts,
+        "amc": legacy_amc_info,
+        "amc_contract": amc_contract_info,
+        "coverage_source": coverage_source,  # "amc_contract", "legacy_amc", or "device_warranty"
+        "effective_coverage_end": effective_coverage_end,
+        "service_count": counted.get("n", 0) if counted else 0
+    }
+
+
+async def search_warranty(q: str) -> Optional[Dict[str, Any]]:
+    """Part by serial number first, then device by serial number / asset tag; None if neither"""
+    part = await find_part(q)
+    if part:
+        return part_result(part)
+    device = await find_device(q)
+    if device:
+        return device_result(device)
+    return None
+
+
+async def backfill_lookup_keys(batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    """Add serial_key / asset_tag_key / device_category to devices and parts written before they existed"""
+    derived = {**LOOKUP_KEY_FIELDS, "device_type": "device_category"}
+    stats = {}
+    for name, fields in (("devices", ["serial_number", "asset_tag", "device_type"]), ("parts", ["serial_number"])):
+        collection = db[name]
+        missing = {"$or": [
+            {field: {"$exists": True}, derived[field]: {"$exists": False}} for field in fields
+        ]}
+        projection = {field: 1 for field in fields}
+        updated = 0
+        ops = []
+        async for doc in collection.find(missing, projection):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": lookup_key_fields(doc)}))
+            if len(ops) >= batch_size:
+                updated += (await collection.bulk_write(ops, ordered=False)).modified_count
+                ops = []
+        if ops:
+            updated += (await collection.bulk_write(ops, ordered=False)).modified_count
+        stats[name] = updated
+        logger.info(f"Lookup keys backfilled for {updated} {name}")
+    return stats
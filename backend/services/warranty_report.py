@@ -0,0 +1,122 @@
+"""
+Warranty Report
+===============
+Public warranty report PDF (`GET /warranty/pdf/{serial_number}`), rendered
+off the event loop and cached by content.
+
+- The device, parts, active AMC contract and portal settings are read and
+  reduced to the rows the report prints (utils.warranty_pdf.report_model)
+- The SHA-256 of that model (plus REPORT_VERSION and the date the statuses
+  are valid for) is both the cache key and the ETag, so a change to any of
+  those inputs - or a new day - yields a new key; stale entries simply
+  expire from `warranty_report_cache` after REPORT_CACHE_DAYS
+- A client revalidating with a matching If-None-Match gets a 304 without
+  the cache being read; a miss renders in the render pool
+  (services/render_pool.py), and concurrent misses for the same key share
+  one render
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from bson import Binary
+
+from database import db
+from services.render_pool import get_render_pool
+from utils.helpers import get_ist_now, is_warranty_active, device_key_query
+from utils.warranty_pdf import report_model, render_warranty_pdf
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1  # bump when the layout changes
+REPORT_CACHE_DAYS = 7
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def report_key(model: Dict[str, Any]) -> str:
+    payload = json.dumps({"version": REPORT_VERSION, "model": model}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def _amc_contract_info(device_id: str) -> Optional[Dict[str, Any]]:
+    # Active AMC from the amc_device_assignments JOIN (not the old amc collection)
+    assignment = await db.amc_device_assignments.find_one(
+        {"device_id": device_id, "status": "active"}, {"_id": 0}
+    )
+    if not assignment or not is_warranty_active(assignment.get("coverage_end", "")):
+        return None
+    amc_contract = await db.amc_contracts.find_one(
+        {"id": assignment["amc_contract_id"], "is_deleted": {"$ne": True}}, {"_id": 0}
+    )
+    if not amc_contract:
+        return None
+    return {
+        "name": amc_contract.get("name"),
+        "amc_type": amc_contract.get("amc_type"),
+        "coverage_start": assignment.get("coverage_start"),
+        "coverage_end": assignment.get("coverage_end"),
+        "coverage_includes": amc_contract.get("coverage_includes"),
+        "entitlements": amc_contract.get("entitlements")
+    }
+
+
+async def load_report(identifier: str) -> Optional[Dict[str, Any]]:
+    """Report inputs for a device by serial number / asset tag, with their ETag; None if not found"""
+    device = await db.devices.find_one(device_key_query(identifier), {"_id": 0})
+    if not device:
+        return None
+
+    company, parts, amc_contract_info, settings = await asyncio.gather(
+        db.companies.find_one({"id": device.get("company_id")}, {"_id": 0, "name": 1}),
+        db.parts.find({"device_id": device["id"], "is_deleted": {"$ne": True}}, {"_id": 0}).to_list(None),
+        _amc_contract_info(device["id"]),
+        db.settings.find_one({"id": "settings"}, {"_id": 0, "company_name": 1}),
+    )
+    company_name = company.get("name") if company else "Unknown"
+    portal_name = settings.get("company_name", "Warranty Portal") if settings else "Warranty Portal"
+
+    model = report_model(device, company_name, parts, amc_contract_info, portal_name,
+                         as_of=get_ist_now().strftime('%Y-%m-%d'))
+    key = report_key(model)
+    return {"device": device, "model": model, "key": key, "etag": f'"{key}"'}
+
+
+async def _render_and_store(key: str, model: Dict[str, Any]) -> bytes:
+    generated_at = get_ist_now().strftime('%d %B %Y, %H:%M')
+    pdf = await get_render_pool().run(render_warranty_pdf, model, generated_at)
+    try:
+        await db.warranty_report_cache.update_one({"key": key}, {"$set": {
+            "key": key,
+            "pdf": Binary(pdf),
+            "generated_at": generated_at,
+            "expires_at": datetime.now(timezone.utc) + timedelta(days=REPORT_CACHE_DAYS),
+        }}, upsert=True)
+    except Exception as e:
+        logger.warning(f"Warranty report cache write failed: {e}")
+    return pdf
+
+
+async def report_pdf(report: Dict[str, Any]) -> bytes:
+    """The rendered PDF for a loaded report: cached copy, or a (shared) render"""
+    key = report["key"]
+    cached = await db.warranty_report_cache.find_one({"key": key}, {"_id": 0, "pdf": 1})
+    if cached:
+        return bytes(cached["pdf"])
+
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_render_and_store(key, report["model"]))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(future)
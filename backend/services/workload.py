@@ -0,0 +1,243 @@
+"""
+Engineer Workload
+=================
+Per-engineer workload metrics and the assignment score built on them, shared
+by reassignment suggestions, the workforce board, the acceptance SLA stats
+(routes/job_acceptance.py) and help-topic auto-assignment
+(routes/ticketing_v2.create_ticket).
+
+`engineer_workloads` computes, for any number of engineers, in one grouped
+aggregation (tickets_v2 with ticket_schedules and assignment_sla_logs joined
+in through $unionWith):
+
+- open_tickets        open tickets assigned to the engineer
+- pending_acceptance  of those, still awaiting accept/decline
+- overdue_pending     pending for longer than AUTO_ESCALATION_HOURS
+- declined            tickets left in "declined" assignment status
+- visits_today        non-cancelled ticket_schedules today
+- accepted / sla_declined / sla_total, acceptance_rate, avg_response_minutes,
+  decline_reasons     from acceptance SLA logs of the last SLA_WINDOW_DAYS
+- recent_declines     declines of the last DECLINE_WINDOW_DAYS
+
+`score_engineer` turns a workload into an assignment score (lower is better);
+`rank_engineers` loads and scores a set of engineers for a ticket.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from database import db
+from utils.helpers import get_ist_now
+
+AUTO_ESCALATION_HOURS = 4  # hours a pending assignment may wait before it escalates
+SLA_WINDOW_DAYS = 90
+DECLINE_WINDOW_DAYS = 30
+
+# Assignment score weights (lower score = better candidate)
+BASE_SCORE = 50
+OPEN_TICKET_WEIGHT = 10
+RECENT_DECLINE_WEIGHT = 15
+DAY_OFF_PENALTY = 100
+HOLIDAY_PENALTY = 200
+SPECIALIZATION_BONUS = 20
+AVAILABLE_BELOW = 150
+
+# Help topic assignment methods served by pick_engineer
+AUTO_ASSIGN_METHODS = ("load_balanced", "skill_based")
+
+ENGINEER_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "email": 1, "specialization": 1, "skills": 1,
+    "working_hours": 1, "holidays": 1, "is_active": 1, "salary": 1,
+}
+
+EMPTY_WORKLOAD = {
+    "open_tickets": 0, "pending_acceptance": 0, "overdue_pending": 0, "declined": 0,
+    "visits_today": 0, "sla_total": 0, "accepted": 0, "sla_declined": 0, "recent_declines": 0,
+    "acceptance_rate": None, "avg_response_minutes": None, "decline_reasons": {},
+}
+
+
+def _timestamp(field: str) -> Dict[str, Any]:
+    return {"$dateFromString": {"dateString": field, "onError": None, "onNull": None}}
+
+
+def _count(*conditions: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$sum": {"$cond": [{"$and": list(conditions)}, 1, 0]}}
+
+
+def workload_pipeline(org_id: str, engineer_ids: List[str], now: datetime) -> List[Dict[str, Any]]:
+    """Aggregation over tickets_v2 that yields one row per engineer (_id = engineer id)"""
+    ids = {"$in": list(engineer_ids)}
+    today = now.strftime("%Y-%m-%d")
+    overdue_cutoff = (now - timedelta(hours=AUTO_ESCALATION_HOURS)).isoformat()
+    sla_since = (now - timedelta(days=SLA_WINDOW_DAYS)).isoformat()
+    decline_since = (now - timedelta(days=DECLINE_WINDOW_DAYS)).isoformat()
+
+    ticket = {"$eq": ["$source", "ticket"]}
+    is_open = {"$eq": ["$is_open", True]}
+    pending = {"$eq": ["$assignment_status", "pending"]}
+    sla = {"$eq": ["$source", "sla"]}
+    sla_declined = {"$eq": ["$response", "declined"]}
+    return [
+        {"$match": {
+            "organization_id": org_id, "assigned_to_id": ids, "is_deleted": {"$ne": True},
+            "$or": [{"is_open": True}, {"assignment_status": "declined"}],
+        }},
+        {"$project": {
+            "_id": 0, "engineer_id": "$assigned_to_id", "source": "ticket",
+            "is_open": 1, "assignment_status": 1, "assigned_at": 1,
+        }},
+        {"$unionWith": {"coll": "ticket_schedules", "pipeline": [
+            {"$match": {
+                "organization_id": org_id, "engineer_id": ids,
+                "scheduled_at": {"$gte": f"{today}T00:00:00", "$lte": f"{today}T23:59:59"},
+                "status": {"$ne": "cancelled"},
+            }},
+            {"$project": {"_id": 0, "engineer_id": 1, "source": "visit"}},
+        ]}},
+        {"$unionWith": {"coll": "assignment_sla_logs", "pipeline": [
+            {"$match": {"organization_id": org_id, "engineer_id": ids, "created_at": {"$gte": sla_since}}},
+            {"$project": {
+                "_id": 0, "engineer_id": 1, "source": "sla", "response": 1, "reason_id": 1, "created_at": 1,
+                "response_ms": {"$subtract": [_timestamp("$responded_at"), _timestamp("$assigned_at")]},
+            }},
+        ]}},
+        {"$group": {
+            "_id": "$engineer_id",
+            "open_tickets": _count(ticket, is_open),
+            "pending_acceptance": _count(ticket, is_open, pending),
+            "overdue_pending": _count(
+                ticket, is_open, pending,
+                {"$eq": [{"$type": "$assigned_at"}, "string"]}, {"$lte": ["$assigned_at", overdue_cutoff]},
+            ),
+            "declined": _count(ticket, {"$eq": ["$assignment_status", "declined"]}),
+            "visits_today": _count({"$eq": ["$source", "visit"]}),
+            "sla_total": _count(sla),
+            "accepted": _count(sla, {"$eq": ["$response", "accepted"]}),
+            "sla_declined": _count(sla, sla_declined),
+            "recent_declines": _count(sla, sla_declined, {"$gte": ["$created_at", decline_since]}),
+            "avg_response_ms": {"$avg": "$response_ms"},
+            "decline_reasons": {"$push": {"$cond": [{"$and": [sla, sla_declined]}, "$reason_id", None]}},
+        }},
+    ]
+
+
+def workload_from_row(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Metrics of one engineer from its pipeline row (zeros when it had none)"""
+    if not row:
+        return {**EMPTY_WORKLOAD, "decline_reasons": {}}
+    workload = {key: row.get(key, default) for key, default in EMPTY_WORKLOAD.items()}
+    total = workload["sla_total"]
+    workload["acceptance_rate"] = round(workload["accepted"] / total * 100, 1) if total else None
+    avg_ms = row.get("avg_response_ms")
+    workload["avg_response_minutes"] = round(avg_ms / 60000, 1) if avg_ms else None
+    workload["decline_reasons"] = dict(Counter(r for r in row.get("decline_reasons") or [] if r))
+    return workload
+
+
+async def engineer_workloads(org_id: str, engineer_ids: Iterable[str],
+                             now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """{engineer id: workload} for every id given, with one aggregation"""
+    engineer_ids = list(engineer_ids)
+    if not engineer_ids:
+        return {}
+    rows = await db.tickets_v2.aggregate(
+        workload_pipeline(org_id, engineer_ids, now or get_ist_now())
+    ).to_list(None)
+    by_id = {row["_id"]: row for row in rows}
+    return {engineer_id: workload_from_row(by_id.get(engineer_id)) for engineer_id in engineer_ids}
+
+
+# ── scoring ─────────────────────────────────────────────────────────────────
+
+def score_engineer(engineer: dict, workload: Dict[str, Any], ticket: Optional[dict] = None) -> int:
+    """Assignment score of an engineer for a ticket: lower is better"""
+    ticket = ticket or {}
+    score = BASE_SCORE
+    score += workload["open_tickets"] * OPEN_TICKET_WEIGHT
+    score += workload["recent_declines"] * RECENT_DECLINE_WEIGHT
+
+    sched_date = (ticket.get("scheduled_at") or "")[:10]
+    if sched_date:
+        try:
+            day_name = datetime.strptime(sched_date, "%Y-%m-%d").strftime("%A").lower()
+            if not (engineer.get("working_hours") or {}).get(day_name, {}).get("is_working", True):
+                score += DAY_OFF_PENALTY
+            if sched_date in (engineer.get("holidays") or []):
+                score += HOLIDAY_PENALTY
+        except ValueError:
+            pass
+
+    specialization = (engineer.get("specialization") or "").lower()
+    if specialization and specialization in (ticket.get("help_topic_name") or "").lower():
+        score -= SPECIALIZATION_BONUS
+    return score
+
+
+def matches_topic(engineer: dict, topic_name: Optional[str]) -> bool:
+    """Whether an engineer's specialization or a skill appears in a help topic name"""
+    topic = (topic_name or "").lower()
+    if not topic:
+        return False
+    candidates = [engineer.get("specialization")] + list(engineer.get("skills") or [])
+    return any(c and c.lower() in topic for c in candidates)
+
+
+async def active_engineers(org_id: str, engineer_ids: Optional[Iterable[str]] = None,
+                           exclude: Iterable[str] = ()) -> List[dict]:
+    query: Dict[str, Any] = {"organization_id": org_id, "is_active": {"$ne": False}, "is_deleted": {"$ne": True}}
+    id_filter: Dict[str, Any] = {}
+    if engineer_ids is not None:
+        id_filter["$in"] = list(engineer_ids)
+    exclude = [e for e in exclude if e]
+    if exclude:
+        id_filter["$nin"] = exclude
+    if id_filter:
+        query["id"] = id_filter
+    return await db.engineers.find(query, ENGINEER_PROJECTION).to_list(None)
+
+
+async def rank_engineers(org_id: str, ticket: Optional[dict] = None, engineers: Optional[List[dict]] = None,
+                         exclude: Iterable[str] = (), now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Candidates for a ticket, best first: each engineer with its workload,
+    `score` and `available_on_date`. Defaults to all active engineers of the org.
+    """
+    if engineers is None:
+        engineers = await active_engineers(org_id, exclude=exclude)
+    workloads = await engineer_workloads(org_id, [e["id"] for e in engineers], now)
+    ranked = []
+    for engineer in engineers:
+        workload = workloads[engineer["id"]]
+        score = score_engineer(engineer, workload, ticket)
+        ranked.append({
+            "engineer_id": engineer["id"],
+            "name": engineer.get("name"),
+            "specialization": engineer.get("specialization"),
+            "skills": engineer.get("skills", []),
+            **workload,
+            "score": score,
+            "available_on_date": score < AVAILABLE_BELOW,
+        })
+    ranked.sort(key=lambda r: (r["score"], r["name"] or ""))
+    return ranked
+
+
+async def pick_engineer(org_id: str, ticket: dict, method: str,
+                        team_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Best candidate for auto-assignment (one of AUTO_ASSIGN_METHODS),
+    among the team's members when a team is given. None if nobody qualifies.
+    """
+    member_ids = None
+    if team_id:
+        team = await db.ticket_teams.find_one({"id": team_id, "organization_id": org_id}, {"_id": 0, "members": 1})
+        member_ids = [m.get("user_id") for m in (team or {}).get("members") or []]
+        if not member_ids:
+            return None
+    engineers = await active_engineers(org_id, member_ids)
+    if method == "skill_based":
+        engineers = [e for e in engineers if matches_topic(e, ticket.get("help_topic_name"))]
+    if not engineers:
+        return None
+    return (await rank_engineers(org_id, ticket, engineers))[0]
@@ -0,0 +1,129 @@
+"""
+Analytics Cache Tests
+The two-level dashboard cache (services/analytics_cache.py), with a
+MemoryStore as the shared level and an injected clock:
+- Concurrent misses for one key share a single computation
+- A stale entry is served at once while one background refresh runs
+- The in-process LRU evicts the least recently used entry at its size limit
+- invalidate_analytics marks only the org's entries with the tag stale
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import analytics_cache as cache_module  # noqa: E402
+from services.analytics_cache import AnalyticsCache, MemoryStore  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Counter:
+    """compute() that counts its calls and returns the call number"""
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return call
+
+
+def make_cache(clock, **kwargs):
+    return AnalyticsCache(ttl=60, stale_ttl=120, shared=MemoryStore(), clock=clock, **kwargs)
+
+
+class TestSingleFlight:
+    def test_concurrent_misses_share_one_compute(self):
+        async def run():
+            cache = make_cache(FakeClock())
+            compute = Counter(delay=0.01)
+            results = await asyncio.gather(*(cache.get_or_compute("sla:o1", compute, "o1") for _ in range(5)))
+            assert results == [1] * 5 and compute.calls == 1
+            stats = cache.stats()["keys"]["sla"]
+            assert stats["misses"] == 5 and stats["computes"] == 1
+            assert await cache.shared.get("sla:o1") is not None
+        asyncio.run(run())
+
+
+class TestStaleWhileRevalidate:
+    def test_stale_served_while_refreshing(self):
+        async def run():
+            clock = FakeClock()
+            cache = make_cache(clock)
+            compute = Counter(delay=0.01)
+            assert await cache.get_or_compute("sla:o1", compute, "o1") == 1
+            clock.now += 30
+            assert await cache.get_or_compute("sla:o1", compute, "o1") == 1  # fresh hit
+            clock.now += 60  # past ttl, inside stale_ttl
+            assert await cache.get_or_compute("sla:o1", compute, "o1") == 1  # stale, refresh started
+            assert await cache.get_or_compute("sla:o1", compute, "o1") == 1  # same refresh in flight
+            await asyncio.sleep(0.05)
+            assert compute.calls == 2
+            assert await cache.get_or_compute("sla:o1", compute, "o1") == 2
+            stats = cache.stats()["keys"]["sla"]
+            assert stats["hits"] == 2 and stats["stale_hits"] == 2 and stats["misses"] == 1
+        asyncio.run(run())
+
+    def test_expired_entry_recomputed(self):
+        async def run():
+            clock = FakeClock()
+            cache = make_cache(clock)
+            compute = Counter()
+            await cache.get_or_compute("sla:o1", compute, "o1")
+            clock.now += 60 + 120 + 1  # past serving
+            assert await cache.get_or_compute("sla:o1", compute, "o1") == 2
+        asyncio.run(run())
+
+
+class TestLruBound:
+    def test_evicts_least_recently_used(self):
+        async def run():
+            cache = AnalyticsCache(max_entries=2, ttl=60, clock=FakeClock())
+            a, b, c = Counter(), Counter(), Counter()
+            await cache.get_or_compute("x:a", a)
+            await cache.get_or_compute("x:b", b)
+            await cache.get_or_compute("x:a", a)  # a is now the most recent
+            await cache.get_or_compute("x:c", c)
+            assert cache.evictions == 1 and cache.stats()["size"] == 2
+            await cache.get_or_compute("x:a", a)
+            await cache.get_or_compute("x:b", b)
+            assert a.calls == 1 and b.calls == 2
+        asyncio.run(run())
+
+
+class TestInvalidation:
+    def test_invalidate_analytics_marks_tagged_entries_stale(self, monkeypatch):
+        async def run():
+            clock = FakeClock()
+            cache = make_cache(clock)
+            monkeypatch.setattr(cache_module, "analytics_cache", cache)
+            tickets, visits, other_org = Counter(delay=0.01), Counter(), Counter()
+            await cache.get_or_compute("ticket_intel:o1", tickets, "o1", tags=["tickets"])
+            await cache.get_or_compute("visits:o1", visits, "o1", tags=["visits"])
+            await cache.get_or_compute("ticket_intel:o2", other_org, "o2", tags=["tickets"])
+
+            await cache_module.invalidate_analytics("o1", "tickets")
+            await cache_module.invalidate_analytics(None, "tickets")  # no org: ignored
+            assert (await cache.shared.get("ticket_intel:o1")).fresh_until <= clock.now
+            assert (await cache.shared.get("visits:o1")).fresh_until > clock.now
+
+            # The invalidated entry is served stale once and refreshed; the others stay fresh hits
+            assert await cache.get_or_compute("ticket_intel:o1", tickets, "o1", tags=["tickets"]) == 1
+            await asyncio.sleep(0.05)
+            assert await cache.get_or_compute("ticket_intel:o1", tickets, "o1", tags=["tickets"]) == 2
+            assert await cache.get_or_compute("visits:o1", visits, "o1", tags=["visits"]) == 1
+            assert await cache.get_or_compute("ticket_intel:o2", other_org, "o2", tags=["tickets"]) == 1
+            assert visits.calls == 1 and other_org.calls == 1
+        asyncio.run(run())
@@ -377,6 +377,49 @@ class TestAnalyticsDashboard:
         assert "kpis" in data
         print("✓ Period 365 days: Works correctly")
 
+    # ==================== Server-side Aggregation ====================
+    def test_aggregated_distributions_are_consistent(self, auth_headers):
+        """$facet-computed buckets add up to the totals they are derived from"""
+        assets = requests.get(f"{BASE_URL}/api/analytics/assets", headers=auth_headers).json()
+        type_total = sum(t["count"] for t in assets["type_distribution"])
+        assert type_total == assets["summary"]["total_devices"]
+        assert sum(b["count"] for b in assets["warranty_timeline"]) <= assets["summary"]["total_devices"]
+
+        contracts = requests.get(f"{BASE_URL}/api/analytics/contracts", headers=auth_headers).json()
+        summary = contracts["summary"]
+        assert summary["active_contracts"] + summary["expired_contracts"] == summary["total_contracts"]
+        assert sum(b["count"] for b in contracts["expiry_pipeline"]) == summary["active_contracts"]
+        assert sum(t["count"] for t in contracts["type_distribution"]) == summary["total_contracts"]
+
+        clients = requests.get(f"{BASE_URL}/api/analytics/clients?days=30", headers=auth_headers).json()
+        for company in clients["companies"]:
+            assert company["period_tickets"] <= company["total_tickets"]
+            assert len(company["top_topics"]) <= 5
+        print("✓ Aggregated distributions are consistent with their totals")
+
+    # ==================== Ticket Rollups ====================
+    def test_rollup_rebuild_matches_ticket_summary(self, auth_headers):
+        """POST /api/analytics/rollups/rebuild backfills the rollups the ticket analytics read"""
+        response = requests.post(
+            f"{BASE_URL}/api/analytics/rollups/rebuild",
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Failed: {response.status_code} - {response.text}"
+        stats = response.json()
+        assert stats["organizations"] == 1
+        assert stats["tickets"] >= 0
+
+        response = requests.get(
+            f"{BASE_URL}/api/analytics/tickets?days=365",
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        summary = response.json()["summary"]
+        assert summary["open_tickets"] + summary["closed_tickets"] == summary["total_tickets"]
+        assert summary["assigned"] + summary["unassigned"] == summary["open_tickets"]
+        assert summary["p95_resolution_hours"] >= 0
+        print(f"✓ Rollups rebuilt from {stats['tickets']} tickets, {stats['daily_rows']} daily rows")
+
     # ==================== Authorization Tests ====================
     def test_analytics_requires_auth(self):
         """Test that analytics endpoints require authentication"""
@@ -0,0 +1,157 @@
+"""
+Engineer Availability Tests
+Interval sets and the shared scheduling engine (services/availability.py):
+- merge / subtract / contains / first_fit on sorted interval lists
+- Working hours, personal and org holidays, emergency hours
+- Bookings with their buffer, and the 30-minute slot picker response
+- Earliest free slot across engineers and days
+"""
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.availability import (  # noqa: E402
+    Calendar, DAY_MINUTES, MAX_RANGE_DAYS, merge, subtract, contains, first_fit, day_range, clock,
+)
+
+MONDAY = date(2026, 3, 2)
+ENGINEER = {"id": "e1", "name": "Asha"}
+
+
+def booking(engineer_id, at, end=None, number="000001", company="Acme"):
+    return {"engineer_id": engineer_id, "scheduled_at": at, "scheduled_end_at": end,
+            "ticket_number": number, "company_name": company}
+
+
+class TestIntervals:
+    def test_merge(self):
+        assert merge([(5, 8), (1, 3), (2, 4), (8, 9), (7, 7)]) == [(1, 4), (5, 9)]
+        assert merge([]) == []
+
+    def test_subtract(self):
+        assert subtract([(0, 100)], [(10, 20), (30, 40)]) == [(0, 10), (20, 30), (40, 100)]
+        assert subtract([(0, 10), (20, 30)], [(5, 25)]) == [(0, 5), (25, 30)]
+        assert subtract([(0, 10)], [(0, 10)]) == []
+        assert subtract([(0, 10)], []) == [(0, 10)]
+
+    def test_contains(self):
+        intervals = [(0, 10), (20, 30)]
+        assert contains(intervals, 0) and contains(intervals, 25)
+        assert not contains(intervals, 10) and not contains(intervals, 15) and not contains(intervals, 30)
+        assert not contains([], 1)
+
+    def test_first_fit_on_grid(self):
+        free = [(540, 600), (615, 720)]
+        assert first_fit(free, 60) == 540
+        assert first_fit(free, 90) == 630  # 10:15 rounds up to 10:30
+        assert first_fit(free, 60, not_before=541) == 630
+        assert first_fit(free, 120) is None
+
+
+class TestDayRange:
+    def test_range(self):
+        assert day_range("2026-03-02") == (MONDAY, 1)
+        assert day_range("2026-03-02", "2026-03-08") == (MONDAY, 7)
+
+    def test_invalid(self):
+        for args in (("03/02/2026",), ("2026-03-02", "2026-03-01"), ("2026-01-01", "2026-12-31")):
+            with pytest.raises(ValueError):
+                day_range(*args)
+        assert MAX_RANGE_DAYS >= 31
+
+
+class TestCalendar:
+    def test_default_hours(self):
+        calendar = Calendar(MONDAY, 7, [ENGINEER])
+        schedule = calendar.engineers["e1"]
+        assert schedule.day_working[0] == [(540, 1080)]
+        assert schedule.day_working[5] == [(5 * DAY_MINUTES + 540, 5 * DAY_MINUTES + 840)]
+        assert schedule.day_status[6] == "day_off" and schedule.day_working[6] == []
+
+    def test_holidays_and_emergency_hours(self):
+        engineer = {**ENGINEER, "holidays": ["2026-03-03"]}
+        calendar = Calendar(
+            MONDAY, 7, [engineer],
+            holidays=[{"date": "2026-03-04", "name": "Holi"}],
+            emergency_hours=[
+                {"date": "2026-03-02", "start": "17:00", "end": "21:00"},
+                {"date": "2026-03-04", "start": "10:00", "end": "12:00"},
+                {"date": "2026-03-08", "start": "10:00", "end": "12:00"},
+            ],
+        )
+        schedule = calendar.engineers["e1"]
+        assert schedule.day_working[0] == [(540, 1260)]  # extended past 18:00
+        assert schedule.day_status[1] == "personal_holiday"
+        # An org holiday with emergency hours is worked only during them
+        assert schedule.day_working[2] == [(2 * DAY_MINUTES + 600, 2 * DAY_MINUTES + 720)]
+        assert schedule.day_status[6] is None
+
+    def test_bookings_block_with_buffer(self):
+        calendar = Calendar(MONDAY, 1, [ENGINEER], bookings=[
+            booking("e1", "2026-03-02T10:00:00", "2026-03-02T11:30:00"),
+            booking("e1", "2026-03-02T15:00:00"),  # no end: one hour
+            booking("e2", "2026-03-02T09:00:00"),
+        ])
+        schedule = calendar.engineers["e1"]
+        assert schedule.busy == [(600, 750), (900, 1020)]
+        assert schedule.free == [(540, 600), (750, 900), (1020, 1080)]
+
+    def test_duplicate_bookings_counted_once(self):
+        calendar = Calendar(MONDAY, 1, [ENGINEER], bookings=[
+            booking("e1", "2026-03-02T10:00:00"), booking("e1", "2026-03-02T10:00:00+05:30"),
+        ])
+        assert len(calendar.engineers["e1"].bookings) == 1
+
+    def test_day_slots(self):
+        calendar = Calendar(MONDAY, 1, [ENGINEER], bookings=[
+            booking("e1", "2026-03-02T10:00:00", "2026-03-02T11:00:00", number="000042", company=""),
+        ])
+        result = calendar.engineers["e1"].day_slots(0)
+        assert result["is_working_day"] and result["work_start"] == "09:00" and result["work_end"] == "18:00"
+        slots = {s["time"]: s for s in result["slots"]}
+        assert len(slots) == 18
+        assert slots["09:30"]["available"]
+        assert not slots["10:00"]["available"] and not slots["11:30"]["available"]
+        assert slots["10:00"]["blocked_by"] == "#000042 - "
+        assert slots["12:00"]["available"]
+        assert result["bookings"][0]["start_mins"] == 600 and result["bookings"][0]["end_mins"] == 660
+
+    def test_day_slots_past_and_off_days(self):
+        calendar = Calendar(MONDAY, 7, [{**ENGINEER, "holidays": ["2026-03-03"]}],
+                            holidays=[{"date": "2026-03-04", "name": "Holi"}])
+        schedule = calendar.engineers["e1"]
+        now = calendar.minute_of(datetime(2026, 3, 2, 10, 0))
+        slots = schedule.day_slots(0, now=now)["slots"]
+        assert slots[2] == {"time": "10:00", "available": False, "blocked_by": "Past time"}
+        assert slots[3]["available"]
+        assert schedule.day_slots(1, holiday_message="x") == {
+            "date": "2026-03-03", "is_holiday": True, "is_working_day": False, "slots": [], "message": "x"
+        }
+        assert "Holi" in schedule.day_slots(2)["message"]
+        assert schedule.day_slots(6)["message"] == "Not a working day (Sunday)"
+
+
+class TestFirstFree:
+    def test_earliest_across_engineers_and_days(self):
+        busy_all_monday = [booking("e1", "2026-03-02T09:00:00", "2026-03-02T17:00:00")]
+        late_shift = {"id": "e2", "working_hours": {"monday": {"is_working": True, "start": "17:00", "end": "20:00"}}}
+        calendar = Calendar(MONDAY, 7, [ENGINEER, late_shift], bookings=busy_all_monday)
+        engineer_id, start = calendar.first_free(60)
+        assert engineer_id == "e2" and calendar.timestamp(start) == "2026-03-02T17:00"
+        engineer_id, start = calendar.first_free(4 * 60)
+        assert engineer_id == "e1" and calendar.timestamp(start) == "2026-03-03T09:00"
+
+    def test_not_before_and_none(self):
+        calendar = Calendar(MONDAY, 1, [ENGINEER])
+        assert calendar.first_free(60, not_before=calendar.minute_of(datetime(2026, 3, 2, 9, 10)) + 1) == ("e1", 570)
+        assert calendar.first_free(10 * 60) is None
+
+    def test_free_windows(self):
+        calendar = Calendar(MONDAY, 1, [ENGINEER], bookings=[booking("e1", "2026-03-02T10:00:00")])
+        assert calendar.free_windows("e1", 60) == [(540, 600), (720, 1080)]
+        assert calendar.free_windows("e1", 90) == [(720, 1080)]
+        assert clock(720) == "12:00"
@@ -0,0 +1,113 @@
+"""
+Startup Backfill Tests
+The once-per-version runner (services/backfills.py) against an in-memory
+`backfills` collection:
+- A backfill runs once, and again only for a newer version
+- A backfill leased by another process is skipped
+- A failed backfill releases its lease and runs at the next start
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+from services import backfills as backfills_module  # noqa: E402
+from services.backfills import BackfillRunner  # noqa: E402
+
+
+def matches(doc, query):
+    if query.get("name") != doc["name"]:
+        return False
+    done = doc.get("done_version")
+    if "done_version" in query and done is not None and done >= query["done_version"]["$not"]["$gte"]:
+        return False
+    if "lease_owner" in query and doc.get("lease_owner") != query["lease_owner"]:
+        return False
+    if "$or" in query:
+        lease = doc.get("lease_until")
+        return lease is None or lease < query["$or"][1]["lease_until"]["$lt"]
+    return True
+
+
+class FakeBackfills:
+    """backfills collection with its unique index on name"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        for doc in self.docs:
+            if matches(doc, query):
+                doc.update(update["$set"])
+                return dict(doc)
+        if any(d["name"] == query["name"] for d in self.docs):
+            raise DuplicateKeyError("E11000 duplicate key")
+        doc = {"name": query["name"], **update["$set"]}
+        self.docs.append(doc)
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                doc.update(update["$set"])
+
+
+class FakeDb:
+    def __init__(self):
+        self.backfills = FakeBackfills()
+
+
+class Job:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("backfill failed")
+        return {"updated": 1}
+
+
+class TestBackfillRunner:
+    def test_runs_once_per_version(self, monkeypatch):
+        fake = FakeDb()
+        monkeypatch.setattr(backfills_module, "db", fake)
+
+        async def run():
+            job = Job()
+            assert await BackfillRunner().run_one("keys", 1, job) is True
+            assert await BackfillRunner().run_one("keys", 1, job) is False
+            assert job.calls == 1 and fake.backfills.docs[0]["done_version"] == 1
+            assert await BackfillRunner().run_one("keys", 2, job) is True
+            assert job.calls == 2
+        asyncio.run(run())
+
+    def test_leased_elsewhere_is_skipped(self, monkeypatch):
+        fake = FakeDb()
+        monkeypatch.setattr(backfills_module, "db", fake)
+        fake.backfills.docs.append({"name": "keys", "lease_owner": "other",
+                                    "lease_until": datetime(2999, 1, 1, tzinfo=timezone.utc)})
+
+        async def run():
+            job = Job()
+            assert await BackfillRunner().run_one("keys", 1, job) is False and job.calls == 0
+        asyncio.run(run())
+
+    def test_failure_releases_lease(self, monkeypatch):
+        fake = FakeDb()
+        monkeypatch.setattr(backfills_module, "db", fake)
+
+        async def run():
+            runner = BackfillRunner()
+            runner.register("keys", 1, Job(fail=True))
+            await runner.run_all()  # logged, not raised
+            assert fake.backfills.docs[0]["lease_until"] is None
+            assert "done_version" not in fake.backfills.docs[0]
+            job = Job()
+            assert await BackfillRunner().run_one("keys", 1, job) is True and job.calls == 1
+        asyncio.run(run())
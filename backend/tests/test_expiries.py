@@ -0,0 +1,66 @@
+"""
+Expiry Index Tests
+Expiry rows and the alert window query (services/expiries.py):
+- Which entities get a row, and what it carries
+- Upserts / deletes produced when re-deriving rows
+- One range scan with a count and a bounded list per (kind, bucket)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.expiries import (  # noqa: E402
+    SOURCES, COLLECTION_OF_KIND, expiry_date, build_row, _row_ops, window_pipeline, day_offset,
+)
+
+DEVICE = {
+    "id": "d1", "organization_id": "o1", "company_id": "c1", "warranty_end_date": "2026-03-31",
+    "brand": "Dell", "model": "5420", "serial_number": "SN-1", "password": "x",
+}
+
+
+class TestRows:
+    def test_expiry_date(self):
+        assert expiry_date("2026-03-31") == "2026-03-31"
+        assert expiry_date("2026-03-31T10:00:00+05:30") == "2026-03-31"
+        assert expiry_date("N/A") is None
+        assert expiry_date("2025-02-30") is None
+        assert expiry_date(None) is None
+
+    def test_build_row(self):
+        row = build_row("devices", DEVICE)
+        assert row["key"] == "devices:d1" and row["kind"] == "warranty"
+        assert row["organization_id"] == "o1" and row["company_id"] == "c1"
+        assert row["expiry_date"] == "2026-03-31"
+        assert row["doc"]["serial_number"] == "SN-1" and "password" not in row["doc"]
+
+    def test_no_row_without_live_expiry(self):
+        assert build_row("devices", {**DEVICE, "is_deleted": True}) is None
+        assert build_row("devices", {**DEVICE, "warranty_end_date": ""}) is None
+        assert build_row("licenses", {"id": "l1", "expiry_date": "2026-01-01"}) is None
+        assert build_row("licenses", {"id": "l1", "end_date": "2026-01-01"})["kind"] == "license"
+
+    def test_row_ops(self):
+        ops = _row_ops("devices", [DEVICE, {**DEVICE, "id": "d2", "is_deleted": True}], ["d1", "d2", "d3"])
+        assert [type(op).__name__ for op in ops] == ["UpdateOne", "DeleteOne", "DeleteOne"]
+        assert ops[2]._filter == {"key": "devices:d3"}
+
+    def test_kinds_round_trip(self):
+        assert all(COLLECTION_OF_KIND[source.kind] == coll for coll, source in SOURCES.items())
+
+
+class TestWindow:
+    def test_pipeline_shape(self):
+        buckets = [("critical", 0, 30), ("warning", 31, 60)]
+        pipeline = window_pipeline("o1", ["warranty", "license"], buckets, company_id="c1", limit=5)
+        match = pipeline[0]["$match"]
+        assert match["organization_id"] == "o1" and match["company_id"] == "c1"
+        assert match["expiry_date"] == {"$gte": day_offset(0), "$lte": day_offset(60)}
+        assert match["kind"] == {"$in": ["warranty", "license"]}
+
+        facets = pipeline[1]["$facet"]
+        assert set(facets) == {"counts", "warranty:critical", "warranty:warning", "license:critical", "license:warning"}
+        warning = facets["license:warning"]
+        assert warning[0]["$match"] == {"kind": "license", "expiry_date": {"$gte": day_offset(31), "$lte": day_offset(60)}}
+        assert warning[2] == {"$limit": 5}
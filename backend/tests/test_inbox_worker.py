@@ -0,0 +1,199 @@
+"""
+Inbox Worker Tests
+Runs services/inbox_worker.py against an in-process IMAP stub:
+- UID cursor: only unseen messages above the last UID are fetched
+- One UID FETCH per pass, BODY.PEEK so nothing is flagged early
+- Handled messages are flagged \\Seen; failed ones stay unseen and are retried
+- A message that keeps failing becomes a poison UID the cursor moves past
+- EmailService.fetch_new_emails drains every unseen message, batch by batch
+"""
+import asyncio
+import os
+import sys
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import email_service  # noqa: E402
+from services import inbox_worker  # noqa: E402
+from services.inbox_worker import InboxWorker, fetch_batch  # noqa: E402
+
+
+def make_email(subject, sender="Alice <alice@example.com>", body="Printer is jammed"):
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = "support@example.com"
+    msg["Subject"] = subject
+    msg["Message-ID"] = f"<{subject.replace(' ', '-')}@example.com>"
+    msg.set_content(body)
+    return msg.as_bytes()
+
+
+class StubIMAP:
+    """Just enough of imaplib.IMAP4 for the worker: select, UID SEARCH/FETCH/STORE"""
+
+    def __init__(self, messages, uid_validity=1):
+        self.messages = dict(messages)  # uid -> raw bytes
+        self.seen = set()
+        self.uid_validity = uid_validity
+        self.commands = []
+        self.logged_out = False
+
+    def select(self, folder="INBOX"):
+        return "OK", [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        return code, [str(self.uid_validity).encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == "SEARCH":
+            criteria = args[1:]
+            low = 1
+            if criteria[0] == "UID":
+                low = int(criteria[1].split(":")[0])
+            matched = [u for u in sorted(self.messages) if u >= low and u not in self.seen]
+            if criteria[0] == "UID" and not matched and self.messages:
+                matched = [max(self.messages)]  # "n:*" always matches the newest message
+            return "OK", [" ".join(str(u) for u in matched).encode()]
+        if command == "FETCH":
+            assert "PEEK" in args[1], "fetch must not set \\Seen"
+            data = []
+            for u in (int(x) for x in args[0].split(",")):
+                raw = self.messages[u]
+                data.append((f"{u} (UID {u} BODY[] {{{len(raw)}}}".encode(), raw))
+                data.append(b")")
+            return "OK", data
+        if command == "STORE":
+            self.seen.update(int(x) for x in args[0].split(","))
+            return "OK", []
+        raise AssertionError(f"unexpected command {command}")
+
+    def logout(self):
+        self.logged_out = True
+
+
+CONFIG = {"organization_id": "org-1", "imap_folder": "INBOX"}
+
+
+class TestFetchBatch:
+    def test_fetches_unseen_above_cursor_in_one_fetch(self):
+        stub = StubIMAP({3: make_email("old"), 7: make_email("new one"), 9: make_email("new two")})
+        stub.seen.add(9)
+        messages, last_uid, validity = fetch_batch(stub, "INBOX", last_uid=3, uid_validity=1)
+
+        assert [m["uid"] for m in messages] == [7]
+        assert messages[0]["subject"] == "new one"
+        assert messages[0]["from_email"] == "alice@example.com"
+        assert messages[0]["body"] == "Printer is jammed"
+        assert last_uid == 3 and validity == 1
+        assert [c[0] for c in stub.commands] == ["SEARCH", "FETCH"]
+
+    def test_uid_validity_change_resets_cursor(self):
+        stub = StubIMAP({1: make_email("first"), 2: make_email("second")}, uid_validity=2)
+        messages, last_uid, validity = fetch_batch(stub, "INBOX", last_uid=50, uid_validity=1)
+
+        assert [m["uid"] for m in messages] == [1, 2]
+        assert last_uid == 0 and validity == 2
+
+    def test_nothing_new(self):
+        stub = StubIMAP({4: make_email("handled")})
+        messages, last_uid, _ = fetch_batch(stub, "INBOX", last_uid=4, uid_validity=1)
+
+        assert messages == [] and last_uid == 4
+        assert [c[0] for c in stub.commands] == ["SEARCH"]
+
+
+class TestEmailServiceFetch:
+    def test_fetches_every_unseen_message_in_batches(self, monkeypatch):
+        stub = StubIMAP({u: make_email(f"mail {u}") for u in range(1, 6)})
+        stub.seen.add(2)
+        monkeypatch.setattr(email_service, "INBOX_BATCH_SIZE", 2)
+        service = email_service.EmailService(db=None)
+        monkeypatch.setattr(service, "_create_imap_connection", lambda: stub)
+
+        emails = service._fetch_new_emails_blocking("INBOX", mark_read=True)
+
+        assert [e["imap_uid"] for e in emails] == [1, 3, 4, 5]
+        assert [c[0] for c in stub.commands] == ["SEARCH", "FETCH", "FETCH", "STORE"]
+        assert stub.seen == {1, 2, 3, 4, 5} and stub.logged_out
+
+
+class TestInboxWorker:
+    def test_ingest_hands_messages_to_pipeline_and_advances_cursor(self):
+        stub = StubIMAP({1: make_email("Re: [Ticket #AB12CD] update"), 2: make_email("brand new")})
+        handled = []
+
+        async def handler(config, message):
+            handled.append(message["subject"])
+            return "updated" if "Ticket #" in message["subject"] else "created"
+
+        async def run():
+            worker = InboxWorker(db=None, handler=handler, threads=2, connect=lambda config: stub)
+            try:
+                return await worker.ingest(CONFIG)
+            finally:
+                await worker.stop()
+
+        results, cursor = asyncio.run(run())
+
+        assert handled == ["Re: [Ticket #AB12CD] update", "brand new"]
+        assert results == {"fetched": 2, "new_tickets": 1, "updated_tickets": 1, "errors": []}
+        assert cursor == {"last_uid": 2, "uid_validity": 1, "failures": {}, "poisoned": []}
+        assert stub.seen == {1, 2}
+        assert stub.logged_out
+
+    def test_failed_message_stays_unseen_and_is_retried(self):
+        stub = StubIMAP({5: make_email("ok"), 6: make_email("boom"), 7: make_email("after")})
+
+        async def handler(config, message):
+            if message["subject"] == "boom":
+                raise RuntimeError("database unavailable")
+            return "created"
+
+        async def run():
+            worker = InboxWorker(db=None, handler=handler, connect=lambda config: stub)
+            try:
+                first = await worker.ingest(CONFIG, last_uid=4, uid_validity=1)
+                second = await worker.ingest(CONFIG, last_uid=first[1]["last_uid"], uid_validity=1)
+                return first, second
+            finally:
+                await worker.stop()
+
+        (results, cursor), (retry, _) = asyncio.run(run())
+
+        assert results["fetched"] == 2 and len(results["errors"]) == 1
+        assert cursor["last_uid"] == 5
+        assert stub.seen == {5, 7}
+        # The retry pass only sees the failed message
+        assert retry["errors"] and retry["fetched"] == 0
+
+    def test_poison_message_is_skipped_after_max_attempts(self):
+        stub = StubIMAP({5: make_email("poison"), 6: make_email("after")})
+
+        async def handler(config, message):
+            if message["subject"] == "poison":
+                raise ValueError("cannot parse")
+            return "created"
+
+        async def run():
+            worker = InboxWorker(db=None, handler=handler, connect=lambda config: stub)
+            cursor = {"last_uid": 4, "uid_validity": 1, "failures": {}}
+            passes = []
+            try:
+                for _ in range(inbox_worker.MAX_MESSAGE_ATTEMPTS):
+                    passes.append(await worker.ingest(
+                        CONFIG, cursor["last_uid"], cursor["uid_validity"], cursor["failures"]
+                    ))
+                    cursor = passes[-1][1]
+                return passes
+            finally:
+                await worker.stop()
+
+        passes = asyncio.run(run())
+
+        first, second, last = (cursor for _, cursor in passes)
+        assert first == {"last_uid": 4, "uid_validity": 1, "failures": {"5": 1}, "poisoned": []}
+        assert second["last_uid"] == 4 and second["failures"] == {"5": 2}
+        assert last == {"last_uid": 5, "uid_validity": 1, "failures": {}, "poisoned": [5]}
+        assert stub.seen == {6}  # the poison message is left unseen for a person to look at
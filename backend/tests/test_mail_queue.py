@@ -0,0 +1,177 @@
+"""
+Outbound Mail Queue Tests
+Delivers through services/mail_queue.py to a local SMTP sink:
+- One pooled connection serves a whole batch and is reused afterwards
+- Rejected recipients fail permanently without breaking the batch
+- Dropped connections are re-established transparently
+- Per-recipient dedup keys and retry backoff
+"""
+import os
+import socketserver
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.mail_queue import (  # noqa: E402
+    SmtpPool, send_batch, dedup_key_for, retry_delay, _recipients,
+    RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, DEDUP_WINDOW_SECONDS
+)
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server: accepts everything except recipients containing 'reject'"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self.reply("220 sink ready")
+        rcpt = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif verb == "MAIL":
+                rcpt = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                if "reject" in command.lower():
+                    self.reply("550 No such user")
+                else:
+                    rcpt.append(command.split(":", 1)[1].strip(" <>"))
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b".\n", b""):
+                        break
+                    data.append(chunk)
+                sink.delivered.extend(rcpt)
+                self.reply("250 queued")
+                if sink.drop_after_data:
+                    sink.drop_after_data = False
+                    return  # hang up without QUIT
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SinkHandler)
+        self.sink = self
+        self.connections = 0
+        self.delivered = []
+        self.drop_after_data = False
+
+
+@pytest.fixture
+def sink():
+    server = SmtpSink()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def account_for(server):
+    return {"host": "127.0.0.1", "port": server.server_address[1], "use_ssl": False,
+            "use_tls": False, "from_addr": "support@example.com"}
+
+
+def message(n, to=None):
+    return {"id": f"m{n}", "to": to or f"user{n}@example.com", "subject": f"Ticket {n}",
+            "html": f"<p>Update {n}</p>", "headers": {}}
+
+
+class TestSendBatch:
+    def test_batch_shares_one_pooled_connection(self, sink):
+        pool = SmtpPool()
+        account = account_for(sink)
+
+        first = send_batch(pool, account, [message(1), message(2), message(3)])
+        second = send_batch(pool, account, [message(4)])
+
+        assert [error for _, error, _ in first + second] == [None] * 4
+        assert sink.delivered == [f"user{n}@example.com" for n in range(1, 5)]
+        assert sink.connections == 1
+        assert pool.stats()["reuses"] == 1
+        pool.close_all()
+
+    def test_rejected_recipient_is_permanent_and_batch_continues(self, sink):
+        pool = SmtpPool()
+        outcomes = send_batch(pool, account_for(sink), [
+            message(1), message(2, to="reject-me@example.com"), message(3)
+        ])
+
+        assert outcomes[0] == ("m1", None, False)
+        assert outcomes[1][0] == "m2" and outcomes[1][1] and outcomes[1][2] is True
+        assert outcomes[2] == ("m3", None, False)
+        assert sink.delivered == ["user1@example.com", "user3@example.com"]
+        pool.close_all()
+
+    def test_dropped_connection_is_reestablished(self, sink):
+        pool = SmtpPool()
+        sink.drop_after_data = True
+
+        outcomes = send_batch(pool, account_for(sink), [message(1), message(2)])
+
+        assert [error for _, error, _ in outcomes] == [None, None]
+        assert sink.delivered == ["user1@example.com", "user2@example.com"]
+        assert sink.connections == 2
+        pool.close_all()
+
+    def test_unreachable_server_is_transient(self):
+        pool = SmtpPool(timeout=2)
+        outcomes = send_batch(pool, {"host": "127.0.0.1", "port": 1, "use_tls": False}, [message(1)])
+
+        assert outcomes[0][1] and outcomes[0][2] is False
+
+
+class TestQueueHelpers:
+    def test_dedup_key_is_per_recipient(self):
+        a = dedup_key_for("a@example.com", "Hi", "<p>x</p>", "org-1", key="ticket:1")
+        assert a == dedup_key_for("A@Example.com", "Hi", "<p>x</p>", "org-1", key="ticket:1")
+        assert a != dedup_key_for("b@example.com", "Hi", "<p>x</p>", "org-1", key="ticket:1")
+        assert a != dedup_key_for("a@example.com", "Hi", "<p>x</p>", "org-2", key="ticket:1")
+
+    def test_content_dedup_expires_with_window(self):
+        now = 1_700_000_000 - (1_700_000_000 % DEDUP_WINDOW_SECONDS)
+        same = dedup_key_for("a@example.com", "Hi", "<p>x</p>", content=True, now=now)
+        assert same == dedup_key_for("a@example.com", "Hi", "<p>x</p>", content=True,
+                                     now=now + DEDUP_WINDOW_SECONDS - 1)
+        assert same != dedup_key_for("a@example.com", "Hi", "<p>x</p>", content=True,
+                                     now=now + DEDUP_WINDOW_SECONDS)
+
+    def test_repeated_content_is_not_deduplicated_by_default(self):
+        now = 1_700_000_000 - (1_700_000_000 % DEDUP_WINDOW_SECONDS)
+        assert dedup_key_for("a@example.com", "Hi", "<p>x</p>", now=now) != \
+            dedup_key_for("a@example.com", "Hi", "<p>x</p>", now=now)
+
+    def test_retry_delay_backs_off_and_caps(self):
+        assert RETRY_BASE_SECONDS * 0.8 <= retry_delay(1) <= RETRY_BASE_SECONDS * 1.2
+        assert RETRY_BASE_SECONDS * 4 * 0.8 <= retry_delay(3) <= RETRY_BASE_SECONDS * 4 * 1.2
+        assert retry_delay(30) <= RETRY_MAX_SECONDS * 1.2
+
+    def test_recipients_are_split_and_deduplicated(self):
+        assert _recipients(["a@x.com, b@x.com", "A@x.com", ""]) == ["a@x.com", "b@x.com"]
+        assert _recipients(None) == []
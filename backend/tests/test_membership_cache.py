@@ -0,0 +1,137 @@
+"""
+Membership and Principal Cache Tests
+Email → organization lookups (utils/tenant_scope.py) and the per-request
+principal of get_current_admin (services/auth.py) against a stubbed db:
+- An active membership is read from MongoDB once, then served from the cache
+- invalidate_org_membership picks up a deactivated or moved membership
+- A missing membership is negatively cached and leaves the admin unscoped
+- get_current_admin resolves the admin once per request and publishes the
+  principal; a new request re-reads the admin but not the membership
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException  # noqa: E402
+
+from services import auth  # noqa: E402
+from utils import tenant_scope  # noqa: E402
+from utils.ttl_cache import TTLCache  # noqa: E402
+
+
+class FakeMembers:
+    def __init__(self, members):
+        self.members = list(members)
+        self.calls = 0
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        for member in self.members:
+            if member["email"] == query["email"] and member.get("is_active") and not member.get("is_deleted"):
+                return {"organization_id": member["organization_id"]}
+        return None
+
+
+class FakeAdmins:
+    def __init__(self, admins):
+        self.admins = {a["email"]: a for a in admins}
+        self.calls = 0
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        admin = self.admins.get(query["email"])
+        return dict(admin) if admin else None
+
+
+class FakeDb:
+    def __init__(self, members=(), admins=()):
+        self.organization_members = FakeMembers(members)
+        self.admins = FakeAdmins(admins)
+
+
+def setup(monkeypatch, members=(), admins=()):
+    cache = TTLCache(max_size=16, ttl=60, negative_ttl=10)
+    fake_db = FakeDb(members, admins)
+    monkeypatch.setattr(tenant_scope, "_membership_cache", cache)
+    monkeypatch.setattr(tenant_scope, "db", fake_db)
+    monkeypatch.setattr(auth, "db", fake_db)
+    return fake_db, cache
+
+
+def lookup(email):
+    return asyncio.run(tenant_scope.lookup_org_membership(email))
+
+
+def request():
+    return SimpleNamespace(state=SimpleNamespace())
+
+
+def bearer(email):
+    return SimpleNamespace(credentials=auth.create_access_token({"sub": email}))
+
+
+MEMBER = {"email": "asha@acme.test", "organization_id": "o1", "is_active": True}
+ADMIN = {"email": "asha@acme.test", "name": "Asha"}
+
+
+class TestMembershipCache:
+    def test_membership_cached(self, monkeypatch):
+        fake_db, cache = setup(monkeypatch, [MEMBER])
+        assert lookup("asha@acme.test") == "o1"
+        assert lookup("asha@acme.test") == "o1"
+        assert fake_db.organization_members.calls == 1 and cache.hits == 1
+
+    def test_invalidate_after_membership_change(self, monkeypatch):
+        fake_db, _ = setup(monkeypatch, [dict(MEMBER)])
+        assert lookup("asha@acme.test") == "o1"
+        fake_db.organization_members.members[0]["organization_id"] = "o2"
+        assert lookup("asha@acme.test") == "o1"  # still cached
+        tenant_scope.invalidate_org_membership("Asha@acme.test")  # any case form
+        assert lookup("asha@acme.test") == "o2"
+        fake_db.organization_members.members[0]["is_active"] = False
+        tenant_scope.invalidate_org_membership()
+        assert lookup("asha@acme.test") is None
+        assert fake_db.organization_members.calls == 3
+
+    def test_missing_membership_negatively_cached(self, monkeypatch):
+        fake_db, cache = setup(monkeypatch)
+        for _ in range(3):
+            assert lookup("legacy@acme.test") is None
+        assert fake_db.organization_members.calls == 1
+        assert cache.negative_hits == 2
+        assert lookup("") is None and fake_db.organization_members.calls == 1
+
+
+class TestPrincipalCache:
+    def test_resolved_once_per_request(self, monkeypatch):
+        fake_db, _ = setup(monkeypatch, [MEMBER], [ADMIN])
+
+        async def run():
+            req = request()
+            admin = await auth.get_current_admin(req, bearer("asha@acme.test"))
+            assert admin["organization_id"] == "o1"
+            assert await auth.get_current_admin(req, bearer("asha@acme.test")) is admin
+            principal = tenant_scope.current_principal.get()
+            assert principal is req.state.principal and principal.organization_id == "o1"
+            assert fake_db.admins.calls == 1
+
+            await auth.get_current_admin(request(), bearer("asha@acme.test"))
+            assert fake_db.admins.calls == 2 and fake_db.organization_members.calls == 1
+        asyncio.run(run())
+
+    def test_admin_without_membership(self, monkeypatch):
+        fake_db, _ = setup(monkeypatch, admins=[ADMIN])
+
+        async def run():
+            admin = await auth.get_current_admin(request(), bearer("asha@acme.test"))
+            assert "organization_id" not in admin
+            assert tenant_scope.current_principal.get().organization_id is None
+            with pytest.raises(HTTPException) as exc:
+                await auth.get_current_admin(request(), bearer("ghost@acme.test"))
+            assert exc.value.status_code == 401
+        asyncio.run(run())
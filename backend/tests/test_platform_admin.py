@@ -406,5 +406,38 @@ class TestPlatformSettings:
         print(f"SUCCESS: Settings update works - Changed trial days from {original_trial_days} to {new_trial_days}")
 
 
+class TestPlatformCacheStats:
+    """In-process tenant/membership cache counters"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        login_response = requests.post(f"{BASE_URL}/api/platform/login", json={
+            "email": PLATFORM_ADMIN_EMAIL,
+            "password": PLATFORM_ADMIN_PASSWORD
+        })
+        self.token = login_response.json()["access_token"]
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+    
+    def test_cache_stats_structure(self):
+        """Test cache stats expose hit/miss counters"""
+        response = requests.get(f"{BASE_URL}/api/platform/cache/stats", headers=self.headers)
+        
+        assert response.status_code == 200, f"Failed: {response.text}"
+        data = response.json()
+        for cache_name in ("tenant_resolution", "org_membership"):
+            stats = data[cache_name]
+            for key in ("size", "max_size", "hits", "misses", "negative_hits", "evictions", "hit_rate"):
+                assert key in stats, f"{cache_name} missing {key}"
+        analytics = data["analytics"]
+        for key in ("size", "max_entries", "ttl_seconds", "stale_ttl_seconds", "inflight", "evictions", "keys"):
+            assert key in analytics, f"analytics missing {key}"
+        print(f"SUCCESS: Cache stats - {data}")
+    
+    def test_cache_stats_unauthorized(self):
+        response = requests.get(f"{BASE_URL}/api/platform/cache/stats")
+        assert response.status_code in [401, 403]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
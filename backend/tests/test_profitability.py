@@ -0,0 +1,135 @@
+"""
+Device Profitability Tests
+The columnar engine behind GET /analytics/profitability
+(services/profitability.py), on small hand-built frames with hand-computed
+results:
+- Travel tier lookup (no distance, in a tier, beyond every tier)
+- On-site labour from the engineer rate (min 1 hour) or the visit's own cost
+- Remote calls at 30 minutes of the assignee's (or the default) rate
+- Parts split across a ticket's visits; AMC revenue through assignments
+- Per-device, per-company and summary margins
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import profitability as p  # noqa: E402
+
+TIERS = [
+    {"min_km": 0, "max_km": 10, "cost": 100},
+    {"min_km": 11, "max_km": 50, "cost": 300},
+    {"min_km": 51, "max_km": 1000, "cost": 600},
+]
+
+
+def frame(fields, *records):
+    return pd.DataFrame.from_records(list(records), columns=fields)
+
+
+def build_frames():
+    return {
+        "devices": frame(
+            p.DEVICE_FIELDS,
+            {"id": "d1", "device_name": "Server", "brand": "Dell", "model": "R740", "company_id": "c1"},
+            {"id": "d2", "brand": "HP", "model": "M404", "company_id": "c1", "company_name": "Old name"},
+            {"id": "d3", "name": "Spare", "company_id": None},
+        ),
+        "tickets": frame(
+            p.TICKET_FIELDS,
+            {"id": "t1", "device_id": "d1", "created_at": "2026-03-01T10:00:00", "assigned_to_id": "e1"},
+            {"id": "t2", "device_id": "d2", "created_at": "2026-03-02T10:00:00",
+             "assigned_to_id": "e2", "assigned_to_name": "Ravi"},
+            {"id": "t3", "device_id": "d2", "created_at": "2026-03-03T10:00:00"},
+            {"id": "t4", "device_id": "unknown", "created_at": "2026-03-04T10:00:00"},
+        ),
+        "visits": frame(
+            p.VISIT_FIELDS,
+            {"ticket_id": "t1", "technician_id": "e1", "technician_name": "Asha", "duration_minutes": 90,
+             "distance_km": 30, "scheduled_date": "2026-03-05"},
+            {"ticket_id": "t1", "technician_id": "e2", "technician_name": "Ravi", "duration_minutes": 30,
+             "travel_cost": 250, "distance_km": 900, "created_at": "2026-03-06T09:00:00"},
+        ),
+        "engineers": frame(p.ENGINEER_FIELDS, {"id": "e1", "hourly_rate": 400}, {"id": "e2", "hourly_rate": 0}),
+        "contracts": frame(p.CONTRACT_FIELDS, {"id": "k1", "name": "AMC", "custom_price": 10000,
+                                               "amc_type": "comprehensive"}),
+        "assignments": frame(p.ASSIGNMENT_FIELDS, {"device_id": "d1", "contract_id": "k1"},
+                             {"device_id": "d2", "contract_id": "missing"}),
+        "part_requests": frame(p.PART_REQUEST_FIELDS, {"ticket_id": "t1", "grand_total": 1000}),
+        "part_issues": frame(p.PART_ISSUE_FIELDS, {"ticket_id": "t1", "total_cost": 200}),
+        "companies": frame(p.COMPANY_FIELDS, {"id": "c1", "name": "Acme"}),
+    }
+
+
+class TestTravelTiers:
+    def test_tiers(self):
+        costs = p.travel_costs([0, 5, 30, 2000, np.nan], TIERS)
+        assert costs.tolist() == [100, 100, 300, 600, 100]
+        assert p.travel_costs([5], []).tolist() == [p.DEFAULT_TRAVEL_COST]
+
+
+class TestComputeProfitability:
+    def setup_method(self):
+        self.report = p.compute_profitability(build_frames(), TIERS, default_hourly=500)
+        self.devices = {d["device_id"]: d for d in self.report["devices"]}
+
+    def test_onsite_device(self):
+        d1 = self.devices["d1"]
+        # Visit 1: 1.5 h × 400 = 600 labour, 30 km → 300 travel
+        # Visit 2: 0.5 h rounds up to 1 h × default 500, own travel 250
+        # Parts 1000 + 200 split across both visits
+        assert (d1["onsite_calls"], d1["remote_calls"], d1["total_calls"]) == (2, 0, 1)
+        assert d1["total_visit_hours"] == 2.5
+        assert (d1["labour_cost"], d1["travel_cost"], d1["parts_cost"]) == (1100, 550, 1200)
+        assert d1["total_cost"] == 2850 and d1["amc_revenue"] == 10000 and d1["profit_loss"] == 7150
+        assert d1["device_name"] == "Server" and d1["company_name"] == "Acme"
+        assert d1["warranty_type"] == "comprehensive"
+        assert d1["call_details"] == [
+            {"type": "on-site", "date": "2026-03-05", "engineer": "Asha", "hours": 1.5,
+             "labour": 600.0, "travel": 300.0, "parts": 600.0},
+            {"type": "on-site", "date": "2026-03-06", "engineer": "Ravi", "hours": 1.0,
+             "labour": 500.0, "travel": 250.0, "parts": 600.0},
+        ]
+
+    def test_remote_device(self):
+        d2 = self.devices["d2"]
+        # Two remote calls: 0.5 h at e2's default rate and 0.5 h unassigned, both 500/h
+        assert (d2["remote_calls"], d2["onsite_calls"], d2["total_calls"]) == (2, 0, 2)
+        assert (d2["labour_cost"], d2["travel_cost"], d2["parts_cost"], d2["total_cost"]) == (500, 0, 0, 500)
+        assert d2["amc_revenue"] == 0 and d2["profit_loss"] == -500
+        assert d2["device_name"] == "HP M404" and d2["warranty_type"] == "none"
+        assert [c["engineer"] for c in d2["call_details"]] == ["Ravi", "Unassigned"]
+
+    def test_ordering_and_unused_devices(self):
+        assert "d3" not in self.devices
+        assert [d["device_id"] for d in self.report["worst_roi"]] == ["d2", "d1"]
+        assert [d["device_id"] for d in self.report["most_expensive"]] == ["d1", "d2"]
+
+    def test_company_and_summary(self):
+        companies = {c["company_id"]: c for c in self.report["company_profitability"]}
+        acme = companies["c1"]
+        assert (acme["devices"], acme["total_calls"]) == (2, 3)
+        assert (acme["amc_revenue"], acme["total_cost"], acme["profit_loss"]) == (10000, 3350, 6650)
+        assert acme["margin_pct"] == 66.5
+        assert companies[None] == {"company_id": None, "company_name": "Unknown", "devices": 1, "total_calls": 0,
+                                   "amc_revenue": 0, "total_cost": 0, "profit_loss": 0, "margin_pct": 0}
+        assert self.report["summary"] == {
+            "total_devices": 3, "devices_with_calls": 2,
+            "total_amc_revenue": 10000, "total_service_cost": 3350, "net_profit_loss": 6650,
+            "overall_margin_pct": 66.5, "profitable_devices": 1, "loss_making_devices": 1,
+            "total_remote_calls": 2, "total_onsite_calls": 2,
+        }
+
+    def test_empty_org(self):
+        empty = {name: frame(fields) for name, fields in (
+            ("devices", p.DEVICE_FIELDS), ("tickets", p.TICKET_FIELDS), ("visits", p.VISIT_FIELDS),
+            ("engineers", p.ENGINEER_FIELDS), ("contracts", p.CONTRACT_FIELDS),
+            ("assignments", p.ASSIGNMENT_FIELDS), ("part_requests", p.PART_REQUEST_FIELDS),
+            ("part_issues", p.PART_ISSUE_FIELDS), ("companies", p.COMPANY_FIELDS),
+        )}
+        report = p.compute_profitability(empty, TIERS)
+        assert report["devices"] == [] and report["summary"]["total_devices"] == 0
+        assert report["summary"]["overall_margin_pct"] == 0
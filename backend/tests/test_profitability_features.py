@@ -241,6 +241,21 @@ class TestProfitabilityBackend:
         else:
             print("No devices with calls found - structure check skipped")
     
+    def test_profitability_pagination(self):
+        """GET /api/analytics/profitability?page=&limit= - pages of the full device list"""
+        full = self.session.get(f"{BASE_URL}/api/analytics/profitability").json()
+        resp = self.session.get(f"{BASE_URL}/api/analytics/profitability", params={"page": 1, "limit": 2})
+        assert resp.status_code == 200, f"Paginated fetch failed: {resp.status_code} {resp.text}"
+        
+        data = resp.json()
+        pagination = data["pagination"]
+        assert pagination["page"] == 1 and pagination["limit"] == 2
+        assert pagination["total"] == len(full["devices"])
+        assert [d["device_id"] for d in data["devices"]] == [d["device_id"] for d in full["devices"][:2]]
+        assert data["summary"] == full["summary"], "Summary should cover all devices, not the page"
+        
+        print(f"Pagination verified: {pagination}")
+    
     def test_profitability_company_rollup(self):
         """Verify company-level profitability rollup"""
         resp = self.session.get(f"{BASE_URL}/api/analytics/profitability")
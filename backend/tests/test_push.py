@@ -0,0 +1,150 @@
+"""
+Push Channel Tests
+Server-sent event streams and the in-process broker (services/push.py):
+- Audience matching by organization, admin flag and user ids
+- Ticket transitions: only pushable field changes, old and new assignee
+- Bounded queues: a slow stream drops its backlog for one resync
+- Resume from Last-Event-ID within history; resync beyond it
+- Heartbeat comments while idle
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.push import (  # noqa: E402
+    MemoryBroker, Subscription, audience_matches, event_stream, format_sse, ticket_transition,
+)
+
+
+def event(n=0, org="o1", admins=True, user_ids=()):
+    return {"type": "notification", "organization_id": org, "admins": admins,
+            "user_ids": list(user_ids), "data": {"n": n}}
+
+
+class FakeRequest:
+    """Disconnects after `frames` checks"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    async def is_disconnected(self):
+        self.frames -= 1
+        return self.frames < 0
+
+
+async def collect(stream):
+    return [frame async for frame in stream]
+
+
+def frames_data(frames):
+    return [json.loads(f.split("data: ", 1)[1]) for f in frames if "data: " in f]
+
+
+class TestAudience:
+    def test_matches(self):
+        assert audience_matches(event(), "o1", is_admin=True)
+        assert not audience_matches(event(), "o2", is_admin=True)
+        assert not audience_matches(event(), "o1", ["e1"])
+        assert audience_matches(event(admins=False, user_ids=["e1"]), "o1", ["e0", "e1"])
+        assert not audience_matches(event(admins=False, user_ids=["e1"]), "o1", is_admin=True)
+        assert not audience_matches(event(), None, is_admin=True)
+
+
+class TestTicketTransition:
+    def test_changes_only(self):
+        before = {"organization_id": "o1", "is_open": True, "assigned_to_id": "e1", "created_at": "x"}
+        after = {**before, "assigned_to_id": "e2", "assignment_status": "pending", "created_at": "y"}
+        assert ticket_transition("t1", before, after) == {
+            "ticket_id": "t1", "action": "updated",
+            "changes": {"assigned_to_id": "e2", "assignment_status": "pending"},
+        }
+        assert ticket_transition("t1", before, {**before, "created_at": "z"}) is None
+
+    def test_created_and_removed(self):
+        ticket = {"organization_id": "o1", "is_open": True}
+        assert ticket_transition("t1", None, ticket)["action"] == "created"
+        assert ticket_transition("t1", ticket, None)["action"] == "removed"
+
+
+class TestBroker:
+    def test_fan_out_and_backpressure(self):
+        async def run():
+            broker = MemoryBroker()
+            fast = Subscription(lambda e: True, size=10)
+            slow = Subscription(lambda e: True, size=2)
+            other = Subscription(lambda e: e["organization_id"] == "o2", size=10)
+            for sub in (fast, slow, other):
+                broker.subscribe(sub)
+            for n in range(4):
+                await broker.publish(event(n))
+            assert fast.queue.qsize() == 4 and other.queue.qsize() == 0
+            # The slow stream overflowed: backlog dropped, one resync queued, later events skipped
+            assert slow.lagged and slow.queue.qsize() == 1
+            assert (await slow.next(0.1))["type"] == "resync" and not slow.lagged
+            await broker.publish(event(4))
+            assert (await slow.next(0.1))["data"] == {"n": 4}
+            assert await slow.next(0.01) is None
+            broker.unsubscribe(fast)
+            await broker.publish(event(5))
+            assert fast.queue.qsize() == 5  # events 0-4, not 5
+        asyncio.run(run())
+
+    def test_replay(self):
+        async def run():
+            broker = MemoryBroker(history_size=3)
+            published = [await broker.publish(event(n)) for n in range(5)]
+            assert [e["data"]["n"] for e in await broker.replay(published[2]["id"])] == [3, 4]
+            assert [e["data"]["n"] for e in await broker.replay(published[1]["id"])] == [2, 3, 4]
+            assert await broker.replay(published[4]["id"]) == []
+            assert await broker.replay(published[0]["id"]) is None  # fell out of history
+            assert await broker.replay("otherepoch-3") is None
+            assert await broker.replay("garbage") is None
+        asyncio.run(run())
+
+
+class TestEventStream:
+    def test_format(self):
+        frame = format_sse({"id": "a-1", "type": "ticket", "data": {"ticket_id": "t1"}, "admins": True})
+        assert frame.startswith("id: a-1\nevent: ticket\ndata: ") and frame.endswith("\n\n")
+        assert json.loads(frame.split("data: ", 1)[1]) == {"id": "a-1", "type": "ticket", "data": {"ticket_id": "t1"}}
+
+    def test_resume_and_heartbeat(self):
+        async def run():
+            broker = MemoryBroker()
+            first = await broker.publish(event(0))
+            await broker.publish(event(1, org="o2"))
+            await broker.publish(event(2))
+            frames = await collect(event_stream(
+                FakeRequest(frames=1), broker, lambda e: e["organization_id"] == "o1",
+                last_event_id=first["id"], heartbeat=0.01,
+            ))
+            assert frames[0].startswith("retry: ")
+            assert [d["data"]["n"] for d in frames_data(frames)] == [2]
+            assert frames[-1] == ": ping\n\n"
+            assert not broker.subscribers
+        asyncio.run(run())
+
+    def test_resync_when_history_lost(self):
+        async def run():
+            broker = MemoryBroker()
+            latest = await broker.publish(event(0))
+            frames = await collect(event_stream(FakeRequest(frames=0), broker, lambda e: True,
+                                                last_event_id="stale-9"))
+            assert frames_data(frames) == [{"id": latest["id"], "type": "resync"}]
+        asyncio.run(run())
+
+    def test_live_events(self):
+        async def run():
+            broker = MemoryBroker()
+            stream = event_stream(FakeRequest(frames=2), broker, lambda e: True, heartbeat=1)
+            assert (await stream.__anext__()).startswith("retry: ")
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            await broker.publish(event(7))
+            assert frames_data([await pending])[0]["data"] == {"n": 7}
+            await stream.aclose()
+            assert not broker.subscribers
+        asyncio.run(run())
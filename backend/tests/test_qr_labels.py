@@ -0,0 +1,104 @@
+"""
+QR Label Tests
+Bulk QR label sheets (utils/label_sheet.py, services/qr_labels.py):
+- The incremental writer produces a well-formed PDF page by page
+- Labels are laid out 4 x 5 with the footer on the last page only
+- The label query is tenant-scoped and PNGs render in worker processes
+"""
+import asyncio
+import os
+import re
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.label_sheet import LabelSheetWriter, LABELS_PER_PAGE, render_qr_png, page_content  # noqa: E402
+from services.qr_labels import LabelRenderer, label_query, cache_key  # noqa: E402
+from services.render_pool import RenderPool  # noqa: E402
+from services.jobs import public_job  # noqa: E402
+
+PNG = render_qr_png("https://portal.example.com/device/SN0001")
+
+
+def labels(n):
+    return [(PNG, f"SN{i:04d}", f"AT-{i}" if i % 2 else None) for i in range(n)]
+
+
+def build(n):
+    writer = LabelSheetWriter()
+    chunks = [writer.header()]
+    items = labels(n)
+    for start in range(0, n, LABELS_PER_PAGE):
+        last = start + LABELS_PER_PAGE >= n
+        chunks.append(writer.page(items[start:start + LABELS_PER_PAGE], "Generated: today" if last else None))
+    chunks.append(writer.finish())
+    return b"".join(chunks)
+
+
+class TestLabelSheetWriter:
+    def test_xref_offsets_point_at_objects(self):
+        pdf = build(45)
+
+        xref_at = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+        assert pdf[xref_at:].startswith(b"xref\n0 ")
+        size = int(re.search(rb"/Size (\d+)", pdf).group(1))
+        entries = pdf[xref_at:].split(b"\n")[3:3 + size - 1]
+        for obj_id, entry in enumerate(entries, start=1):
+            offset = int(entry[:10])
+            assert pdf[offset:].startswith(b"%d 0 obj\n" % obj_id)
+
+    def test_pages_and_images(self):
+        pdf = build(45)
+
+        assert b"/Count 3" in pdf
+        assert pdf.count(b"/Type /Page ") == 3
+        assert pdf.count(b"/Subtype /Image") == 45
+
+    def test_layout_and_footer(self):
+        content = page_content(labels(20), footer="Generated: today")
+
+        assert content.count(b" Do Q") == 20
+        assert content.count(b"(S/N: SN") == 20
+        assert content.count(b"(Tag: AT-") == 10
+        assert b"(Generated: today)" in content
+        assert b"Generated" not in page_content(labels(20))
+
+    def test_text_is_escaped(self):
+        content = page_content([(PNG, "A(1)\\B", None)])
+        assert b"(S/N: A\\(1\\)\\\\B)" in content
+
+    def test_content_is_compressed(self):
+        pdf = build(1)
+        stream = re.search(rb"<< /Filter /FlateDecode /Length (\d+) >>\nstream\n", pdf)
+        body = pdf[stream.end():stream.end() + int(stream.group(1))]
+        assert b"/Im0 Do" in zlib.decompress(body)
+
+
+class TestLabelService:
+    def test_label_query_is_scoped(self):
+        assert label_query("org-1", ["d1"], "s1") == {
+            "is_deleted": {"$ne": True}, "id": {"$in": ["d1"]}, "organization_id": "org-1"
+        }
+        assert label_query("org-1", site_id="s1")["site_id"] == "s1"
+        assert label_query("org-1", company_id="c1")["company_id"] == "c1"
+
+    def test_cache_key_is_per_url(self):
+        assert cache_key("https://a/device/1") != cache_key("https://b/device/1")
+        assert len(cache_key("x")) == 64
+
+    def test_render_in_worker_processes(self):
+        pool = RenderPool(processes=2)
+        urls = [f"https://portal.example.com/device/SN{i:04d}" for i in range(5)]
+        try:
+            pngs = asyncio.run(LabelRenderer(pool).render(urls))
+        finally:
+            pool.shutdown()
+
+        assert len(pngs) == 5 and pngs[1] == render_qr_png(urls[1])
+        assert all(png.startswith(b"\x89PNG") for png in pngs)
+
+    def test_public_job_hides_storage_fields(self):
+        job = public_job({"_id": 1, "id": "j1", "purge_at": 2, "heartbeat_at": 3,
+                          "artifact": {"file_id": 4, "filename": "x.pdf", "size": 10}})
+        assert job == {"id": "j1", "artifact": {"filename": "x.pdf", "size": 10}}
@@ -0,0 +1,70 @@
+"""
+Search Index Tests
+Entry construction in services/search_index.py:
+- Words are indexed with their prefixes, identifiers with their infixes
+- Synonyms and brand aliases are expanded at index time
+- Deleted entities are not indexed
+- Queries tokenize the same way entries do
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search_index import build_entry, query_words, search_pipeline, MAX_GRAM  # noqa: E402
+
+DEVICE = {
+    "id": "d1", "organization_id": "org-1", "brand": "HP", "model": "ProBook 450",
+    "serial_number": "5CD-1234XYZ", "asset_tag": "AT-0042", "device_type": "IP Camera",
+    "location": "Floor 3", "company_id": "c1", "notes": None,
+}
+
+
+def matches(entry, q):
+    return all(word in entry["terms"] for word in query_words(q))
+
+
+class TestBuildEntry:
+    def test_prefix_and_infix_terms(self):
+        entry = build_entry("devices", DEVICE)
+
+        assert entry["key"] == "devices:d1" and entry["organization_id"] == "org-1"
+        assert matches(entry, "prob") and matches(entry, "ProBook 450")
+        assert matches(entry, "1234x")          # infix of the serial number
+        assert matches(entry, "5cd-1234")
+        assert matches(entry, "0042")
+        assert not matches(entry, "robook")     # plain words only match by prefix
+        assert entry["doc"] == {"id": "d1", "brand": "HP", "model": "ProBook 450", "serial_number": "5CD-1234XYZ",
+                                "asset_tag": "AT-0042", "company_id": "c1"}
+
+    def test_synonyms_and_brand_aliases(self):
+        entry = build_entry("devices", DEVICE)
+
+        assert matches(entry, "surveillance") and matches(entry, "cctv")
+        assert matches(entry, "hewlett packard")
+        assert "hp" in entry["title_words"] and "probook" in entry["title_words"]
+
+    def test_nested_deployment_items(self):
+        entry = build_entry("deployments", {
+            "id": "dep1", "name": "Phase One", "site_id": "s1",
+            "items": [{"category": "Laptop", "brand": "Dell", "serial_numbers": ["ABC123", "ABC124"]}],
+        })
+
+        assert matches(entry, "abc124") and matches(entry, "notebook") and matches(entry, "dell")
+        assert entry["doc"]["item_count"] == 1
+
+    def test_deleted_entities_are_not_indexed(self):
+        assert build_entry("users", {"id": "u1", "name": "Ann", "is_deleted": True}) is None
+        assert build_entry("users", {"name": "No id"}) is None
+
+
+class TestQuery:
+    def test_query_words(self):
+        assert query_words("  Dell  dell LATITUDE-5420 ") == ["dell", "latitude", "5420"]
+        assert query_words("x" * 40) == ["x" * MAX_GRAM]
+        assert query_words("--") == []
+
+    def test_pipeline_is_scoped_and_grouped(self):
+        pipeline = search_pipeline("org-1", ["dell"], 5)
+        assert pipeline[0] == {"$match": {"organization_id": "org-1", "terms": {"$all": ["dell"]}}}
+        assert pipeline[-1] == {"$project": {"hits": {"$slice": ["$hits", 5]}}}
@@ -0,0 +1,356 @@
+"""
+SLA Scheduler Tests
+Deadlines and the due-queue of the SLA scheduler (services/sla_timers.py,
+services/sla_scheduler.py), driven by a fake clock:
+- Which timers a ticket has (acceptance, response, resolution)
+- SLA policy deadlines with priority multipliers
+- Heap ordering, moved and discarded keys
+- Breach actions only match tickets that still have the deadline
+- Sleep until the next due timer, capped at the poll interval
+- Ticks against an in-memory db: firing at the due time, retries, and a
+  lease handover that never fires a timer twice
+- The first staff reply stamps first_response_at once, ending the response SLA
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+from config import IST  # noqa: E402
+from services import sla_scheduler as scheduler_module  # noqa: E402
+from services import ticket_rollups  # noqa: E402
+from services.sla_timers import ACCEPTANCE, RESOLUTION, RESPONSE, sla_deadlines, ticket_timers  # noqa: E402
+from services.sla_scheduler import DueQueue, SlaScheduler, breach_action, iso  # noqa: E402
+
+T0 = datetime(2026, 3, 2, 10, 0, tzinfo=IST)
+
+
+class FakeClock:
+    """Time moves only when a test (or a sleep) moves it"""
+
+    def __init__(self, now=T0):
+        self.current = now
+        self.sleeps = []
+
+    def now(self):
+        return self.current
+
+    def advance(self, **delta):
+        self.current += timedelta(**delta)
+
+    async def sleep(self, seconds, wake):
+        self.sleeps.append(seconds)
+        self.advance(seconds=seconds)
+
+
+def matches(doc, query):
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = doc.get(field)
+            if "$lt" in cond and not (value is not None and value < cond["$lt"]):
+                return False
+            if "$lte" in cond and not (value is not None and value <= cond["$lte"]):
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+def apply(doc, update):
+    doc.update(update.get("$set", {}))
+    for field, n in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + n
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """The few collection methods the scheduler uses; `unique` mimics a unique index on one field"""
+
+    def __init__(self, docs=(), unique=None):
+        self.docs = [dict(d) for d in docs]
+        self.unique = unique
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.docs if matches(d, query)])
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        for doc in self.docs:
+            if matches(doc, query):
+                apply(doc, update)
+                return dict(doc)
+        if not upsert:
+            return None
+        if self.unique and any(d.get(self.unique) == query.get(self.unique) for d in self.docs):
+            raise DuplicateKeyError("E11000 duplicate key")
+        doc = {k: v for k, v in query.items() if not k.startswith("$")}
+        apply(doc, update)
+        self.docs.append(doc)
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                apply(doc, update)
+                return
+
+
+class FakeTickets(FakeCollection):
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                apply(doc, update)
+                return type("Result", (), {"modified_count": 1})()
+        return type("Result", (), {"modified_count": 0})()
+
+
+class FakeDb:
+    def __init__(self, timers=()):
+        self.scheduler_leases = FakeCollection(unique="name")
+        self.sla_timers = FakeCollection(timers)
+
+    def timer(self, key):
+        return next(d for d in self.sla_timers.docs if d["key"] == key)
+
+
+def timer_doc(key, due):
+    return {"key": key, "ticket_id": key.split(":")[0], "kind": RESOLUTION, "ref": iso(due),
+            "due_at": iso(due), "fired_at": None}
+
+
+def fake_db(monkeypatch, *timers, fail=()):
+    """Swap in an in-memory db and a fire_timer that records (key, fired_by); keys in `fail` raise once"""
+    fake = FakeDb(timers)
+    fake.fired = []
+    failing = set(fail)
+
+    async def fire_timer(timer):
+        if timer["key"] in failing:
+            failing.discard(timer["key"])
+            raise RuntimeError("ticket write failed")
+        fake.fired.append((timer["key"], timer["fired_by"]))
+        return True
+
+    monkeypatch.setattr(scheduler_module, "db", fake)
+    monkeypatch.setattr(scheduler_module, "fire_timer", fire_timer)
+    return fake
+
+
+def ticket(**fields):
+    return {"id": "t1", "organization_id": "o1", "is_open": True, **fields}
+
+
+class TestTicketTimers:
+    def test_pending_assignment(self):
+        timers = ticket_timers(ticket(assignment_status="pending", assigned_at="2026-03-02T10:00:00+05:30"))
+        assert timers == [{"key": "t1:acceptance", "kind": ACCEPTANCE,
+                           "due_at": "2026-03-02T14:00:00+05:30", "ref": "2026-03-02T10:00:00+05:30"}]
+
+    def test_sla_deadlines_normalized_to_ist(self):
+        timers = ticket_timers(ticket(response_due_at="2026-03-02T06:00:00+00:00",
+                                      resolution_due_at="2026-03-03T10:00:00.123456"))
+        assert [(t["kind"], t["due_at"]) for t in timers] == [
+            (RESPONSE, "2026-03-02T11:30:00+05:30"), (RESOLUTION, "2026-03-03T10:00:00+05:30"),
+        ]
+
+    def test_met_or_closed(self):
+        responded = ticket(response_due_at="2026-03-02T12:00:00", first_response_at="2026-03-02T11:00:00")
+        assert ticket_timers(responded) == []
+        assert ticket_timers(ticket(assignment_status="accepted", assigned_at="2026-03-02T10:00:00")) == []
+        assert ticket_timers(ticket(is_open=False, resolution_due_at="2026-03-03T10:00:00")) == []
+        assert ticket_timers(ticket(is_deleted=True, resolution_due_at="2026-03-03T10:00:00")) == []
+        assert ticket_timers(ticket(resolution_due_at="not a date")) == []
+        assert ticket_timers(None) == []
+
+
+class TestSlaDeadlines:
+    def test_priority_multiplier(self):
+        policy = {"id": "p1", "response_time_hours": 4, "resolution_time_hours": 24,
+                  "priority_multipliers": {"high": 0.5, "medium": 1.0}}
+        assert sla_deadlines(policy, "High", T0) == {
+            "sla_policy_id": "p1",
+            "response_due_at": "2026-03-02T12:00:00+05:30",
+            "resolution_due_at": "2026-03-02T22:00:00+05:30",
+        }
+        assert sla_deadlines(policy, "unknown", T0)["response_due_at"] == "2026-03-02T14:00:00+05:30"
+
+    def test_no_policy(self):
+        assert sla_deadlines(None, "high", T0) == {}
+
+
+class TestDueQueue:
+    def test_order_and_pop_due(self):
+        queue = DueQueue()
+        queue.push("b", "2026-03-02T11:00:00+05:30")
+        queue.push("a", "2026-03-02T10:30:00+05:30")
+        queue.push("c", "2026-03-02T12:00:00+05:30")
+        assert queue.peek() == "2026-03-02T10:30:00+05:30"
+        assert queue.pop_due("2026-03-02T11:00:00+05:30") == [
+            ("2026-03-02T10:30:00+05:30", "a"), ("2026-03-02T11:00:00+05:30", "b"),
+        ]
+        assert len(queue) == 1 and queue.pop_due("2026-03-02T11:59:59+05:30") == []
+
+    def test_moved_and_discarded(self):
+        queue = DueQueue()
+        queue.push("a", "2026-03-02T10:00:00+05:30")
+        queue.push("a", "2026-03-02T13:00:00+05:30")  # deadline moved later
+        queue.push("b", "2026-03-02T11:00:00+05:30")
+        queue.discard("b")
+        assert len(queue) == 1
+        assert queue.pop_due("2026-03-02T12:00:00+05:30") == []
+        assert queue.peek() == "2026-03-02T13:00:00+05:30"
+        queue.push("b", "2026-03-02T11:00:00+05:30")
+        assert [key for _, key in queue.pop_due("2026-03-02T23:00:00+05:30")] == ["b", "a"]
+        assert queue.peek() is None
+
+
+class TestBreachAction:
+    def test_acceptance(self):
+        action = breach_action({"ticket_id": "t1", "kind": ACCEPTANCE, "ref": "2026-03-02T10:00:00",
+                                "due_at": "2026-03-02T14:00:00+05:30"})
+        assert action["filter"]["assignment_status"] == "pending"
+        assert action["filter"]["assigned_at"] == "2026-03-02T10:00:00"
+        assert action["set"] == {"is_escalated": True}
+        assert action["event"]["type"] == action["notification"]["notif_type"] == "assignment_escalated"
+
+    def test_response_and_resolution(self):
+        timer = {"ticket_id": "t1", "ref": "2026-03-02T12:00:00", "due_at": "2026-03-02T12:00:00+05:30"}
+        response = breach_action({**timer, "kind": RESPONSE})
+        assert response["filter"]["first_response_at"] is None
+        assert response["filter"]["response_due_at"] == timer["ref"]
+        resolution = breach_action({**timer, "kind": RESOLUTION})
+        assert resolution["filter"]["is_open"] is True
+        assert resolution["set"] == {"sla_breached": True, "is_overdue": True, "is_escalated": True}
+        assert breach_action({**timer, "kind": "other"}) is None
+
+
+class TestSchedulerClock:
+    def test_wait_until_next_due(self):
+        clock = FakeClock()
+        scheduler = SlaScheduler(clock=clock, poll_seconds=30)
+        assert scheduler.wait_seconds(clock.now()) == 30
+        scheduler.queue.push("t1:response", iso(T0 + timedelta(seconds=12)))
+        assert scheduler.wait_seconds(clock.now()) == 12
+        clock.advance(seconds=20)
+        assert scheduler.wait_seconds(clock.now()) == 0
+        scheduler.queue.clear()
+        scheduler.queue.push("t1:resolution", iso(T0 + timedelta(hours=1)))
+        assert scheduler.wait_seconds(clock.now()) == 30
+
+    def test_notify_only_inside_loaded_window(self):
+        clock = FakeClock()
+        scheduler = SlaScheduler(clock=clock, poll_seconds=30)
+        timer = {"key": "t1:acceptance", "due_at": iso(T0 + timedelta(seconds=5)), "fired_at": None}
+        scheduler.notify(timer)  # not the leader
+        assert len(scheduler.queue) == 0
+        scheduler.is_leader, scheduler.loaded_until = True, iso(T0 + timedelta(seconds=30))
+        scheduler.notify(timer)
+        scheduler.notify({**timer, "key": "t2:acceptance", "due_at": iso(T0 + timedelta(minutes=5))})
+        assert len(scheduler.queue) == 1 and scheduler._wake.is_set()
+
+
+
+class TestSchedulerTicks:
+    def test_fires_once_at_due_time(self, monkeypatch):
+        fake = fake_db(monkeypatch, timer_doc("t1:resolution", T0 + timedelta(seconds=45)))
+
+        async def run():
+            clock = FakeClock()
+            scheduler = SlaScheduler(clock=clock, poll_seconds=30)
+            assert await scheduler.run_once() == 0
+            assert len(scheduler.queue) == 0  # due after the loaded window
+            clock.advance(seconds=30)
+            assert await scheduler.run_once() == 0
+            assert len(scheduler.queue) == 1 and scheduler.wait_seconds(clock.now()) == 15
+            await clock.sleep(scheduler.wait_seconds(clock.now()), scheduler._wake)
+            assert await scheduler.run_once() == 1
+            assert fake.fired == [("t1:resolution", scheduler.owner)]
+            assert fake.timer("t1:resolution")["fired_at"] == iso(T0 + timedelta(seconds=45))
+            clock.advance(seconds=30)
+            assert await scheduler.run_once() == 0 and len(fake.fired) == 1
+            assert fake.scheduler_leases.docs[0]["fired_total"] == 1
+        asyncio.run(run())
+
+    def test_failed_breach_is_retried(self, monkeypatch):
+        fake = fake_db(monkeypatch, timer_doc("t1:response", T0), fail=["t1:response"])
+
+        async def run():
+            clock = FakeClock()
+            scheduler = SlaScheduler(clock=clock, poll_seconds=30)
+            assert await scheduler.run_once() == 0
+            timer = fake.timer("t1:response")
+            assert timer["fired_at"] is None and timer["attempts"] == 1
+            clock.advance(seconds=30)
+            assert await scheduler.run_once() == 1 and [k for k, _ in fake.fired] == ["t1:response"]
+        asyncio.run(run())
+
+    def test_lease_handover_fires_each_timer_once(self, monkeypatch):
+        fake = fake_db(monkeypatch, timer_doc("t1:resolution", T0 + timedelta(seconds=10)),
+                       timer_doc("t2:resolution", T0 + timedelta(seconds=20)))
+
+        async def run():
+            clock = FakeClock()
+            a = SlaScheduler(clock=clock, poll_seconds=30, lease_seconds=90)
+            b = SlaScheduler(clock=clock, poll_seconds=30, lease_seconds=90)
+            assert await a.run_once() == 0 and len(a.queue) == 2
+            assert await b.run_once() is None and not b.is_leader  # lease held by a
+            clock.advance(seconds=10)
+            assert await a.run_once() == 1
+
+            # a stalls with t2 still in its heap; its lease lapses and b takes over
+            clock.advance(seconds=91)  # renewed at +10s for 90s
+            assert await b.run_once() == 1 and b.is_leader
+            assert fake.scheduler_leases.docs[0]["owner"] == b.owner
+            assert fake.fired == [("t1:resolution", a.owner), ("t2:resolution", b.owner)]
+
+            # a's stale entry can no longer be claimed, and a's next tick stands down
+            assert await a._claim("t2:resolution", iso(T0 + timedelta(seconds=20)), clock.now()) is None
+            assert await a.run_once() is None and len(a.queue) == 0 and a.loaded_until is None
+            assert len(fake.fired) == 2
+
+            # A clean stop hands the lease over without waiting for it to lapse
+            await b.stop()
+            clock.advance(seconds=1)
+            assert await a.run_once() == 0 and a.is_leader
+        asyncio.run(run())
+
+
+class TestFirstResponse:
+    def test_first_staff_reply_ends_response_sla(self, monkeypatch):
+        tickets = FakeTickets([ticket(response_due_at="2026-03-02T12:00:00+05:30", first_response_at=None)])
+        synced = []
+
+        async def sync_ticket_rollup(ticket_id):
+            synced.append(ticket_id)
+
+        monkeypatch.setattr(ticket_rollups, "db", type("Db", (), {"tickets_v2": tickets})())
+        monkeypatch.setattr(ticket_rollups, "sync_ticket_rollup", sync_ticket_rollup)
+
+        async def run():
+            assert [t["kind"] for t in ticket_timers(tickets.docs[0])] == [RESPONSE]
+            assert await ticket_rollups.record_first_response("t1", "2026-03-02T11:00:00+05:30") is True
+            assert await ticket_rollups.record_first_response("t1", "2026-03-02T11:30:00+05:30") is False
+            assert tickets.docs[0]["first_response_at"] == "2026-03-02T11:00:00+05:30"
+            assert synced == ["t1"] and ticket_timers(tickets.docs[0]) == []
+        asyncio.run(run())
@@ -0,0 +1,69 @@
+"""
+Synonym Matcher Tests
+Compiled matchers in utils/synonyms.py:
+- Device types resolve to one canonical device_category
+- Queries resolve to categories without per-call regex construction
+- The phrase automaton finds every synonym in a text in one pass
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.synonyms import (  # noqa: E402
+    PhraseMatcher, device_category, query_categories, device_type_filter,
+    get_synonym_terms, build_synonym_regex, get_brand_variants, synonym_index_words
+)
+from utils.helpers import lookup_key_fields  # noqa: E402
+
+
+class TestDeviceCategory:
+    def test_exact_and_contained_synonyms(self):
+        assert device_category("IP Camera") == "cctv"
+        assert device_category("laser printer") == "printer"
+        assert device_category("Dell Latitude Laptop") == "laptop"
+        assert device_category("Hewlett-Packard LaserJet") == "printer"
+
+    def test_most_specific_phrase_wins(self):
+        assert device_category("All-in-One PC") == "desktop"
+        assert device_category("Inverter AC") == "ac"
+
+    def test_unknown(self):
+        assert device_category("Coffee Machine") is None
+        assert device_category(None) is None
+
+    def test_written_with_device_type(self):
+        assert lookup_key_fields({"device_type": "NVR"}) == {"device_category": "nvr"}
+        assert lookup_key_fields({"brand": "Dell"}) == {}
+
+
+class TestQueries:
+    def test_exact_term_is_one_category(self):
+        assert query_categories("Laptop") == {"laptop"}
+        assert device_type_filter("notebook") == {"device_category": {"$in": ["laptop"]}}
+
+    def test_partial_query(self):
+        assert {"cctv", "nvr"} <= query_categories("surveill")
+
+    def test_unknown_query_falls_back_to_escaped_regex(self):
+        assert device_type_filter("x+y") == {"device_type": {"$regex": r"x\+y", "$options": "i"}}
+        assert get_synonym_terms("zzz") == ["zzz"]
+
+    def test_regex_is_escaped(self):
+        assert "m\\.2\\ ssd" in build_synonym_regex("ssd")
+
+    def test_brand_variants(self):
+        assert get_brand_variants("Hewlett Packard") == ["hp", "hewlett packard", "hewlett-packard"]
+        assert get_brand_variants("Acme") == ["Acme"]
+
+
+class TestPhraseMatcher:
+    def test_overlapping_phrases(self):
+        matcher = PhraseMatcher({"ip": "a", "ip camera": "b", "camera": "c", "camera system": "d"})
+        assert matcher.values("Outdoor IP camera system") == {"a", "b", "c", "d"}
+        assert matcher.best("Outdoor IP camera") == "b"
+        assert matcher.values("ipcamera") == set()
+
+    def test_index_words(self):
+        words = synonym_index_words("Security camera, 8 channel")
+        assert "cctv" in words and "surveillance" in words
@@ -0,0 +1,90 @@
+"""
+Tenant Resolution Cache Tests
+Slug → organization lookups (middleware/tenant.py) against a stubbed db:
+- Known slugs are read from MongoDB once, then served from the cache
+- Unknown slugs are negatively cached: one DB call, then negative hits
+- Negative entries expire after the shorter negative TTL
+- invalidate_tenant drops a negative entry once the slug is created
+- Callers get a copy: changing it leaves the cached organization intact
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import tenant  # noqa: E402
+from utils.ttl_cache import TTLCache  # noqa: E402
+
+
+class FakeOrganizations:
+    def __init__(self, orgs):
+        self.orgs = {org["slug"]: org for org in orgs}
+        self.calls = 0
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        return self.orgs.get(query["slug"])
+
+
+class FakeDb:
+    def __init__(self, orgs=()):
+        self.organizations = FakeOrganizations(orgs)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def setup(monkeypatch, orgs=()):
+    clock = FakeClock()
+    cache = TTLCache(max_size=16, ttl=60, negative_ttl=10, clock=clock)
+    fake_db = FakeDb(orgs)
+    monkeypatch.setattr(tenant, "_tenant_cache", cache)
+    monkeypatch.setattr(tenant, "db", fake_db)
+    return fake_db.organizations, cache, clock
+
+
+def resolve(slug):
+    return asyncio.run(tenant.resolve_tenant_from_slug(slug))
+
+
+class TestTenantCache:
+    def test_known_slug_cached(self, monkeypatch):
+        organizations, cache, _ = setup(monkeypatch, [{"id": "o1", "slug": "acme"}])
+        assert resolve("acme")["id"] == "o1"
+        assert resolve("ACME")["id"] == "o1"
+        assert organizations.calls == 1 and cache.hits == 1 and cache.negative_hits == 0
+
+    def test_unknown_slug_negatively_cached(self, monkeypatch):
+        organizations, cache, clock = setup(monkeypatch)
+        for _ in range(4):
+            assert resolve("no-such-tenant") is None
+        assert organizations.calls == 1
+        assert cache.negative_hits == 3 and cache.misses == 1
+
+        clock.now += 11  # past the negative TTL
+        assert resolve("no-such-tenant") is None
+        assert organizations.calls == 2
+
+    def test_invalidate_clears_negative_entry(self, monkeypatch):
+        organizations, _, _ = setup(monkeypatch)
+        assert resolve("newco") is None
+        organizations.orgs["newco"] = {"id": "o2", "slug": "newco"}
+        assert resolve("newco") is None  # still negatively cached
+        assert tenant.invalidate_tenant(slug="newco") == 1
+        assert resolve("newco")["id"] == "o2"
+        assert organizations.calls == 2
+
+    def test_returns_copy_of_cached_org(self, monkeypatch):
+        setup(monkeypatch, [{"id": "o1", "slug": "acme", "settings": {"theme": "dark"}}])
+        first = resolve("acme")
+        first["status"] = "suspended"
+        first["settings"]["theme"] = "light"
+        second = resolve("acme")
+        assert second == {"id": "o1", "slug": "acme", "settings": {"theme": "dark"}}
+        assert second is not first
@@ -0,0 +1,90 @@
+"""
+Tenant Counter Tests
+Materialized dashboard counters (services/tenant_counters.py):
+- What a document contributes to its org / company counter documents
+- Deltas for create, soft delete, date changes and ticket status changes
+- Date histograms summed over a range at read time
+- Reconciliation pipeline and document layout
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tenant_counters import (  # noqa: E402
+    COUNTED, contributions, delta, bucket_of, count_between, _pipeline, _nest,
+)
+
+DEVICE = {"organization_id": "o1", "company_id": "c1", "warranty_end_date": "2026-03-31", "is_deleted": False}
+
+
+class TestContributions:
+    def test_device_counts_on_org_and_company(self):
+        assert contributions("devices", DEVICE) == {
+            "org:o1": {"devices": 1, "warranty_end.2026-03-31": 1},
+            "company:c1": {"devices": 1, "warranty_end.2026-03-31": 1},
+        }
+
+    def test_org_only_collections(self):
+        assert contributions("parts", {"organization_id": "o1", "company_id": "c1"}) == {"org:o1": {"parts": 1}}
+
+    def test_deleted_and_unmatched_count_nothing(self):
+        assert contributions("devices", {**DEVICE, "is_deleted": True}) == {}
+        assert contributions("tickets_v2", {"organization_id": "o1", "company_id": "c1", "is_open": False}) == {}
+        assert contributions("devices", None) == {}
+
+    def test_buckets(self):
+        assert bucket_of("2026-03-31T10:00:00+05:30", 10) == "2026-03-31"
+        assert bucket_of("2026-03-31T10:00:00", 7) == "2026-03"
+        assert bucket_of("N/A", 10) is None
+        assert bucket_of(None, 10) is None
+        assert contributions("devices", {**DEVICE, "warranty_end_date": ""}) == {
+            "org:o1": {"devices": 1}, "company:c1": {"devices": 1},
+        }
+
+
+class TestDelta:
+    def test_insert_and_delete_cancel(self):
+        assert delta("devices", [(None, DEVICE)])["org:o1"]["devices"] == 1
+        assert delta("devices", [(DEVICE, {**DEVICE, "is_deleted": True})])["company:c1"] == {
+            "devices": -1, "warranty_end.2026-03-31": -1,
+        }
+        assert delta("devices", [(None, DEVICE), (DEVICE, None)]) == {}
+
+    def test_warranty_date_change_moves_bucket(self):
+        moved = delta("devices", [(DEVICE, {**DEVICE, "warranty_end_date": "2027-03-31"})])
+        assert moved["org:o1"] == {"warranty_end.2026-03-31": -1, "warranty_end.2027-03-31": 1}
+
+    def test_ticket_close_and_company_move(self):
+        ticket = {"organization_id": "o1", "company_id": "c1", "is_open": True}
+        assert delta("tickets_v2", [(ticket, {**ticket, "is_open": False})]) == {
+            "org:o1": {"open_tickets": -1}, "company:c1": {"open_tickets": -1},
+        }
+        assert delta("tickets_v2", [(ticket, {**ticket, "company_id": "c2"})]) == {
+            "company:c1": {"open_tickets": -1}, "company:c2": {"open_tickets": 1},
+        }
+
+    def test_unchanged_update_is_noop(self):
+        assert delta("devices", [(DEVICE, {**DEVICE, "brand": "Dell"})]) == {}
+
+
+class TestReadAndReconcile:
+    def test_count_between(self):
+        hist = {"2026-01-01": 2, "2026-02-01": 3, "2026-03-01": 5}
+        assert count_between(hist, start="2026-02-01") == 8
+        assert count_between(hist, "2026-01-15", "2026-02-28") == 3
+        assert count_between(None, start="2026-01-01") == 0
+
+    def test_pipeline_groups_by_scope_and_bucket(self):
+        pipeline = _pipeline(COUNTED["devices"], "o1")
+        assert pipeline[0]["$match"] == {"is_deleted": {"$ne": True}, "organization_id": "o1"}
+        group = pipeline[1]["$group"]["_id"]
+        assert set(group) == {"organization_id", "company_id", "bucket"}
+
+        tickets = _pipeline(COUNTED["tickets_v2"], None)[0]["$match"]
+        assert tickets["is_open"] is True and tickets["organization_id"] == {"$ne": None}
+
+    def test_nest(self):
+        assert _nest({"devices": 3, "warranty_end.2026-03-31": 2}) == {
+            "devices": 3, "warranty_end": {"2026-03-31": 2},
+        }
@@ -0,0 +1,63 @@
+"""
+Ticket Event Tests
+Append-only ticket history (services/ticket_events.py):
+- Entries get ids and timestamps; the ticket keeps only the last few
+- Legacy timeline entries migrate idempotently
+- Cursor pagination over (created_at, id)
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_events import (  # noqa: E402
+    TIMELINE_SUMMARY_SIZE, _entries, _upserts, summary_push, event_docs, page_query,
+)
+from utils.pagination import encode_cursor, decode_cursor, page_of  # noqa: E402
+
+
+class TestWrites:
+    def test_entries_are_stamped_in_place(self):
+        entry = {"type": "comment", "description": "hi"}
+        [stamped] = _entries(entry)
+        assert stamped is entry and entry["id"] and entry["created_at"]
+        assert _entries([{"id": "e1", "created_at": "2026-01-01"}])[0]["id"] == "e1"
+
+    def test_summary_is_capped(self):
+        assert summary_push([{"id": "e1"}]) == {"$each": [{"id": "e1"}], "$slice": -TIMELINE_SUMMARY_SIZE}
+
+    def test_event_docs_carry_ticket(self):
+        assert event_docs("o1", "t1", [{"id": "e1"}]) == [{"id": "e1", "organization_id": "o1", "ticket_id": "t1"}]
+
+    def test_legacy_upserts(self):
+        ops = _upserts("o1", "t1", [{"id": "e1", "created_at": "2025-01-01"}, {"type": "comment"}])
+        assert [op._filter for op in ops] == [{"id": "e1"}, {"id": "t1:1"}]
+        assert ops[1]._doc["$setOnInsert"] == {
+            "id": "t1:1", "type": "comment", "created_at": "", "organization_id": "o1", "ticket_id": "t1",
+        }
+
+
+class TestPaging:
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor({"created_at": "2026-10-16T10:00:00+05:30", "id": "e9"})
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == ("2026-10-16T10:00:00+05:30", "e9")
+        for bad in ("nope", encode_cursor({}).replace("W", "X") + "!!"):
+            with pytest.raises(ValueError):
+                decode_cursor(bad)
+
+    def test_page_query(self):
+        assert page_query("o1", "t1") == {"organization_id": "o1", "ticket_id": "t1"}
+        cursor = encode_cursor({"created_at": "2026-01-01", "id": "e5"})
+        newest = page_query("o1", "t1", cursor, include_internal=False)
+        assert newest["is_internal"] == {"$ne": True}
+        assert newest["$or"] == [{"created_at": {"$lt": "2026-01-01"}}, {"created_at": "2026-01-01", "id": {"$lt": "e5"}}]
+        assert page_query("o1", "t1", cursor, newest_first=False)["$or"][0] == {"created_at": {"$gt": "2026-01-01"}}
+
+    def test_page_of(self):
+        rows = [{"created_at": f"2026-01-0{i}", "id": f"e{i}"} for i in (3, 2, 1)]
+        page, cursor = page_of(rows, 2)
+        assert [r["id"] for r in page] == ["e3", "e2"] and decode_cursor(cursor) == ("2026-01-02", "e2")
+        assert page_of(rows, 3) == (rows, None)
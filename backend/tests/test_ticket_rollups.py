@@ -0,0 +1,139 @@
+"""
+Ticket Rollup Tests
+The pure parts of services/ticket_rollups.py:
+- What one ticket contributes to the totals and daily rows
+- The delta between two versions of a ticket
+- Percentiles from the hour histograms
+- Only rebuilt totals (current schema) are trusted as complete
+- The tickets_v2 fallback for SLA compliance yields the same daily rows as
+  the rollups
+"""
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import ticket_rollups as rollups  # noqa: E402
+
+TICKETS = [
+    {"organization_id": "o1", "created_at": "2026-03-01T09:00:00+05:30", "is_open": True,
+     "priority_name": "High", "assigned_team_name": "Field", "sla_breached": True, "is_escalated": True},
+    {"organization_id": "o1", "created_at": "2026-03-01T11:00:00+05:30", "is_open": False,
+     "closed_at": "2026-03-02T11:00:00+05:30", "priority_name": "High", "is_overdue": True},
+    {"organization_id": "o1", "created_at": "2026-03-02T10:00:00+05:30", "is_open": True,
+     "assigned_team_name": "Desk.A"},
+]
+
+
+def rollup_rows(tickets):
+    """Daily rows the way sync / rebuild accumulate them"""
+    acc = defaultdict(lambda: defaultdict(int))
+    for ticket in tickets:
+        for key, paths in rollups.contributions(ticket).items():
+            for path, amount in paths.items():
+                acc[key][path] += amount
+    return [{"date": day, **rollups._nest(acc[day])} for day in sorted(acc) if day != rollups.TOTALS]
+
+
+def pipeline_groups(tickets):
+    """What sla_daily_pipeline's $group returns for these tickets"""
+    groups = defaultdict(lambda: defaultdict(int))
+    for t in tickets:
+        key = (t["created_at"][:10], t.get("priority_name"), t.get("assigned_team_name"))
+        groups[key]["created"] += 1
+        for flag in ("sla_breached", "is_overdue", "is_escalated"):
+            groups[key][flag] += 1 if t.get(flag) else 0
+    return [{"_id": {"date": d, "priority": p, "team": team}, **counts} for (d, p, team), counts in groups.items()]
+
+
+CLOSED = {
+    "organization_id": "o1", "created_at": "2026-03-01T09:00:00+05:30", "is_open": False,
+    "closed_at": "2026-03-02T11:00:00+05:30", "first_response_at": "2026-03-01T09:30:00+05:30",
+    "current_stage_name": "Done", "priority_name": "High", "assigned_to_id": "e1",
+    "assigned_to_name": "Asha", "assigned_at": "2026-03-01T10:00:00+05:30", "sla_breached": True,
+}
+
+
+class TestContributions:
+    def test_closed_ticket(self):
+        c = rollups.contributions(CLOSED)
+        assert set(c) == {rollups.TOTALS, "2026-03-01", "2026-03-02"}
+        totals = c[rollups.TOTALS]
+        assert totals["total"] == totals["closed"] == totals["by_stage.Done"] == 1
+        assert "open" not in totals and "unassigned" not in totals and "reopened" not in totals
+        assert totals["engineers.e1.closed"] == 1 and totals["engineers.e1.resolution_hours"] == 25
+        assert totals["resolution_hist.48"] == 1 and totals["resolution_hours"] == 26
+        assert totals["first_response_hist.1"] == 1 and totals["first_response_hours"] == 0.5
+        created = c["2026-03-01"]
+        assert created["created"] == created["sla_breached"] == created["priority_breached.High"] == 1
+        assert created["team.Unassigned.breached"] == 1 and created["heatmap.Sun.9"] == 1
+        assert c["2026-03-02"] == {"resolved": 1, "resolution_hist.48": 1,
+                                   "resolution_hours": 26, "resolution_count": 1}
+
+    def test_escaped_keys_and_skipped_tickets(self):
+        c = rollups.contributions({"organization_id": "o1", "created_at": "2026-03-01T09:00:00",
+                                   "is_open": True, "current_stage_name": "L1.$pending"})
+        assert c[rollups.TOTALS]["open_by_stage.L1．＄pending"] == 1
+        assert rollups._unk("L1．＄pending") == "L1.$pending"
+        assert rollups.contributions({**CLOSED, "is_deleted": True}) == {}
+        assert rollups.contributions({"created_at": "2026-03-01"}) == {}
+        assert rollups.contributions(None) == {}
+
+
+class TestDelta:
+    def test_reopen(self):
+        reopened = {**CLOSED, "is_open": True, "current_stage_name": "New"}
+        delta = rollups._delta(rollups.contributions(CLOSED), rollups.contributions(reopened))
+        totals = delta[rollups.TOTALS]
+        assert totals["open"] == 1 and totals["closed"] == -1 and totals["reopened"] == 1
+        assert totals["by_stage.Done"] == -1 and totals["by_stage.New"] == 1
+        assert totals["engineers.e1.closed"] == -1 and totals["engineers.e1.resolution_count"] == -1
+        assert "total" not in totals and "resolution_count" not in totals
+        assert delta["2026-03-01"] == {"created_open": 1}
+        assert "2026-03-02" not in delta
+
+    def test_unchanged_and_created(self):
+        c = rollups.contributions(CLOSED)
+        assert rollups._delta(c, c) == {}
+        assert rollups._delta({}, c) == c
+        assert rollups._delta(c, {})["2026-03-02"]["resolved"] == -1
+
+
+class TestHistogramPercentile:
+    def test_interpolates_inside_bucket(self):
+        hist = {"1": 2, "4": 2}
+        assert rollups.histogram_percentile(hist, 0.5) == 1.0
+        assert rollups.histogram_percentile(hist, 0.75) == 3.0
+        assert rollups.histogram_percentile(hist, 1.0) == 4.0
+
+    def test_overflow_and_empty(self):
+        assert rollups.histogram_percentile({rollups.OVERFLOW_BUCKET: 3}, 0.5) == 720.0
+        assert rollups.histogram_percentile({}, 0.5) == 0.0
+        assert rollups.histogram_percentile(None, 0.9) == 0.0
+
+
+class TestSchemaGate:
+    def test_only_rebuilt_totals_are_current(self):
+        assert rollups.rollups_current({"total": 3, "schema": rollups.ROLLUP_SCHEMA})
+        assert not rollups.rollups_current({"total": 3})  # written by deltas only
+        assert not rollups.rollups_current({"total": 3, "schema": rollups.ROLLUP_SCHEMA - 1})
+        assert not rollups.rollups_current({})
+
+
+class TestSlaFallbackRows:
+    def test_matches_rollup_rows(self):
+        fallback = rollups.daily_rows_from_groups(pipeline_groups(TICKETS))
+        rows = [r for r in rollup_rows(TICKETS) if r.get("created")]
+        assert [r["date"] for r in fallback] == [r["date"] for r in rows] == ["2026-03-01", "2026-03-02"]
+        for field in ("created", "sla_breached", "is_overdue", "is_escalated"):
+            assert rollups.total(fallback, field) == rollups.total(rows, field)
+        for field in ("priority", "priority_breached"):
+            assert rollups.merge_counts(fallback, field) == rollups.merge_counts(rows, field)
+        fallback_teams = {
+            team: {k: v for k, v in metrics.items() if v}
+            for team, metrics in rollups.merge_nested(fallback, "team").items()
+        }
+        assert fallback_teams == rollups.merge_nested(rows, "team") == {
+            "Field": {"total": 1, "breached": 1}, "Unassigned": {"total": 1}, "Desk.A": {"total": 1},
+        }
@@ -0,0 +1,40 @@
+"""
+Ticket Search Tests
+Indexed ticket search terms (services/ticket_search.py):
+- Subject words match by prefix
+- Ticket numbers match by prefix, suffix or any 3+ character infix
+- Queries are tokenized the same way as tickets
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_search import ticket_search_terms, search_words  # noqa: E402
+
+TICKET = {"ticket_number": "T2610-0042", "subject": "Printer jammed on 3rd floor"}
+
+
+def matches(ticket, q):
+    terms = set(ticket_search_terms(ticket))
+    return all(word in terms for word in search_words(q))
+
+
+class TestTerms:
+    def test_subject_prefixes(self):
+        assert matches(TICKET, "print")
+        assert matches(TICKET, "Printer JAM")
+        assert not matches(TICKET, "rinter")
+        assert not matches(TICKET, "printer scanner")
+
+    def test_number_fragments(self):
+        assert matches(TICKET, "T2610-0042")
+        assert matches(TICKET, "0042")
+        assert matches(TICKET, "42")
+        assert matches(TICKET, "100")
+        assert not matches(TICKET, "0043")
+
+    def test_empty(self):
+        assert ticket_search_terms({}) == []
+        assert search_words("  -- ") == []
+        assert search_words(None) == []
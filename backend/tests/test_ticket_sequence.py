@@ -0,0 +1,47 @@
+"""
+Ticket Sequence Tests
+Ticket number formatting and validation (services/ticket_sequence.py):
+- Default and per-org formats with date placeholders
+- Formats that would break email threading are rejected
+- Unreserved blocks hand out nothing and release nothing
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_sequence import format_ticket_number, validate_format, TicketNumberBlock  # noqa: E402
+from routes.email_inbox import extract_ticket_number_from_subject  # noqa: E402
+
+OCT = datetime(2026, 10, 16)
+
+
+class TestFormat:
+    def test_default_is_six_digits(self):
+        assert format_ticket_number(42, "{seq:06d}") == "000042"
+        assert format_ticket_number(1234567, "{seq:06d}") == "1234567"
+
+    def test_date_placeholders(self):
+        assert format_ticket_number(7, "t{yy}{month}-{seq:04d}", OCT) == "T2610-0007"
+        assert format_ticket_number(7, "HD{year}{seq}", OCT) == "HD20267"
+
+    def test_validate(self):
+        assert validate_format("T{yy}-{seq:05d}") == "T{yy}-{seq:05d}"
+        for bad in ("TKT", "{seq} #1", "{seq:xx}", "{ticket}{seq}", "{seq}/{yy}"):
+            with pytest.raises(ValueError):
+                validate_format(bad)
+
+    def test_numbers_thread_by_subject(self):
+        number = format_ticket_number(7, "T{yy}{month}-{seq:04d}", OCT)
+        assert extract_ticket_number_from_subject(f"Re: [Ticket #{number}] Printer") == number
+
+
+class TestBlock:
+    def test_unused_block_is_free(self):
+        block = TicketNumberBlock("org-1", 0)
+        assert block.size == 1 and block.remaining == 0
+        asyncio.run(block.release())
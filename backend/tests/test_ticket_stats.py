@@ -0,0 +1,74 @@
+"""
+Ticketing Stats Tests
+Header stats served from the live rollup totals (services/ticket_rollups.py):
+- What a ticket adds to the per-org stage / priority / topic / assignment counters
+- Moving between stages and getting assigned are deltas on those counters
+- The single-pass $facet fallback and both read shapes agree
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ticket_rollups import (  # noqa: E402
+    TOTALS, ROLLUP_SCHEMA, contributions, _delta, _nest, is_assigned,
+    stats_pipeline, stats_from_facet, stats_from_totals,
+)
+
+TICKET = {
+    "organization_id": "o1", "is_open": True, "created_at": "2026-10-16T10:00:00+05:30",
+    "current_stage_name": "New", "priority_name": "high", "help_topic_name": "Printer. Issues",
+}
+
+
+class TestCounters:
+    def test_open_unassigned_ticket(self):
+        totals = contributions(TICKET)[TOTALS]
+        assert totals["by_stage.New"] == 1
+        assert totals["open_by_priority.high"] == 1
+        assert totals["open_by_topic.Printer． Issues"] == 1
+        assert totals["unassigned"] == 1
+
+    def test_is_assigned_needs_id_and_name(self):
+        assert not is_assigned({"assigned_to_id": "e1"})
+        assert not is_assigned({"assigned_to_name": "Ann"})
+        assert is_assigned({"assigned_to_id": "e1", "assigned_to_name": "Ann"})
+
+    def test_assign_and_transition_deltas(self):
+        assigned = {**TICKET, "assigned_to_id": "e1", "assigned_to_name": "Ann", "current_stage_name": "Assigned"}
+        delta = _delta(contributions(TICKET), contributions(assigned))[TOTALS]
+        assert delta["unassigned"] == -1
+        assert delta["by_stage.New"] == -1 and delta["by_stage.Assigned"] == 1
+        assert "open_by_priority.high" not in delta
+
+    def test_close_leaves_open_breakdowns(self):
+        closed = {**TICKET, "is_open": False, "closed_at": "2026-10-17T10:00:00+05:30"}
+        delta = _delta(contributions(TICKET), contributions(closed))[TOTALS]
+        assert delta["open"] == -1 and delta["closed"] == 1
+        assert delta["open_by_priority.high"] == -1 and delta["open_by_topic.Printer． Issues"] == -1
+        assert "by_stage.New" not in delta
+
+
+class TestRead:
+    def test_totals_and_facet_agree(self):
+        totals = {**_nest(contributions(TICKET)[TOTALS]), "schema": ROLLUP_SCHEMA}
+        facets = {
+            "counts": [{"_id": None, "total": 1, "open": 1, "closed": 0, "unassigned": 1}],
+            "by_priority": [{"_id": "high", "count": 1}],
+            "by_topic": [{"_id": "Printer. Issues", "count": 1}],
+            "by_stage": [{"_id": "New", "count": 1}],
+        }
+        assert stats_from_totals(totals) == stats_from_facet(facets) == {
+            "total": 1, "open": 1, "closed": 0, "unassigned": 1,
+            "by_priority": {"high": 1}, "by_topic": {"Printer. Issues": 1}, "by_stage": {"New": 1},
+        }
+
+    def test_missing_names_and_empty_org(self):
+        assert stats_from_facet({"by_stage": [{"_id": None, "count": 2}]})["by_stage"] == {"Unknown": 2}
+        assert stats_from_facet({})["total"] == 0
+
+    def test_pipeline_is_one_pass(self):
+        pipeline = stats_pipeline("o1")
+        assert len(pipeline) == 2
+        assert pipeline[0]["$match"] == {"organization_id": "o1", "is_deleted": {"$ne": True}}
+        assert set(pipeline[1]["$facet"]) == {"counts", "by_priority", "by_topic", "by_stage"}
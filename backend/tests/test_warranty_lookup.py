@@ -0,0 +1,82 @@
+"""
+Warranty Lookup Tests
+Pure parts of services/warranty_lookup.py and the lookup key helpers:
+- Serial numbers / asset tags normalize to one case-insensitive key
+- Key fields are only produced for the identifiers present in a write
+- A blank identifier matches nothing (not every record without a key)
+- Joined aggregation rows are shaped like the public search response
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.helpers import normalize_lookup_key, lookup_key_fields, with_lookup_keys, device_key_query  # noqa: E402
+from services.warranty_lookup import device_result, part_result, device_pipeline, find_device, find_part  # noqa: E402
+
+
+class TestLookupKeys:
+    def test_normalize(self):
+        assert normalize_lookup_key("  AbC-123 ") == "abc-123"
+        assert normalize_lookup_key("") is None
+        assert normalize_lookup_key(None) is None
+
+    def test_only_present_fields(self):
+        assert lookup_key_fields({"brand": "Dell"}) == {}
+        assert lookup_key_fields({"asset_tag": None}) == {"asset_tag_key": None}
+        doc = with_lookup_keys({"serial_number": "SN1", "asset_tag": "AT-9"})
+        assert doc["serial_key"] == "sn1" and doc["asset_tag_key"] == "at-9"
+
+    def test_query_is_equality_not_regex(self):
+        query = device_key_query(" SN1 ")
+        assert query["$or"] == [{"serial_key": "sn1"}, {"asset_tag_key": "sn1"}]
+        assert "$regex" not in str(device_pipeline("sn1")[0])
+
+    def test_blank_identifier_matches_nothing(self):
+        for identifier in (" ", "", None):
+            query = device_key_query(identifier)
+            assert query == {"_id": {"$in": []}}
+            assert "serial_key" not in str(query) and "asset_tag_key" not in str(query)
+        assert asyncio.run(find_device(" ")) is None and asyncio.run(find_part("\t")) is None
+
+
+class TestResultShape:
+    def test_active_amc_overrides_expired_warranty(self):
+        device = {
+            "id": "d1", "serial_number": "SN1", "warranty_end_date": "2001-01-01", "status": "active",
+            "company": [{"name": "Acme"}], "assigned_user": [{"name": "Bob"}],
+            "amc_assignment": [{"coverage_start": "2020-01-01", "coverage_end": "2999-12-31",
+                                "contract": [{"id": "c1", "name": "Gold"}]}],
+            "legacy_amc": [], "service_count": [{"n": 4}],
+            "parts": [{"part_name": "SSD", "warranty_expiry_date": "2999-01-01"}],
+        }
+        result = device_result(device)
+
+        assert result["company_name"] == "Acme" and result["assigned_user"] == "Bob"
+        assert result["coverage_source"] == "amc_contract"
+        assert result["device"]["warranty_active"] is True
+        assert result["device"]["device_warranty_active"] is False
+        assert result["amc_contract"]["contract_id"] == "c1"
+        assert result["parts"][0]["warranty_active"] is True
+        assert result["service_count"] == 4
+
+    def test_device_without_joins(self):
+        result = device_result({"id": "d2", "warranty_end_date": "2999-01-01", "company": [],
+                                "assigned_user": [], "amc_assignment": [], "legacy_amc": [],
+                                "service_count": [], "parts": []})
+
+        assert result["company_name"] == "Unknown" and result["assigned_user"] is None
+        assert result["coverage_source"] == "device_warranty" and result["service_count"] == 0
+
+    def test_retired_device(self):
+        result = device_result({"id": "d3", "status": "retired", "company": [{"name": "Acme"}]})
+        assert result["device"]["message"] == "This asset is no longer active"
+        assert result["company_name"] is None
+
+    def test_part_with_parent_device(self):
+        result = part_result({"id": "p1", "serial_number": "PT1", "warranty_expiry_date": "2001-01-01",
+                              "device": [{"id": "d1", "brand": "Dell", "company": [{"name": "Acme"}]}]})
+
+        assert result["search_type"] == "part" and result["part"]["warranty_active"] is False
+        assert result["parent_device"]["id"] == "d1" and result["company_name"] == "Acme"
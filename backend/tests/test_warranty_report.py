@@ -0,0 +1,73 @@
+"""
+Warranty Report Tests
+Content-hash caching of the warranty report PDF (services/warranty_report.py):
+- The cache key / ETag changes when any printed input changes, and only then
+- If-None-Match parsing for 304 revalidation
+- The report renders in a worker process
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.warranty_pdf import report_model, render_warranty_pdf  # noqa: E402
+from services.warranty_report import report_key, etag_matches  # noqa: E402
+from services.render_pool import RenderPool  # noqa: E402
+
+DEVICE = {
+    "id": "d1", "device_type": "Laptop", "brand": "Dell", "model": "Latitude 5420",
+    "serial_number": "SN-1", "asset_tag": "AT-1", "purchase_date": "2024-01-01",
+    "condition": "good", "warranty_end_date": "2099-01-01", "updated_at": "2025-01-01T00:00:00",
+}
+PARTS = [{"part_name": "SSD", "replaced_date": "2025-01-01", "warranty_months": 12, "warranty_expiry_date": "2000-01-01"}]
+AMC = {"name": "Gold", "amc_type": "comprehensive", "coverage_start": "2025-01-01", "coverage_end": "2099-01-01",
+       "coverage_includes": {"onsite_support": True}, "entitlements": {"onsite_visits_per_year": -1}}
+
+
+def model(**overrides):
+    args = {"device": DEVICE, "company_name": "Acme", "parts": PARTS, "amc_contract_info": AMC,
+            "portal_name": "Warranty Portal", "as_of": "2025-06-01"}
+    args.update(overrides)
+    return report_model(**args)
+
+
+class TestReportKey:
+    def test_model_holds_printed_rows(self):
+        m = model()
+        assert ["Warranty Status", "Active"] in m["device_rows"]
+        assert m["part_rows"][0][-1] == "Expired"
+        assert ["Entitlements", "Unlimited Onsite Visits"] in m["amc_rows"]
+        assert model(amc_contract_info=None)["amc_rows"] == [["Status", "No active AMC found for this device"]]
+
+    def test_key_changes_with_inputs(self):
+        base = report_key(model())
+        assert report_key(model()) == base
+        assert report_key(model(parts=[])) != base
+        assert report_key(model(amc_contract_info=None)) != base
+        assert report_key(model(company_name="Other")) != base
+        assert report_key(model(portal_name="Other")) != base
+        assert report_key(model(as_of="2025-06-02")) != base
+        assert report_key(model(device={**DEVICE, "asset_tag": "AT-2"})) != base
+
+    def test_unprinted_fields_do_not_change_key(self):
+        assert report_key(model(device={**DEVICE, "updated_at": "2026-01-01"})) == report_key(model())
+
+    def test_etag_matches(self):
+        etag = '"abc"'
+        assert etag_matches('"abc"', etag)
+        assert etag_matches('"x", W/"abc"', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"x"', etag)
+        assert not etag_matches(None, etag)
+
+
+class TestRender:
+    def test_renders_in_worker_process(self):
+        pool = RenderPool(processes=1, concurrency=1)
+        try:
+            pdf = asyncio.run(pool.run(render_warranty_pdf, model(), "01 June 2025, 10:00"))
+        finally:
+            pool.shutdown()
+
+        assert pdf.startswith(b"%PDF") and pdf.rstrip().endswith(b"%%EOF")
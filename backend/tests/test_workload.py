@@ -0,0 +1,78 @@
+"""
+Engineer Workload Tests
+Workload metrics and assignment scoring (services/workload.py):
+- One grouped aggregation over tickets, today's visits and SLA logs
+- Metrics derived from a pipeline row (rates, response time, reasons)
+- Assignment score and help topic matching
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.workload import (  # noqa: E402
+    AUTO_ESCALATION_HOURS, BASE_SCORE, workload_pipeline, workload_from_row, score_engineer, matches_topic,
+    EMPTY_WORKLOAD,
+)
+
+IST = timezone(timedelta(hours=5, minutes=30))
+NOW = datetime(2026, 3, 2, 12, 0, tzinfo=IST)
+
+
+class TestPipeline:
+    def test_single_grouped_aggregation(self):
+        pipeline = workload_pipeline("o1", ["e1", "e2"], NOW)
+        assert pipeline[0]["$match"]["assigned_to_id"] == {"$in": ["e1", "e2"]}
+        assert pipeline[0]["$match"]["organization_id"] == "o1"
+        unions = [stage["$unionWith"]["coll"] for stage in pipeline if "$unionWith" in stage]
+        assert unions == ["ticket_schedules", "assignment_sla_logs"]
+        assert list(pipeline[-1]) == ["$group"] and pipeline[-1]["$group"]["_id"] == "$engineer_id"
+
+    def test_windows(self):
+        pipeline = workload_pipeline("o1", ["e1"], NOW)
+        visits = pipeline[2]["$unionWith"]["pipeline"][0]["$match"]
+        assert visits["scheduled_at"] == {"$gte": "2026-03-02T00:00:00", "$lte": "2026-03-02T23:59:59"}
+        assert visits["status"] == {"$ne": "cancelled"}
+        overdue = pipeline[-1]["$group"]["overdue_pending"]["$sum"]["$cond"][0]["$and"]
+        cutoff = (NOW - timedelta(hours=AUTO_ESCALATION_HOURS)).isoformat()
+        assert {"$lte": ["$assigned_at", cutoff]} in overdue
+
+
+class TestWorkloadFromRow:
+    def test_empty(self):
+        workload = workload_from_row(None)
+        assert workload == EMPTY_WORKLOAD and workload["decline_reasons"] is not EMPTY_WORKLOAD["decline_reasons"]
+
+    def test_derived_metrics(self):
+        workload = workload_from_row({
+            "_id": "e1", "open_tickets": 3, "pending_acceptance": 1, "sla_total": 4, "accepted": 3,
+            "sla_declined": 1, "avg_response_ms": 90000, "decline_reasons": [None, "too_far", None, "too_far"],
+        })
+        assert workload["open_tickets"] == 3 and workload["overdue_pending"] == 0
+        assert workload["acceptance_rate"] == 75.0
+        assert workload["avg_response_minutes"] == 1.5
+        assert workload["decline_reasons"] == {"too_far": 2}
+
+
+class TestScoring:
+    def test_workload_and_declines(self):
+        load = {**EMPTY_WORKLOAD, "open_tickets": 2, "recent_declines": 1}
+        assert score_engineer({}, load) == BASE_SCORE + 20 + 15
+
+    def test_schedule_penalties_and_bonus(self):
+        engineer = {
+            "specialization": "Printer",
+            "working_hours": {"sunday": {"is_working": False}},
+            "holidays": ["2026-03-03"],
+        }
+        load = dict(EMPTY_WORKLOAD)
+        assert score_engineer(engineer, load, {"scheduled_at": "2026-03-01T10:00"}) == BASE_SCORE + 100
+        assert score_engineer(engineer, load, {"scheduled_at": "2026-03-03T10:00"}) == BASE_SCORE + 200
+        assert score_engineer(engineer, load, {"help_topic_name": "Printer Repair"}) == BASE_SCORE - 20
+
+    def test_matches_topic(self):
+        assert matches_topic({"skills": ["network"]}, "Network Outage")
+        assert matches_topic({"specialization": "CCTV"}, "cctv install")
+        assert not matches_topic({"skills": ["network"]}, "Printer Repair")
+        assert not matches_topic({"skills": ["network"]}, None)
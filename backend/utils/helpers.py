@@ -2,7 +2,9 @@
 Utility helper functions
 """
 from datetime import datetime, timedelta
+from typing import Optional
 from config import IST
+from utils.synonyms import device_category
 
 
 def get_ist_now():
@@ -55,3 +57,49 @@ def days_until_expiry(expiry_date: str) -> int:
         return (expiry.date() - today.date()).days
     except:
         return -9999
+
+
+# Serial numbers and asset tags are matched case-insensitively, device types by
+# synonym. Writes store a normalized copy next to the original so lookups are
+# indexed equality matches.
+LOOKUP_KEY_FIELDS = {"serial_number": "serial_key", "asset_tag": "asset_tag_key"}
+
+# A filter no document matches: an empty key must not match records whose key is unset
+NO_MATCH = {"_id": {"$in": []}}
+
+
+def normalize_lookup_key(value) -> Optional[str]:
+    """Normalized form of a serial number / asset tag (trimmed, lowercased), or None"""
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    return value or None
+
+
+def lookup_key_fields(data: dict) -> dict:
+    """Normalized key fields for whichever of serial_number / asset_tag / device_type appear in data"""
+    fields = {
+        key_field: normalize_lookup_key(data.get(field))
+        for field, key_field in LOOKUP_KEY_FIELDS.items()
+        if field in data
+    }
+    if "device_type" in data:
+        fields["device_category"] = device_category(data.get("device_type"))
+    return fields
+
+
+def with_lookup_keys(doc: dict) -> dict:
+    """Add the normalized key fields to a device / part document (in place)"""
+    doc.update(lookup_key_fields(doc))
+    return doc
+
+
+def device_key_query(identifier: str) -> dict:
+    """Exact-match filter for a live device by serial number or asset tag (matches nothing when blank)"""
+    key = normalize_lookup_key(identifier)
+    if key is None:
+        return dict(NO_MATCH)
+    return {
+        "is_deleted": {"$ne": True},
+        "$or": [{"serial_key": key}, {"asset_tag_key": key}]
+    }
@@ -0,0 +1,175 @@
+"""
+QR Label Sheets
+===============
+Rendering for the bulk QR label PDF: 1.5" x 1.5" QR codes with the serial
+number and asset tag underneath, 4 columns x 5 rows per A4 page.
+
+- `render_qr_pngs` turns device URLs into PNGs. It has no app imports so it
+  can run in a worker process (services/qr_labels.py).
+- `LabelSheetWriter` emits the PDF incrementally: `header()`, one
+  `page(labels)` per sheet and `finish(footer)` each return the bytes to
+  append, so a sheet of any size is produced page by page with only the
+  current page in memory. reportlab's canvas keeps the whole document until
+  `save()`; its font metrics are still used to centre the text.
+"""
+import zlib
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+import qrcode
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+QR_PIXELS = 300  # high res for print
+
+PAGE_WIDTH, PAGE_HEIGHT = A4  # 595 x 842 points
+QR_SIZE = 1.5 * inch
+LABEL_HEIGHT = 0.35 * inch  # space for text below QR
+CELL_PADDING = 0.15 * inch
+CELL_WIDTH = QR_SIZE + CELL_PADDING
+CELL_HEIGHT = QR_SIZE + LABEL_HEIGHT + CELL_PADDING
+COLUMNS = 4
+ROWS_PER_PAGE = 5
+LABELS_PER_PAGE = COLUMNS * ROWS_PER_PAGE
+MARGIN_X = (PAGE_WIDTH - COLUMNS * CELL_WIDTH) / 2
+MARGIN_Y = 0.5 * inch
+
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+# (png, serial number, asset tag)
+Label = Tuple[bytes, str, Optional[str]]
+
+
+def render_qr_png(url: str) -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=1,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    img = img.resize((QR_PIXELS, QR_PIXELS), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_qr_pngs(urls: List[str]) -> List[bytes]:
+    """Worker-process entry point: one PNG per URL, in order"""
+    return [render_qr_png(url) for url in urls]
+
+
+def _truncate(text: str) -> str:
+    return text if len(text) <= 20 else text[:17] + "..."
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = text.encode("cp1252", "replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _text(font: str, size: float, gray: float, x: float, y: float, text: str, centred: bool = False) -> bytes:
+    if centred:
+        x -= stringWidth(text, FONTS[font], size) / 2
+    return b"BT /%s %g Tf %g g %.2f %.2f Td %s Tj ET\n" % (font.encode(), size, gray, x, y, _pdf_string(text))
+
+
+def image_stream(png: bytes) -> Tuple[bytes, bytes]:
+    """(image dictionary, compressed samples) for a PNG as a 1-bit gray XObject"""
+    img = Image.open(BytesIO(png)).convert("1")
+    width, height = img.size
+    data = zlib.compress(img.tobytes())
+    head = (b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+            b"/BitsPerComponent 1 /Filter /FlateDecode /Length %d >>" % (width, height, len(data)))
+    return head, data
+
+
+def page_content(labels: List[Label], footer: Optional[str] = None) -> bytes:
+    """Drawing operators for one sheet; label i uses image /Im<i>"""
+    ops = []
+    for i, (_, serial, asset_tag) in enumerate(labels):
+        row, col = divmod(i, COLUMNS)
+        x = MARGIN_X + col * CELL_WIDTH
+        y = PAGE_HEIGHT - MARGIN_Y - (row + 1) * CELL_HEIGHT
+        qr_x = x + (CELL_WIDTH - QR_SIZE) / 2
+        qr_y = y + LABEL_HEIGHT
+        text_x = x + CELL_WIDTH / 2
+        ops.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q\n" % (QR_SIZE, QR_SIZE, qr_x, qr_y, i))
+        ops.append(_text("F2", 7, 0, text_x, y + LABEL_HEIGHT - 12, f"S/N: {_truncate(serial or 'N/A')}", True))
+        if asset_tag:
+            ops.append(_text("F1", 6, 0.3, text_x, y + LABEL_HEIGHT - 22, f"Tag: {_truncate(asset_tag)}", True))
+        # Cutting guide border
+        ops.append(b"0.85 G 0.5 w %.2f %.2f %.2f %.2f re S\n" % (x + 2, y + 2, CELL_WIDTH - 4, CELL_HEIGHT - 4))
+    if footer:
+        ops.append(_text("F1", 7, 0.5, MARGIN_X, 12, footer))
+    return b"".join(ops)
+
+
+class LabelSheetWriter:
+    """
+    Incremental PDF writer for label sheets. Object 1 is the catalog, 2 the
+    page tree (written last, once every page is known), 3-4 the fonts.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.xref = {}
+        self.next_id = 5
+        self.page_ids = []
+
+    def _object(self, obj_id: int, body: bytes, stream: Optional[bytes] = None) -> bytes:
+        chunk = b"%d 0 obj\n%s\n" % (obj_id, body)
+        if stream is not None:
+            chunk += b"stream\n" + stream + b"\nendstream\n"
+        chunk += b"endobj\n"
+        self.xref[obj_id] = self.offset
+        self.offset += len(chunk)
+        return chunk
+
+    def _new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def header(self) -> bytes:
+        out = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.offset = len(out)
+        out += self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        for obj_id, font in ((3, "F1"), (4, "F2")):
+            out += self._object(obj_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+                                        b"/Encoding /WinAnsiEncoding >>" % FONTS[font].encode())
+        return out
+
+    def page(self, labels: List[Label], footer: Optional[str] = None) -> bytes:
+        out = []
+        images = []
+        for i, (png, _, _) in enumerate(labels):
+            head, data = image_stream(png)
+            image_id = self._new_id()
+            out.append(self._object(image_id, head, data))
+            images.append(b"/Im%d %d 0 R" % (i, image_id))
+        content = zlib.compress(page_content(labels, footer))
+        content_id = self._new_id()
+        out.append(self._object(content_id, b"<< /Filter /FlateDecode /Length %d >>" % len(content), content))
+        page_id = self._new_id()
+        out.append(self._object(page_id, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> /XObject << %s >> >> >>"
+        ) % (PAGE_WIDTH, PAGE_HEIGHT, content_id, b" ".join(images))))
+        self.page_ids.append(page_id)
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        out = self._object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        xref_offset = self.offset
+        size = self.next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self.xref[obj_id])
+        out += b"".join(xref)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_offset)
+        return out
@@ -0,0 +1,53 @@
+"""
+Keyset Pagination
+=================
+Opaque cursors for lists ordered by (created_at, id), newest first by
+default. A page is "the next `limit` rows strictly after the last row of the
+previous page", which an index on (..., created_at, id) serves directly,
+however deep the page - unlike skip(), which walks every skipped row.
+
+Cursors are URL-safe base64 of [created_at, id]; clients pass them back
+verbatim and must not build them.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row.get("created_at") or "", row.get("id") or ""]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(created_at, id) of a cursor from encode_cursor; ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+
+def after_cursor(cursor: str, newest_first: bool = True) -> Dict[str, Any]:
+    """Filter for the rows that come after `cursor` in (created_at, id) order"""
+    created_at, row_id = decode_cursor(cursor)
+    op = "$lt" if newest_first else "$gt"
+    return {"$or": [
+        {"created_at": {op: created_at}},
+        {"created_at": created_at, "id": {op: row_id}},
+    ]}
+
+
+def keyset_sort(newest_first: bool = True) -> List[Tuple[str, int]]:
+    direction = -1 if newest_first else 1
+    return [("created_at", direction), ("id", direction)]
+
+
+def page_of(rows: List[dict], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """Split rows fetched with limit + 1 into (page, next cursor or None)"""
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
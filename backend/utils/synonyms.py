@@ -4,6 +4,9 @@ Device Category Synonyms and Smart Search Utility
 This module provides synonym mapping for device categories to enable
 intelligent search across alternative names and related terms.
 """
+import re
+from functools import lru_cache
+from typing import Optional
 
 # Device category synonyms - each key maps to a list of equivalent terms
 DEVICE_CATEGORY_SYNONYMS = {
@@ -210,12 +213,174 @@ DEVICE_CATEGORY_SYNONYMS = {
     ]
 }
 
-# Build reverse lookup: term -> canonical category
-TERM_TO_CATEGORY = {}
-for category, terms in DEVICE_CATEGORY_SYNONYMS.items():
-    for term in terms:
-        TERM_TO_CATEGORY[term.lower()] = category
 
+# Common brand aliases
+BRAND_ALIASES = {
+    "hp": ["hp", "hewlett packard", "hewlett-packard"],
+    "dell": ["dell", "dell technologies", "dell inc"],
+    "lenovo": ["lenovo", "thinkpad", "ideapad"],
+    "apple": ["apple", "macbook", "imac", "mac"],
+    "samsung": ["samsung", "samsung electronics"],
+    "lg": ["lg", "lg electronics"],
+    "asus": ["asus", "republic of gamers", "rog"],
+    "acer": ["acer", "acer inc"],
+    "microsoft": ["microsoft", "surface"],
+    "cisco": ["cisco", "cisco systems"],
+    "hikvision": ["hikvision", "hik vision", "hik-vision"],
+    "dahua": ["dahua", "dahua technology"],
+    "epson": ["epson", "seiko epson"],
+    "canon": ["canon", "canon inc"],
+    "brother": ["brother", "brother industries"],
+    "xerox": ["xerox", "xerox corporation"],
+    "sony": ["sony", "sony corporation"],
+    "logitech": ["logitech", "logi"],
+    "apc": ["apc", "schneider electric", "apc by schneider"],
+    "seagate": ["seagate", "seagate technology"],
+    "wd": ["wd", "western digital", "wdc"],
+    "tplink": ["tp-link", "tplink", "tp link"],
+    "dlink": ["d-link", "dlink", "d link"],
+    "netgear": ["netgear", "net gear"],
+    "ubiquiti": ["ubiquiti", "unifi", "ubnt"],
+    "fortinet": ["fortinet", "fortigate"],
+    "sophos": ["sophos", "sophos ltd"],
+    "mikrotik": ["mikrotik", "mikro tik"]
+}
+
+
+# ==================== COMPILED MATCHERS ====================
+# Everything below is built once at import. Per-request work is a dictionary
+# lookup or one pass of the phrase automaton over the words of the text.
+
+def _words(text) -> tuple:
+    """Lowercase alphanumeric words; "Hewlett-Packard" and "hewlett packard" both give (hewlett, packard)"""
+    return tuple(re.findall(r"[a-z0-9]+", str(text or "").lower()))
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over words: finds every known phrase occurring in a
+    text in a single left-to-right pass, whatever the number of phrases.
+    """
+
+    def __init__(self, phrases: dict):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # node -> [(phrase length in words, value)]
+        for phrase, value in phrases.items():
+            words = _words(phrase)
+            if not words:
+                continue
+            node = 0
+            for word in words:
+                if word not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][word] = len(self._goto) - 1
+                node = self._goto[node][word]
+            self._out[node].append((len(words), value))
+
+        queue = list(self._goto[0].values())
+        while queue:
+            node = queue.pop(0)
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0) if self._goto[fail].get(word) != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def matches(self, text) -> list:
+        """(start word index, length in words, value) of every phrase occurrence"""
+        found = []
+        node = 0
+        for i, word in enumerate(_words(text)):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, value in self._out[node]:
+                found.append((i - length + 1, length, value))
+        return found
+
+    def values(self, text) -> set:
+        return {value for _, _, value in self.matches(text)}
+
+    def best(self, text):
+        """Value of the longest phrase in text (earliest on ties), or None"""
+        found = self.matches(text)
+        if not found:
+            return None
+        return min(found, key=lambda m: (-m[1], m[0]))[2]
+
+
+def _prefix_index(phrases: dict, min_length: int = 2) -> dict:
+    """Every prefix of a phrase, starting at any of its words -> values (partial query matching)"""
+    index = {}
+    for phrase, value in phrases.items():
+        words = _words(phrase)
+        for start in range(len(words)):
+            text = " ".join(words[start:])
+            for end in range(min_length, len(text) + 1):
+                index.setdefault(text[:end], set()).add(value)
+    return index
+
+
+def _group_words(groups: dict) -> dict:
+    return {key: sorted({word for term in terms for word in _words(term)}) for key, terms in groups.items()}
+
+
+# term -> canonical category, and canonical brand <- alias
+TERM_TO_CATEGORY = {" ".join(_words(term)): category
+                    for category, terms in DEVICE_CATEGORY_SYNONYMS.items() for term in terms}
+BRAND_ALIAS_LOOKUP = {" ".join(_words(alias)): canonical
+                      for canonical, aliases in BRAND_ALIASES.items() for alias in aliases}
+
+CATEGORY_MATCHER = PhraseMatcher(TERM_TO_CATEGORY)
+BRAND_MATCHER = PhraseMatcher(BRAND_ALIAS_LOOKUP)
+CATEGORY_PREFIXES = _prefix_index(TERM_TO_CATEGORY)
+CATEGORY_WORDS = _group_words(DEVICE_CATEGORY_SYNONYMS)
+BRAND_WORDS = _group_words(BRAND_ALIASES)
+
+
+# ==================== DEVICE CATEGORIES ====================
+
+@lru_cache(maxsize=4096)
+def device_category(device_type: str) -> Optional[str]:
+    """
+    Canonical category key stored on device records ("IP Camera" -> "cctv").
+    Exact synonym first, otherwise the most specific synonym the text contains.
+    """
+    words = " ".join(_words(device_type))
+    if not words:
+        return None
+    return TERM_TO_CATEGORY.get(words) or CATEGORY_MATCHER.best(words)
+
+
+@lru_cache(maxsize=4096)
+def query_categories(query: str) -> frozenset:
+    """
+    Categories a search query refers to: the category of an exact synonym,
+    else synonyms the query contains ("dell laptop" -> laptop) or that the
+    query starts, from any word on ("surveill" -> cctv, nvr).
+    """
+    words = " ".join(_words(query))
+    if not words:
+        return frozenset()
+    if words in TERM_TO_CATEGORY:
+        return frozenset([TERM_TO_CATEGORY[words]])
+    return frozenset(CATEGORY_MATCHER.values(words) | CATEGORY_PREFIXES.get(words, set()))
+
+
+def device_type_filter(query: str) -> dict:
+    """Mongo clause matching devices of the categories a query refers to (indexed equality on device_category)"""
+    categories = sorted(query_categories(query))
+    if not categories:
+        return {"device_type": {"$regex": re.escape(query.strip()), "$options": "i"}}
+    return {"device_category": {"$in": categories}}
+
+
+# ==================== QUERY EXPANSION ====================
 
 def get_synonym_terms(query: str) -> list:
     """
@@ -227,28 +392,13 @@ def get_synonym_terms(query: str) -> list:
     Returns:
         List of all related terms including the original query
     """
-    query_lower = query.lower().strip()
-    
-    # Check if query matches any term
-    if query_lower in TERM_TO_CATEGORY:
-        category = TERM_TO_CATEGORY[query_lower]
-        return DEVICE_CATEGORY_SYNONYMS[category]
-    
-    # Check for partial matches
-    matched_categories = set()
-    for term, category in TERM_TO_CATEGORY.items():
-        if query_lower in term or term in query_lower:
-            matched_categories.add(category)
-    
-    if matched_categories:
-        all_terms = []
-        for category in matched_categories:
-            all_terms.extend(DEVICE_CATEGORY_SYNONYMS[category])
-        return list(set(all_terms))
-    
-    return [query]
+    categories = query_categories(query)
+    if not categories:
+        return [query]
+    return sorted({term for category in categories for term in DEVICE_CATEGORY_SYNONYMS[category]})
 
 
+@lru_cache(maxsize=1024)
 def build_synonym_regex(query: str) -> str:
     """
     Build a regex pattern that matches the query and all its synonyms.
@@ -260,13 +410,11 @@ def build_synonym_regex(query: str) -> str:
         Regex pattern string for MongoDB
     """
     terms = get_synonym_terms(query)
-    
-    # Escape special regex characters and join with OR
-    escaped_terms = [term.replace("(", "\\(").replace(")", "\\)").replace("+", "\\+") for term in terms]
+    escaped_terms = [re.escape(term) for term in terms]
     
     # Also include the original query
     if query.lower() not in [t.lower() for t in terms]:
-        escaped_terms.append(query)
+        escaped_terms.append(re.escape(query))
     
     return "|".join(escaped_terms)
 
@@ -281,60 +429,33 @@ def expand_search_query(query: str) -> dict:
     Returns:
         MongoDB query dict with synonym expansion
     """
-    terms = get_synonym_terms(query)
-    
-    # Build regex that matches any of the terms
-    regex_pattern = build_synonym_regex(query)
-    
     return {
-        "$regex": regex_pattern,
+        "$regex": build_synonym_regex(query),
         "$options": "i"
     }
 
 
-# Common brand aliases
-BRAND_ALIASES = {
-    "hp": ["hp", "hewlett packard", "hewlett-packard"],
-    "dell": ["dell", "dell technologies", "dell inc"],
-    "lenovo": ["lenovo", "thinkpad", "ideapad"],
-    "apple": ["apple", "macbook", "imac", "mac"],
-    "samsung": ["samsung", "samsung electronics"],
-    "lg": ["lg", "lg electronics"],
-    "asus": ["asus", "republic of gamers", "rog"],
-    "acer": ["acer", "acer inc"],
-    "microsoft": ["microsoft", "surface"],
-    "cisco": ["cisco", "cisco systems"],
-    "hikvision": ["hikvision", "hik vision", "hik-vision"],
-    "dahua": ["dahua", "dahua technology"],
-    "epson": ["epson", "seiko epson"],
-    "canon": ["canon", "canon inc"],
-    "brother": ["brother", "brother industries"],
-    "xerox": ["xerox", "xerox corporation"],
-    "sony": ["sony", "sony corporation"],
-    "logitech": ["logitech", "logi"],
-    "apc": ["apc", "schneider electric", "apc by schneider"],
-    "seagate": ["seagate", "seagate technology"],
-    "wd": ["wd", "western digital", "wdc"],
-    "tplink": ["tp-link", "tplink", "tp link"],
-    "dlink": ["d-link", "dlink", "d link"],
-    "netgear": ["netgear", "net gear"],
-    "ubiquiti": ["ubiquiti", "unifi", "ubnt"],
-    "fortinet": ["fortinet", "fortigate"],
-    "sophos": ["sophos", "sophos ltd"],
-    "mikrotik": ["mikrotik", "mikro tik"]
-}
-
-# Build reverse lookup for brands
-BRAND_ALIAS_LOOKUP = {}
-for canonical, aliases in BRAND_ALIASES.items():
-    for alias in aliases:
-        BRAND_ALIAS_LOOKUP[alias.lower()] = canonical
-
-
 def get_brand_variants(brand: str) -> list:
     """Get all variants of a brand name."""
-    brand_lower = brand.lower().strip()
-    if brand_lower in BRAND_ALIAS_LOOKUP:
-        canonical = BRAND_ALIAS_LOOKUP[brand_lower]
+    canonical = BRAND_ALIAS_LOOKUP.get(" ".join(_words(brand)))
+    if canonical:
         return BRAND_ALIASES[canonical]
     return [brand]
+
+
+# ==================== INDEX-TIME EXPANSION ====================
+# Used by services/search_index.py: instead of expanding every query into a
+# regex alternation, documents are indexed under all the words of the synonym
+# groups they mention, so a query word only needs an exact term match.
+
+def synonym_index_words(text: str, brand: bool = False) -> list:
+    """
+    Words to index a field under so that any synonym (or brand alias) of a
+    term it mentions finds it: "IP Camera" -> cctv, surveillance, security, ...
+    """
+    matcher, groups = (BRAND_MATCHER, BRAND_WORDS) if brand else (CATEGORY_MATCHER, CATEGORY_WORDS)
+    words = set()
+    for key in matcher.values(text):
+        words.add(key)
+        words.update(groups[key])
+    return sorted(words)
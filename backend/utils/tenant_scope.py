@@ -4,20 +4,81 @@ Tenant Scoping Helper - Apply organization filters to admin queries
 This module provides utilities for automatically scoping queries
 by organization_id based on the authenticated admin's organization.
 """
+import os
+from contextvars import ContextVar
 from typing import Optional, Dict, Any
 from database import db
+from utils.ttl_cache import TTLCache, MISSING
 
+# email → organization_id (or None for legacy admins) for active memberships.
+# Invalidated via invalidate_org_membership() wherever members are written.
+_membership_cache = TTLCache(
+    max_size=int(os.environ.get("ORG_MEMBERSHIP_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("ORG_MEMBERSHIP_CACHE_TTL", "60")),
+    negative_ttl=float(os.environ.get("ORG_MEMBERSHIP_CACHE_NEGATIVE_TTL", "15")),
+)
 
-async def get_admin_org_id(admin_email: str) -> Optional[str]:
+
+class Principal:
     """
-    Get the organization_id for an admin user.
-    Returns None for legacy admins without organization membership.
+    Authenticated admin resolved once per request.
+    Stored on request.state.principal and in the current_principal context
+    variable so scoping helpers can reuse it without hitting the database.
     """
+
+    def __init__(self, email: str, admin: dict, organization_id: Optional[str]):
+        self.email = email
+        self.admin = admin
+        self.organization_id = organization_id
+
+
+current_principal: ContextVar[Optional[Principal]] = ContextVar('current_principal', default=None)
+
+
+async def lookup_org_membership(admin_email: str) -> Optional[str]:
+    """Cached email → organization_id lookup against organization_members"""
+    if not admin_email:
+        return None
+
+    cached = _membership_cache.get(admin_email)
+    if cached is not MISSING:
+        return cached
+
     org_member = await db.organization_members.find_one(
         {"email": admin_email, "is_active": True, "is_deleted": {"$ne": True}},
         {"_id": 0, "organization_id": 1}
     )
-    return org_member.get("organization_id") if org_member else None
+    org_id = org_member.get("organization_id") if org_member else None
+    _membership_cache.set(admin_email, org_id)
+    return org_id
+
+
+def invalidate_org_membership(email: Optional[str] = None) -> None:
+    """
+    Drop cached membership for an email (or everything if email is None).
+    Call after inserting members or changing is_active/is_deleted/organization_id.
+    """
+    if email:
+        _membership_cache.invalidate(email)
+        _membership_cache.invalidate(email.lower())
+    else:
+        _membership_cache.clear()
+
+
+def get_membership_cache_stats() -> Dict[str, Any]:
+    return _membership_cache.stats()
+
+
+async def get_admin_org_id(admin_email: str) -> Optional[str]:
+    """
+    Get the organization_id for an admin user.
+    Returns None for legacy admins without organization membership.
+    Reuses the principal resolved by get_current_admin for this request.
+    """
+    principal = current_principal.get()
+    if principal is not None and principal.email == admin_email:
+        return principal.organization_id
+    return await lookup_org_membership(admin_email)
 
 
 def scope_query(query: Dict[str, Any], org_id: Optional[str]) -> Dict[str, Any]:
@@ -0,0 +1,150 @@
+"""
+Warranty Report PDF
+===================
+Layout of the public warranty report (`GET /warranty/pdf/{serial_number}`).
+
+`report_model` reduces the device, parts, AMC and settings inputs to exactly
+the rows the report prints (services/warranty_report.py hashes it for the
+cache key); `render_warranty_pdf` lays it out with reportlab. The renderer
+takes plain data only so it can run in a worker process.
+"""
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from utils.helpers import is_warranty_active
+
+
+def amc_rows(amc_contract_info: Optional[Dict[str, Any]]) -> List[List[Any]]:
+    if not amc_contract_info:
+        return [["Status", "No active AMC found for this device"]]
+
+    amc_type_display = (amc_contract_info.get("amc_type") or "standard").replace("_", " ").title()
+    coverage_includes = amc_contract_info.get("coverage_includes") or {}
+
+    coverage_items = []
+    if coverage_includes.get("onsite_support"):
+        coverage_items.append("Onsite Support")
+    if coverage_includes.get("remote_support"):
+        coverage_items.append("Remote Support")
+    if coverage_includes.get("preventive_maintenance"):
+        coverage_items.append("Preventive Maintenance")
+    coverage_str = ", ".join(coverage_items) if coverage_items else "Standard Coverage"
+
+    entitlements = amc_contract_info.get("entitlements") or {}
+    entitlement_items = []
+    if entitlements.get("onsite_visits_per_year"):
+        visits = entitlements["onsite_visits_per_year"]
+        entitlement_items.append(f"{visits} Onsite Visits/Year" if visits != -1 else "Unlimited Onsite Visits")
+    if entitlements.get("remote_support_count"):
+        remote = entitlements["remote_support_count"]
+        entitlement_items.append(f"{remote} Remote Support Sessions" if remote != -1 else "Unlimited Remote Support")
+    entitlement_str = ", ".join(entitlement_items) if entitlement_items else "-"
+
+    return [
+        ["Contract Name", amc_contract_info.get("name", "-")],
+        ["AMC Type", amc_type_display],
+        ["Coverage Start", amc_contract_info.get("coverage_start", "-")],
+        ["Coverage End", amc_contract_info.get("coverage_end", "-")],
+        ["Status", "Active"],
+        ["Coverage Includes", coverage_str],
+        ["Entitlements", entitlement_str]
+    ]
+
+
+def report_model(device: Dict[str, Any], company_name: str, parts: List[Dict[str, Any]],
+                 amc_contract_info: Optional[Dict[str, Any]], portal_name: str, as_of: str) -> Dict[str, Any]:
+    """Everything the report prints except the generation time; `as_of` is the date statuses are valid for"""
+    device_rows = [
+        ["Device Type", device.get("device_type", "-")],
+        ["Brand", device.get("brand", "-")],
+        ["Model", device.get("model", "-")],
+        ["Serial Number", device.get("serial_number", "-")],
+        ["Asset Tag", device.get("asset_tag", "-") or "-"],
+        ["Company", company_name],
+        ["Purchase Date", device.get("purchase_date", "-")],
+        ["Condition", (device.get("condition") or "-").title()],
+        ["Warranty Expiry", device.get("warranty_end_date", "-") or "Not specified"],
+        ["Warranty Status", "Active" if is_warranty_active(device.get("warranty_end_date", "")) else "Expired / Not Covered"]
+    ]
+    part_rows = [
+        [
+            part.get("part_name", "-"),
+            part.get("replaced_date", "-"),
+            f"{part.get('warranty_months', 0)} months",
+            part.get("warranty_expiry_date", "-"),
+            "Active" if is_warranty_active(part.get("warranty_expiry_date", "")) else "Expired"
+        ]
+        for part in parts
+    ]
+    return {
+        "as_of": as_of,
+        "portal_name": portal_name,
+        "device_rows": device_rows,
+        "part_rows": part_rows,
+        "amc_rows": amc_rows(amc_contract_info),
+    }
+
+
+def render_warranty_pdf(model: Dict[str, Any], generated_at: str) -> bytes:
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+    story = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20, textColor=colors.HexColor('#0F172A'))
+    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, spaceAfter=10, textColor=colors.HexColor('#0F172A'))
+    body_style = ParagraphStyle('Body', parent=styles['Normal'], fontSize=10, spaceAfter=5, textColor=colors.HexColor('#64748B'))
+
+    story.append(Paragraph(f"{model['portal_name']} - Warranty Report", title_style))
+    story.append(Paragraph(f"Generated: {generated_at}", body_style))
+    story.append(Spacer(1, 20))
+
+    key_value_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F8FAFC')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#0F172A')),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
+    ])
+
+    story.append(Paragraph("Device Information", heading_style))
+    device_table = Table(model["device_rows"], colWidths=[2*inch, 4*inch])
+    device_table.setStyle(key_value_style)
+    story.append(device_table)
+    story.append(Spacer(1, 20))
+
+    if model["part_rows"]:
+        story.append(Paragraph("Parts Warranty Status", heading_style))
+        parts_data = [["Part Name", "Replaced Date", "Warranty", "Expiry", "Status"]] + model["part_rows"]
+        parts_table = Table(parts_data, colWidths=[1.5*inch, 1.2*inch, 1*inch, 1.2*inch, 1*inch])
+        parts_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0F62FE')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ]))
+        story.append(parts_table)
+        story.append(Spacer(1, 20))
+
+    story.append(Paragraph("AMC / Service Coverage", heading_style))
+    amc_table = Table(model["amc_rows"], colWidths=[2*inch, 4*inch])
+    amc_table.setStyle(key_value_style)
+    story.append(amc_table)
+    story.append(Spacer(1, 30))
+
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.HexColor('#94A3B8'))
+    story.append(Paragraph("This document is auto-generated and valid as of the date mentioned above.", footer_style))
+    story.append(Paragraph("For any discrepancies, please contact support.", footer_style))
+
+    doc.build(story)
+    return buffer.getvalue()